@@ -5,7 +5,6 @@
 """
 
 import json
-import os
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
@@ -13,6 +12,8 @@ from pathlib import Path
 from datetime import datetime
 import argparse
 
+from evaluation.results_index import ResultsIndex
+
 # 設置字體 - 直接使用英文避免字體問題
 plt.rcParams['font.sans-serif'] = ['DejaVu Sans']
 plt.rcParams['axes.unicode_minus'] = False
@@ -39,30 +40,28 @@ class ResultAggregator:
                 print(f"Warning: Directory not found - {eval_dir}")
                 continue
                 
-            # 尋找 JSON 結果文件
-            json_files = list(eval_dir.glob("evaluation_results_*.json"))
-            if not json_files:
-                print(f"Warning: No result files found - {eval_dir}")
-                continue
-                
-            # 載入最新的結果文件
-            latest_json = max(json_files, key=os.path.getctime)
-            
-            try:
-                with open(latest_json, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
+            # 尋找 JSON 結果文件 (透過 ResultsIndex，未變更的檔案不重新解析)
+            with ResultsIndex(eval_dir, pattern="evaluation_results_*.json", recursive=False) as index:
+                index.refresh()
+                files = index.files()
+                if files.empty:
+                    print(f"Warning: No result files found - {eval_dir}")
+                    continue
+                    
+                # 載入最新的結果文件
+                latest = files.loc[files['ctime'].idxmax()]
+                if latest['error'] or latest['layout'] != 'grouped':
+                    print(f"Error: Failed to load {latest['path']} - {latest['error'] or 'unexpected results format'}")
+                    continue
                     
                 # 提取結果
-                results = data.get('results', {})
+                results = index.controller_results(latest['path'])
                 for controller_name, controller_data in results.items():
                     if controller_name not in self.aggregated_results:
                         self.aggregated_results[controller_name] = controller_data
                         print(f"✓ Loaded results for {controller_name}")
                     else:
                         print(f"⚠ Skipping duplicate {controller_name}")
-                        
-            except Exception as e:
-                print(f"Error: Failed to load {latest_json} - {e}")
                 
         print(f"\nSuccessfully loaded results for {len(self.aggregated_results)} controllers")
         
@@ -8,9 +8,11 @@ import os
 import json
 from datetime import datetime
 from lib.logger import get_logger
+from lib.metrics_log import MetricsWriter
 
 # --- GPU 優化: 步驟 6 ---
 from ai.utils import get_device
+from world.deadlock_detector import DeadlockDetector
 # --- GPU 優化結束 ---
 
 
@@ -24,7 +26,8 @@ class DQNController(TrafficController):
     
     def __init__(self, min_green_time=1, bias_factor=1.5, state_size=17, action_size=6, 
                  max_wait_threshold=50, model_name=None, reward_mode="step", 
-                 training_dir=None, log_file_path=None, batch_size=8192, memory_size=50000, **kwargs):
+                 training_dir=None, log_file_path=None, batch_size=8192, memory_size=50000,
+                 inference_backend="torch", **kwargs):
         """
         初始化DQN控制器
         
@@ -35,6 +38,7 @@ class DQNController(TrafficController):
             action_size (int): 動作空間維度
             max_wait_threshold (int): 機器人最大等待時間閾值，用於防鎖死
             model_name (str): 模型名稱，用於保存和加載模型
+            inference_backend (str): 決策推論後端，"torch" 或 "numpy" (小批次時較快)
             **kwargs: 其他參數
         """
         super().__init__(controller_name="DQN控制器")
@@ -80,7 +84,8 @@ class DQNController(TrafficController):
             model_name=self.model_name,  # 使用包含 reward_mode 的 model_name
             memory_size=memory_size,
             batch_size=self.batch_size,
-            reward_mode=reward_mode
+            reward_mode=reward_mode,
+            inference_backend=inference_backend
         )
         
         # 初始化自適應正規化器
@@ -101,6 +106,9 @@ class DQNController(TrafficController):
         
         # 是否處於訓練模式
         self.is_training = True
+        
+        # 是否在本進程更新網絡；多環境訓練的環境 worker 只收集轉換，由 learner 統一更新
+        self.learning_enabled = True
 
         # 用於追蹤每個交叉口的最後方向，以便實現"保持"動作
         self.intersection_last_directions = {}
@@ -243,18 +251,7 @@ class DQNController(TrafficController):
         intersection_id = intersection.id
         
         # 防鎖死機制檢查 - 計算每個方向的最大等待時間
-        max_wait_time_h = 0
-        max_wait_time_v = 0
-        
-        for robot in intersection.horizontal_robots.values():
-            if robot.current_intersection_start_time is not None:
-                wait_time = tick - robot.current_intersection_start_time
-                max_wait_time_h = max(max_wait_time_h, wait_time)
-        
-        for robot in intersection.vertical_robots.values():
-            if robot.current_intersection_start_time is not None:
-                wait_time = tick - robot.current_intersection_start_time
-                max_wait_time_v = max(max_wait_time_v, wait_time)
+        max_wait_time_h, max_wait_time_v = DeadlockDetector.getIntersectionMaxWaitTimes(intersection, tick)
         
         # === 新增：多層防鎖死機制 ===
         
@@ -284,10 +281,10 @@ class DQNController(TrafficController):
         if (h_robots > 0 and v_robots > 0 and 
             max_wait_time_h > deadlock_threshold and max_wait_time_v > deadlock_threshold):
             
-            # 檢查鄰近交叉口是否也有擁堵
-            neighboring_congestion = self._check_neighboring_congestion(intersection, warehouse)
+            # 路口上有機器人處於循環等待，或鄰近交叉口也有擁堵
+            wait_cycle = warehouse.deadlock_detector.hasCycleAtIntersection(intersection)
             
-            if neighboring_congestion:
+            if wait_cycle or self._check_neighboring_congestion(intersection, warehouse):
                 self.logger.warning(f"Intersection {intersection.id}: DEADLOCK DETECTED - Using priority break strategy")
                 # 優先讓delivery任務通行
                 h_priority = sum(1 for robot in intersection.horizontal_robots.values() 
@@ -520,6 +517,9 @@ class DQNController(TrafficController):
             # 更新先前狀態
             self.previous_states[intersection_id] = current_state
         
+        if not getattr(self, 'learning_enabled', True):
+            return
+        
         # 每32個tick進行一次批次訓練（更頻繁的訓練以充分利用GPU）
         if tick % 32 == 0:
             if len(self.dqn.memory) >= self.batch_size:
@@ -546,6 +546,15 @@ class DQNController(TrafficController):
         if tick % 5000 == 0 and tick > 0:
             self.dqn.save_model(tick=tick)
     
+    def set_learning_enabled(self, enabled):
+        """
+        設置是否在本進程執行經驗回放、目標網絡更新與模型保存
+        
+        Args:
+            enabled (bool): False 時 train() 只收集轉換
+        """
+        self.learning_enabled = enabled
+        
     def set_training_mode(self, is_training):
         """
         設置是否處於訓練模式
@@ -715,7 +724,7 @@ class DQNController(TrafficController):
             'system_metrics': episode_summary
         }
         
-        self.training_history['episodes'].append(episode_data)
+        self.record_episode(episode_data)
         
         # 重置 episode 數據
         self.current_episode_data = {
@@ -729,6 +738,22 @@ class DQNController(TrafficController):
         # 保存到文件
         self.save_training_history()
     
+    def record_episode(self, episode_data):
+        """
+        記錄一個 episode 到訓練歷史，並追加一筆到 metrics.jsonl (分析工具只需讀取新增的部分)
+        
+        Args:
+            episode_data: episode 摘要 (end_tick / total_reward / steps / avg_loss / avg_q_value / system_metrics ...)
+        """
+        self.training_history['episodes'].append(episode_data)
+        if not self.training_dir:
+            return
+        try:
+            MetricsWriter(self.training_dir).append(dict(
+                episode_data, episode=len(self.training_history['episodes']), epsilon=self.dqn.epsilon))
+        except Exception as e:
+            self.logger.error(f"Error appending training metrics: {e}")
+    
     def save_training_history(self):
         """保存訓練歷史到文件"""
         if not self.training_dir:
@@ -4,17 +4,18 @@ from ai.unified_reward_system import UnifiedRewardSystem
 import torch
 import torch.nn as nn
 import numpy as np
-import random
 import os
-import copy
 from multiprocessing import Pool
 import time
 import json
 import logging
 from lib.logger import get_logger
+from lib.metrics_log import MetricsWriter
 
 # --- GPU 優化: 步驟 4 ---
 from ai.utils import get_device
+from world.deadlock_detector import DeadlockDetector
+from ai.numpy_inference import NumpyMLP, validate_inference_backend
 # --- GPU 優化結束 ---
 
 
@@ -56,6 +57,9 @@ class EvolvableNetwork(nn.Module):
         # 保留 layers 屬性以便向後相容
         self.layers = nn.Sequential(self.fc1, nn.ReLU(), self.fc2, nn.ReLU(), self.fc3)
         
+        # NumPy 推論用的權重快取，權重變更時清除
+        self._numpy_mlp = None
+        
         self.to(self.device)
 
     def forward(self, x):
@@ -91,6 +95,18 @@ class EvolvableNetwork(nn.Module):
         else:
             # 新版本模型，直接載入
             super().load_state_dict(state_dict, strict=strict)
+        self._numpy_mlp = None
+    
+    def to_numpy(self):
+        """
+        取得此網絡的 NumPy 版本，用於小批次推論
+        
+        Returns:
+            NumpyMLP: 與 forward 輸出相同的 NumPy 網絡
+        """
+        if getattr(self, '_numpy_mlp', None) is None:
+            self._numpy_mlp = NumpyMLP.from_torch(self)
+        return self._numpy_mlp
     
     def get_weights_as_vector(self):
         """
@@ -112,14 +128,15 @@ class EvolvableNetwork(nn.Module):
             weight_vector (numpy.ndarray): 包含所有權重的一維數組
         """
         start = 0
-        for param in self.parameters():
-            param_size = param.numel()
-            param.data = torch.tensor(
-                weight_vector[start:start+param_size],
-                dtype=param.dtype,
-                device=self.device # 確保張量在正確的設備上
-            ).view_as(param.data)
-            start += param_size
+        with torch.no_grad():
+            for param in self.parameters():
+                param_size = param.numel()
+                # 直接寫入既有的參數張量，不另外配置新張量
+                param.copy_(torch.as_tensor(
+                    weight_vector[start:start+param_size], dtype=param.dtype
+                ).view_as(param))
+                start += param_size
+        self._numpy_mlp = None
 
 
 class NEController(TrafficController):
@@ -133,7 +150,8 @@ class NEController(TrafficController):
                  max_wait_threshold=50, model_name=None, 
                  population_size=20, elite_ratio=0.2, elite_size=None, tournament_size=4,
                  crossover_rate=0.8, mutation_rate=0.2, mutation_strength=0.15,  # 提高探索性
-                 evolution_interval=1000, reward_mode="global", training_dir=None, log_file_path=None, **kwargs):
+                 evolution_interval=1000, reward_mode="global", training_dir=None, log_file_path=None,
+                 inference_backend="torch", **kwargs):
         """
         初始化NERL控制器
         
@@ -151,6 +169,7 @@ class NEController(TrafficController):
             mutation_rate (float): 突變機率
             mutation_strength (float): 突變強度
             evolution_interval (int): 進化間隔 (修正：從100改為1000)
+            inference_backend (str): 決策推論後端，"torch" 或 "numpy" (小批次時較快)
         """
         super().__init__(controller_name="NERL控制器")
         # --- 【修改點 2：在呼叫 get_logger 時傳入 log_file_path】 ---
@@ -167,6 +186,7 @@ class NEController(TrafficController):
         # --- GPU 優化: 步驟 4 ---
         self.device = get_device()
         # --- GPU 優化結束 ---
+        self.inference_backend = validate_inference_backend(inference_backend)
         
         # NERL特有參數
         self.state_size = state_size
@@ -210,8 +230,8 @@ class NEController(TrafficController):
         self.logger.info(f"NEController initialized with reward_mode: {reward_mode} (V6.0 改進版)")
         print(f"NEController initialized with reward_mode: {reward_mode} (V6.0 改進版)")  # 強制輸出
         
-        # 初始化族群
-        self.population = self._initialize_population()
+        # 初始化族群：以 (population_size, 參數數量) 的權重矩陣保存，網絡在評估時才由矩陣建立
+        self.population_weights = self._initialize_population()
         self.fitness_scores = [0.0] * self.population_size
         
         # 當前個體索引和最佳個體
@@ -254,7 +274,7 @@ class NEController(TrafficController):
         初始化族群
         
         Returns:
-            list: 包含population_size個神經網絡的列表
+            numpy.ndarray: (population_size, 參數數量) 的權重矩陣，每列為一個個體
         """
         population = []
         for i in range(self.population_size):
@@ -266,7 +286,50 @@ class NEController(TrafficController):
                     for param in network.parameters():
                         param.data += torch.randn_like(param) * 0.1
             population.append(network)
-        return population
+        # 初始網絡與矩陣一致，直接作為網絡快取
+        self._population_networks = population
+        self._population_stale = False
+        return np.stack([network.get_weights_as_vector() for network in population]).astype(np.float32)
+    
+    @property
+    def population(self):
+        """族群的網絡列表，權重矩陣變更後第一次存取時才更新"""
+        self._ensure_population_matrix()
+        if self._population_stale:
+            self._materialize_population()
+        return self._population_networks
+    
+    @population.setter
+    def population(self, networks):
+        networks = list(networks)
+        self.population_weights = np.stack([network.get_weights_as_vector() for network in networks]).astype(np.float32)
+        self._population_networks = networks
+        self._population_stale = False
+    
+    def _ensure_population_matrix(self):
+        """舊版本保存的控制器只有網絡列表，轉成權重矩陣"""
+        if 'population_weights' not in self.__dict__:
+            self.population = self.__dict__.pop('population')
+    
+    def _materialize_population(self):
+        """
+        依權重矩陣更新網絡快取
+        
+        沿用上一代的網絡物件，只把權重寫入既有的參數張量；族群變大時才建立新網絡。
+        """
+        networks = self._population_networks[:len(self.population_weights)]
+        while len(networks) < len(self.population_weights):
+            networks.append(EvolvableNetwork(self.state_size, self.action_size, self.device))
+        for network, weights in zip(networks, self.population_weights):
+            network.set_weights_from_vector(weights)
+        self._population_networks = networks
+        self._population_stale = False
+    
+    def _network_from_weights(self, weights):
+        """由一列權重建立獨立的網絡 (不與族群快取共用)"""
+        network = EvolvableNetwork(self.state_size, self.action_size, self.device)
+        network.set_weights_from_vector(weights)
+        return network
     
     def get_state(self, intersection, tick, warehouse):
         """
@@ -389,18 +452,7 @@ class NEController(TrafficController):
             str: 允許通行的方向 "Horizontal" 或 "Vertical"
         """
         # 防鎖死機制檢查 - 計算每個方向的最大等待時間
-        max_wait_time_h = 0
-        max_wait_time_v = 0
-        
-        for robot in intersection.horizontal_robots.values():
-            if robot.current_intersection_start_time is not None:
-                wait_time = tick - robot.current_intersection_start_time
-                max_wait_time_h = max(max_wait_time_h, wait_time)
-        
-        for robot in intersection.vertical_robots.values():
-            if robot.current_intersection_start_time is not None:
-                wait_time = tick - robot.current_intersection_start_time
-                max_wait_time_v = max(max_wait_time_v, wait_time)
+        max_wait_time_h, max_wait_time_v = DeadlockDetector.getIntersectionMaxWaitTimes(intersection, tick)
         
         # === 增強防鎖死機制 ===
         
@@ -422,10 +474,10 @@ class NEController(TrafficController):
         if (h_robots > 0 and v_robots > 0 and 
             max_wait_time_h > deadlock_threshold and max_wait_time_v > deadlock_threshold):
             
-            # 檢查鄰近交叉口是否也有擁堵
-            neighboring_congestion = self._check_neighboring_congestion(intersection, warehouse)
+            # 路口上有機器人處於循環等待，或鄰近交叉口也有擁堵
+            wait_cycle = warehouse.deadlock_detector.hasCycleAtIntersection(intersection)
             
-            if neighboring_congestion:
+            if wait_cycle or self._check_neighboring_congestion(intersection, warehouse):
                 self.logger.warning(f"Intersection {intersection.id}: NERL DEADLOCK DETECTED - Using priority break strategy")
                 # 優先讓delivery任務通行
                 h_priority = sum(1 for robot in intersection.horizontal_robots.values() 
@@ -491,23 +543,20 @@ class NEController(TrafficController):
             network = self.best_individual if self.best_individual is not None else self.population[0]
         
         # 使用網絡預測動作
-        state_tensor = torch.FloatTensor(state).unsqueeze(0).to(self.device)
-        network.eval()  # 切換到評估模式，解決 BatchNorm1d 在單樣本時的問題
-        with torch.no_grad():
-            action_logits = network(state_tensor)
-            
-            # V7.0: 在訓練的早期世代增加探索
-            if self.is_training and self.generation_count < 3 and np.random.random() < 0.2:
-                # 20% 機率隨機選擇動作
-                action = np.random.randint(0, self.action_size)
-            else:
-                action = torch.argmax(action_logits).item()
-            
-            # V7.0 診斷：第一次決策時輸出網路輸出
-            if not hasattr(self, '_first_decision_logged'):
-                self.logger.info(f"[NERL] First decision network outputs: {action_logits.cpu().numpy().flatten()}")
-                self.logger.info(f"[NERL] Selected action: {action}")
-                self._first_decision_logged = True
+        action_logits = self._predict(network, state)
+        
+        # V7.0: 在訓練的早期世代增加探索
+        if self.is_training and self.generation_count < 3 and np.random.random() < 0.2:
+            # 20% 機率隨機選擇動作
+            action = np.random.randint(0, self.action_size)
+        else:
+            action = int(np.argmax(action_logits))
+        
+        # V7.0 診斷：第一次決策時輸出網路輸出
+        if not hasattr(self, '_first_decision_logged'):
+            self.logger.info(f"[NERL] First decision network outputs: {action_logits.flatten()}")
+            self.logger.info(f"[NERL] Selected action: {action}")
+            self._first_decision_logged = True
         
         self.previous_actions[intersection_id] = action
         
@@ -606,13 +655,25 @@ class NEController(TrafficController):
             return actions
 
         for intersection_id, state_list in states.items():
-            state_tensor = torch.FloatTensor(state_list).unsqueeze(0).to(self.device)
-            with torch.no_grad():
-                q_values = self.active_individual(state_tensor)
-                action = torch.argmax(q_values).item()
-            actions[intersection_id] = action
+            q_values = self._predict(self.active_individual, state_list)
+            actions[intersection_id] = int(np.argmax(q_values))
         return actions
 
+    def _predict(self, network, state):
+        """
+        以設定的推論後端計算網絡輸出
+        
+        Returns:
+            np.ndarray: 形狀為 (1, action_size) 的輸出
+        """
+        if getattr(self, 'inference_backend', "torch") == "numpy":
+            return network.to_numpy().forward(np.asarray(state, dtype=np.float32).reshape(1, -1))
+        
+        state_tensor = torch.FloatTensor(state).unsqueeze(0).to(self.device)
+        network.eval()  # 切換到評估模式，解決 BatchNorm1d 在單樣本時的問題
+        with torch.no_grad():
+            return network(state_tensor).cpu().numpy()
+
     def evolve_with_fitness(self, fitness_scores, episode_summaries=None, generation=None):
         """
         使用外部傳入的適應度分數列表來執行一代進化。
@@ -642,14 +703,14 @@ class NEController(TrafficController):
 
         if current_best_fitness > self.best_fitness:
             self.best_fitness = current_best_fitness
-            self.best_individual = copy.deepcopy(self.population[current_best_idx])
+            self.best_individual = self._network_from_weights(self.population_weights[current_best_idx])
             self.logger.info(f"New global best individual found with fitness: {self.best_fitness:.4f}")
             # 立刻保存更優的模型
             self.save_model()
 
-        # 創建新一代
-        new_population = self._create_new_generation()
-        self.population = new_population
+        # 創建新一代 (只更新權重矩陣，網絡在下次評估前才建立)
+        self.population_weights = self._create_new_generation()
+        self._population_stale = True
 
         # 重置內部狀態，為下一代做準備
         self.fitness_scores = [0.0] * self.population_size
@@ -657,116 +718,76 @@ class NEController(TrafficController):
         
         return self.best_fitness 
 
-    def _tournament_selection(self, k=3):
+    def _tournament_selection(self, k=3, count=1):
         """
-        錦標賽選擇
+        錦標賽選擇 (一次進行 count 場)
         
         Args:
             k (int): 錦標賽大小
+            count (int): 錦標賽場數
             
         Returns:
-            int: 選中的個體索引
+            numpy.ndarray: 每場選中的個體索引
         """
-        # 隨機選擇k個個體
-        selected_indices = np.random.choice(self.population_size, size=k, replace=False)
+        fitness = np.asarray(self.fitness_scores, dtype=np.float64)
+        k = min(k, len(fitness))
+        # 每場以隨機排序的前 k 個作為參賽者 (不重複)
+        contestants = np.argsort(np.random.random((count, len(fitness))), axis=1)[:, :k]
         # 返回適應度最高的
-        return selected_indices[np.argmax([self.fitness_scores[i] for i in selected_indices])]
+        winners = np.argmax(fitness[contestants], axis=1)
+        return contestants[np.arange(count), winners]
     
-    def _crossover(self, parent1, parent2):
+    def _crossover(self, parents1, parents2):
         """
-        均勻交叉兩個父代個體
+        均勻交叉 (逐列對應的父代權重)
         
         Args:
-            parent1: 第一個父代個體
-            parent2: 第二個父代個體
+            parents1: 第一個父代的權重矩陣
+            parents2: 第二個父代的權重矩陣
             
         Returns:
-            EvolvableNetwork: 子代個體
+            numpy.ndarray: 子代權重矩陣
         """
-        child = EvolvableNetwork(self.state_size, self.action_size, self.device)
-        
-        # 獲取父代權重
-        p1_weights = parent1.get_weights_as_vector()
-        p2_weights = parent2.get_weights_as_vector()
-        
-        # 均勻交叉
-        mask = np.random.random(p1_weights.shape) < 0.5
-        child_weights = np.where(mask, p1_weights, p2_weights)
-        
-        # 設置子代權重
-        child.set_weights_from_vector(child_weights)
-        
-        return child
+        mask = np.random.random(parents1.shape) < 0.5
+        return np.where(mask, parents1, parents2)
     
-    def _mutate(self, individual):
+    def _mutate(self, weights):
         """
-        高斯變異
+        高斯變異 (直接修改傳入的權重矩陣)
         
         Args:
-            individual: 要變異的個體
+            weights: 要變異的權重矩陣
             
         Returns:
-            EvolvableNetwork: 變異後的個體
+            numpy.ndarray: 變異後的權重矩陣
         """
-        # 獲取權重
-        weights = individual.get_weights_as_vector()
-        
-        # 生成變異遮罩 (選擇哪些權重進行變異)
+        # 生成變異遮罩 (選擇哪些權重進行變異)，只為被選中的權重產生高斯噪聲
         mutation_mask = np.random.random(weights.shape) < self.mutation_rate
-        
-        # 生成高斯噪聲
-        noise = np.random.normal(0, self.mutation_strength, weights.shape)
-        
-        # 應用變異
-        weights = weights + mutation_mask * noise
-        
-        # 設置變異後的權重
-        individual.set_weights_from_vector(weights)
-        
-        return individual
+        weights[mutation_mask] += np.random.normal(0, self.mutation_strength, int(mutation_mask.sum()))
+        return weights
     
     def _create_new_generation(self):
         """
         創建新一代族群
         
         Returns:
-            list: 新族群
+            numpy.ndarray: 新族群的權重矩陣
         """
-        new_population = []
-        
         # 精英保留 - 直接複製最佳個體
         # 確保精英數量不超過族群大小
-        actual_elite_size = min(self.elite_size, len(self.population))
+        actual_elite_size = min(self.elite_size, len(self.population_weights))
         elite_indices = np.argsort(self.fitness_scores)[-actual_elite_size:]
-        for idx in elite_indices:
-            new_population.append(copy.deepcopy(self.population[idx]))
-        
-        # 填充剩餘族群
-        while len(new_population) < self.population_size:
-            # 決定是否進行交叉
-            if random.random() < self.crossover_rate and len(new_population) + 1 < self.population_size:
-                # 交叉
-                parent1_idx = self._tournament_selection(self.tournament_size)
-                parent2_idx = self._tournament_selection(self.tournament_size)
-                
-                child1 = self._crossover(self.population[parent1_idx], self.population[parent2_idx])
-                child2 = self._crossover(self.population[parent2_idx], self.population[parent1_idx])
-                
-                # 變異
-                child1 = self._mutate(child1)
-                child2 = self._mutate(child2)
-                
-                new_population.append(child1)
-                if len(new_population) < self.population_size:
-                    new_population.append(child2)
-            else:
-                # 只複製和變異
-                parent_idx = self._tournament_selection(self.tournament_size)
-                child = copy.deepcopy(self.population[parent_idx])
-                child = self._mutate(child)
-                new_population.append(child)
+        elites = self.population_weights[elite_indices]
+        
+        # 填充剩餘族群：每個子代以 crossover_rate 的機率由兩個父代交叉，否則複製一個父代，之後一律變異
+        offspring_count = self.population_size - actual_elite_size
+        parents1 = self.population_weights[self._tournament_selection(self.tournament_size, offspring_count)]
+        parents2 = self.population_weights[self._tournament_selection(self.tournament_size, offspring_count)]
+        use_crossover = np.random.random(offspring_count) < self.crossover_rate
+        offspring = np.where(use_crossover[:, None], self._crossover(parents1, parents2), parents1)
+        offspring = self._mutate(offspring)
         
-        return new_population
+        return np.concatenate([elites, offspring]).astype(np.float32, copy=False)
     
     def save_generation_best(self, generation, best_idx, best_fitness, fitness_scores, episode_summary=None):
         """
@@ -843,6 +864,12 @@ class NEController(TrafficController):
                 json.dump(fitness_data, f, indent=2, ensure_ascii=False)
         except Exception as e:
             self.logger.error(f"Error saving fitness scores: {e}")
+
+        # 每一代追加一筆到 metrics.jsonl (內容與 fitness_scores.json 相同)
+        try:
+            MetricsWriter(self.training_dir).append(fitness_data)
+        except Exception as e:
+            self.logger.error(f"Error appending training metrics: {e}")
     
     def save_metadata(self, start_time, end_time, config, final_results):
         """
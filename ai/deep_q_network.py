@@ -6,12 +6,70 @@ import torch
 import torch.nn as nn
 import torch.optim as optim
 from lib.logger import get_logger
+from ai.numpy_inference import NumpyMLP, validate_inference_backend
+
+class EpisodeBuffer:
+    """
+    Global 模式的 episode 轉換緩衝區
+    
+    以預先配置、倍增擴充的陣列儲存轉換，episode 結束時可以整批取出，
+    避免逐筆處理 Python tuple。
+    """
+    
+    def __init__(self, state_size, capacity=1024):
+        self.state_size = state_size
+        self.size = 0
+        self.states = np.empty((capacity, state_size), dtype=np.float64)
+        self.actions = np.empty(capacity, dtype=np.int64)
+        self.next_states = np.empty((capacity, state_size), dtype=np.float64)
+        self.dones = np.empty(capacity, dtype=bool)
+    
+    def __len__(self):
+        return self.size
+    
+    def _grow(self):
+        capacity = 2 * len(self.actions)
+        for name in ('states', 'actions', 'next_states', 'dones'):
+            old = getattr(self, name)
+            new = np.empty((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+    
+    def append(self, state, action, next_state, done):
+        if self.size == len(self.actions):
+            self._grow()
+        self.states[self.size] = state
+        self.actions[self.size] = action
+        self.next_states[self.size] = next_state
+        self.dones[self.size] = done
+        self.size += 1
+    
+    def arrays(self):
+        """回傳目前所有轉換的陣列 (states, actions, next_states, dones)"""
+        n = self.size
+        return self.states[:n], self.actions[:n], self.next_states[:n], self.dones[:n]
+
+
+def discounted_returns(final_reward, length, gamma):
+    """
+    將 episode 結束時的獎勵以折扣因子回溯分配給每一步
+    
+    第 i 步 (共 length 步) 得到 final_reward * gamma^(length - 1 - i)，
+    以一次反向累積乘積計算。
+    """
+    if length <= 0:
+        return np.empty(0, dtype=np.float64)
+    discounts = np.full(length, gamma, dtype=np.float64)
+    discounts[-1] = 1.0
+    return final_reward * np.cumprod(discounts[::-1])[::-1]
+
 
 class DeepQNetwork:
     """深度Q學習網絡管理器"""
     
     def __init__(self, state_size, action_size, device, model_name=None, learning_rate=5e-4, gamma=0.95, 
-                 epsilon=1.0, epsilon_min=0.01, epsilon_decay=0.999, memory_size=100000, batch_size=8192, reward_mode="step"):
+                 epsilon=1.0, epsilon_min=0.01, epsilon_decay=0.999, memory_size=100000, batch_size=8192, reward_mode="step",
+                 inference_backend="torch"):
         """
         初始化深度Q網絡
         
@@ -27,6 +85,7 @@ class DeepQNetwork:
             epsilon_decay (float): epsilon 的衰減率
             memory_size (int): 記憶庫大小
             batch_size (int): 訓練時的批次大小
+            inference_backend (str): act() 使用的推論後端，"torch" 或 "numpy"
         """
         self.state_size = state_size
         self.action_size = action_size
@@ -49,7 +108,7 @@ class DeepQNetwork:
         self.reward_mode = reward_mode
         
         # Global 模式專用：儲存單個 episode 的所有轉換
-        self.episode_buffer = []
+        self.episode_buffer = EpisodeBuffer(state_size)
         
         # 初始化策略網絡和目標網絡
         self.policy_net = self._build_model().to(self.device) # 將模型移至GPU
@@ -61,6 +120,21 @@ class DeepQNetwork:
         
         # 均方誤差損失函數
         self.criterion = nn.MSELoss()
+        
+        # 推論後端：numpy 模式下 act() 使用匯出的權重矩陣，策略網絡更新後重新匯出
+        self.inference_backend = validate_inference_backend(inference_backend)
+        self._numpy_policy = None
+    
+    def set_inference_backend(self, backend):
+        """切換 act() 使用的推論後端"""
+        self.inference_backend = validate_inference_backend(backend)
+        self._numpy_policy = None
+    
+    def get_numpy_policy(self):
+        """取得策略網絡的 NumPy 版本，權重變更後自動重新匯出"""
+        if self._numpy_policy is None:
+            self._numpy_policy = NumpyMLP.from_torch(self.policy_net)
+        return self._numpy_policy
     
     def _build_model(self):
         """
@@ -95,12 +169,36 @@ class DeepQNetwork:
             done: 是否結束
         """
         if self.reward_mode == "global":
-            # Global 模式：先存入 episode buffer
-            self.episode_buffer.append((state, action, reward, next_state, done))
+            # Global 模式：先存入 episode buffer（獎勵在 episode 結束時分配）
+            self.episode_buffer.append(state, action, next_state, done)
         else:
             # Step 模式：直接存入記憶庫
             self.memory.append((state, action, reward, next_state, done))
         
+    def drain_memory(self):
+        """
+        取出並清空記憶庫中的所有轉換
+        
+        多環境訓練時，環境 worker 用它把收集到的轉換交給 learner。
+        """
+        transitions = list(self.memory)
+        self.memory.clear()
+        return transitions
+    
+    def add_transitions(self, transitions):
+        """將一批 (state, action, reward, next_state, done) 轉換整批存入記憶庫"""
+        self.memory.extend(transitions)
+    
+    def get_policy_weights(self):
+        """以 NumPy 陣列回傳策略網絡權重，可在進程之間傳遞"""
+        return {name: tensor.detach().cpu().numpy() for name, tensor in self.policy_net.state_dict().items()}
+    
+    def set_policy_weights(self, weights):
+        """載入 get_policy_weights() 產生的權重"""
+        state_dict = {name: torch.as_tensor(array, device=self.device) for name, array in weights.items()}
+        self.policy_net.load_state_dict(state_dict)
+        self._numpy_policy = None
+        
     def act(self, state):
         """
         根據當前狀態選擇動作
@@ -114,6 +212,9 @@ class DeepQNetwork:
         if np.random.rand() <= self.epsilon:
             return random.randrange(self.action_size)
         
+        if getattr(self, 'inference_backend', "torch") == "numpy":
+            return self.get_numpy_policy().predict_action(state)
+        
         # 將狀態轉換為張量並移至GPU
         state_tensor = torch.FloatTensor(state).unsqueeze(0).to(self.device)
         self.policy_net.eval()  # 設置為評估模式
@@ -171,6 +272,7 @@ class DeepQNetwork:
         # 梯度裁剪，防止梯度爆炸
         torch.nn.utils.clip_grad_norm_(self.policy_net.parameters(), max_norm=1.0)
         self.optimizer.step()
+        self._numpy_policy = None  # 權重已更新
         
         # 更新 epsilon
         if self.epsilon > self.epsilon_min:
@@ -200,6 +302,7 @@ class DeepQNetwork:
             try:
                 # 使用 map_location 將模型加載到正確的設備
                 self.policy_net.load_state_dict(torch.load(model_path, map_location=self.device))
+                self._numpy_policy = None
                 self.update_target_model()
                 self.logger.info(f"DQN model loaded from {model_path} to {self.device}")
                 return True
@@ -261,18 +364,14 @@ class DeepQNetwork:
         
         # 選項 2: 使用折扣因子進行時間衰減分配
         # 後期的動作對最終結果影響更大，應該得到更多獎勵
-        discounted_rewards = []
-        running_reward = global_reward
-        for i in range(len(self.episode_buffer) - 1, -1, -1):
-            discounted_rewards.insert(0, running_reward)
-            running_reward *= self.gamma
+        states, actions, next_states, dones = self.episode_buffer.arrays()
+        discounted_rewards = discounted_returns(global_reward, len(actions), self.gamma)
         
-        # 將 episode buffer 中的轉換與分配的獎勵一起存入主記憶庫
-        for i, (state, action, _, next_state, done) in enumerate(self.episode_buffer):
-            # 使用分配的獎勵替換原本的 0 獎勵
-            self.memory.append((state, action, discounted_rewards[i], next_state, done))
+        # 將 episode buffer 中的轉換與分配的獎勵一起整批存入主記憶庫
+        self.memory.extend(zip(states, actions.tolist(), discounted_rewards.tolist(),
+                               next_states, dones.tolist()))
         
         self.logger.info(f"Processed episode with {len(self.episode_buffer)} steps, global reward: {global_reward:.4f}")
         
-        # 清空 episode buffer 為下一個 episode 做準備
-        self.episode_buffer = []
+        # 換一個新的 episode buffer，已存入記憶庫的狀態仍引用舊陣列
+        self.episode_buffer = EpisodeBuffer(self.state_size)
@@ -0,0 +1,101 @@
+"""
+NumPy 推論後端
+將控制器的小型 MLP (Linear + ReLU) 權重匯出為 NumPy 矩陣，以純矩陣乘法進行前向傳播
+
+控制器每次只對單一路口的狀態做推論 (batch size = 1)，
+這種情況下 PyTorch 的框架開銷遠大於實際計算量。
+本模組在頂層不匯入 torch，評估 worker 可以直接從 .npz 權重檔載入網路。
+"""
+import numpy as np
+
+INFERENCE_BACKENDS = ("torch", "numpy")
+
+
+def validate_inference_backend(backend):
+    """檢查推論後端名稱，回傳正規化後的名稱"""
+    backend = (backend or "torch").lower()
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(f"未知的推論後端: {backend}，可用選項: {INFERENCE_BACKENDS}")
+    return backend
+
+
+class NumpyMLP:
+    """以 NumPy 執行的多層感知器，隱藏層使用 ReLU，輸出層不使用激活函數"""
+
+    def __init__(self, weights, biases):
+        """
+        Args:
+            weights (list): 每層的權重矩陣，形狀為 (out_features, in_features)，與 nn.Linear 相同
+            biases (list): 每層的偏置向量
+        """
+        if len(weights) != len(biases) or not weights:
+            raise ValueError("weights 與 biases 的層數必須相同且不為空")
+        # 預先轉置成 (in, out)，前向傳播時 x @ W + b
+        self.weights = [np.ascontiguousarray(np.asarray(w, dtype=np.float32).T) for w in weights]
+        self.biases = [np.asarray(b, dtype=np.float32) for b in biases]
+
+    @property
+    def input_size(self):
+        return self.weights[0].shape[0]
+
+    @property
+    def output_size(self):
+        return self.weights[-1].shape[1]
+
+    @classmethod
+    def from_torch(cls, module):
+        """
+        從 PyTorch 模組匯出權重
+
+        依註冊順序收集 nn.Linear 層 (重複註冊的層只計算一次)，
+        適用於 EvolvableNetwork 與 DeepQNetwork 的 nn.Sequential 模型。
+        """
+        import torch.nn as nn
+
+        linear_layers = [m for m in module.modules() if isinstance(m, nn.Linear)]
+        if not linear_layers:
+            raise ValueError("模組中沒有 nn.Linear 層")
+        weights = [layer.weight.detach().cpu().numpy() for layer in linear_layers]
+        biases = [layer.bias.detach().cpu().numpy() for layer in linear_layers]
+        return cls(weights, biases)
+
+    @classmethod
+    def load(cls, path):
+        """從 .npz 權重檔載入 (不需要 torch)"""
+        with np.load(path) as data:
+            num_layers = int(data["num_layers"])
+            weights = [data[f"weight_{i}"].T for i in range(num_layers)]
+            biases = [data[f"bias_{i}"] for i in range(num_layers)]
+        return cls(weights, biases)
+
+    def save(self, path):
+        """將權重存成 .npz 檔，供不匯入 torch 的評估 worker 使用"""
+        arrays = {"num_layers": np.array(len(self.weights))}
+        for i, (w, b) in enumerate(zip(self.weights, self.biases)):
+            arrays[f"weight_{i}"] = w
+            arrays[f"bias_{i}"] = b
+        np.savez(path, **arrays)
+
+    def forward(self, x):
+        """
+        前向傳播
+
+        Args:
+            x: 單一狀態 (state_size,) 或一批狀態 (batch, state_size)
+
+        Returns:
+            np.ndarray: 輸出，形狀與輸入的批次維度一致
+        """
+        x = np.asarray(x, dtype=np.float32)
+        last_layer = len(self.weights) - 1
+        for i, (w, b) in enumerate(zip(self.weights, self.biases)):
+            x = x @ w + b
+            if i < last_layer:
+                np.maximum(x, 0, out=x)
+        return x
+
+    __call__ = forward
+
+    def predict_action(self, state):
+        """回傳輸出值最大的動作"""
+        return int(np.argmax(self.forward(state)))
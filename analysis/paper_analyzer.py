@@ -8,68 +8,63 @@ import argparse
 import json
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
+from matplotlib import colormaps
 from pathlib import Path
 from datetime import datetime
 from scipy import stats
 import warnings
 warnings.filterwarnings('ignore')
 
-# 設置圖表樣式
-plt.style.use('seaborn-v0_8-darkgrid')
-sns.set_palette("husl")
+from evaluation.chart_renderer import ChartRenderer
+from evaluation.results_index import ResultsIndex
+from lib.metrics_log import read_metrics
 
-# 設置字體以支援英文
-plt.rcParams['font.family'] = 'DejaVu Sans'
-plt.rcParams['font.size'] = 10
-plt.rcParams['axes.unicode_minus'] = False
+# 圖表樣式 (字體設定以支援英文)；ChartRenderer 在獨立程序中渲染，樣式需隨 spec 一起傳遞
+CHART_STYLE = {
+    'style': 'seaborn-v0_8-darkgrid',
+    'rc': {'font.family': 'DejaVu Sans', 'font.size': 10, 'axes.unicode_minus': False}
+}
 
 class PaperAnalyzer:
-    def __init__(self, root_dir, output_dir=None):
+    def __init__(self, root_dir, output_dir=None, chart_options=None):
         """
         初始化分析器
         
         Args:
             root_dir: 包含評估結果的根目錄（可能是批次目錄）
             output_dir: 輸出目錄，如果為None則使用root_dir/aggregated_results
+            chart_options: 傳給 ChartRenderer 的參數 (dpi / fmt / preview / workers)
         """
         self.root_dir = Path(root_dir)
         self.output_dir = Path(output_dir) if output_dir else self.root_dir / "aggregated_results"
         self.output_dir.mkdir(exist_ok=True)
+        self.chart_options = chart_options or {}
         
         # 儲存所有有效數據
         self.all_data = []
         self.controller_data = {}
         
     def load_all_results(self):
-        """遞歸加載所有評估結果"""
+        """遞歸加載所有評估結果 (透過 ResultsIndex，只解析新增或變更的檔案)"""
         print(f"Scanning directory: {self.root_dir}")
         
-        # 搜尋所有 evaluation_results.json 檔案
-        json_files = list(self.root_dir.rglob("evaluation_results.json"))
-        print(f"Found {len(json_files)} evaluation result files")
-        
-        for json_file in json_files:
-            try:
-                with open(json_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                
-                # 提取結果
-                if 'results' in data:
-                    results = data['results']
-                    eval_config = data.get('evaluation_config', {})
-                    
-                    # 為每個結果添加來源資訊
-                    for result in results:
-                        result['source_file'] = str(json_file)
-                        result['eval_ticks_config'] = eval_config.get('evaluation_ticks', 0)
-                        self.all_data.append(result)
-                        
-                print(f"  Loaded {len(results)} runs from {json_file.parent.name}")
-                        
-            except Exception as e:
-                print(f"  Error loading {json_file}: {e}")
+        with ResultsIndex(self.root_dir) as index:
+            refreshed = index.refresh()
+            # 只取 evaluation_results.json 的運行清單格式
+            files = index.files("name = ?", ("evaluation_results.json",))
+            print(f"Found {len(files)} evaluation result files "
+                  f"({refreshed['parsed']} parsed, {refreshed['unchanged']} cached)")
+            
+            for _, row in files.iterrows():
+                if row['error']:
+                    print(f"  Error loading {row['path']}: {row['error']}")
+                elif row['layout'] == 'list':
+                    print(f"  Loaded {row['run_count']} runs from {row['experiment']}")
+            
+            # 為每個結果添加來源資訊 (source_file / eval_ticks_config)
+            self.all_data.extend(index.run_records(
+                "layout = 'list' AND file IN (SELECT path FROM files WHERE name = ?)",
+                ("evaluation_results.json",)))
         
         print(f"\nTotal runs loaded: {len(self.all_data)}")
         
@@ -353,63 +348,70 @@ class PaperAnalyzer:
                     metrics_data[metric]['values'].append(mean)
                     metrics_data[metric]['errors'].append(std)
         
-        # 創建圖表
-        fig, axes = plt.subplots(2, 2, figsize=(15, 12))
-        fig.suptitle('RMFS Controller Performance Comparison', fontsize=16, fontweight='bold')
-        
         # 設置顏色
-        colors = plt.cm.Set3(np.linspace(0, 1, len(controllers)))
+        colors = colormaps['Set3'](np.linspace(0, 1, len(controllers)))
         
-        # 繪製每個指標
-        for idx, (metric, data) in enumerate(metrics_data.items()):
-            ax = axes[idx // 2, idx % 2]
-            
+        # 每個指標一個子圖
+        axes_specs = []
+        for metric, data in metrics_data.items():
             # 創建條形圖
-            bars = ax.bar(controllers, data['values'], yerr=data['errors'] if any(data['errors']) else None,
-                          color=colors, capsize=5, alpha=0.8, edgecolor='black', linewidth=1)
-            
-            # 設置標題和標籤
-            ax.set_title(metric.replace('_', ' ').title(), fontsize=14, fontweight='bold')
-            ax.set_ylabel(data['ylabel'], fontsize=12)
-            ax.set_xlabel('Controller', fontsize=12)
-            
-            # 旋轉x軸標籤
-            ax.tick_params(axis='x', rotation=45)
+            layers = [{
+                'kind': 'bar',
+                'args': [controllers, data['values']],
+                'kwargs': {'yerr': data['errors'] if any(data['errors']) else None, 'color': colors,
+                           'capsize': 5, 'alpha': 0.8, 'edgecolor': 'black', 'linewidth': 1}
+            }]
             
-            # 添加數值標籤
-            for bar, value, error in zip(bars, data['values'], data['errors']):
-                height = bar.get_height()
+            # 添加數值標籤 (類別軸上第 i 個條形的中心為 i)
+            for index, (value, error) in enumerate(zip(data['values'], data['errors'])):
                 if error > 0:
                     label = f'{value:.1f}\n±{error:.1f}'
                 else:
                     label = f'{value:.1f}'
-                ax.text(bar.get_x() + bar.get_width()/2., height + max(data['errors']) * 0.1,
-                       label, ha='center', va='bottom', fontsize=9)
+                layers.append({'kind': 'text', 'args': [index, value + max(data['errors']) * 0.1, label],
+                               'kwargs': {'ha': 'center', 'va': 'bottom', 'fontsize': 9}})
             
-            # 添加網格
-            ax.grid(True, axis='y', alpha=0.3)
-        
-        plt.tight_layout()
-        
-        # 保存圖表
-        chart_file = self.output_dir / "performance_comparison.png"
-        plt.savefig(chart_file, dpi=300, bbox_inches='tight')
-        print(f"Comparison chart saved to: {chart_file}")
-        
-        # 生成統計顯著性熱力圖
-        self._generate_significance_heatmap()
-        
-        plt.close('all')
+            axes_specs.append({
+                # 設置標題和標籤
+                'title': {'label': metric.replace('_', ' ').title(), 'fontsize': 14, 'fontweight': 'bold'},
+                'ylabel': {'label': data['ylabel'], 'fontsize': 12},
+                'xlabel': {'label': 'Controller', 'fontsize': 12},
+                # 旋轉x軸標籤
+                'tick_params': {'axis': 'x', 'rotation': 45},
+                # 添加網格
+                'grid': {'axis': 'y', 'alpha': 0.3},
+                'layers': layers
+            })
+        
+        specs = [dict(CHART_STYLE, **{
+            'name': 'performance_comparison',
+            'figsize': (15, 12),
+            'grid': (2, 2),
+            'suptitle': {'t': 'RMFS Controller Performance Comparison', 'fontsize': 16, 'fontweight': 'bold'},
+            'tight_layout': True,
+            'axes': axes_specs
+        })]
+        
+        # 統計顯著性熱力圖
+        specs.append(self._significance_heatmap_spec())
+        
+        # 兩張圖一起平行渲染
+        renderer = ChartRenderer(self.output_dir, **self.chart_options)
+        chart_file, heatmap_file = renderer.render(specs)
+        if chart_file:
+            print(f"Comparison chart saved to: {chart_file}")
+        if heatmap_file:
+            print(f"Significance heatmap saved to: {heatmap_file}")
     
-    def _generate_significance_heatmap(self):
-        """生成統計顯著性熱力圖"""
+    def _significance_heatmap_spec(self):
+        """統計顯著性熱力圖 spec，沒有檢驗結果時返回None"""
         if not hasattr(self, 'significance_results'):
-            return
+            return None
         
         # 為完成率創建熱力圖
         metric = 'completion_rate'
         if metric not in self.significance_results:
-            return
+            return None
         
         controllers = list(self.statistics.keys())
         n = len(controllers)
@@ -425,10 +427,7 @@ class PaperAnalyzer:
                     p_matrix[i, j] = p_value
                     p_matrix[j, i] = p_value
         
-        # 創建圖表
-        plt.figure(figsize=(10, 8))
-        
-        # 使用自定義顏色映射
+        # 只顯示下三角
         mask = np.triu(np.ones_like(p_matrix, dtype=bool))
         
         # 轉換p值為顯著性等級
@@ -438,19 +437,20 @@ class PaperAnalyzer:
         sig_matrix[(p_matrix >= 0.01) & (p_matrix < 0.05)] = 1  # *
         sig_matrix[p_matrix >= 0.05] = 0  # ns
         
-        # 繪製熱力圖
-        ax = sns.heatmap(sig_matrix, mask=mask, cmap='RdYlGn_r', vmin=0, vmax=3,
-                        xticklabels=controllers, yticklabels=controllers,
-                        square=True, linewidths=1, cbar_kws={'label': 'Significance Level'},
-                        annot=p_matrix, fmt='.3f')
-        
-        plt.title('Statistical Significance Matrix - Completion Rate', fontsize=14, fontweight='bold')
-        plt.tight_layout()
-        
-        # 保存圖表
-        heatmap_file = self.output_dir / "significance_heatmap.png"
-        plt.savefig(heatmap_file, dpi=300, bbox_inches='tight')
-        print(f"Significance heatmap saved to: {heatmap_file}")
+        return dict(CHART_STYLE, **{
+            'name': 'significance_heatmap',
+            'figsize': (10, 8),
+            'tight_layout': True,
+            'axes': [{
+                'title': {'label': 'Statistical Significance Matrix - Completion Rate',
+                          'fontsize': 14, 'fontweight': 'bold'},
+                'layers': [{
+                    'kind': 'heatmap', 'data': sig_matrix, 'mask': mask, 'cmap': 'RdYlGn_r', 'vmin': 0, 'vmax': 3,
+                    'xticklabels': controllers, 'yticklabels': controllers,
+                    'annot': p_matrix, 'fmt': '.3f', 'colorbar': 'Significance Level'
+                }]
+            }]
+        })
     
     def save_aggregated_results(self):
         """保存聚合後的結果"""
@@ -590,31 +590,35 @@ def parse_dqn_log_line_as_json(line):
         pass
     return None
 
-def analyze_dqn_training(log_file, title, output_dir):
+def analyze_dqn_training(log_file, title, output_dir, chart_options=None):
     """分析DQN訓練日誌並生成圖表，日誌中包含JSON格式的摘要。"""
     print(f"Analyzing DQN training log with JSON parsing: {log_file}")
     output_dir = Path(output_dir)
     output_dir.mkdir(exist_ok=True)
     
-    episodes_data = []
-    try:
-        # 使用 'latin-1' 編碼來避免 UnicodeDecodeError
-        with open(log_file, 'r', encoding='latin-1') as f:
-            for line in f:
-                parsed_data = parse_dqn_log_line_as_json(line)
-                if parsed_data:
-                    episodes_data.append(parsed_data)
-    except FileNotFoundError:
-        print(f"Error: Log file not found at {log_file}")
-        return
+    # 訓練時寫入的 metrics.jsonl 優先，沒有時才逐行解析日誌
+    episodes_data = read_metrics(Path(log_file).parent)
+    if episodes_data:
+        print(f"  Using structured metrics: {len(episodes_data)} episodes")
+    else:
+        try:
+            # 使用 'latin-1' 編碼來避免 UnicodeDecodeError
+            with open(log_file, 'r', encoding='latin-1') as f:
+                for line in f:
+                    parsed_data = parse_dqn_log_line_as_json(line)
+                    if parsed_data:
+                        episodes_data.append(parsed_data)
+        except FileNotFoundError:
+            print(f"Error: Log file not found at {log_file}")
+            return
 
     if not episodes_data:
         print("No valid JSON summary data found in log file.")
         return
 
-    # 添加 episode 序號
+    # 添加 episode 序號 (metrics.jsonl 的紀錄已帶有序號)
     for i, episode in enumerate(episodes_data):
-        episode['episode_num'] = i + 1
+        episode['episode_num'] = episode.pop('episode', i + 1)
 
     df = pd.DataFrame(episodes_data)
     
@@ -655,85 +659,112 @@ def analyze_dqn_training(log_file, title, output_dir):
     }, inplace=True)
 
 
-    plot_dqn_training_from_data(df_plot, title, output_dir)
+    plot_dqn_training_from_data(df_plot, title, output_dir, chart_options=chart_options)
+
+
+def _training_curve_layers(episodes, values, label, color, avg_color, alpha=1.0):
+    """每回合數值與 50 回合移動平均兩條曲線"""
+    moving_avg = values.rolling(window=50, min_periods=1).mean()
+    return [
+        {'kind': 'plot', 'args': [episodes, values.to_numpy()],
+         'kwargs': {'label': f'{label} per Episode', 'color': color, 'alpha': alpha}},
+        {'kind': 'plot', 'args': [episodes, moving_avg.to_numpy()],
+         'kwargs': {'label': '50-Episode Moving Average', 'color': avg_color, 'linestyle': '--'}}
+    ]
 
 
-def plot_dqn_training_from_data(df, title, output_dir):
+def plot_dqn_training_from_data(df, title, output_dir, chart_options=None):
     """從DataFrame生成DQN訓練圖表。"""
-    fig, axes = plt.subplots(3, 1, figsize=(14, 20), sharex=True)
-    fig.suptitle(f'DQN Training Progression: {title}', fontsize=18, fontweight='bold')
+    episodes = df.index.to_numpy()
+    grid = {'which': 'both', 'linestyle': '--', 'linewidth': 0.5}
 
     # 1. 總獎勵 (Total Reward)
-    ax1 = axes[0]
-    ax1.plot(df.index, df['Total Reward'], label='Total Reward per Episode', color='royalblue')
-    reward_moving_avg = df['Total Reward'].rolling(window=50, min_periods=1).mean()
-    ax1.plot(df.index, reward_moving_avg, label='50-Episode Moving Average', color='cyan', linestyle='--')
-    ax1.set_ylabel('Total Reward')
-    ax1.set_title('Episode Reward')
-    ax1.legend()
-    ax1.grid(True, which='both', linestyle='--', linewidth=0.5)
+    reward_axes = {
+        'title': 'Episode Reward',
+        'ylabel': 'Total Reward',
+        'legend': True,
+        'grid': grid,
+        'layers': _training_curve_layers(episodes, df['Total Reward'], 'Total Reward', 'royalblue', 'cyan')
+    }
 
     # 2. 平均損失 (Average Loss)
-    ax2 = axes[1]
-    ax2.plot(df.index, df['Average Loss'], label='Average Loss per Episode', color='orangered', alpha=0.6)
-    loss_moving_avg = df['Average Loss'].rolling(window=50, min_periods=1).mean()
-    ax2.plot(df.index, loss_moving_avg, label='50-Episode Moving Average', color='darkorange', linestyle='--')
-    ax2.set_ylabel('Average Loss')
-    ax2.set_title('Training Loss')
+    loss_axes = {
+        'title': 'Training Loss',
+        'ylabel': 'Average Loss',
+        'legend': True,
+        'grid': grid,
+        'layers': _training_curve_layers(episodes, df['Average Loss'], 'Average Loss', 'orangered', 'darkorange',
+                                         alpha=0.6)
+    }
     # 損失通常跨越多個數量級，使用對數座標軸，但要處理0或負值
     if (df['Average Loss'] > 0).all():
-        ax2.set_yscale('log')
-    ax2.legend()
-    ax2.grid(True, which='both', linestyle='--', linewidth=0.5)
+        loss_axes['yscale'] = 'log'
 
     # 3. 平均Q值 (Average Q-Value)
-    ax3 = axes[2]
-    ax3.plot(df.index, df['Average Q-Value'], label='Average Q-Value per Episode', color='forestgreen')
-    q_moving_avg = df['Average Q-Value'].rolling(window=50, min_periods=1).mean()
-    ax3.plot(df.index, q_moving_avg, label='50-Episode Moving Average', color='lime', linestyle='--')
-    ax3.set_xlabel('Episode Number')
-    ax3.set_ylabel('Average Q-Value')
-    ax3.set_title('Average Q-Value')
-    ax3.legend()
-    ax3.grid(True, which='both', linestyle='--', linewidth=0.5)
-
-    plt.tight_layout(rect=[0, 0.03, 1, 0.96])
-    
+    q_axes = {
+        'title': 'Average Q-Value',
+        'xlabel': 'Episode Number',
+        'ylabel': 'Average Q-Value',
+        'legend': True,
+        'grid': grid,
+        'layers': _training_curve_layers(episodes, df['Average Q-Value'], 'Average Q-Value', 'forestgreen', 'lime')
+    }
+
     file_title = title.replace(" ", "_").replace("(", "").replace(")", "")
-    output_path = output_dir / f'DQN_Training_{file_title}.png'
-    plt.savefig(output_path, dpi=300)
-    plt.close()
-    print(f"DQN training plot saved to {output_path}")
+    spec = dict(CHART_STYLE, **{
+        'name': f'DQN_Training_{file_title}',
+        'figsize': (14, 20),
+        'grid': (3, 1),
+        'sharex': True,
+        'suptitle': {'t': f'DQN Training Progression: {title}', 'fontsize': 18, 'fontweight': 'bold'},
+        'tight_layout': {'rect': [0, 0.03, 1, 0.96]},
+        'savefig': {'bbox_inches': None},
+        'axes': [reward_axes, loss_axes, q_axes]
+    })
 
+    output_path, = ChartRenderer(Path(output_dir), **(chart_options or {})).render([spec])
+    if output_path:
+        print(f"DQN training plot saved to {output_path}")
 
-def analyze_nerl_evolution(experiment_dir, title, output_dir):
-    """分析單個NERL實驗的演化過程。"""
-    print(f"Analyzing NERL evolution for: {title}")
-    experiment_path = Path(experiment_dir)
-    output_path = Path(output_dir)
-    output_path.mkdir(exist_ok=True)
 
-    generation_data = []
-    for gen_dir in sorted(experiment_path.glob('gen???')):
+def load_nerl_generations(experiment_path):
+    """每一代的 fitness 紀錄：優先讀 metrics.jsonl，沒有時才逐一讀取 gen???/fitness_scores.json"""
+    records = read_metrics(experiment_path)
+    if records:
+        return records
+
+    records = []
+    for gen_dir in sorted(Path(experiment_path).glob('gen???')):
         fitness_file = gen_dir / 'fitness_scores.json'
         if fitness_file.exists():
             try:
                 with open(fitness_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                
-                generation = data.get('generation')
-                all_fitness = data.get('all_fitness')
-                
-                if generation is not None and all_fitness:
-                    generation_data.append({
-                        'generation': generation,
-                        'max_fitness': np.max(all_fitness),
-                        'mean_fitness': np.mean(all_fitness),
-                        'min_fitness': np.min(all_fitness),
-                        'std_fitness': np.std(all_fitness)
-                    })
+                    records.append(json.load(f))
             except (json.JSONDecodeError, TypeError) as e:
                 print(f"  Warning: Could not process {fitness_file}. Error: {e}")
+    return records
+
+
+def analyze_nerl_evolution(experiment_dir, title, output_dir, chart_options=None):
+    """分析單個NERL實驗的演化過程。"""
+    print(f"Analyzing NERL evolution for: {title}")
+    experiment_path = Path(experiment_dir)
+    output_path = Path(output_dir)
+    output_path.mkdir(exist_ok=True)
+
+    generation_data = []
+    for data in load_nerl_generations(experiment_path):
+        generation = data.get('generation')
+        all_fitness = data.get('all_fitness')
+        
+        if generation is not None and all_fitness:
+            generation_data.append({
+                'generation': generation,
+                'max_fitness': np.max(all_fitness),
+                'mean_fitness': np.mean(all_fitness),
+                'min_fitness': np.min(all_fitness),
+                'std_fitness': np.std(all_fitness)
+            })
 
     if not generation_data:
         print("  No valid generation data found.")
@@ -741,34 +772,40 @@ def analyze_nerl_evolution(experiment_dir, title, output_dir):
 
     df = pd.DataFrame(generation_data).sort_values('generation')
 
-    # Plotting the evolution curve
-    plt.figure(figsize=(15, 8))
-    
-    # Plotting the mean fitness
-    plt.plot(df['generation'], df['mean_fitness'], label='Mean Fitness', color='b', marker='o')
-    
-    # Filling the area between max and min fitness to show diversity
-    plt.fill_between(df['generation'], df['min_fitness'], df['max_fitness'], 
-                     alpha=0.2, color='lightblue', label='Fitness Range (Min-Max)')
-    
-    # Plotting the max fitness for each generation
-    plt.plot(df['generation'], df['max_fitness'], label='Max Fitness', color='g', linestyle='--', marker='^', markersize=4)
-
-    plt.title(f'NERL Evolutionary Process: {title}', fontsize=16)
-    plt.xlabel('Generation')
-    plt.ylabel('Fitness Score')
-    plt.legend()
-    plt.grid(True)
-    
+    generations = df['generation'].to_numpy()
+    layers = [
+        # Plotting the mean fitness
+        {'kind': 'plot', 'args': [generations, df['mean_fitness'].to_numpy()],
+         'kwargs': {'label': 'Mean Fitness', 'color': 'b', 'marker': 'o'}},
+        # Filling the area between max and min fitness to show diversity
+        {'kind': 'fill_between', 'args': [generations, df['min_fitness'].to_numpy(), df['max_fitness'].to_numpy()],
+         'kwargs': {'alpha': 0.2, 'color': 'lightblue', 'label': 'Fitness Range (Min-Max)'}},
+        # Plotting the max fitness for each generation
+        {'kind': 'plot', 'args': [generations, df['max_fitness'].to_numpy()],
+         'kwargs': {'label': 'Max Fitness', 'color': 'g', 'linestyle': '--', 'marker': '^', 'markersize': 4}}
+    ]
+
     file_title = title.replace(" ", "_").replace("/", "_").replace("(", "").replace(")", "")
-    plot_save_path = output_path / f'NERL_Evolution_{file_title}.png'
-    plt.savefig(plot_save_path, dpi=300)
-    plt.close()
-    
-    print(f"  Evolution plot saved to {plot_save_path}")
+    spec = dict(CHART_STYLE, **{
+        'name': f'NERL_Evolution_{file_title}',
+        'figsize': (15, 8),
+        'savefig': {'bbox_inches': None},
+        'axes': [{
+            'title': {'label': f'NERL Evolutionary Process: {title}', 'fontsize': 16},
+            'xlabel': 'Generation',
+            'ylabel': 'Fitness Score',
+            'legend': True,
+            'grid': True,
+            'layers': layers
+        }]
+    })
+
+    plot_save_path, = ChartRenderer(output_path, **(chart_options or {})).render([spec])
+    if plot_save_path:
+        print(f"  Evolution plot saved to {plot_save_path}")
 
 
-def analyze_nerl_elite_evolution(experiment_dir, title, output_dir):
+def analyze_nerl_elite_evolution(experiment_dir, title, output_dir, chart_options=None):
     """
     分析單個NERL實驗中，每一代精英個體的KPI演化過程。
     為每個KPI生成獨立的圖表，並計算線性回歸趨勢。
@@ -780,25 +817,17 @@ def analyze_nerl_elite_evolution(experiment_dir, title, output_dir):
     exp_output_dir.mkdir(parents=True, exist_ok=True)
 
     elite_kpi_data = []
-    for gen_dir in sorted(experiment_path.glob('gen???')):
-        fitness_file = gen_dir / 'fitness_scores.json'
-        if fitness_file.exists():
-            try:
-                with open(fitness_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                
-                generation = data.get('generation')
-                best_metrics = data.get('best_individual_metrics')
-                best_fitness = data.get('best_fitness')
-                
-                if generation is not None and best_metrics and best_fitness is not None:
-                    record = {'generation': generation, 'best_fitness': best_fitness}
-                    record.update(best_metrics)
-                    elite_kpi_data.append(record)
-                else:
-                    print(f"  Warning: Skipping gen {generation or 'N/A'}. Missing data.")
-            except (json.JSONDecodeError, TypeError) as e:
-                print(f"  Warning: Could not process {fitness_file}. Error: {e}. Skipping.")
+    for data in load_nerl_generations(experiment_path):
+        generation = data.get('generation')
+        best_metrics = data.get('best_individual_metrics')
+        best_fitness = data.get('best_fitness')
+        
+        if generation is not None and best_metrics and best_fitness is not None:
+            record = {'generation': generation, 'best_fitness': best_fitness}
+            record.update(best_metrics)
+            elite_kpi_data.append(record)
+        else:
+            print(f"  Warning: Skipping gen {generation or 'N/A'}. Missing data.")
 
     if not elite_kpi_data:
         print("  No valid elite KPI data found.")
@@ -826,20 +855,20 @@ def analyze_nerl_elite_evolution(experiment_dir, title, output_dir):
     }
 
     trend_report_lines = [f"Trend Analysis Report for: {title}\n" + "="*50]
+    specs = []
 
     for kpi_key, kpi_title in kpis_to_plot.items():
         if kpi_key not in df.columns or df[kpi_key].isnull().all():
             continue
 
-        plt.figure(figsize=(12, 7))
-        ax = plt.gca()
-
         # 原始數據點
-        ax.plot(df['generation'], df[kpi_key], marker='.', linestyle='-', label=kpi_title, alpha=0.6)
+        layers = [{'kind': 'plot', 'args': [df['generation'].to_numpy(), df[kpi_key].to_numpy()],
+                   'kwargs': {'marker': '.', 'linestyle': '-', 'label': kpi_title, 'alpha': 0.6}}]
         
         # 5代移動平均線
         moving_avg = df[kpi_key].rolling(window=5, min_periods=1).mean()
-        ax.plot(df['generation'], moving_avg, linestyle='--', label='5-Gen Moving Avg.')
+        layers.append({'kind': 'plot', 'args': [df['generation'].to_numpy(), moving_avg.to_numpy()],
+                       'kwargs': {'linestyle': '--', 'label': '5-Gen Moving Avg.'}})
 
         # 線性回歸趨勢線
         x = df['generation']
@@ -848,7 +877,8 @@ def analyze_nerl_elite_evolution(experiment_dir, title, output_dir):
         valid_indices = ~np.isnan(y)
         if np.any(valid_indices):
             m, b = np.polyfit(x[valid_indices], y[valid_indices], 1)
-            ax.plot(x, m*x + b, 'r--', label=f'Linear Trend (Slope: {m:.4f})')
+            layers.append({'kind': 'plot', 'args': [x.to_numpy(), (m*x + b).to_numpy(), 'r--'],
+                           'kwargs': {'label': f'Linear Trend (Slope: {m:.4f})'}})
             
             # 判斷趨勢好壞
             is_positive_good = kpi_trend_is_good_if_positive[kpi_key]
@@ -863,17 +893,23 @@ def analyze_nerl_elite_evolution(experiment_dir, title, output_dir):
             trend_report_lines.append(f"  - Slope: {m:.6f}")
             trend_report_lines.append(f"  - Assessment: {trend_assessment}")
 
+        specs.append(dict(CHART_STYLE, **{
+            'name': kpi_key,
+            'figsize': (12, 7),
+            'tight_layout': True,
+            'savefig': {'bbox_inches': None},
+            'axes': [{
+                'title': {'label': f'Elite KPI Evolution: {kpi_title}\n({title})', 'fontsize': 16},
+                'xlabel': 'Generation',
+                'ylabel': kpi_title,
+                'grid': {'which': 'both', 'linestyle': '--', 'linewidth': 0.5},
+                'legend': True,
+                'layers': layers
+            }]
+        }))
 
-        ax.set_title(f'Elite KPI Evolution: {kpi_title}\n({title})', fontsize=16)
-        ax.set_xlabel('Generation')
-        ax.set_ylabel(kpi_title)
-        ax.grid(True, which='both', linestyle='--', linewidth=0.5)
-        ax.legend()
-        
-        plt.tight_layout()
-        plot_save_path = exp_output_dir / f'{kpi_key}.png'
-        plt.savefig(plot_save_path, dpi=300)
-        plt.close()
+    # 各 KPI 圖表平行渲染
+    ChartRenderer(exp_output_dir, **(chart_options or {})).render(specs)
 
     # 保存趨勢報告
     report_path = exp_output_dir / 'trend_report.txt'
@@ -883,7 +919,7 @@ def analyze_nerl_elite_evolution(experiment_dir, title, output_dir):
     print(f"  Individual KPI plots and trend report saved to {exp_output_dir}")
 
 
-def analyze_nerl_final_comparison(root_log_dir, output_dir):
+def analyze_nerl_final_comparison(root_log_dir, output_dir, chart_options=None):
     """
     比較所有NERL實驗組最終一代（冠軍模型）的KPI。
     """
@@ -951,41 +987,51 @@ def analyze_nerl_final_comparison(root_log_dir, output_dir):
     def get_hatch(name):
         return '/' if '8000' in name else ''
 
+    # 添加圖例說明
+    legend_patches = [
+        {'facecolor': 'royalblue', 'edgecolor': 'black', 'label': 'Step Reward (Variant A)'},
+        {'facecolor': 'skyblue', 'edgecolor': 'black', 'label': 'Step Reward (Variant B)'},
+        {'facecolor': 'seagreen', 'edgecolor': 'black', 'label': 'Global Reward (Variant A)'},
+        {'facecolor': 'limegreen', 'edgecolor': 'black', 'label': 'Global Reward (Variant B)'},
+        {'facecolor': 'white', 'edgecolor': 'black', 'hatch': '/', 'label': '8000 Ticks Evaluation'}
+    ]
+
+    specs = []
     for kpi, title in kpis_to_plot.items():
         if kpi not in df.columns:
+            specs.append(None)
             continue
         
-        plt.figure(figsize=(18, 10))
         # 排序以獲得更好的視覺效果
         df_sorted = df.sort_values(by=kpi, ascending=False if kpi != 'energy_per_order' else True)
-        
-        bars = plt.bar(df_sorted['experiment'], df_sorted[kpi], 
-                       color=[get_color(name) for name in df_sorted['experiment']],
-                       hatch=[get_hatch(name) for name in df_sorted['experiment']],
-                       edgecolor='black')
-
-        plt.title(f'Final Elite Model Comparison: {title}', fontsize=16)
-        plt.ylabel(title)
-        plt.xlabel('Experiment Group')
-        plt.xticks(rotation=45, ha="right")
-        plt.grid(axis='y', linestyle='--', alpha=0.7)
-
-        # 添加圖例說明
-        from matplotlib.patches import Patch
-        legend_elements = [
-            Patch(facecolor='royalblue', edgecolor='black', label='Step Reward (Variant A)'),
-            Patch(facecolor='skyblue', edgecolor='black', label='Step Reward (Variant B)'),
-            Patch(facecolor='seagreen', edgecolor='black', label='Global Reward (Variant A)'),
-            Patch(facecolor='limegreen', edgecolor='black', label='Global Reward (Variant B)'),
-            Patch(facecolor='white', edgecolor='black', hatch='/', label='8000 Ticks Evaluation')
-        ]
-        plt.legend(handles=legend_elements, bbox_to_anchor=(1.05, 1), loc='upper left')
-
-        plt.tight_layout()
-        plot_save_path = output_path / f'NERL_Final_Comparison_{kpi}.png'
-        plt.savefig(plot_save_path, dpi=300)
-        plt.close()
-        print(f"  Comparison plot for {kpi} saved to {plot_save_path}")
+        experiments = df_sorted['experiment'].tolist()
+        
+        specs.append(dict(CHART_STYLE, **{
+            'name': f'NERL_Final_Comparison_{kpi}',
+            'figsize': (18, 10),
+            'tight_layout': True,
+            'savefig': {'bbox_inches': None},
+            'axes': [{
+                'title': {'label': f'Final Elite Model Comparison: {title}', 'fontsize': 16},
+                'ylabel': title,
+                'xlabel': 'Experiment Group',
+                'xticklabel_props': {'rotation': 45, 'ha': 'right'},
+                'grid': {'axis': 'y', 'linestyle': '--', 'alpha': 0.7},
+                'legend': {'patches': legend_patches, 'bbox_to_anchor': (1.05, 1), 'loc': 'upper left'},
+                'layers': [{
+                    'kind': 'bar',
+                    'args': [experiments, df_sorted[kpi].to_numpy()],
+                    'kwargs': {'color': [get_color(name) for name in experiments],
+                               'hatch': [get_hatch(name) for name in experiments],
+                               'edgecolor': 'black'}
+                }]
+            }]
+        }))
+
+    # 各 KPI 圖表平行渲染
+    for kpi, plot_save_path in zip(kpis_to_plot, ChartRenderer(output_path, **(chart_options or {})).render(specs)):
+        if plot_save_path:
+            print(f"  Comparison plot for {kpi} saved to {plot_save_path}")
 
 def main():
     parser = argparse.ArgumentParser(description="RMFS 數據分析與視覺化工具")
@@ -996,14 +1042,19 @@ def main():
     parser.add_argument('--title', '-t', default='Training Analysis', help='圖表標題 (用於 "training" 分析)')
     parser.add_argument('--exp_dir', help='單個實驗目錄 (用於 "nerl-evolution" 分析)')
     parser.add_argument('--log_dir', help='包含所有NERL實驗日誌的根目錄 (用於 "nerl-final-comparison")')
+    parser.add_argument('--dpi', type=int, help='圖表解析度 (預設 300)')
+    parser.add_argument('--format', dest='chart_format', help='圖表格式，例如 png、pdf、svg (預設 png)')
+    parser.add_argument('--preview', action='store_true', help='快速預覽：以低解析度輸出圖表')
+    parser.add_argument('--workers', type=int, help='平行渲染圖表的程序數 (預設為 CPU 核心數)')
     
     args = parser.parse_args()
+    chart_options = {'dpi': args.dpi, 'fmt': args.chart_format, 'preview': args.preview, 'workers': args.workers}
     
     if args.analysis_type == 'eval':
         if not args.root_dir:
             parser.error('"eval" 分析需要 --root_dir 參數。')
         output_dir = args.output if args.output else Path(args.root_dir) / "aggregated_results"
-        analyzer = PaperAnalyzer(args.root_dir, output_dir)
+        analyzer = PaperAnalyzer(args.root_dir, output_dir, chart_options=chart_options)
         analyzer.run_analysis()
     
     elif args.analysis_type == 'training':
@@ -1011,27 +1062,27 @@ def main():
             parser.error('"training" 分析需要 --log_file 參數。')
         output_dir = args.output if args.output else Path(args.log_file).parent / "analysis_results"
         # 假設是DQN日誌，未來可以擴充
-        analyze_dqn_training(args.log_file, args.title, output_dir)
+        analyze_dqn_training(args.log_file, args.title, output_dir, chart_options=chart_options)
 
     elif args.analysis_type == 'nerl-evolution':
         if not args.exp_dir:
             parser.error('"nerl-evolution" 分析需要 --exp_dir 參數。')
         output_dir = args.output if args.output else Path(args.exp_dir).parent / "analysis_results"
         title = args.title if args.title else Path(args.exp_dir).name
-        analyze_nerl_evolution(args.exp_dir, title, output_dir)
+        analyze_nerl_evolution(args.exp_dir, title, output_dir, chart_options=chart_options)
 
     elif args.analysis_type == 'nerl-elite-kpi':
         if not args.exp_dir:
             parser.error('"nerl-elite-kpi" 分析需要 --exp_dir 參數。')
         output_dir = args.output if args.output else Path(args.exp_dir).parent / "analysis_results"
         title = args.title if args.title else Path(args.exp_dir).name
-        analyze_nerl_elite_evolution(args.exp_dir, title, output_dir)
+        analyze_nerl_elite_evolution(args.exp_dir, title, output_dir, chart_options=chart_options)
 
     elif args.analysis_type == 'nerl-final-comparison':
         if not args.log_dir:
             parser.error('"nerl-final-comparison" 分析需要 --log_dir 參數。')
         output_dir = args.output if args.output else Path(args.log_dir) / "analysis_results"
-        analyze_nerl_final_comparison(args.log_dir, output_dir)
+        analyze_nerl_final_comparison(args.log_dir, output_dir, chart_options=chart_options)
 
 
 if __name__ == "__main__":
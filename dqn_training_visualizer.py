@@ -6,29 +6,27 @@ DQN Training Visualizer
 
 import os
 import json
-import matplotlib.pyplot as plt
 import pandas as pd
 import numpy as np
 from pathlib import Path
-import seaborn as sns
 from datetime import datetime
 import argparse
 import warnings
 warnings.filterwarnings('ignore')
 
-# 設置樣式
-sns.set_style("whitegrid")
-plt.style.use('default')
+from evaluation.chart_renderer import ChartRenderer
 
 class DQNTrainingVisualizer:
-    def __init__(self, training_dir):
+    def __init__(self, training_dir, chart_options=None):
         """
         初始化 DQN 訓練視覺化器
         
         Args:
             training_dir: 訓練數據目錄路徑
+            chart_options: 傳給 ChartRenderer 的參數 (dpi / fmt / preview / workers)
         """
         self.training_dir = Path(training_dir)
+        self.chart_options = chart_options or {}
         self.output_dir = self.training_dir / "visualizations"
         self.output_dir.mkdir(exist_ok=True)
         
@@ -61,15 +59,38 @@ class DQNTrainingVisualizer:
             print(f"❌ 載入數據時發生錯誤: {e}")
             return False
     
+    def _render(self, specs):
+        """以 ChartRenderer 渲染圖表，回傳輸出路徑"""
+        renderer = ChartRenderer(self.output_dir, **self.chart_options)
+        return renderer.render(specs)
+    
     def plot_training_curves(self):
         """繪製訓練曲線"""
+        save_path, = self._render([self._training_curves_spec()])
+        if save_path:
+            print(f"✅ 訓練曲線已保存至: {save_path}")
+    
+    def plot_episode_analysis(self):
+        """分析 episode 數據"""
+        save_path, = self._render([self._episode_analysis_spec()])
+        if save_path:
+            print(f"✅ Episode 分析已保存至: {save_path}")
+    
+    def plot_action_distribution(self):
+        """繪製動作分布"""
+        save_path, = self._render([self._action_distribution_spec()])
+        if save_path:
+            print(f"✅ 動作分布已保存至: {save_path}")
+    
+    def _training_curves_spec(self):
+        """訓練曲線圖表 spec"""
         if not self.training_data:
-            return
+            return None
             
         checkpoints = self.training_data.get('checkpoints', [])
         if not checkpoints:
             print("❌ 沒有找到檢查點數據")
-            return
+            return None
             
         # 提取數據
         ticks = [cp['tick'] for cp in checkpoints]
@@ -78,79 +99,52 @@ class DQNTrainingVisualizer:
         q_values = [cp['avg_q_value'] for cp in checkpoints]
         epsilons = [cp['epsilon'] for cp in checkpoints]
         completion_rates = [cp['completion_rate'] * 100 for cp in checkpoints]
+        memory_sizes = [cp['memory_size'] for cp in checkpoints]
         
-        # 創建子圖
-        fig, axes = plt.subplots(2, 3, figsize=(18, 10))
-        fig.suptitle('DQN Training Progress', fontsize=16, fontweight='bold')
-        
-        # 1. 累積獎勵
-        ax = axes[0, 0]
-        ax.plot(ticks, rewards, 'b-', linewidth=2)
-        ax.set_title('Cumulative Episode Reward')
-        ax.set_xlabel('Training Steps')
-        ax.set_ylabel('Cumulative Reward')
-        ax.grid(True, alpha=0.3)
-        
-        # 2. 平均損失
-        ax = axes[0, 1]
-        if any(loss > 0 for loss in losses):
-            ax.plot(ticks, losses, 'r-', linewidth=2)
-            ax.set_title('Average Loss')
-            ax.set_xlabel('Training Steps')
-            ax.set_ylabel('Loss')
-            ax.set_yscale('log')
-            ax.grid(True, alpha=0.3)
-        
-        # 3. 平均 Q 值
-        ax = axes[0, 2]
-        ax.plot(ticks, q_values, 'g-', linewidth=2)
-        ax.set_title('Average Q-Value')
-        ax.set_xlabel('Training Steps')
-        ax.set_ylabel('Q-Value')
-        ax.grid(True, alpha=0.3)
-        
-        # 4. Epsilon 衰減
-        ax = axes[1, 0]
-        ax.plot(ticks, epsilons, 'm-', linewidth=2)
-        ax.set_title('Epsilon Decay')
-        ax.set_xlabel('Training Steps')
-        ax.set_ylabel('Epsilon')
-        ax.set_ylim(0, 1.1)
-        ax.grid(True, alpha=0.3)
-        
-        # 5. 訂單完成率
-        ax = axes[1, 1]
-        ax.plot(ticks, completion_rates, 'c-', linewidth=2)
-        ax.set_title('Order Completion Rate')
-        ax.set_xlabel('Training Steps')
-        ax.set_ylabel('Completion Rate (%)')
-        ax.set_ylim(0, 105)
-        ax.grid(True, alpha=0.3)
+        def line_axes(values, style, title, ylabel, **options):
+            axes = {
+                'title': title,
+                'xlabel': 'Training Steps',
+                'ylabel': ylabel,
+                'grid': {'alpha': 0.3},
+                'layers': [{'kind': 'plot', 'args': [ticks, values, style], 'kwargs': {'linewidth': 2}}]
+            }
+            axes.update(options)
+            return axes
         
-        # 6. 記憶體大小
-        ax = axes[1, 2]
-        memory_sizes = [cp['memory_size'] for cp in checkpoints]
-        ax.plot(ticks, memory_sizes, 'orange', linewidth=2)
-        ax.set_title('Replay Memory Size')
-        ax.set_xlabel('Training Steps')
-        ax.set_ylabel('Memory Size')
-        ax.grid(True, alpha=0.3)
+        axes = [
+            # 1. 累積獎勵
+            line_axes(rewards, 'b-', 'Cumulative Episode Reward', 'Cumulative Reward'),
+            # 2. 平均損失
+            line_axes(losses, 'r-', 'Average Loss', 'Loss', yscale='log') if any(loss > 0 for loss in losses) else {},
+            # 3. 平均 Q 值
+            line_axes(q_values, 'g-', 'Average Q-Value', 'Q-Value'),
+            # 4. Epsilon 衰減
+            line_axes(epsilons, 'm-', 'Epsilon Decay', 'Epsilon', ylim=(0, 1.1)),
+            # 5. 訂單完成率
+            line_axes(completion_rates, 'c-', 'Order Completion Rate', 'Completion Rate (%)', ylim=(0, 105)),
+            # 6. 記憶體大小
+            line_axes(memory_sizes, 'orange', 'Replay Memory Size', 'Memory Size'),
+        ]
         
-        plt.tight_layout()
-        save_path = self.output_dir / 'dqn_training_curves.png'
-        plt.savefig(save_path, dpi=300, bbox_inches='tight')
-        plt.close()
-        print(f"✅ 訓練曲線已保存至: {save_path}")
+        return {
+            'name': 'dqn_training_curves',
+            'figsize': (18, 10),
+            'grid': (2, 3),
+            'suptitle': {'t': 'DQN Training Progress', 'fontsize': 16, 'fontweight': 'bold'},
+            'tight_layout': True,
+            'axes': axes
+        }
     
-    def plot_episode_analysis(self):
-        """分析 episode 數據"""
+    def _episode_analysis_spec(self):
+        """episode 分析圖表 spec"""
         if not self.training_data:
-            return
+            return None
             
         episodes = self.training_data.get('episodes', [])
         if not episodes:
             print("❌ 沒有找到 episode 數據")
-            return
+            return None
             
         # 提取數據
         episode_nums = list(range(1, len(episodes) + 1))
@@ -159,65 +153,71 @@ class DQNTrainingVisualizer:
         avg_losses = [ep['avg_loss'] for ep in episodes]
         avg_q_values = [ep['avg_q_value'] for ep in episodes]
         
-        # 創建圖表
-        fig, axes = plt.subplots(2, 2, figsize=(12, 10))
-        fig.suptitle('Episode-wise Analysis', fontsize=16, fontweight='bold')
-        
         # 1. Episode 獎勵
-        ax = axes[0, 0]
-        ax.plot(episode_nums, total_rewards, 'b-', linewidth=2)
+        reward_layers = [{'kind': 'plot', 'args': [episode_nums, total_rewards, 'b-'], 'kwargs': {'linewidth': 2}}]
         # 添加移動平均線
         if len(total_rewards) > 10:
             ma = pd.Series(total_rewards).rolling(window=10).mean()
-            ax.plot(episode_nums, ma, 'r--', linewidth=2, label='10-Episode MA')
-        ax.set_title('Episode Total Reward')
-        ax.set_xlabel('Episode')
-        ax.set_ylabel('Total Reward')
-        ax.legend()
-        ax.grid(True, alpha=0.3)
+            reward_layers.append({'kind': 'plot', 'args': [episode_nums, ma.to_numpy(), 'r--'],
+                                  'kwargs': {'linewidth': 2, 'label': '10-Episode MA'}})
+        reward_axes = {
+            'title': 'Episode Total Reward',
+            'xlabel': 'Episode',
+            'ylabel': 'Total Reward',
+            'legend': True,
+            'grid': {'alpha': 0.3},
+            'layers': reward_layers
+        }
         
         # 2. Episode 步數
-        ax = axes[0, 1]
-        ax.plot(episode_nums, steps, 'g-', linewidth=2)
-        ax.set_title('Episode Length')
-        ax.set_xlabel('Episode')
-        ax.set_ylabel('Steps')
-        ax.grid(True, alpha=0.3)
+        steps_axes = {
+            'title': 'Episode Length',
+            'xlabel': 'Episode',
+            'ylabel': 'Steps',
+            'grid': {'alpha': 0.3},
+            'layers': [{'kind': 'plot', 'args': [episode_nums, steps, 'g-'], 'kwargs': {'linewidth': 2}}]
+        }
         
         # 3. Episode 平均損失
-        ax = axes[1, 0]
+        loss_axes = {}
         valid_losses = [loss for loss in avg_losses if loss > 0]
         valid_episodes = [i for i, loss in enumerate(avg_losses, 1) if loss > 0]
         if valid_losses:
-            ax.plot(valid_episodes, valid_losses, 'r-', linewidth=2)
-            ax.set_title('Episode Average Loss')
-            ax.set_xlabel('Episode')
-            ax.set_ylabel('Average Loss')
-            ax.set_yscale('log')
-            ax.grid(True, alpha=0.3)
+            loss_axes = {
+                'title': 'Episode Average Loss',
+                'xlabel': 'Episode',
+                'ylabel': 'Average Loss',
+                'yscale': 'log',
+                'grid': {'alpha': 0.3},
+                'layers': [{'kind': 'plot', 'args': [valid_episodes, valid_losses, 'r-'], 'kwargs': {'linewidth': 2}}]
+            }
         
         # 4. Episode 平均 Q 值
-        ax = axes[1, 1]
-        ax.plot(episode_nums, avg_q_values, 'm-', linewidth=2)
-        ax.set_title('Episode Average Q-Value')
-        ax.set_xlabel('Episode')
-        ax.set_ylabel('Average Q-Value')
-        ax.grid(True, alpha=0.3)
+        q_axes = {
+            'title': 'Episode Average Q-Value',
+            'xlabel': 'Episode',
+            'ylabel': 'Average Q-Value',
+            'grid': {'alpha': 0.3},
+            'layers': [{'kind': 'plot', 'args': [episode_nums, avg_q_values, 'm-'], 'kwargs': {'linewidth': 2}}]
+        }
         
-        plt.tight_layout()
-        save_path = self.output_dir / 'dqn_episode_analysis.png'
-        plt.savefig(save_path, dpi=300, bbox_inches='tight')
-        plt.close()
-        print(f"✅ Episode 分析已保存至: {save_path}")
+        return {
+            'name': 'dqn_episode_analysis',
+            'figsize': (12, 10),
+            'grid': (2, 2),
+            'suptitle': {'t': 'Episode-wise Analysis', 'fontsize': 16, 'fontweight': 'bold'},
+            'tight_layout': True,
+            'axes': [reward_axes, steps_axes, loss_axes, q_axes]
+        }
     
-    def plot_action_distribution(self):
-        """繪製動作分布"""
+    def _action_distribution_spec(self):
+        """動作分布圖表 spec"""
         if not self.training_data:
-            return
+            return None
             
         episodes = self.training_data.get('episodes', [])
         if not episodes:
-            return
+            return None
             
         # 收集所有動作分布
         all_actions = []
@@ -228,23 +228,21 @@ class DQNTrainingVisualizer:
         
         if not all_actions:
             print("❌ 沒有找到動作數據")
-            return
+            return None
             
-        # 創建圖表
-        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 5))
-        fig.suptitle('Action Distribution Analysis', fontsize=16, fontweight='bold')
-        
         # 1. 整體動作分布
         action_counts = pd.Series(all_actions).value_counts().sort_index()
         action_labels = ['Keep', 'Switch to H', 'Switch to V']
-        
-        ax1.bar(action_counts.index, action_counts.values, color=['green', 'blue', 'red'])
-        ax1.set_xticks(action_counts.index)
-        ax1.set_xticklabels(action_labels)
-        ax1.set_title('Overall Action Distribution')
-        ax1.set_xlabel('Action')
-        ax1.set_ylabel('Count')
-        ax1.grid(True, alpha=0.3, axis='y')
+        overall_axes = {
+            'xticks': action_counts.index.tolist(),
+            'xticklabels': action_labels,
+            'title': 'Overall Action Distribution',
+            'xlabel': 'Action',
+            'ylabel': 'Count',
+            'grid': {'alpha': 0.3, 'axis': 'y'},
+            'layers': [{'kind': 'bar', 'args': [action_counts.index.tolist(), action_counts.values.tolist()],
+                        'kwargs': {'color': ['green', 'blue', 'red']}}]
+        }
         
         # 2. 動作分布隨時間變化
         episode_actions = []
@@ -255,25 +253,31 @@ class DQNTrainingVisualizer:
                 percentages = [action_dist.get(str(a), 0) / total * 100 for a in range(3)]
                 episode_actions.append(percentages)
         
+        trend_axes = {}
         if episode_actions:
             episode_actions = np.array(episode_actions).T
             episodes_nums = list(range(1, len(episodes) + 1))
             
-            for i, (action_data, label, color) in enumerate(zip(episode_actions, action_labels, ['green', 'blue', 'red'])):
-                ax2.plot(episodes_nums, action_data, label=label, color=color, linewidth=2)
-            
-            ax2.set_title('Action Distribution Over Episodes')
-            ax2.set_xlabel('Episode')
-            ax2.set_ylabel('Action Percentage (%)')
-            ax2.legend()
-            ax2.grid(True, alpha=0.3)
-            ax2.set_ylim(0, 100)
+            trend_axes = {
+                'title': 'Action Distribution Over Episodes',
+                'xlabel': 'Episode',
+                'ylabel': 'Action Percentage (%)',
+                'legend': True,
+                'grid': {'alpha': 0.3},
+                'ylim': (0, 100),
+                'layers': [{'kind': 'plot', 'args': [episodes_nums, action_data],
+                            'kwargs': {'label': label, 'color': color, 'linewidth': 2}}
+                           for action_data, label, color in zip(episode_actions, action_labels, ['green', 'blue', 'red'])]
+            }
         
-        plt.tight_layout()
-        save_path = self.output_dir / 'dqn_action_distribution.png'
-        plt.savefig(save_path, dpi=300, bbox_inches='tight')
-        plt.close()
-        print(f"✅ 動作分布已保存至: {save_path}")
+        return {
+            'name': 'dqn_action_distribution',
+            'figsize': (12, 5),
+            'grid': (1, 2),
+            'suptitle': {'t': 'Action Distribution Analysis', 'fontsize': 16, 'fontweight': 'bold'},
+            'tight_layout': True,
+            'axes': [overall_axes, trend_axes]
+        }
     
     def generate_summary_report(self):
         """生成訓練總結報告"""
@@ -357,9 +361,11 @@ class DQNTrainingVisualizer:
         if not self.load_data():
             return
             
-        self.plot_training_curves()
-        self.plot_episode_analysis()
-        self.plot_action_distribution()
+        # 三張圖一起平行渲染
+        specs = [self._training_curves_spec(), self._episode_analysis_spec(), self._action_distribution_spec()]
+        for save_path in self._render(specs):
+            if save_path:
+                print(f"✅ 圖表已保存至: {save_path}")
         self.generate_summary_report()
         
         print(f"\n✅ 所有視覺化已完成！結果保存在: {self.output_dir}")
@@ -368,9 +374,14 @@ class DQNTrainingVisualizer:
 def main():
     parser = argparse.ArgumentParser(description="DQN Training Visualizer")
     parser.add_argument('training_dir', type=str, help='Path to training directory')
+    parser.add_argument('--dpi', type=int, help='Chart resolution (default 300)')
+    parser.add_argument('--format', dest='chart_format', help='Chart format, e.g. png, pdf, svg (default png)')
+    parser.add_argument('--preview', action='store_true', help='Quick low-resolution preview')
+    parser.add_argument('--workers', type=int, help='Chart rendering processes (default: CPU count)')
     args = parser.parse_args()
     
-    visualizer = DQNTrainingVisualizer(args.training_dir)
+    chart_options = {'dpi': args.dpi, 'fmt': args.chart_format, 'preview': args.preview, 'workers': args.workers}
+    visualizer = DQNTrainingVisualizer(args.training_dir, chart_options=chart_options)
     visualizer.visualize_all()
 
 
@@ -5,14 +5,15 @@ RMFS 控制器評估腳本（簡化版）
 """
 
 import argparse
+import hashlib
 import os
 import json
+import random
 import time
 import signal
 import sys
 import numpy as np
 import pandas as pd
-import pickle
 from datetime import datetime
 from pathlib import Path
 from concurrent.futures import ProcessPoolExecutor, as_completed
@@ -40,11 +41,21 @@ from ai.controllers.nerl_controller import NEController
 from ai.controllers.queue_based_controller import QueueBasedController
 from ai.controllers.time_based_controller import TimeBasedController
 from lib.logger import get_logger
+from world.checkpoint import saveCheckpoint, loadCheckpoint, loadWarehouse
 
 class ControllerEvaluator:
-    def __init__(self, evaluation_ticks=5000, num_runs=3, output_dir=None):
+    def __init__(self, evaluation_ticks=5000, num_runs=3, output_dir=None, inference_backend="torch",
+                 seed=42, cache_dir=None, use_cache=True, warehouse_features=None):
         self.evaluation_ticks = evaluation_ticks
         self.num_runs = num_runs
+        self.inference_backend = inference_backend  # DQN/NERL 決策推論後端
+        # 倉庫選用功能 (Warehouse.configureFeatures 的參數)，例如 {'congestion_costs': True}
+        self.warehouse_features = dict(warehouse_features or {})
+        self.seed = seed  # 每次運行使用 seed + run_id
+        # 結果快取與斷點以運行鍵命名，跨評估目錄共用，新增控制器時不需要重跑基準控制器
+        self.use_cache = use_cache
+        self.cache_dir = Path(cache_dir) if cache_dir else Path("result/evaluations/cache")
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
         
         # 如果沒有指定輸出目錄，創建帶時間戳的子目錄
         if output_dir is None:
@@ -119,8 +130,153 @@ class ControllerEvaluator:
                     
         return models
         
+    # === 結果快取與斷點 ===
+
+    @staticmethod
+    def _file_checksum(path):
+        """模型檔的 SHA-256，沒有模型檔時為 None"""
+        if not path or not os.path.exists(path):
+            return None
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def get_run_key(self, controller_config, run_id):
+        """以控制器設定、模型檔內容、隨機種子與 tick 數計算運行鍵"""
+        controller_type = controller_config['type']
+        payload = {
+            'type': controller_type,
+            'reward_mode': controller_config.get('reward_mode'),
+            'model_checksum': self._file_checksum(controller_config.get('model_path')),
+            'seed': self.seed + run_id,
+            'evaluation_ticks': self.evaluation_ticks,
+        }
+        if controller_type in ('dqn', 'nerl'):
+            payload['inference_backend'] = self.inference_backend
+        if self.warehouse_features:
+            # 未開啟選用功能時不加入，沿用既有的快取鍵
+            payload['warehouse_features'] = self.warehouse_features
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()[:20]
+
+    def _cached_result_path(self, run_key):
+        return self.cache_dir / f"{run_key}.json"
+
+    def _checkpoint_path(self, run_key):
+        return self.cache_dir / f"{run_key}.checkpoint"
+
+    def _load_cached_result(self, run_key):
+        path = self._cached_result_path(run_key)
+        if not self.use_cache or not path.exists():
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"快取結果無法讀取，將重新評估 {path}: {e}")
+            return None
+
+    def _save_cached_result(self, run_key, result):
+        path = self._cached_result_path(run_key)
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False, default=str)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _seed_run(seed):
+        random.seed(seed)
+        np.random.seed(seed)
+        if 'torch' in sys.modules:
+            sys.modules['torch'].manual_seed(seed)
+
+    def _save_checkpoint(self, run_key, warehouse, next_tick, metrics, elapsed_time):
+        """保存斷點：倉庫狀態、下一個 tick、累計統計與亂數狀態"""
+        extra = {
+            'next_tick': next_tick,
+            'metrics': metrics,
+            'elapsed_time': elapsed_time,
+        }
+        saveCheckpoint(self._checkpoint_path(run_key), warehouse, extra=extra)
+        self.logger.debug(f"保存斷點在 tick {next_tick}")
+
+    def _load_checkpoint(self, run_key):
+        path = self._checkpoint_path(run_key)
+        if not self.use_cache or not path.exists():
+            return None
+        try:
+            warehouse, checkpoint = loadCheckpoint(path, restore_random_state=True)
+        except Exception as e:
+            self.logger.warning(f"斷點無法讀取，將從頭評估 {path}: {e}")
+            return None
+        checkpoint['warehouse'] = warehouse
+        return checkpoint
+
+    def _setup_run(self, controller_type, controller_config, run_id):
+        """從頭建立一次評估運行的倉庫與控制器"""
+        self._seed_run(self.seed + run_id)
+        
+        # 初始化NetLogo模型
+        # 使用 netlogo.py 的 setup 函數
+        netlogo.setup()
+        
+        # 載入 warehouse 狀態
+        # 確保 states 資料夾存在
+        state_dir = 'states'
+        if not os.path.exists(state_dir):
+            os.makedirs(state_dir)
+        
+        sim_id = os.environ.get('SIMULATION_ID', '')
+        if sim_id:
+            state_file = os.path.join(state_dir, f'netlogo_{sim_id}.state')
+        else:
+            state_file = os.path.join(state_dir, 'netlogo.state')
+        warehouse = loadWarehouse(state_file)
+        warehouse.configureFeatures(**self.warehouse_features)
+        
+        # 創建控制器實例
+        controller = None
+        
+        if controller_type == 'dqn':
+            controller = DQNController(
+                model_path=controller_config['model_path'],
+                reward_mode=controller_config['reward_mode'],
+                inference_backend=self.inference_backend
+            )
+        elif controller_type == 'nerl':
+            controller = NEController(
+                model_path=controller_config['model_path'],
+                reward_mode=controller_config['reward_mode'],
+                inference_backend=self.inference_backend
+            )
+        elif controller_type == 'queue_based':
+            controller = QueueBasedController()
+        elif controller_type == 'time_based':
+            controller = TimeBasedController()
+        elif controller_type == 'none':
+            # 無控制器模式
+            controller = None
+            self.logger.info("使用無控制器模式 - 不進行交通控制")
+        else:
+            raise ValueError(f"未知的控制器類型: {controller_type}")
+        
+        # 設置控制器（如果有的話）
+        if controller is not None:
+            # 使用 warehouse 的 set_traffic_controller 方法
+            controller_kwargs = {'model_path': controller_config.get('model_path')}
+            if controller_type in ('dqn', 'nerl'):
+                controller_kwargs['inference_backend'] = self.inference_backend
+            warehouse.set_traffic_controller(controller_type, **controller_kwargs)
+        else:
+            # 無控制器模式 - 不啟用交通控制
+            warehouse.update_intersection_using_RL = False
+            warehouse.current_controller = "none"
+        
+        return warehouse, controller, state_file
+
     def evaluate_controller(self, controller_name, controller_config, run_id=0):
-        """評估單個控制器"""
+        """評估單個控制器：已完成的運行從快取取得，中斷的運行從最近的斷點續跑"""
         self.logger.info(f"開始評估 {controller_name} (運行 {run_id + 1}/{self.num_runs})")
         
         # 檢查是否被中斷
@@ -128,67 +284,36 @@ class ControllerEvaluator:
             self.logger.warning("評估被中斷")
             return None
         
+        run_key = self.get_run_key(controller_config, run_id)
+        cached_result = self._load_cached_result(run_key)
+        if cached_result is not None:
+            self.logger.info(f"使用快取結果: {controller_name} (運行 {run_id + 1}, 鍵 {run_key})")
+            cached_result.update({'controller_name': controller_name, 'run_id': run_id, 'from_cache': True})
+            return cached_result
+        
         start_time = time.time()
+        state_file = None
         
         try:
-            # 初始化NetLogo模型
-            # 使用 netlogo.py 的 setup 函數
-            netlogo.setup()
-            
-            # 載入 warehouse 狀態
-            import pickle
-            # 確保 states 資料夾存在
-            state_dir = 'states'
-            if not os.path.exists(state_dir):
-                os.makedirs(state_dir)
-            
-            sim_id = os.environ.get('SIMULATION_ID', '')
-            if sim_id:
-                state_file = os.path.join(state_dir, f'netlogo_{sim_id}.state')
-            else:
-                state_file = os.path.join(state_dir, 'netlogo.state')
-            with open(state_file, 'rb') as file:
-                warehouse = pickle.load(file)
-            
-            # 創建控制器實例
             controller_type = controller_config['type']
-            controller = None
-            
-            if controller_type == 'dqn':
-                controller = DQNController(
-                    model_path=controller_config['model_path'],
-                    reward_mode=controller_config['reward_mode']
-                )
-            elif controller_type == 'nerl':
-                controller = NEController(
-                    model_path=controller_config['model_path'],
-                    reward_mode=controller_config['reward_mode']
-                )
-            elif controller_type == 'queue_based':
-                controller = QueueBasedController()
-            elif controller_type == 'time_based':
-                controller = TimeBasedController()
-            elif controller_type == 'none':
-                # 無控制器模式
-                controller = None
-                self.logger.info("使用無控制器模式 - 不進行交通控制")
+            checkpoint = self._load_checkpoint(run_key)
+            if checkpoint is not None:
+                warehouse = checkpoint['warehouse']
+                start_tick = checkpoint['next_tick']
+                elapsed_before = checkpoint['elapsed_time']
+                # 倉庫中已經設定好控制器，直接使用它
+                controller = warehouse.intersection_manager.controllers.get(controller_type)
+                self.logger.info(f"從斷點續跑: {controller_name} (運行 {run_id + 1}) 於 tick {start_tick}")
             else:
-                raise ValueError(f"未知的控制器類型: {controller_type}")
-            
-            # 設置控制器（如果有的話）
-            if controller is not None:
-                # 使用 warehouse 的 set_traffic_controller 方法
-                warehouse.set_traffic_controller(controller_type, model_path=controller_config.get('model_path'))
-            else:
-                # 無控制器模式 - 不啟用交通控制
-                warehouse.update_intersection_using_RL = False
-                warehouse.current_controller = "none"
+                warehouse, controller, state_file = self._setup_run(controller_type, controller_config, run_id)
+                start_tick = 0
+                elapsed_before = 0.0
             
             # 運行評估
             self.logger.info(f"開始運行 {self.evaluation_ticks} ticks...")
             
             # 初始化統計變數
-            metrics = {
+            metrics = checkpoint['metrics'] if checkpoint is not None else {
                 'completed_orders': 0,
                 'total_orders': 0,
                 'total_wait_time': 0,
@@ -202,25 +327,29 @@ class ControllerEvaluator:
             
             # 主評估循環
             tick_interval = 100  # 每100個tick記錄一次
-            save_interval = 5000  # 每5000個tick保存一次狀態（減少I/O）
+            save_interval = 5000  # 每5000個tick保存一次斷點（減少I/O）
+            was_interrupted = False
             
-            for tick in range(self.evaluation_ticks):
+            for tick in range(start_tick, self.evaluation_ticks):
                 # 檢查是否被中斷
                 if interrupted:
                     self.logger.warning(f"在 tick {tick} 被中斷")
+                    was_interrupted = True
+                    if self.use_cache:
+                        self._save_checkpoint(run_key, warehouse, tick, metrics,
+                                              elapsed_before + time.time() - start_time)
                     break
+                
+                # 定期保存斷點，之後可從這裡續跑
+                if self.use_cache and tick > start_tick and tick % save_interval == 0:
+                    self._save_checkpoint(run_key, warehouse, tick, metrics,
+                                          elapsed_before + time.time() - start_time)
                     
                 tick_start = time.time()
                 
                 # 執行一個tick
                 warehouse.tick()
                 
-                # 只在特定間隔或最後一個tick時保存狀態
-                if tick % save_interval == 0 or tick == self.evaluation_ticks - 1:
-                    with open(state_file, 'wb') as file:
-                        pickle.dump(warehouse, file)
-                    self.logger.debug(f"保存狀態在 tick {tick}")
-                
                 # 記錄時間
                 tick_time = time.time() - tick_start
                 metrics['time_per_tick'].append(tick_time)
@@ -280,8 +409,8 @@ class ControllerEvaluator:
                         self.logger.info(f"  進度: {tick}/{self.evaluation_ticks} ticks, "
                                        f"完成訂單: {current_completed}/{current_total}")
             
-            # 計算最終統計
-            execution_time = time.time() - start_time
+            # 計算最終統計（包含斷點之前已花費的時間）
+            execution_time = elapsed_before + time.time() - start_time
             final_tick = warehouse._tick
             
             # 計算衍生指標
@@ -309,6 +438,9 @@ class ControllerEvaluator:
                 'avg_traffic_rate': metrics['avg_traffic_rate'],
                 'execution_time': execution_time,
                 'avg_tick_time': np.mean(metrics['time_per_tick']) if metrics['time_per_tick'] else 0,
+                'seed': self.seed + run_id,
+                'run_key': run_key,
+                'interrupted': was_interrupted,
                 'timestamp': datetime.now().isoformat()
             }
             
@@ -320,9 +452,16 @@ class ControllerEvaluator:
                            f"完成率: {completion_rate*100:.1f}%, "
                            f"執行時間: {execution_time:.1f}秒")
             
+            # 完整跑完的運行才寫入快取，並移除斷點
+            if self.use_cache and not was_interrupted:
+                self._save_cached_result(run_key, result)
+                checkpoint_path = self._checkpoint_path(run_key)
+                if checkpoint_path.exists():
+                    checkpoint_path.unlink()
+            
             # 清理
             # 清理臨時檔案
-            if os.path.exists(state_file):
+            if state_file and os.path.exists(state_file):
                 os.remove(state_file)
             
             return result
@@ -516,6 +655,7 @@ class ControllerEvaluator:
                 'evaluation_config': {
                     'evaluation_ticks': self.evaluation_ticks,
                     'num_runs': self.num_runs,
+                    'warehouse_features': self.warehouse_features,
                     'timestamp': timestamp
                 },
                 'results': all_results,
@@ -555,16 +695,41 @@ def main():
                        help='啟用併行評估模式')
     parser.add_argument('--seed', type=int, default=42,
                        help='隨機種子')
+    parser.add_argument('--inference_backend', choices=['torch', 'numpy'], default='torch',
+                       help='DQN/NERL 決策推論後端 (numpy 在單一路口推論時較快)')
+    parser.add_argument('--cache_dir', default=None,
+                       help='結果快取與斷點目錄 (預設 result/evaluations/cache)')
+    parser.add_argument('--no_cache', action='store_true',
+                       help='不使用結果快取與斷點，每次都從頭評估')
+    parser.add_argument('--congestion_costs', action='store_true',
+                       help='路徑規劃加入動態擁塞成本')
+    parser.add_argument('--reservations', action='store_true',
+                       help='機器人取得新路徑時預約時空區間')
+    parser.add_argument('--predictive_replenishment', action='store_true',
+                       help='依訂單積壓與到達率提前排入補貨')
     
     args = parser.parse_args()
     
+    warehouse_features = {}
+    if args.congestion_costs:
+        warehouse_features['congestion_costs'] = True
+    if args.reservations:
+        warehouse_features['reservations'] = True
+    if args.predictive_replenishment:
+        warehouse_features['predictive_replenishment'] = True
+    
     # 設置隨機種子
     np.random.seed(args.seed)
     
     evaluator = ControllerEvaluator(
         evaluation_ticks=args.eval_ticks,
         num_runs=args.num_runs,
-        output_dir=args.output_dir
+        output_dir=args.output_dir,
+        inference_backend=args.inference_backend,
+        seed=args.seed,
+        cache_dir=args.cache_dir,
+        use_cache=not args.no_cache,
+        warehouse_features=warehouse_features
     )
     
     results = evaluator.run_evaluation(
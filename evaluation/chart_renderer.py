@@ -0,0 +1,331 @@
+"""
+共用圖表渲染服務
+
+報告與分析腳本把圖表描述成宣告式的 spec (純 dict，可 pickle)，交給 ChartRenderer 在程序池中平行渲染：
+
+- 只用 Agg 後端的 Figure/FigureCanvasAgg，不經過 pyplot 的全域狀態，每張圖互不影響
+- 以 spec 內容、DPI、格式計算雜湊，輸出檔存在且雜湊相同時跳過不重畫
+- DPI 與格式可選，快速預覽用 preview=True (低 DPI)，論文輸出用預設 300 DPI；
+  也可用環境變數 RMFS_CHART_DPI / RMFS_CHART_FORMAT 統一覆蓋預設值
+
+spec 格式::
+
+    {
+        'name': 'performance_comparison',      # 輸出檔名 (不含副檔名)
+        'figsize': (15, 12),
+        'grid': (2, 2),                        # 子圖 (列, 行)，預設 (1, 1)
+        'sharex': False,
+        'style': 'seaborn-v0_8-darkgrid',      # 選用，matplotlib 樣式
+        'rc': {'font.size': 10},               # 選用，rcParams
+        'suptitle': 'Title' 或 {'t': 'Title', 'fontsize': 16},
+        'tight_layout': True 或 {'rect': [0, 0, 1, 0.96]},
+        'savefig': {'bbox_inches': 'tight'},   # 選用，額外的 savefig 參數
+        'axes': [                              # 依序對應每個子圖
+            {
+                'title': 'Energy' 或 {'label': 'Energy', 'fontsize': 14},
+                'xlabel': ..., 'ylabel': ..., 'xlim': ..., 'ylim': ..., 'xscale': ..., 'yscale': ...,
+                'grid': True 或 {'axis': 'y', 'alpha': 0.3},
+                'tick_params': {'axis': 'x', 'rotation': 45},
+                'xticklabel_props': {'rotation': 45, 'ha': 'right'},
+                'legend': True 或 {'loc': 'upper left'} 或 {'patches': [{'facecolor': 'b', 'label': 'A'}]},
+                'layers': [
+                    {'kind': 'plot', 'args': [x, y, 'b-'], 'kwargs': {'linewidth': 2}},
+                    {'kind': 'axhline', 'kwargs': {'y': 1.0, 'color': 'r'}},
+                    {'kind': 'heatmap', 'data': matrix, ...},
+                ],
+            },
+        ],
+    }
+
+layer 的 kind 為 Axes 的繪圖方法 (見 AXES_METHODS) 或 'heatmap'。
+"""
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import cpu_count
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# 渲染邏輯改變時遞增，讓舊的雜湊失效
+RENDERER_VERSION = 1
+
+DEFAULT_DPI = 300
+PREVIEW_DPI = 100
+DEFAULT_FORMAT = 'png'
+MANIFEST_NAME = '.chart_manifest.json'
+
+# spec 中允許呼叫的 Axes 繪圖方法
+AXES_METHODS = {
+    'plot', 'scatter', 'bar', 'barh', 'errorbar', 'fill_between', 'hist', 'boxplot', 'violinplot',
+    'axhline', 'axvline', 'axhspan', 'axvspan', 'text', 'annotate', 'step', 'stem', 'pie', 'imshow',
+}
+
+
+def _json_default(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, Path):
+        return str(value)
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    raise TypeError(f"圖表 spec 含有無法雜湊的值: {type(value).__name__}")
+
+
+def spec_hash(spec: Dict[str, Any], dpi: int, fmt: str) -> str:
+    """spec 內容加上輸出設定的雜湊，用來判斷圖表是否需要重畫"""
+    import matplotlib
+    payload = json.dumps([spec, dpi, fmt, RENDERER_VERSION, matplotlib.__version__],
+                         sort_keys=True, default=_json_default)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+# === 渲染 (在工作程序中執行) ===
+
+def _call_with_options(method, option):
+    """option 可為單一值 (字串/布林) 或參數 dict"""
+    if isinstance(option, dict):
+        option = dict(option)
+        label = option.pop('label', None)
+        return method(label, **option) if label is not None else method(**option)
+    return method(option)
+
+
+def _draw_heatmap(fig, ax, layer):
+    """
+    熱力圖：imshow 加上格子標註與色條，取代 seaborn.heatmap
+
+    layer 欄位: data, mask (True 的格子不畫), annot (標註用的數值矩陣，預設為 data), fmt,
+    xticklabels, yticklabels, cmap, vmin, vmax, colorbar (色條標籤或 dict)
+    """
+    data = np.asarray(layer['data'], dtype=float)
+    mask = layer.get('mask')
+    shown = np.ma.masked_where(np.asarray(mask, dtype=bool), data) if mask is not None else data
+    image = ax.imshow(shown, cmap=layer.get('cmap', 'viridis'), vmin=layer.get('vmin'), vmax=layer.get('vmax'),
+                      aspect=layer.get('aspect', 'equal'))
+    # 樣式中的格線會穿過格子
+    ax.grid(False)
+    annot = layer.get('annot')
+    if annot is not None:
+        annot = np.asarray(data if annot is True else annot, dtype=float)
+        fmt = layer.get('fmt', '.2f')
+        for (row, col), value in np.ndenumerate(annot):
+            if mask is not None and mask[row][col]:
+                continue
+            ax.text(col, row, format(value, fmt), ha='center', va='center', fontsize=layer.get('annot_fontsize', 9))
+    if 'xticklabels' in layer:
+        ax.set_xticks(range(len(layer['xticklabels'])))
+        ax.set_xticklabels(layer['xticklabels'], rotation=layer.get('xtick_rotation', 45), ha='right')
+    if 'yticklabels' in layer:
+        ax.set_yticks(range(len(layer['yticklabels'])))
+        ax.set_yticklabels(layer['yticklabels'])
+    colorbar = layer.get('colorbar')
+    if colorbar:
+        bar = fig.colorbar(image, ax=ax)
+        if isinstance(colorbar, str):
+            bar.set_label(colorbar)
+
+
+def _draw_axes(fig, ax, axes_spec):
+    for layer in axes_spec.get('layers', ()):
+        kind = layer['kind']
+        if kind == 'heatmap':
+            _draw_heatmap(fig, ax, layer)
+        elif kind in AXES_METHODS:
+            getattr(ax, kind)(*layer.get('args', ()), **layer.get('kwargs', {}))
+        else:
+            raise ValueError(f"不支援的圖層類型: {kind}")
+
+    if 'title' in axes_spec:
+        _call_with_options(ax.set_title, axes_spec['title'])
+    if 'xlabel' in axes_spec:
+        _call_with_options(ax.set_xlabel, axes_spec['xlabel'])
+    if 'ylabel' in axes_spec:
+        _call_with_options(ax.set_ylabel, axes_spec['ylabel'])
+    if 'xlim' in axes_spec:
+        ax.set_xlim(*axes_spec['xlim'])
+    if 'ylim' in axes_spec:
+        ax.set_ylim(*axes_spec['ylim'])
+    if 'xscale' in axes_spec:
+        ax.set_xscale(axes_spec['xscale'])
+    if 'yscale' in axes_spec:
+        ax.set_yscale(axes_spec['yscale'])
+    if 'xticks' in axes_spec:
+        ax.set_xticks(axes_spec['xticks'])
+    if 'xticklabels' in axes_spec:
+        _call_with_options(ax.set_xticklabels, axes_spec['xticklabels'])
+    if 'tick_params' in axes_spec:
+        ax.tick_params(**axes_spec['tick_params'])
+    if 'xticklabel_props' in axes_spec:
+        for label in ax.get_xticklabels():
+            label.update(axes_spec['xticklabel_props'])
+    grid = axes_spec.get('grid')
+    if grid:
+        ax.grid(True, **(grid if isinstance(grid, dict) else {}))
+    legend = axes_spec.get('legend')
+    if legend:
+        legend = dict(legend) if isinstance(legend, dict) else {}
+        patches = legend.pop('patches', None)
+        if patches:
+            # 自訂圖例：以色塊描述 (facecolor / edgecolor / hatch / label)
+            from matplotlib.patches import Patch
+            legend['handles'] = [Patch(**patch) for patch in patches]
+        ax.legend(**legend)
+
+
+def render_spec(spec: Dict[str, Any], output_path: str, dpi: int, fmt: str) -> str:
+    """依 spec 畫出一張圖並寫到 output_path"""
+    import matplotlib
+    import matplotlib.style
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    styles = [spec['style']] if spec.get('style') else []
+    if spec.get('rc'):
+        styles.append(spec['rc'])
+    with matplotlib.style.context(styles):
+        fig = Figure(figsize=spec.get('figsize', (10, 6)))
+        FigureCanvasAgg(fig)
+        nrows, ncols = spec.get('grid', (1, 1))
+        axs = fig.subplots(nrows, ncols, sharex=spec.get('sharex', False), squeeze=False).ravel()
+        for ax, axes_spec in zip(axs, spec.get('axes', ())):
+            _draw_axes(fig, ax, axes_spec)
+
+        suptitle = spec.get('suptitle')
+        if suptitle:
+            if isinstance(suptitle, dict):
+                suptitle = dict(suptitle)
+                fig.suptitle(suptitle.pop('t'), **suptitle)
+            else:
+                fig.suptitle(suptitle)
+        tight_layout = spec.get('tight_layout')
+        if tight_layout:
+            fig.tight_layout(**(tight_layout if isinstance(tight_layout, dict) else {}))
+
+        savefig = {'bbox_inches': 'tight'}
+        savefig.update(spec.get('savefig', {}))
+        tmp_path = f"{output_path}.tmp.{fmt}"
+        fig.savefig(tmp_path, dpi=dpi, format=fmt, **savefig)
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+def _worker_init():
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def _render_task(spec, output_path, dpi, fmt):
+    try:
+        return render_spec(spec, output_path, dpi, fmt), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+
+# === 渲染服務 ===
+
+class ChartRenderer:
+    """在程序池中渲染圖表 spec，未改變的圖表不重畫"""
+
+    def __init__(self, output_dir, dpi: Optional[int] = None, fmt: Optional[str] = None,
+                 preview: bool = False, workers: Optional[int] = None, use_cache: bool = True):
+        """
+        Args:
+            output_dir: 圖表輸出目錄
+            dpi: 解析度，預設 300 (preview 時 100)，環境變數 RMFS_CHART_DPI 可覆蓋預設
+            fmt: 輸出格式 (png / pdf / svg ...)，環境變數 RMFS_CHART_FORMAT 可覆蓋預設
+            preview: 快速預覽模式，使用低 DPI
+            workers: 程序數，預設為 CPU 核心數；1 表示在目前程序中依序渲染
+            use_cache: 輸出已存在且內容雜湊相同時跳過
+        """
+        self.output_dir = Path(output_dir)
+        default_dpi = PREVIEW_DPI if preview else int(os.environ.get('RMFS_CHART_DPI', DEFAULT_DPI))
+        self.dpi = dpi or default_dpi
+        self.fmt = (fmt or os.environ.get('RMFS_CHART_FORMAT', DEFAULT_FORMAT)).lstrip('.')
+        self.workers = workers or cpu_count()
+        self.use_cache = use_cache
+        self.rendered = 0
+        self.skipped = 0
+
+    def output_path(self, spec: Dict[str, Any]) -> Path:
+        return self.output_dir / f"{spec['name']}.{self.fmt}"
+
+    def _manifest_path(self) -> Path:
+        return self.output_dir / MANIFEST_NAME
+
+    def _load_manifest(self) -> Dict[str, str]:
+        try:
+            with open(self._manifest_path(), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_manifest(self, manifest: Dict[str, str]):
+        tmp_path = self._manifest_path().with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self._manifest_path())
+
+    def render(self, specs: List[Optional[Dict[str, Any]]]) -> List[Optional[str]]:
+        """
+        渲染一批圖表
+
+        Args:
+            specs: 圖表 spec 列表，None 會被略過
+
+        Returns:
+            list: 與 specs 對應的輸出路徑，失敗或略過的 spec 為 None
+        """
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        manifest = self._load_manifest()
+        results: List[Optional[str]] = [None] * len(specs)
+        pending = []
+        for index, spec in enumerate(specs):
+            if spec is None:
+                continue
+            path = self.output_path(spec)
+            digest = spec_hash(spec, self.dpi, self.fmt)
+            if self.use_cache and manifest.get(path.name) == digest and path.exists():
+                results[index] = str(path)
+                self.skipped += 1
+                continue
+            pending.append((index, spec, path, digest))
+
+        def finish(index, path, digest, rendered, error):
+            if error is not None:
+                print(f"Error generating chart {path.name}: {error}")
+                manifest.pop(path.name, None)
+                return
+            results[index] = rendered
+            manifest[path.name] = digest
+            self.rendered += 1
+
+        workers = min(self.workers, len(pending))
+        if workers <= 1:
+            for index, spec, path, digest in pending:
+                finish(index, path, digest, *_render_task(spec, str(path), self.dpi, self.fmt))
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_worker_init) as executor:
+                futures = {executor.submit(_render_task, spec, str(path), self.dpi, self.fmt): (index, path, digest)
+                           for index, spec, path, digest in pending}
+                for future in as_completed(futures):
+                    index, path, digest = futures[future]
+                    try:
+                        rendered, error = future.result()
+                    except Exception as e:
+                        rendered, error = None, f"{type(e).__name__}: {e}"
+                    finish(index, path, digest, rendered, error)
+
+        if pending:
+            self._save_manifest(manifest)
+        return results
+
+
+def render_charts(specs, output_dir, dpi=None, fmt=None, preview=False, workers=None, use_cache=True):
+    """便利函式：建立 ChartRenderer 並渲染一批 spec"""
+    return ChartRenderer(output_dir, dpi=dpi, fmt=fmt, preview=preview, workers=workers,
+                         use_cache=use_cache).render(specs)
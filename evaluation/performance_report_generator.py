@@ -3,10 +3,11 @@ import csv
 import json
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 from datetime import datetime
 from pathlib import Path
 
+from evaluation.chart_renderer import ChartRenderer
+
 class PerformanceReportGenerator:
     """
     綜合性能報告生成器，用於分析和記錄模擬結束後的關鍵績效指標。
@@ -134,10 +135,18 @@ class PerformanceReportGenerator:
         print(f"Time series data saved to {file_path}")
         return file_path
     
-    def generate_charts(self):
+    def generate_charts(self, dpi=None, fmt=None, preview=False, workers=None):
         """
         根據時間序列數據生成圖表
         
+        圖表描述成 spec 後交給 ChartRenderer 平行渲染，數據沒有改變的圖表不會重畫。
+        
+        Args:
+            dpi (int): 解析度，預設 300
+            fmt (str): 輸出格式，預設 png
+            preview (bool): 快速預覽模式 (低 DPI)
+            workers (int): 渲染程序數，預設為 CPU 核心數
+        
         Returns:
             list: 圖表文件路徑列表
         """
@@ -162,7 +171,7 @@ class PerformanceReportGenerator:
         old_controller_name = self.controller_name
         self.controller_name = controller_name
             
-        chart_files = []
+        specs = []
         
         # 生成單一指標圖表
         metrics = [
@@ -175,197 +184,178 @@ class PerformanceReportGenerator:
         ]
         
         for metric_key, title, ylabel in metrics:
-            chart_path = self._create_single_metric_chart(charts_dir, metric_key, title, ylabel)
-            if chart_path:
-                chart_files.append(chart_path)
+            specs.append(self._build_chart_spec(self._single_metric_chart_spec, metric_key, title, ylabel))
                 
         # 生成多指標比較圖表 (機器人利用率、交叉口流量和等待時間)
-        comparison_chart_path = self._create_comparison_chart(charts_dir)
-        if comparison_chart_path:
-            chart_files.append(comparison_chart_path)
+        specs.append(self._build_chart_spec(self._comparison_chart_spec))
             
         # 新增：生成 NERL 適應度圖表 (如果適用)
-        nerl_fitness_chart_path = self._create_nerl_fitness_chart(charts_dir)
-        if nerl_fitness_chart_path:
-            chart_files.append(nerl_fitness_chart_path)
+        specs.append(self._build_chart_spec(self._nerl_fitness_chart_spec))
             
         # 恢復原始控制器名稱
         self.controller_name = old_controller_name
+        
+        renderer = ChartRenderer(charts_dir, dpi=dpi, fmt=fmt, preview=preview, workers=workers)
+        chart_files = [path for path in renderer.render(specs) if path]
+        print(f"Charts generated: {renderer.rendered}, unchanged: {renderer.skipped} ({charts_dir})")
             
         return chart_files
         
-    def _create_single_metric_chart(self, charts_dir, metric_key, title, ylabel):
+    def _build_chart_spec(self, builder, *args):
+        """建立圖表 spec，失敗時只略過該圖表"""
+        try:
+            return builder(*args)
+        except Exception as e:
+            print(f"Error preparing chart {builder.__name__}{args}: {e}")
+            return None
+        
+    def _single_metric_chart_spec(self, metric_key, title, ylabel):
         """
-        創建單一指標的時間序列圖表
+        單一指標的時間序列圖表 spec
         
         Args:
-            charts_dir (str): 圖表保存目錄
             metric_key (str): 指標鍵名
             title (str): 圖表標題
             ylabel (str): Y軸標籤
             
         Returns:
-            str: 圖表文件路徑，如果失敗則返回None
+            dict: 圖表 spec
         """
-        try:
-            # 確保控制器名稱不是'none'
-            controller_name = self.controller_name
-            if controller_name == "none" or controller_name == "unknown":
-                controller_name = "default"
-                
-            plt.figure(figsize=(10, 6))
-            plt.plot(self.time_series_data["ticks"], self.time_series_data[metric_key])
-            plt.title(f"{title} - {controller_name}")
-            plt.xlabel("Simulation Time (ticks)")
-            plt.ylabel(ylabel)
-            plt.grid(True)
-            
-            # 添加數據波動和趨勢說明
-            if len(self.time_series_data["ticks"]) > 1:
-                # 計算簡單統計
-                mean_value = np.mean(self.time_series_data[metric_key])
-                max_value = np.max(self.time_series_data[metric_key])
-                min_value = np.min(self.time_series_data[metric_key])
-                
-                # 添加統計信息
-                plt.axhline(y=mean_value, color='r', linestyle='--', alpha=0.3)
-                plt.text(self.time_series_data["ticks"][0], mean_value, 
-                        f" Mean: {mean_value:.2f}", va='center')
-                
-                # 添加趨勢線 (簡單線性回歸)
-                x = np.array(self.time_series_data["ticks"])
-                y = np.array(self.time_series_data[metric_key])
-                coeffs = np.polyfit(x, y, 1)
-                poly_line = np.poly1d(coeffs)
-                plt.plot(x, poly_line(x), "r--", alpha=0.5)
-            
-            # 保存圖表
-            file_name = f"chart_{metric_key}_{controller_name}_{self.date_string}.png"
-            file_path = os.path.join(charts_dir, file_name)
-            plt.savefig(file_path, dpi=300, bbox_inches='tight')
-            plt.close()
-            
-            print(f"Chart generated: {file_path}")
-            return file_path
-        except Exception as e:
-            print(f"Error generating chart for {metric_key}: {e}")
-            return None
+        # 確保控制器名稱不是'none'
+        controller_name = self.controller_name
+        if controller_name == "none" or controller_name == "unknown":
+            controller_name = "default"
+            
+        ticks = self.time_series_data["ticks"]
+        values = self.time_series_data[metric_key]
+        layers = [{'kind': 'plot', 'args': [ticks, values]}]
+        
+        # 添加數據波動和趨勢說明
+        if len(ticks) > 1:
+            # 添加平均值
+            mean_value = float(np.mean(values))
+            layers.append({'kind': 'axhline', 'kwargs': {'y': mean_value, 'color': 'r', 'linestyle': '--', 'alpha': 0.3}})
+            layers.append({'kind': 'text', 'args': [ticks[0], mean_value, f" Mean: {mean_value:.2f}"],
+                           'kwargs': {'va': 'center'}})
+            
+            # 添加趨勢線 (簡單線性回歸)
+            x = np.array(ticks)
+            poly_line = np.poly1d(np.polyfit(x, np.array(values), 1))
+            layers.append({'kind': 'plot', 'args': [x, poly_line(x), "r--"], 'kwargs': {'alpha': 0.5}})
+        
+        return {
+            'name': f"chart_{metric_key}_{controller_name}_{self.date_string}",
+            'figsize': (10, 6),
+            'axes': [{
+                'title': f"{title} - {controller_name}",
+                'xlabel': "Simulation Time (ticks)",
+                'ylabel': ylabel,
+                'grid': True,
+                'layers': layers
+            }]
+        }
             
-    def _create_comparison_chart(self, charts_dir):
+    def _comparison_chart_spec(self):
         """
-        創建多指標比較圖表
+        多指標比較圖表 spec
         
-        Args:
-            charts_dir (str): 圖表保存目錄
-            
         Returns:
-            str: 圖表文件路徑，如果失敗則返回None
+            dict: 圖表 spec
         """
-        try:
-            # 確保控制器名稱不是'none'
-            controller_name = self.controller_name
-            if controller_name == "none" or controller_name == "unknown":
-                controller_name = "default"
-                
-            # 創建帶有四個子圖的圖表 (從三個改為四個)
-            fig, axs = plt.subplots(4, 1, figsize=(12, 18), sharex=True)
-            fig.suptitle(f"Performance Metrics - {controller_name}", fontsize=16)
-            
-            # 1. 機器人利用率
-            axs[0].plot(self.time_series_data["ticks"], 
-                       [v * 100 for v in self.time_series_data["avg_robot_utilization"]], 
-                       'b-', linewidth=2)
-            axs[0].set_ylabel("Robot Utilization (%)")
-            axs[0].set_title("Average Robot Utilization")
-            axs[0].grid(True)
-            
+        # 確保控制器名稱不是'none'
+        controller_name = self.controller_name
+        if controller_name == "none" or controller_name == "unknown":
+            controller_name = "default"
+            
+        ticks = self.time_series_data["ticks"]
+        
+        def mean_layers(values, label_format):
+            mean_value = float(np.mean(values))
+            return [
+                {'kind': 'axhline', 'kwargs': {'y': mean_value, 'color': 'r', 'linestyle': '--', 'alpha': 0.5}},
+                {'kind': 'text', 'args': [ticks[0], mean_value, label_format.format(mean_value)],
+                 'kwargs': {'va': 'center'}}
+            ]
+        
+        # 1. 機器人利用率
+        utilization = [v * 100 for v in self.time_series_data["avg_robot_utilization"]]
+        utilization_axes = {
+            'ylabel': "Robot Utilization (%)",
+            'title': "Average Robot Utilization",
+            'grid': True,
             # 設定Y軸範圍從0到100
-            axs[0].set_ylim(0, 100)
-            
-            # 繪製平均線
-            mean_util = np.mean([v * 100 for v in self.time_series_data["avg_robot_utilization"]])
-            axs[0].axhline(y=mean_util, color='r', linestyle='--', alpha=0.5)
-            axs[0].text(self.time_series_data["ticks"][0], mean_util, 
-                      f" Mean: {mean_util:.2f}%", va='center')
-            
-            # 2. 交叉口流量
-            axs[1].plot(self.time_series_data["ticks"], 
-                       self.time_series_data["avg_intersection_traffic"], 
-                       'g-', linewidth=2)
-            axs[1].set_ylabel("Traffic Rate")
-            axs[1].set_title("Average Intersection Traffic")
-            axs[1].grid(True)
-            
-            # 繪製平均線
-            mean_traffic = np.mean(self.time_series_data["avg_intersection_traffic"])
-            axs[1].axhline(y=mean_traffic, color='r', linestyle='--', alpha=0.5)
-            axs[1].text(self.time_series_data["ticks"][0], mean_traffic, 
-                      f" Mean: {mean_traffic:.4f}", va='center')
-            
-            # 3. 交叉口等待時間
-            axs[2].plot(self.time_series_data["ticks"], 
-                       self.time_series_data["avg_intersection_wait_time"], 
-                       'r-', linewidth=2)
-            axs[2].set_ylabel("Wait Time (ticks)")
-            axs[2].set_title("Average Intersection Waiting Time")
-            axs[2].grid(True)
-            
-            # 繪製平均線
-            mean_wait = np.mean(self.time_series_data["avg_intersection_wait_time"])
-            axs[2].axhline(y=mean_wait, color='r', linestyle='--', alpha=0.5)
-            axs[2].text(self.time_series_data["ticks"][0], mean_wait, 
-                      f" Mean: {mean_wait:.2f}", va='center')
-            
-            # 4. 新增：訂單數量
-            axs[3].plot(self.time_series_data["ticks"], 
-                       self.time_series_data["completed_orders_count"], 
-                       'purple', linewidth=2, marker='o')
-            axs[3].set_ylabel("Orders Count")
-            axs[3].set_title("Completed Orders Over Time")
-            axs[3].grid(True)
-            axs[3].set_xlabel("Simulation Time (ticks)")
-            
-            # 如果有足夠的數據點，添加訂單增長率趨勢線
-            if len(self.time_series_data["ticks"]) > 2:
-                # 計算訂單增長趨勢
-                x = np.array(self.time_series_data["ticks"])
-                y = np.array(self.time_series_data["completed_orders_count"])
-                # 只使用非零值進行趨勢線擬合
-                non_zero_indices = y > 0
-                if np.any(non_zero_indices):
-                    x_valid = x[non_zero_indices]
-                    y_valid = y[non_zero_indices]
-                    if len(x_valid) > 1:  # 至少需要兩個點來擬合線
-                        coeffs = np.polyfit(x_valid, y_valid, 1)
-                        poly_line = np.poly1d(coeffs)
-                        axs[3].plot(x_valid, poly_line(x_valid), "r--", alpha=0.7, 
-                                  label=f"Growth trend: {coeffs[0]:.4f} orders/tick")
-                        axs[3].legend(loc='upper left')
-            
+            'ylim': (0, 100),
+            'layers': [{'kind': 'plot', 'args': [ticks, utilization, 'b-'], 'kwargs': {'linewidth': 2}}]
+                      + mean_layers(utilization, " Mean: {:.2f}%")
+        }
+        
+        # 2. 交叉口流量
+        traffic = self.time_series_data["avg_intersection_traffic"]
+        traffic_axes = {
+            'ylabel': "Traffic Rate",
+            'title': "Average Intersection Traffic",
+            'grid': True,
+            'layers': [{'kind': 'plot', 'args': [ticks, traffic, 'g-'], 'kwargs': {'linewidth': 2}}]
+                      + mean_layers(traffic, " Mean: {:.4f}")
+        }
+        
+        # 3. 交叉口等待時間
+        wait_time = self.time_series_data["avg_intersection_wait_time"]
+        wait_axes = {
+            'ylabel': "Wait Time (ticks)",
+            'title': "Average Intersection Waiting Time",
+            'grid': True,
+            'layers': [{'kind': 'plot', 'args': [ticks, wait_time, 'r-'], 'kwargs': {'linewidth': 2}}]
+                      + mean_layers(wait_time, " Mean: {:.2f}")
+        }
+        
+        # 4. 新增：訂單數量
+        orders = self.time_series_data["completed_orders_count"]
+        orders_axes = {
+            'ylabel': "Orders Count",
+            'title': "Completed Orders Over Time",
+            'grid': True,
+            'xlabel': "Simulation Time (ticks)",
+            'layers': [{'kind': 'plot', 'args': [ticks, orders, 'purple'], 'kwargs': {'linewidth': 2, 'marker': 'o'}}]
+        }
+        
+        # 如果有足夠的數據點，添加訂單增長率趨勢線
+        if len(ticks) > 2:
+            # 計算訂單增長趨勢
+            x = np.array(ticks)
+            y = np.array(orders)
+            # 只使用非零值進行趨勢線擬合
+            non_zero_indices = y > 0
+            if np.any(non_zero_indices):
+                x_valid = x[non_zero_indices]
+                y_valid = y[non_zero_indices]
+                if len(x_valid) > 1:  # 至少需要兩個點來擬合線
+                    coeffs = np.polyfit(x_valid, y_valid, 1)
+                    poly_line = np.poly1d(coeffs)
+                    orders_axes['layers'].append({
+                        'kind': 'plot', 'args': [x_valid, poly_line(x_valid), "r--"],
+                        'kwargs': {'alpha': 0.7, 'label': f"Growth trend: {coeffs[0]:.4f} orders/tick"}
+                    })
+                    orders_axes['legend'] = {'loc': 'upper left'}
+        
+        return {
+            'name': f"chart_comparison_{controller_name}_{self.date_string}",
+            # 四個子圖 (從三個改為四個)
+            'figsize': (12, 18),
+            'grid': (4, 1),
+            'sharex': True,
+            'suptitle': {'t': f"Performance Metrics - {controller_name}", 'fontsize': 16},
             # 調整子圖之間的間距
-            plt.tight_layout(rect=[0, 0, 1, 0.96])
-            
-            # 保存圖表
-            file_name = f"chart_comparison_{controller_name}_{self.date_string}.png"
-            file_path = os.path.join(charts_dir, file_name)
-            plt.savefig(file_path, dpi=300, bbox_inches='tight')
-            plt.close()
-            
-            print(f"Comparison chart generated: {file_path}")
-            return file_path
-        except Exception as e:
-            print(f"Error generating comparison chart: {e}")
-            return None
+            'tight_layout': {'rect': [0, 0, 1, 0.96]},
+            'axes': [utilization_axes, traffic_axes, wait_axes, orders_axes]
+        }
             
-    def _create_nerl_fitness_chart(self, charts_dir):
+    def _nerl_fitness_chart_spec(self):
         """
-        創建 NERL Best 和 Average Fitness 的時間序列圖表
+        NERL Best 和 Average Fitness 的時間序列圖表 spec
         
-        Args:
-            charts_dir (str): 圖表保存目錄
-            
         Returns:
-            str: 圖表文件路徑，如果數據不存在或繪製失敗則返回None
+            dict: 圖表 spec，如果不是 NERL 或沒有數據則返回None
         """
         # 檢查是否為 NERL 控制器，並且是否有歷史數據
         nerl_controller = None
@@ -376,58 +366,46 @@ class PerformanceReportGenerator:
                     nerl_controller = controller
         
         if not nerl_controller:
-            # print("NERL controller or fitness history not found, skipping fitness chart.")
             return None # 不是 NERL 或沒有數據，不生成圖表
             
-        try:
-            best_history = nerl_controller.best_fitness_history
-            avg_history = nerl_controller.average_fitness_history
-            generations = list(range(len(best_history)))
-            
-            if not generations:
-                print("NERL fitness history is empty, skipping fitness chart.")
-                return None
-                
-            plt.figure(figsize=(10, 6))
-            plt.plot(generations, best_history, label='Best Fitness', marker='o')
-            plt.plot(generations, avg_history, label='Average Fitness', marker='x')
-            plt.title(f"NERL Fitness Evolution - {self.controller_name}")
-            plt.xlabel("Generation")
-            plt.ylabel("Fitness Score")
-            plt.legend()
-            plt.grid(True)
-            
-            # 添加趨勢線 (如果數據點足夠)
-            if len(generations) > 1:
-                # Best Fitness Trend
-                x = np.array(generations)
-                y_best = np.array(best_history)
-                coeffs_best = np.polyfit(x, y_best, 1)
-                poly_line_best = np.poly1d(coeffs_best)
-                plt.plot(x, poly_line_best(x), "b--", alpha=0.5, label=f'Best Trend ({coeffs_best[0]:.2f})')
-                
-                # Average Fitness Trend
-                y_avg = np.array(avg_history)
-                coeffs_avg = np.polyfit(x, y_avg, 1)
-                poly_line_avg = np.poly1d(coeffs_avg)
-                plt.plot(x, poly_line_avg(x), "r--", alpha=0.5, label=f'Avg Trend ({coeffs_avg[0]:.2f})')
-                
-                plt.legend() # 更新圖例以包含趨勢線
-
-            # 保存圖表
-            file_name = f"chart_nerl_fitness_{self.controller_name}_{self.date_string}.png"
-            file_path = os.path.join(charts_dir, file_name)
-            plt.savefig(file_path, dpi=300, bbox_inches='tight')
-            plt.close()
-            
-            print(f"NERL Fitness chart generated: {file_path}")
-            return file_path
-        except Exception as e:
-            print(f"Error generating NERL fitness chart: {e}")
-            import traceback
-            traceback.print_exc() # 打印詳細錯誤
+        best_history = nerl_controller.best_fitness_history
+        avg_history = nerl_controller.average_fitness_history
+        generations = list(range(len(best_history)))
+        
+        if not generations:
+            print("NERL fitness history is empty, skipping fitness chart.")
             return None
             
+        layers = [
+            {'kind': 'plot', 'args': [generations, best_history], 'kwargs': {'label': 'Best Fitness', 'marker': 'o'}},
+            {'kind': 'plot', 'args': [generations, avg_history], 'kwargs': {'label': 'Average Fitness', 'marker': 'x'}}
+        ]
+        
+        # 添加趨勢線 (如果數據點足夠)
+        if len(generations) > 1:
+            x = np.array(generations)
+            # Best Fitness Trend
+            coeffs_best = np.polyfit(x, np.array(best_history), 1)
+            layers.append({'kind': 'plot', 'args': [x, np.poly1d(coeffs_best)(x), "b--"],
+                           'kwargs': {'alpha': 0.5, 'label': f'Best Trend ({coeffs_best[0]:.2f})'}})
+            # Average Fitness Trend
+            coeffs_avg = np.polyfit(x, np.array(avg_history), 1)
+            layers.append({'kind': 'plot', 'args': [x, np.poly1d(coeffs_avg)(x), "r--"],
+                           'kwargs': {'alpha': 0.5, 'label': f'Avg Trend ({coeffs_avg[0]:.2f})'}})
+        
+        return {
+            'name': f"chart_nerl_fitness_{self.controller_name}_{self.date_string}",
+            'figsize': (10, 6),
+            'axes': [{
+                'title': f"NERL Fitness Evolution - {self.controller_name}",
+                'xlabel': "Generation",
+                'ylabel': "Fitness Score",
+                'legend': True,
+                'grid': True,
+                'layers': layers
+            }]
+        }
+    
     def generate_report(self):
         """生成綜合性能報告"""
         # 計算KPIs
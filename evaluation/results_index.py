@@ -0,0 +1,226 @@
+"""
+評估結果索引
+
+分析腳本原本每次都 rglob 所有 evaluation_results*.json 並整份載入。這裡把結果增量匯入單一 SQLite 資料表：
+
+- files 表記錄每個結果檔的 mtime 與大小，只有新增或變更的檔案才會重新解析，刪除的檔案一併移除
+- runs 表每筆是一次運行，常用指標存成欄位 (可直接 SQL 查詢 / 讀成 DataFrame)，完整內容另存 JSON
+- controllers 表存 {控制器: 彙總結果} 格式檔案中每個控制器的完整資料
+
+支援 evaluate.py 的兩種輸出格式::
+
+    {"results": [run, ...], "evaluation_config": {...}}                     # layout = 'list'
+    {"results": {"controller": {"individual_runs": [run, ...], ...}}}        # layout = 'grouped'
+
+只用標準庫的 sqlite3，索引檔預設為 <root_dir>/results_index.sqlite。掃描範圍 (檔名樣式、是否遞迴) 不同的工具
+各用一個索引檔 (見 index_filename)，否則每次 refresh 都會把對方匯入的檔案當成已刪除而清掉。
+"""
+import hashlib
+import json
+import os
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+# 資料表欄位改變時遞增，版本不符的索引檔會整份重建
+SCHEMA_VERSION = 1
+DEFAULT_PATTERN = "evaluation_results*.json"
+INDEX_FILENAME = "results_index.sqlite"
+
+# 存成獨立欄位的運行指標
+METRIC_COLUMNS = [
+    'completion_rate', 'completed_orders', 'total_orders', 'avg_wait_time', 'energy_per_order',
+    'total_energy', 'robot_utilization', 'signal_switch_count', 'avg_traffic_rate', 'avg_tick_time',
+    'execution_time', 'evaluation_ticks', 'warehouse_final_tick',
+]
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    name TEXT,
+    experiment TEXT,
+    mtime_ns INTEGER,
+    ctime REAL,
+    size INTEGER,
+    layout TEXT,
+    run_count INTEGER,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS runs (
+    file TEXT,
+    experiment TEXT,
+    layout TEXT,
+    controller_group TEXT,
+    group_index INTEGER,
+    run_index INTEGER,
+    eval_ticks_config INTEGER,
+    controller_name TEXT,
+    controller_type TEXT,
+    run_id INTEGER,
+    {', '.join(f'{column} REAL' for column in METRIC_COLUMNS)},
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_file ON runs (file);
+CREATE INDEX IF NOT EXISTS runs_controller ON runs (controller_name);
+CREATE TABLE IF NOT EXISTS controllers (
+    file TEXT,
+    controller_group TEXT,
+    group_index INTEGER,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS controllers_file ON controllers (file);
+"""
+
+
+def index_filename(pattern: str = DEFAULT_PATTERN, recursive: bool = True) -> str:
+    """掃描範圍對應的索引檔名，預設範圍沿用 results_index.sqlite"""
+    if pattern == DEFAULT_PATTERN and recursive:
+        return INDEX_FILENAME
+    scope = hashlib.sha1(f"{pattern}|{recursive}".encode('utf-8')).hexdigest()[:8]
+    return f"results_index_{scope}.sqlite"
+
+
+def _number(value) -> Optional[float]:
+    if isinstance(value, bool):
+        return float(value)
+    if isinstance(value, (int, float)):
+        return value
+    return None
+
+
+class ResultsIndex:
+    """evaluation_results*.json 的增量 SQLite 索引"""
+
+    def __init__(self, root_dir, index_path=None, pattern: str = DEFAULT_PATTERN, recursive: bool = True):
+        """
+        Args:
+            root_dir: 要掃描的根目錄
+            index_path: 索引檔路徑，預設為 root_dir 下依掃描範圍命名的索引檔 (見 index_filename)
+            pattern: 結果檔名的 glob 樣式
+            recursive: 是否遞迴掃描子目錄
+        """
+        self.root_dir = Path(root_dir)
+        self.index_path = Path(index_path) if index_path else self.root_dir / index_filename(pattern, recursive)
+        self.pattern = pattern
+        self.recursive = recursive
+        self.connection = sqlite3.connect(str(self.index_path))
+        if self.connection.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            self.connection.executescript(
+                "DROP TABLE IF EXISTS files; DROP TABLE IF EXISTS runs; DROP TABLE IF EXISTS controllers;")
+            self.connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    # === 匯入 ===
+
+    def refresh(self) -> Dict[str, int]:
+        """
+        掃描根目錄，只解析新增或變更的結果檔
+
+        Returns:
+            dict: {'parsed': 重新解析的檔案數, 'unchanged': 未變更的檔案數, 'removed': 已刪除的檔案數}
+        """
+        files = self.root_dir.rglob(self.pattern) if self.recursive else self.root_dir.glob(self.pattern)
+        current = {}
+        for path in files:
+            stat = path.stat()
+            current[str(path)] = (path, stat)
+
+        known = {path: (mtime_ns, size) for path, mtime_ns, size in
+                 self.connection.execute("SELECT path, mtime_ns, size FROM files")}
+        removed = [path for path in known if path not in current]
+        changed = [(path, stat) for key, (path, stat) in current.items()
+                   if known.get(key) != (stat.st_mtime_ns, stat.st_size)]
+
+        with self.connection:
+            for path in removed:
+                self._forget(path)
+            for path, stat in changed:
+                self._forget(str(path))
+                self._ingest(path, stat)
+
+        return {'parsed': len(changed), 'unchanged': len(current) - len(changed), 'removed': len(removed)}
+
+    def _forget(self, path: str):
+        for table, column in (('files', 'path'), ('runs', 'file'), ('controllers', 'file')):
+            self.connection.execute(f"DELETE FROM {table} WHERE {column} = ?", (path,))
+
+    def _ingest(self, path: Path, stat: os.stat_result):
+        key = str(path)
+        layout, error, rows, controllers = None, None, [], []
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            results = data.get('results', [])
+            eval_ticks = data.get('evaluation_config', {}).get('evaluation_ticks', 0)
+            if isinstance(results, list):
+                layout = 'list'
+                runs = [(None, None, run) for run in results]
+            else:
+                layout = 'grouped'
+                runs = []
+                for group_index, (group, group_data) in enumerate(results.items()):
+                    controllers.append((key, group, group_index, json.dumps(group_data, ensure_ascii=False)))
+                    runs.extend((group, group_index, run) for run in group_data.get('individual_runs', []))
+            for run_index, (group, group_index, run) in enumerate(runs):
+                rows.append((key, path.parent.name, layout, group, group_index, run_index, eval_ticks,
+                             run.get('controller_name'), run.get('controller_type'), run.get('run_id'),
+                             *[_number(run.get(column)) for column in METRIC_COLUMNS],
+                             json.dumps(run, ensure_ascii=False)))
+        except Exception as e:
+            error = str(e)
+            rows, controllers = [], []
+
+        self.connection.execute(
+            "INSERT INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, path.name, path.parent.name, stat.st_mtime_ns, stat.st_ctime, stat.st_size,
+             layout, len(rows), error))
+        placeholders = ', '.join('?' * (10 + len(METRIC_COLUMNS) + 1))
+        self.connection.executemany(f"INSERT INTO runs VALUES ({placeholders})", rows)
+        self.connection.executemany("INSERT INTO controllers VALUES (?, ?, ?, ?)", controllers)
+
+    # === 查詢 ===
+
+    def query(self, sql: str, params=()) -> pd.DataFrame:
+        """直接以 SQL 查詢索引，回傳 DataFrame"""
+        return pd.read_sql_query(sql, self.connection, params=params)
+
+    def runs_frame(self, where: str = "1", params=()) -> pd.DataFrame:
+        """運行指標表 (不含完整 JSON)"""
+        columns = [column for column in self._columns('runs') if column != 'data']
+        return self.query(f"SELECT {', '.join(columns)} FROM runs WHERE {where} "
+                          f"ORDER BY file, run_index", params)
+
+    def run_records(self, where: str = "1", params=()) -> List[Dict[str, Any]]:
+        """完整的運行內容 (與原始 JSON 相同的 dict)，附上 source_file 與 eval_ticks_config"""
+        records = []
+        for file, eval_ticks, data in self.connection.execute(
+                f"SELECT file, eval_ticks_config, data FROM runs WHERE {where} "
+                f"ORDER BY file, run_index", params):
+            record = json.loads(data)
+            record['source_file'] = file
+            record['eval_ticks_config'] = eval_ticks
+            records.append(record)
+        return records
+
+    def files(self, where: str = "1", params=()) -> pd.DataFrame:
+        return self.query(f"SELECT * FROM files WHERE {where} ORDER BY path", params)
+
+    def controller_results(self, file) -> Dict[str, Any]:
+        """{控制器: 彙總結果} 格式檔案的 results 內容"""
+        rows = self.connection.execute(
+            "SELECT controller_group, data FROM controllers WHERE file = ? ORDER BY group_index", (str(file),))
+        return {group: json.loads(data) for group, data in rows}
+
+    def _columns(self, table: str) -> List[str]:
+        return [row[1] for row in self.connection.execute(f"PRAGMA table_info({table})")]
@@ -21,9 +21,14 @@ __description__ = "RMFS 實驗自動化管理系統"
 from .presets import EXPERIMENT_PRESETS
 from .config_manager import ConfigManager
 from .workflow_runner import WorkflowRunner
+from .sweep_runner import ResultStore, grid_search, random_search, run_sweep
 
 __all__ = [
     'EXPERIMENT_PRESETS',
     'ConfigManager', 
-    'WorkflowRunner'
+    'WorkflowRunner',
+    'ResultStore',
+    'grid_search',
+    'random_search',
+    'run_sweep'
 ]
\ No newline at end of file
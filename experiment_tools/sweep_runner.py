@@ -0,0 +1,384 @@
+"""
+參數掃描執行器
+==============
+
+在 Python 內直接執行參數掃描，不再為每次模擬啟動 shell 與新的直譯器：
+
+- 以 grid search 或 random search 展開設定空間 (機器人數、訂單速率、控制器、限速、隨機種子、倉庫選用功能)
+- 以固定大小的進程池分配模擬，worker 只在啟動時匯入一次模擬模組，之後重複使用
+- 所有結果寫入同一個列式存放檔 (.npz，每個欄位一個陣列)
+- 每個格子以設定的雜湊值為鍵，中斷後重新執行會跳過已完成的格子
+
+使用範例:
+    python -m experiment_tools.sweep_runner \\
+        --param controller=time_based,queue_based --param num_robots=10,20,30 \\
+        --param seed=0,1,2 --ticks 2000 --workers 4 --output result/sweeps/robots.npz
+"""
+
+import argparse
+import contextlib
+import hashlib
+import itertools
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# 每個掃描格子的預設設定，未在設定空間中指定的參數使用這裡的值
+DEFAULT_CONFIG = {
+    'controller': 'time_based',
+    'model_path': None,
+    'num_robots': 20,
+    'order_rate': 1.0,      # 訂單到達速率倍數 (2.0 = 訂單到達時間間隔減半)
+    'speed_limit': None,    # 全倉走廊限速係數 (0.3-1.0)，None 為不限速
+    'seed': 0,
+    'ticks': 2000,
+    'congestion_costs': False,  # 路徑規劃加入動態擁塞成本
+    'reservations': False,      # 取得新路徑時預約時空區間
+    'predictive_replenishment': False,  # 依訂單積壓與到達率提前排入補貨
+}
+
+# 倉庫選用功能 (Warehouse.configureFeatures 的參數)，維持預設值時不計入格子鍵，既有存放檔的格子鍵不變
+FEATURE_PARAMS = ('congestion_costs', 'reservations', 'predictive_replenishment')
+
+# 存放檔中用來識別格子的欄位
+CELL_ID_COLUMN = 'cell_id'
+
+
+# === 設定空間 ===
+
+def normalize_config(config: Dict[str, Any]) -> Dict[str, Any]:
+    """補上預設值並檢查未知參數"""
+    unknown = set(config) - set(DEFAULT_CONFIG)
+    if unknown:
+        raise ValueError(f"未知的掃描參數: {sorted(unknown)}，可用參數: {list(DEFAULT_CONFIG)}")
+    normalized = dict(DEFAULT_CONFIG)
+    normalized.update(config)
+    return normalized
+
+
+def cell_id(config: Dict[str, Any]) -> str:
+    """以正規化設定的雜湊值作為格子鍵"""
+    normalized = normalize_config(config)
+    for key in FEATURE_PARAMS:
+        if normalized[key] == DEFAULT_CONFIG[key]:
+            del normalized[key]
+    payload = json.dumps(normalized, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def grid_search(space: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    """展開所有參數組合"""
+    keys = list(space)
+    return [normalize_config(dict(zip(keys, values)))
+            for values in itertools.product(*(space[key] for key in keys))]
+
+
+def random_search(space: Dict[str, Any], num_samples: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    隨機抽樣設定
+
+    Args:
+        space: 參數 -> 候選值列表 (均勻抽選) 或 (low, high) 區間 (兩端皆為整數時抽整數)
+        num_samples: 抽樣數量
+        seed: 抽樣用的隨機種子，相同種子產生相同的掃描，才能續跑
+    """
+    rng = random.Random(seed)
+    configs = []
+    for _ in range(num_samples):
+        config = {}
+        for key, values in space.items():
+            if isinstance(values, tuple):
+                low, high = values
+                if isinstance(low, int) and isinstance(high, int):
+                    config[key] = rng.randint(low, high)
+                else:
+                    config[key] = rng.uniform(low, high)
+            else:
+                config[key] = rng.choice(values)
+        configs.append(normalize_config(config))
+    return configs
+
+
+def shard_configs(configs: List[Dict[str, Any]], shard_index: int, num_shards: int) -> List[Dict[str, Any]]:
+    """將掃描切成 num_shards 份，讓多台機器各自執行其中一份"""
+    if not 0 <= shard_index < num_shards:
+        raise ValueError(f"shard_index 必須介於 0 與 {num_shards - 1} 之間")
+    return [config for i, config in enumerate(configs) if i % num_shards == shard_index]
+
+
+# === 列式結果存放 ===
+
+class ResultStore:
+    """以 .npz 保存的列式結果表，每個欄位一個陣列"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def load(self) -> pd.DataFrame:
+        if not self.path.exists():
+            return pd.DataFrame()
+        with np.load(self.path, allow_pickle=False) as data:
+            return pd.DataFrame({column: data[column] for column in data.files})
+
+    def completed_ids(self) -> set:
+        df = self.load()
+        if df.empty or CELL_ID_COLUMN not in df:
+            return set()
+        return set(df[CELL_ID_COLUMN])
+
+    def append(self, rows: List[Dict[str, Any]]):
+        """附加結果並以原子方式重寫存放檔"""
+        if not rows:
+            return
+        df = pd.concat([self.load(), pd.DataFrame(rows)], ignore_index=True)
+        columns = {}
+        for column in df.columns:
+            values = df[column]
+            if pd.api.types.is_bool_dtype(values) or pd.api.types.is_numeric_dtype(values):
+                columns[column] = values.to_numpy()
+            else:
+                # None 以空字串保存，避免需要 pickle
+                columns[column] = values.fillna('').astype(str).to_numpy(dtype=str)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.stem + '.tmp.npz')
+        np.savez(tmp_path, **columns)
+        os.replace(tmp_path, self.path)
+
+
+# === worker ===
+
+_netlogo = None
+# 模擬的輸出導向這裡；logger 會保留匯入時的 stdout，所以整個 worker 生命週期都不關閉
+_devnull = None
+
+
+def _worker_init():
+    """每個 worker 啟動時匯入一次模擬模組，之後的格子都重複使用"""
+    global _netlogo, _devnull
+    _devnull = open(os.devnull, 'w')
+    with contextlib.redirect_stdout(_devnull):
+        import netlogo
+    _netlogo = netlogo
+
+
+def _seed_everything(seed: int):
+    random.seed(seed)
+    np.random.seed(seed)
+    if 'torch' in sys.modules:
+        sys.modules['torch'].manual_seed(seed)
+
+
+def _reset_process_order_file(process_id: int):
+    # 上一個格子留下的訂單狀態檔會讓新的模擬以為訂單已處理過
+    from lib.constant import PARENT_DIRECTORY
+    path = os.path.join(PARENT_DIRECTORY, f'data/input/assign_order_{process_id}.csv')
+    if os.path.exists(path):
+        os.remove(path)
+    return path
+
+
+def _apply_order_rate(assign_order_path: str, order_rate: float):
+    """以縮放訂單到達時間的方式調整訂單速率"""
+    if order_rate == 1.0 or not os.path.exists(assign_order_path):
+        return
+    assign_order_df = pd.read_csv(assign_order_path)
+    assign_order_df['order_arrival'] = assign_order_df['order_arrival'] / order_rate
+    assign_order_df.to_csv(assign_order_path, index=False)
+
+
+def _apply_speed_limit(warehouse, speed_limit: Optional[float]):
+    if speed_limit is None or speed_limit == '':
+        return
+    for intersection in warehouse.intersection_manager.getAllIntersections():
+        warehouse.speed_limit_manager.set_corridor_speed_limit(intersection.id, float(speed_limit), "both")
+    warehouse.speed_limit_manager.update(0)
+
+
+def run_cell(config: Dict[str, Any]) -> Dict[str, Any]:
+    """執行單一掃描格子並回傳一列結果"""
+    if _netlogo is None:
+        _worker_init()
+    config = normalize_config(config)
+    process_id = os.getpid()
+    start_time = time.time()
+    _seed_everything(int(config['seed']))
+    assign_order_path = _reset_process_order_file(process_id)
+
+    controller_kwargs = {'process_id': process_id, 'num_robots': int(config['num_robots'])}
+    controller_kwargs.update({key: bool(config[key]) for key in FEATURE_PARAMS})
+    if config['controller'] in ('dqn', 'nerl'):
+        controller_kwargs.update(model_path=config['model_path'], is_training=False)
+
+    with contextlib.redirect_stdout(_devnull):
+        warehouse = _netlogo.training_setup(config['controller'], controller_kwargs)
+        if warehouse is None:
+            raise RuntimeError(f"無法建立模擬環境: {config}")
+        _apply_order_rate(assign_order_path, float(config['order_rate']))
+        _apply_speed_limit(warehouse, config['speed_limit'])
+
+        setup_time = time.time() - start_time
+        for _ in range(int(config['ticks'])):
+            warehouse.tick()
+
+    run_time = time.time() - start_time - setup_time
+    completed_orders = len(warehouse.order_manager.finished_orders)
+    total_orders = len(warehouse.order_manager.orders)
+    result = dict(config)
+    result.update({
+        CELL_ID_COLUMN: cell_id(config),
+        'completed_orders': completed_orders,
+        'total_orders': total_orders,
+        'completion_rate': completed_orders / total_orders if total_orders else 0.0,
+        'total_energy': float(warehouse.total_energy),
+        'energy_per_order': float(warehouse.total_energy) / completed_orders if completed_orders else 0.0,
+        'stop_and_go': int(warehouse.stop_and_go),
+        'total_turning': int(warehouse.total_turning),
+        'final_tick': float(warehouse._tick),
+        'setup_time': setup_time,
+        'run_time': run_time,
+        'worker_pid': process_id,
+    })
+    return result
+
+
+# === 掃描 ===
+
+def run_sweep(configs: List[Dict[str, Any]], output_path, workers: int = 1, flush_every: int = 1):
+    """
+    執行掃描，跳過存放檔中已完成的格子
+
+    Args:
+        configs: 掃描格子設定列表
+        output_path: 列式存放檔路徑 (.npz)
+        workers: 進程池大小，1 時在目前進程中依序執行
+        flush_every: 每完成幾個格子寫入一次存放檔
+
+    Returns:
+        pd.DataFrame: 存放檔中的所有結果
+    """
+    store = ResultStore(output_path)
+    completed = store.completed_ids()
+    pending, seen = [], set(completed)
+    for config in configs:
+        key = cell_id(config)
+        if key not in seen:
+            seen.add(key)
+            pending.append(config)
+    print(f"掃描共 {len(configs)} 格，已完成 {len(configs) - len(pending)} 格，待執行 {len(pending)} 格")
+
+    buffer = []
+    failed = 0
+
+    def collect(config, result=None, error=None):
+        nonlocal failed
+        if error is not None:
+            failed += 1
+            print(f"  ✗ {cell_id(config)} 失敗: {error}")
+            return
+        buffer.append(result)
+        print(f"  ✓ {result[CELL_ID_COLUMN]} {config['controller']} robots={config['num_robots']} "
+              f"seed={config['seed']}: 完成訂單 {result['completed_orders']}, 能耗 {result['total_energy']:.1f}")
+        if len(buffer) >= flush_every:
+            store.append(buffer)
+            buffer.clear()
+
+    try:
+        if workers <= 1:
+            for config in pending:
+                try:
+                    collect(config, run_cell(config))
+                except Exception as e:
+                    collect(config, error=e)
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_worker_init) as executor:
+                futures = {executor.submit(run_cell, config): config for config in pending}
+                for future in as_completed(futures):
+                    try:
+                        collect(futures[future], future.result())
+                    except Exception as e:
+                        collect(futures[future], error=e)
+    finally:
+        # 中斷時也保存已完成的格子，下次從這裡續跑
+        store.append(buffer)
+
+    if failed:
+        print(f"{failed} 個格子失敗，重新執行掃描會再次嘗試")
+    return store.load()
+
+
+# === CLI ===
+
+def _parse_value(text: str):
+    if text in ('None', 'none', ''):
+        return None
+    if text in ('True', 'true'):
+        return True
+    if text in ('False', 'false'):
+        return False
+    for cast in (int, float):
+        try:
+            return cast(text)
+        except ValueError:
+            pass
+    return text
+
+
+def parse_space(params: List[str]) -> Dict[str, Any]:
+    """
+    解析 --param 參數
+
+    name=a,b,c 為候選值列表；name=low:high 為 random search 的區間。
+    """
+    space = {}
+    for param in params:
+        if '=' not in param:
+            raise ValueError(f"參數格式應為 name=value[,value...]: {param}")
+        name, values = param.split('=', 1)
+        if ':' in values and ',' not in values and os.path.sep not in values:
+            low, high = values.split(':', 1)
+            space[name] = (_parse_value(low), _parse_value(high))
+        else:
+            space[name] = [_parse_value(value) for value in values.split(',')]
+    return space
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RMFS 參數掃描")
+    parser.add_argument('--param', action='append', default=[],
+                        help=f"掃描參數 name=a,b,c 或 name=low:high，可用參數: {', '.join(DEFAULT_CONFIG)}")
+    parser.add_argument('--ticks', type=int, default=DEFAULT_CONFIG['ticks'], help='每個格子的模擬 tick 數')
+    parser.add_argument('--random', type=int, default=0, help='random search 抽樣數 (0 為 grid search)')
+    parser.add_argument('--search_seed', type=int, default=0, help='random search 的抽樣種子')
+    parser.add_argument('--workers', type=int, default=1, help='進程池大小')
+    parser.add_argument('--shard', type=str, default=None, help='只執行其中一份掃描，格式 i/n (例如 0/4)')
+    parser.add_argument('--output', type=str, default='result/sweeps/sweep.npz', help='列式結果存放檔')
+    args = parser.parse_args()
+
+    space = parse_space(args.param)
+    space.setdefault('ticks', [args.ticks])
+    if args.random > 0:
+        configs = random_search(space, args.random, seed=args.search_seed)
+    else:
+        ranges = [name for name, values in space.items() if isinstance(values, tuple)]
+        if ranges:
+            parser.error(f"區間參數 {ranges} 只能用於 random search (--random N)")
+        configs = grid_search(space)
+
+    if args.shard:
+        shard_index, num_shards = map(int, args.shard.split('/'))
+        configs = shard_configs(configs, shard_index, num_shards)
+
+    results = run_sweep(configs, args.output, workers=args.workers)
+    print(f"結果保存在: {args.output} ({len(results)} 列)")
+
+
+if __name__ == '__main__':
+    main()
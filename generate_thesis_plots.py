@@ -1,12 +1,14 @@
 import os
 import json
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 
-def plot_nerl_evolution(log_dir, output_dir):
+from evaluation.chart_renderer import ChartRenderer
+
+THESIS_STYLE = 'seaborn-v0_8-whitegrid'
+
+def nerl_evolution_spec(log_dir):
     """
-    Plots the evolution of fitness scores for a NERL training run,
+    Builds the chart spec for the fitness evolution of a NERL training run,
     showing the cumulative best fitness and per-generation average.
     """
     fitness_data = []
@@ -34,46 +36,51 @@ def plot_nerl_evolution(log_dir, output_dir):
 
     if not fitness_data:
         print(f"No fitness data found in {log_dir}")
-        return
+        return None
 
-    df = pd.DataFrame(fitness_data)
+    df = pd.DataFrame(fitness_data).sort_values('Generation')
     # Calculate Cumulative Best Fitness
     df['Cumulative Best Fitness'] = df['Best Fitness'].cummax()
 
-    plt.style.use('seaborn-v0_8-whitegrid')
-    fig, ax = plt.subplots(figsize=(12, 7))
-
-    sns.lineplot(data=df, x='Generation', y='Cumulative Best Fitness', ax=ax, marker='o', label='Cumulative Best Fitness')
-    sns.lineplot(data=df, x='Generation', y='Average Fitness', ax=ax, marker='x', linestyle='--', label='Average Fitness (per generation)')
-
-    ax.set_title(f'NERL Training Evolution: {experiment_name}', fontsize=16)
-    ax.set_xlabel('Generation', fontsize=12)
-    ax.set_ylabel('Fitness Score', fontsize=12)
-    ax.legend(fontsize=10)
-    ax.tick_params(axis='both', which='major', labelsize=10)
-    plt.tight_layout()
-
-    # Ensure output directory exists
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-
-    output_path = os.path.join(output_dir, f"{experiment_name}_evolution.png")
-    plt.savefig(output_path, dpi=300)
-    print(f"SUCCESS: Plot for {experiment_name} saved to {output_path}")
-    plt.close(fig)
+    return {
+        'name': f"{experiment_name}_evolution",
+        'style': THESIS_STYLE,
+        'figsize': (12, 7),
+        'tight_layout': True,
+        'savefig': {'bbox_inches': None},
+        'axes': [{
+            'title': {'label': f'NERL Training Evolution: {experiment_name}', 'fontsize': 16},
+            'xlabel': {'label': 'Generation', 'fontsize': 12},
+            'ylabel': {'label': 'Fitness Score', 'fontsize': 12},
+            'legend': {'fontsize': 10},
+            'tick_params': {'axis': 'both', 'which': 'major', 'labelsize': 10},
+            'layers': [
+                {'kind': 'plot', 'args': [df['Generation'].to_numpy(), df['Cumulative Best Fitness'].to_numpy()],
+                 'kwargs': {'marker': 'o', 'label': 'Cumulative Best Fitness'}},
+                {'kind': 'plot', 'args': [df['Generation'].to_numpy(), df['Average Fitness'].to_numpy()],
+                 'kwargs': {'marker': 'x', 'linestyle': '--', 'label': 'Average Fitness (per generation)'}}
+            ]
+        }]
+    }
+
+def plot_nerl_evolution(log_dir, output_dir, **chart_options):
+    """
+    Plots the evolution of fitness scores for a NERL training run.
+    """
+    spec = nerl_evolution_spec(log_dir)
+    output_path, = ChartRenderer(output_dir, **chart_options).render([spec])
+    if output_path:
+        print(f"SUCCESS: Plot for {os.path.basename(os.path.normpath(log_dir))} saved to {output_path}")
 
-def plot_comparison_evolution(experiment_dirs, title, output_dir, smoothing_window=3):
+def comparison_evolution_spec(experiment_dirs, title, smoothing_window=3):
     """
-    Plots a smoothed comparison of normalized fitness evolution for multiple NERL runs.
+    Builds the chart spec for a smoothed comparison of normalized fitness evolution for multiple NERL runs.
 
     Args:
         experiment_dirs (list): A list of directories for the experiments to compare.
         title (str): The title for the plot.
-        output_dir (str): The directory to save the generated plot.
     """
-    plt.style.use('seaborn-v0_8-whitegrid')
-    fig, ax = plt.subplots(figsize=(14, 8))
-
+    layers = []
     for log_dir in experiment_dirs:
         experiment_name = os.path.basename(os.path.normpath(log_dir))
         fitness_data = []
@@ -92,7 +99,7 @@ def plot_comparison_evolution(experiment_dirs, title, output_dir, smoothing_wind
         if not fitness_data:
             continue
 
-        df = pd.DataFrame(fitness_data)
+        df = pd.DataFrame(fitness_data).sort_values('Generation')
         
         # Min-Max Normalization
         min_fitness = df['Best Fitness'].min()
@@ -106,25 +113,39 @@ def plot_comparison_evolution(experiment_dirs, title, output_dir, smoothing_wind
         # Apply moving average for smoothing
         df['Smoothed Fitness'] = df['Normalized Fitness'].rolling(window=smoothing_window, center=True, min_periods=1).mean()
 
-        sns.lineplot(data=df, x='Generation', y='Smoothed Fitness', ax=ax, label=experiment_name)
-
-    ax.set_title(title, fontsize=18, weight='bold')
-    ax.set_xlabel('Generation', fontsize=14)
-    ax.set_ylabel('Smoothed Normalized Fitness Score', fontsize=14)
-    ax.legend(title='Experiment', fontsize=10)
-    ax.tick_params(axis='both', which='major', labelsize=12)
-    ax.grid(True, which='both', linestyle='--', linewidth=0.5)
-    plt.tight_layout()
-
-    # Ensure output directory exists
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
+        layers.append({'kind': 'plot', 'args': [df['Generation'].to_numpy(), df['Smoothed Fitness'].to_numpy()],
+                       'kwargs': {'label': experiment_name}})
+
+    return {
+        'name': title.replace(' ', '_'),
+        'style': THESIS_STYLE,
+        'figsize': (14, 8),
+        'tight_layout': True,
+        'savefig': {'bbox_inches': None},
+        'axes': [{
+            'title': {'label': title, 'fontsize': 18, 'weight': 'bold'},
+            'xlabel': {'label': 'Generation', 'fontsize': 14},
+            'ylabel': {'label': 'Smoothed Normalized Fitness Score', 'fontsize': 14},
+            'legend': {'title': 'Experiment', 'fontsize': 10},
+            'tick_params': {'axis': 'both', 'which': 'major', 'labelsize': 12},
+            'grid': {'which': 'both', 'linestyle': '--', 'linewidth': 0.5},
+            'layers': layers
+        }]
+    }
+
+def plot_comparison_evolution(experiment_dirs, title, output_dir, smoothing_window=3, **chart_options):
+    """
+    Plots a smoothed comparison of normalized fitness evolution for multiple NERL runs.
 
-    output_filename = title.replace(' ', '_') + ".png"
-    output_path = os.path.join(output_dir, output_filename)
-    plt.savefig(output_path, dpi=300)
-    print(f"SUCCESS: Comparison plot saved to {output_path}")
-    plt.close(fig)
+    Args:
+        experiment_dirs (list): A list of directories for the experiments to compare.
+        title (str): The title for the plot.
+        output_dir (str): The directory to save the generated plot.
+    """
+    spec = comparison_evolution_spec(experiment_dirs, title, smoothing_window)
+    output_path, = ChartRenderer(output_dir, **chart_options).render([spec])
+    if output_path:
+        print(f"SUCCESS: Comparison plot saved to {output_path}")
 
 def generate_summary_table(log_dir, output_dir):
     """
@@ -202,11 +223,15 @@ if __name__ == '__main__':
     step_experiments = [d for d in all_nerl_experiments if 'step' in os.path.basename(d)]
     global_experiments = [d for d in all_nerl_experiments if 'global' in os.path.basename(d)]
 
-    # Generate comparison plots
+    # Generate comparison plots (rendered together in a process pool)
+    specs = []
     if step_experiments:
-        plot_comparison_evolution(step_experiments, "NERL Performance Comparison (Step Reward)", output_plot_dir, smoothing_window=3)
+        specs.append(comparison_evolution_spec(step_experiments, "NERL Performance Comparison (Step Reward)", smoothing_window=3))
     if global_experiments:
-        plot_comparison_evolution(global_experiments, "NERL Performance Comparison (Global Reward)", output_plot_dir, smoothing_window=3)
+        specs.append(comparison_evolution_spec(global_experiments, "NERL Performance Comparison (Global Reward)", smoothing_window=3))
+    for output_path in ChartRenderer(output_plot_dir).render(specs):
+        if output_path:
+            print(f"SUCCESS: Comparison plot saved to {output_path}")
 
 
     # --- Generate individual plots (optional, can be enabled if needed) ---
@@ -0,0 +1,99 @@
+"""
+積壓訂單 (backlog) 批次分群
+
+以稀疏的 訂單 × SKU 關聯矩陣取代逐對 Python set 運算：
+- 交集大小 = X @ X.T，聯集 = |A| + |B| - 交集，Jaccard 只在有共同 SKU 的訂單對上有非零值
+- K-Means 直接在稀疏相似度矩陣上分群，距離由 kmeans.transform 一次算出
+- 依站點剩餘容量分配訂單也以陣列排序完成，不再逐筆迴圈
+"""
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.cluster import KMeans
+
+
+def build_order_sku_matrix(data: pd.DataFrame):
+    """
+    建立 訂單 × SKU 的稀疏關聯矩陣 (同一訂單重複的 SKU 只計一次)
+
+    Returns:
+        (order_ids, sku_ids, matrix): 排序後的訂單 id、SKU id，以及 CSR 0/1 矩陣
+    """
+    order_codes, order_ids = pd.factorize(data['order_id'], sort=True)
+    sku_codes, sku_ids = pd.factorize(data['item_id'], sort=True)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(order_codes), dtype=np.float64), (order_codes, sku_codes)),
+        shape=(len(order_ids), len(sku_ids)))
+    # 重複的 (order, sku) 在建構時會被加總，這裡壓回 0/1
+    matrix.data[:] = 1.0
+    return np.asarray(order_ids), np.asarray(sku_ids), matrix
+
+
+def jaccard_similarity_matrix(incidence) -> sparse.csr_matrix:
+    """
+    以稀疏矩陣乘積計算所有訂單對的 Jaccard 相似度
+
+    Args:
+        incidence: 訂單 × SKU 的 0/1 稀疏矩陣
+
+    Returns:
+        csr_matrix: 訂單 × 訂單 相似度，沒有共同 SKU 的訂單對不存值 (即 0)，對角線為 1
+    """
+    incidence = sparse.csr_matrix(incidence)
+    intersection = (incidence @ incidence.T).tocoo()
+    sizes = np.asarray(incidence.sum(axis=1)).ravel()
+    union = sizes[intersection.row] + sizes[intersection.col] - intersection.data
+    similarity = sparse.csr_matrix((intersection.data / union, (intersection.row, intersection.col)),
+                                   shape=intersection.shape)
+    # 沒有任何 SKU 的訂單也視為與自己相同
+    similarity.setdiag(1.0)
+    return similarity
+
+
+def assign_by_capacity(labels, distances, capacities):
+    """
+    依到群中心的距離由近到遠，把訂單分配給所屬群的站點，超過站點剩餘容量的訂單不分配
+
+    Args:
+        labels: 每筆訂單的群編號
+        distances: 每筆訂單到所屬群中心的距離
+        capacities: 每個群 (站點) 的剩餘容量
+
+    Returns:
+        ndarray[bool]: 每筆訂單是否分配成功
+    """
+    labels = np.asarray(labels)
+    capacities = np.asarray(capacities, dtype=np.int64)
+    count = len(labels)
+    # 群內依距離排序，距離相同時保持原本順序
+    order = np.lexsort((np.arange(count), np.asarray(distances), labels))
+    sorted_labels = labels[order]
+    group_start = np.searchsorted(sorted_labels, sorted_labels, side='left')
+    rank = np.empty(count, dtype=np.int64)
+    rank[order] = np.arange(count) - group_start
+    return rank < capacities[labels]
+
+
+def cluster_orders(similarity, station_ids, capacities, random_state=None):
+    """
+    以 K-Means 將訂單分成與站點數相同的群，再依容量分配到站點
+
+    Args:
+        similarity: 訂單 × 訂單 相似度矩陣 (稀疏或密集)，每列為一筆訂單的特徵
+        station_ids: 站點 id 列表，群編號 i 對應 station_ids[i]
+        capacities: 各站點剩餘容量
+        random_state: K-Means 亂數種子
+
+    Returns:
+        list: 每筆訂單分配到的站點 id，容量不足者為 None
+    """
+    count = similarity.shape[0]
+    if count == 0:
+        return []
+    station_ids = list(station_ids)
+    kmeans = KMeans(n_clusters=min(len(station_ids), count), random_state=random_state)
+    labels = kmeans.fit_predict(similarity)
+    distances = kmeans.transform(similarity)[np.arange(count), labels]
+    assigned = assign_by_capacity(labels, distances, capacities[:kmeans.n_clusters])
+    stations = np.asarray(station_ids, dtype=object)[labels]
+    return [station if ok else None for station, ok in zip(stations, assigned)]
@@ -4,6 +4,7 @@ import pandas as pd
 
 from lib.file import *
 from lib.constant import *
+from lib.generator.slotting import EMPTY, SlotTable
 
 def config_items_slots(dev_mode=False):
     working_path = get_working_path(dev_mode)
@@ -166,41 +167,50 @@ def gen_pods(pod_num, pod_types, dev_mode=True):
 
     # generate pods based on the pod specification (types and the number of pods)
     counter_id = 0
-    pods = pd.DataFrame()
+    pods = []
     for i, p in enumerate(pod_types):
 
-        pod_slot_num = pods_dictionary.loc[pods_dictionary["pod_type"] == p].shape[0]
-        pod_slot_id = pods_dictionary.loc[pods_dictionary["pod_type"]
-                                 == p, "slot_sequence"].to_list()
-        slot_type = pods_dictionary.loc[pods_dictionary["pod_type"]
-                                 == p, "slot_type"].to_list()       
-
-        pod_type = [p] * pod_slot_num
-        pod_face = pods_dictionary.loc[pods_dictionary["pod_type"] == p, "pod_face"].to_list()
-
-        for _ in range(pod_num[i]):
-            pod_id = [counter_id] * pod_slot_num
-            counter_id += 1
-
-            pod = pd.DataFrame({"pod_id": pod_id,
-                                "pod_type": pod_type,
-                                "slot_id": pod_slot_id,
-                                "slot_type": slot_type,
-                                "item": np.nan,
-                                "unusedColumn1": 0,
-                                "unusedColumn2": 0,
-                                "unusedColumn3": 0,
-                                "qty": np.nan,
-                                "max_qty": np.nan,
-                                'due_date': 99999,
-                                'facing': pod_face,
-                                'pick_ind': 0
-                                })
-            pods = pd.concat([pods, pod], axis=0)
-
+        pod_slots = pods_dictionary.loc[pods_dictionary["pod_type"] == p]
+        pod_slot_num = pod_slots.shape[0]
+
+        # every pod of the same type repeats the slot layout of the pod dictionary
+        pods.append(pd.DataFrame({"pod_id": np.repeat(np.arange(counter_id, counter_id + pod_num[i]), pod_slot_num),
+                                  "pod_type": p,
+                                  "slot_id": np.tile(pod_slots["slot_sequence"].to_numpy(), pod_num[i]),
+                                  "slot_type": np.tile(pod_slots["slot_type"].to_numpy(), pod_num[i]),
+                                  "item": np.nan,
+                                  "unusedColumn1": 0,
+                                  "unusedColumn2": 0,
+                                  "unusedColumn3": 0,
+                                  "qty": np.nan,
+                                  "max_qty": np.nan,
+                                  'due_date': 99999,
+                                  'facing': np.tile(pod_slots["pod_face"].to_numpy(), pod_num[i]),
+                                  'pick_ind': 0
+                                  }))
+        counter_id += pod_num[i]
+
+    pods = pd.concat(pods, axis=0) if pods else pd.DataFrame()
     pods.reset_index(drop=True, inplace=True)
     return pods
 
+def build_slot_capacity(item_ids, slot_types, item_slot_configuration):
+    # item x slot type matrix of max_item_in_slot (0 if the item cannot be stored in the slot type)
+    item_index = pd.Index(item_ids)
+    slot_type_index = pd.Index(slot_types)
+    capacity = np.zeros((len(item_index), len(slot_type_index)), dtype=np.int64)
+    rows = item_index.get_indexer(item_slot_configuration["item_id"])
+    cols = slot_type_index.get_indexer(item_slot_configuration["slot_type"])
+    valid = (rows >= 0) & (cols >= 0)
+    capacity[rows[valid], cols[valid]] = item_slot_configuration["max_item_in_slot"].to_numpy()[valid].astype(np.int64)
+    return capacity
+
+def report_slotting_shortage(item_ids, shortage, empty_slots):
+    for item_id, qty in zip(item_ids[shortage > 0], shortage[shortage > 0]):
+        print("    All pod is unavailable for item_id:", item_id, qty)
+    if empty_slots > 0:
+        print("    Not enough items to fill", empty_slots, "slot(s). The slots are left empty (item = -1).")
+
 def assign_items_to_pods_single_slot_type(pods, items, items_pods_class_conf, dev_mode=False):
 
     # For now, this only work if pod only has 1 type of slot.
@@ -228,98 +238,33 @@ def assign_items_to_pods_single_slot_type(pods, items, items_pods_class_conf, de
     items["number_of_item_in_a_box"] = items["number_of_item_in_a_box"].astype(
         int)
     items["max_box_in_slot"] = items["max_box_in_slot"].astype(int)
-    items["item_slot_needed"] = np.ceil(
-        (items["item_initial_quantity_inventory"] / items["number_of_item_in_a_box"]) / items["max_box_in_slot"]).astype(int)
+    items["item_id"] = items.index
+    items["max_item_in_slot"] = items["number_of_item_in_a_box"] * items["max_box_in_slot"]
+
+    item_ids = items.index.to_numpy()
+    capacity = build_slot_capacity(item_ids, slot_types, items)
+    slots = SlotTable(pods["pod_id"], pd.Index(slot_types).get_indexer(pods["slot_type"]), len(item_ids))
 
     # add item to pod based on the initial quantity inventory
-    for item_id in items.index:
-        slot_needed = items.loc[item_id, "item_slot_needed"].astype(int)
-        pod_available = np.random.choice(
-            pods.loc[pods["item"] != item_id, "pod_id"], size=slot_needed, replace=False)
-
-        for pod_id in pod_available:
-            slot_available = pods.loc[(pods["pod_id"] == pod_id) & (
-                pods["item"].isnull()), "slot_id"]
-            if len(slot_available) == 0:
-                break
-            else:
-                slot_id = np.random.choice(slot_available)
-                pods.loc[(pods["pod_id"] == pod_id) & (pods["item"].isnull()) & (pods["slot_id"] == slot_id), 
-                         "item"] = item_id
-                pods.loc[(pods["pod_id"] == pod_id) & (pods["item"] == item_id) & (pods["slot_id"] == slot_id),
-                         "qty"] = items.loc[item_id, "number_of_item_in_a_box"] * items.loc[item_id, "max_box_in_slot"]
-                pods.loc[(pods["pod_id"] == pod_id) & (pods["item"] == item_id) & (pods["slot_id"] == slot_id),
-                         "max_qty"] = items.loc[item_id, "number_of_item_in_a_box"] * items.loc[item_id, "max_box_in_slot"]
-
-    # If there is still slot available, we need to add item to pods. For this case, we will use the class_pod_conf.
-
-    temp = 0
-    # calculate cummulative the class_pod_conf value, to get the threshold to assign the item to the pod.
-    for key, value in items_pods_class_conf.items():
-        if temp == 0:
-            temp = value
-        else:
-            temp += value
-            items_pods_class_conf[key] = np.round(temp, 1)
-
-    # sort the class_pod_conf based on the value
-    items_pods_class_conf = dict(sorted(items_pods_class_conf.items(), key=lambda x: x[1]))
-
-    # get class_pod_conf values into list as thresholds. The keys will be used to get the item based on the class
-    thresholds = list(items_pods_class_conf.values())
-    keys = list(items_pods_class_conf.keys())
-
-    # get the pod_id that its slot still has no item assigned
-    pod_available = pods.loc[pods["item"].isnull(),
-                             "pod_id"].unique().astype(int)
-
-    # assign item to the pod
-    if len(pod_available) > 0:
-        for pod_id in pod_available:
-
-            # get slot_id that still has no item assigned
-            pod = pods.loc[pods["pod_id"] == pod_id]
-            pod = pod.sort_values(by="slot_id")
-            slot_available = pod.loc[pod["item"].isnull(), "slot_id"].unique()
-
-            # generate random number
-            rand = np.random.rand(len(slot_available)).round(2)
-
-            # print(pod)
-            # print(pod_id, slot_available, rand)
-            for no, r in enumerate(rand):
-
-                # get the items that already assigned to the pod. Each pod cannot have the same item
-                item_exist = pod.loc[(pod["item"].notnull()),
-                                     "item"].unique().astype(int)
-                if r <= thresholds[0]:
-                    # print(f"  below {thresholds[0]}, then the class is {keys[0]}")
-                    item_available = items.loc[(items["item_class"] == keys[0]) & (
-                        ~items.index.isin(item_exist)), "item_order_frequency"]
-
-                for i in range(len(thresholds) - 1):
-                    if thresholds[i] < r <= thresholds[i + 1]:
-                        # print(f"  between {thresholds[i]} and {thresholds[i + 1]}, then the class is {keys[i+1]}")
-                        item_available = items.loc[(items["item_class"] == keys[i+1]) & (
-                            ~items.index.isin(item_exist)), "item_order_frequency"]
-                # print("    ", item_available)
-                item_probability = item_available / item_available.sum()
-                item_available = item_available.index.tolist()
-                # print("    ", item_available)
-
-                # assign item to the slot
-                if len(item_available) > 0:
-                    item_id = np.random.choice(
-                        item_available, p=item_probability)
-                    slot_id = slot_available[no]
-                    pods.loc[(pods["pod_id"] == pod_id) & (pods["item"].isnull()) & (
-                        pods["slot_id"] == slot_id), "item"] = item_id
-                    pods.loc[(pods["pod_id"] == pod_id) & (pods["item"] == item_id) & (pods["slot_id"] == slot_id),
-                             "qty"] = items.loc[item_id, "number_of_item_in_a_box"] * items.loc[item_id, "max_box_in_slot"]
-                    pods.loc[(pods["pod_id"] == pod_id) & (pods["item"] == item_id) & (pods["slot_id"] == slot_id),
-                             "max_qty"] = items.loc[item_id, "number_of_item_in_a_box"] * items.loc[item_id, "max_box_in_slot"]
-                else:
-                    break
+    shortage = slots.place_items(np.arange(len(item_ids)), items["item_initial_quantity_inventory"].to_numpy(), capacity)
+
+    # If there is still slot available, we need to add item to pods. For this case, we will use the class_pod_conf:
+    # each empty slot draws a class by its ratio, then an item of the class by its order frequency.
+    class_names = list(items_pods_class_conf.keys())
+    empty_slots = slots.empty_slots()
+    slot_classes = slots.draw_slot_classes(empty_slots, list(items_pods_class_conf.values()))
+    order_frequency = items["item_order_frequency"].to_numpy(dtype=float)
+    for class_no, class_name in enumerate(class_names):
+        class_weight = np.where(items["item_class"].to_numpy() == class_name, order_frequency, 0.0)
+        class_slots = empty_slots[slot_classes == class_no]
+        for slot_type in np.unique(slots.slot_type[class_slots]):
+            slots.fill_slots(class_slots[slots.slot_type[class_slots] == slot_type], class_weight, capacity)
+
+    filled = slots.item != EMPTY
+    report_slotting_shortage(item_ids, shortage, int((~filled).sum()))
+    pods["item"] = np.where(filled, item_ids[slots.item], EMPTY)
+    pods["qty"] = slots.qty
+    pods["max_qty"] = slots.qty
 
     # make sure the qty and max_qty are integer
     pods[["item", "qty", "max_qty"]] = pods[["item", "qty", "max_qty"]].astype(int)
@@ -350,158 +295,54 @@ def assign_items_to_pods(pods, items, items_pods_class_conf, dev_mode=False):
                                                                    (items_slots_configuration["slot_type"].isin(slot_types)) & 
                                                                    (items_slots_configuration["max_box_in_slot"] > 0)]
     
-    # merge the item_slot_configuration with the items to get the item_slot_needed and know each item_id's slot_type
+    # merge the item_slot_configuration with the items to know each item_id's slot_type
     items["item_id"] = items.index
     items_slots_configuration_selected = items_slots_configuration_selected.merge(items[["item_id", 
                                                                                          "item_code", 
                                                                                          "item_class",                                                                                          
-                                                                                         "box_weight", 
-                                                                                         "item_weight",
-                                                                                         "item_order_frequency", 
-                                                                                         "item_initial_quantity_inventory", 
-                                                                                         "item_pod_inventory_level",
-                                                                                         "item_warehouse_inventory_level"]
+                                                                                         "item_initial_quantity_inventory"]
                                                                                          ].copy(), how='inner', on='item_code')
-    items_slots_configuration_selected["item_slot_needed"] = np.ceil(
-        (items_slots_configuration_selected["item_initial_quantity_inventory"] / items_slots_configuration_selected["number_of_item_in_a_box"]) / items_slots_configuration_selected["max_box_in_slot"]).astype(int)
 
-    # assign item to the pod based on the slot volume
+    # item x slot type capacity, and the slot table of the generated pods
+    item_ids = items.index.to_numpy()
+    capacity = build_slot_capacity(item_ids, slot_types, items_slots_configuration_selected)
+    slots = SlotTable(pods["pod_id"], pd.Index(slot_types).get_indexer(pods["slot_type"]), len(item_ids))
+
+    # assign item to the pod based on the slot volume: the items of the biggest slot volume range go first,
+    # within a range class A before B before C and the larger initial inventory first
+    item_order = []
     for s in range(len(slot_volumes)):
         
         # Filtering the item_slot_configuration based on the slot volume
-        if s == (len(slot_volumes)-1):
-            # the biggest slot
-            items_slots_volume_filtered = items_slots_configuration_selected.loc[(items_slots_configuration_selected["box_volume"] < slot_volumes[s]), 
-                                                       ["item_id", "item_class", "slot_type",                                                          
-                                                        "number_of_item_in_a_box", "max_box_in_slot", "max_item_in_slot", "item_weight", 
-                                                        "item_initial_quantity_inventory", "item_pod_inventory_level", "item_warehouse_inventory_level"
-                                                        ]].sort_values(by=["item_class", "item_initial_quantity_inventory"], ascending=[True, False])
-
-            # print(s, slot_volumes[s], len(a))
-        else:
-            items_slots_volume_filtered = items_slots_configuration_selected.loc[(items_slots_configuration_selected["box_volume"] < slot_volumes[s]) & 
-                                                       (items_slots_configuration_selected["box_volume"] >= slot_volumes[s+1]), 
-                                                       ["item_id", "item_class", "slot_type",                                                          
-                                                        "number_of_item_in_a_box", "max_box_in_slot", "max_item_in_slot", "item_weight", 
-                                                        "item_initial_quantity_inventory", "item_pod_inventory_level", "item_warehouse_inventory_level"
-                                                        ]].sort_values(by=["item_class", "item_initial_quantity_inventory"], ascending=[True, False])                                            
-            # print(s, slot_volumes[s], slot_volumes[s+1], len(a))
-        
-        if len(items_slots_volume_filtered) > 0:
-            item_fitted = items_slots_volume_filtered.loc[:, "item_id"].unique()
-            slot_fitted = items_slots_volume_filtered.loc[:, "slot_type"].unique()
-            # print("    ", item_fitted, slot_fitted)
-    
-            for item_id in item_fitted:
-                item_initial_quantity_needed = items.loc[items["item_id"] == item_id, "item_initial_quantity_inventory"].values[0]
-                while (item_initial_quantity_needed > 0):
-                    # print(item_id, item_initial_quantity_needed)
-                    pod_available = list(set(pods.loc[(pods["item"] != item_id) & (pods["item"].isnull()) & (pods["slot_type"].isin(slot_fitted)), "pod_id"].unique().tolist()) - 
-                                         set(pods.loc[(pods["item"] == item_id) & (pods["item"].notnull()) & (pods["slot_type"].isin(slot_fitted)), "pod_id"].unique().tolist()))    
-                    # print("  len(pod_available):", len(pod_available))
-                    # print("  pod_available:", pod_available)
-                    if len(pod_available) == 0:
-                        print("    All pod is unavailable for item_id:", item_id, item_initial_quantity_needed)
-                        print("    Break the loop")
-                        break
-                    else:
-                        pod_id = np.random.choice(pod_available)
-                        pod = pods.loc[pods["pod_id"] == pod_id]
-                        slot_available = pod.loc[(pod["item"] != item_id) & (pod["item"].isnull()) & (pod["slot_type"].isin(slot_fitted)), "slot_id"].unique()
-                        # print("    pod_id:", pod_id)
-                        # print("    slot_available:", slot_available, len(slot_available))
-                        if len(slot_available) == 0:
-                            print("      All slot is unavailable in pod_id", pod_id)
-                            break
-                        else:
-                            slot_id = np.random.choice(slot_available)
-                            slot_type = pod.loc[pod["slot_id"] == slot_id, "slot_type"].values[0] 
-
-                            max_item_in_slot = items_slots_volume_filtered.loc[(items_slots_volume_filtered["item_id"] == item_id) & 
-                                                                               (items_slots_volume_filtered["slot_type"] == slot_type),
-                                                                               "max_item_in_slot"].to_numpy()[0]
-
-                            item_weight = items_slots_volume_filtered.loc[(items_slots_volume_filtered["item_id"] == item_id) &
-                                                                          (items_slots_volume_filtered["slot_type"] == slot_type), 
-                                                                          "item_weight"].to_numpy()[0]
-                            
-                            qty = max_item_in_slot.astype(int)
-                            max_qty = max_item_in_slot.astype(int)
-                            total_item_weight = (item_weight * qty).round(3)
+        in_range = items_slots_configuration_selected["box_volume"] < slot_volumes[s]
+        if s < (len(slot_volumes)-1):
+            in_range &= items_slots_configuration_selected["box_volume"] >= slot_volumes[s+1]
+        items_slots_volume_filtered = items_slots_configuration_selected.loc[in_range].sort_values(
+            by=["item_class", "item_initial_quantity_inventory"], ascending=[True, False])
+        item_order.extend(items_slots_volume_filtered["item_id"].unique().tolist())
+
+    shortage = slots.place_items(pd.Index(item_ids).get_indexer(item_order),
+                                 items["item_initial_quantity_inventory"].to_numpy(), capacity)
 
-                            
-                            pods.loc[(pods["pod_id"] == pod_id) & (pods["slot_id"] == slot_id), "item"] = item_id
-                            pods.loc[(pods["pod_id"] == pod_id) & (pods["slot_id"] == slot_id), "qty"] = qty
-                            pods.loc[(pods["pod_id"] == pod_id) & (pods["slot_id"] == slot_id), "max_qty"] = max_qty
-                            pods.loc[(pods["pod_id"] == pod_id) & (pods["slot_id"] == slot_id), "item_weight"] = item_weight
-                            pods.loc[(pods["pod_id"] == pod_id) & (pods["slot_id"] == slot_id), "total_item_weight"] = total_item_weight
-                            
-                            item_initial_quantity_needed -= qty 
-                            # print("      ", slot_id, slot_type)
-                            # print("      ", number_of_item_in_a_box, max_box_in_slot, qty, max_qty, item_initial_quantity_needed)
-    
     # Fill slot that still empty with the item based on the class_pod_conf
-    pod_still_available = pods.loc[pods["item"].isnull(), "pod_id"].unique().tolist()
+    item_pod_class_ratio = items["item_class"].map(items_pods_class_conf).fillna(0).to_numpy(dtype=float)
+    empty_slots = slots.empty_slots()
+    for slot_type in pd.unique(slots.slot_type[empty_slots]):
+        slots.fill_slots(empty_slots[slots.slot_type[empty_slots] == slot_type], item_pod_class_ratio, capacity)
+
+    # write the slot table back to the pods
+    filled = slots.item != EMPTY
+    report_slotting_shortage(item_ids, shortage, int((~filled).sum()))
+    slot_items = items.iloc[np.where(filled, slots.item, 0)]
+    item_weight = np.where(filled, slot_items["item_weight"].to_numpy(dtype=float), np.nan)
+    pods["item"] = np.where(filled, item_ids[slots.item], EMPTY)
+    pods["qty"] = slots.qty
+    pods["max_qty"] = slots.qty
+    pods["item_weight"] = item_weight
+    pods["total_item_weight"] = (item_weight * slots.qty).round(3)
+    pods["item_pod_inventory_level"] = np.where(filled, slot_items["item_pod_inventory_level"].to_numpy(dtype=float), np.nan)
+    pods["item_warehouse_inventory_level"] = np.where(filled, slot_items["item_warehouse_inventory_level"].to_numpy(dtype=float), np.nan)
 
-    # calculate the class_pod_conf value, to get the threshold to assign the item to the pod.
-    items = pd.merge(items, pd.DataFrame(list(items_pods_class_conf.items()), columns=['item_class', 'item_pod_class_ratio']), on='item_class', how='left')
-    
-    for pod_id in pod_still_available:
-        pod = pods.loc[pods["pod_id"] == pod_id].copy()
-        slot_types = pod.loc[pod["item"].isnull(), "slot_type"].unique()
-        for slot_type in slot_types:
-            
-            # get the item that already assigned to the pod. We will exclude this item because a pod cannot has the same item in multiple slot.
-            item_exist = pod.loc[(pod["item"].notnull()), "item"].unique().astype(int)
-            
-            # get the item that can be stored in the slot type
-            item_slot_matched = items_slots_configuration_selected.loc[items_slots_configuration_selected["slot_type"]==slot_type, 
-                                                                     "item_code"].unique().tolist()
-            
-            # get the item that still available to be stored in the slot type
-            item_available = items.loc[(~items.index.isin(item_exist)) & (items["item_code"].isin(item_slot_matched)), 
-                                       ["item_code", "item_pod_class_ratio"]]
-            
-            # get the item based on the class_pod_conf
-            item_probability = item_available["item_pod_class_ratio"] / item_available["item_pod_class_ratio"].sum()
-            item_available = item_available.index.tolist()
-            
-            # get the slot that still empty
-            slot_available = pod.loc[(pod["item"].isnull()) & (pod["slot_type"]==slot_type), "slot_id"].unique()
-           
-            if len(item_available) > 0:
-
-                # select the item based on the class_pod_conf probability
-                item_selected = np.random.choice(item_available, size=len(slot_available), p=item_probability, replace=False)
-              
-                for i, item_id in enumerate(item_selected):
-
-                    # calculate the qty and max_qty based on the item's selected
-                    max_item_in_slot = items_slots_configuration_selected.loc[(items_slots_configuration_selected["item_id"]==item_id) &
-                                                                              (items_slots_configuration_selected["slot_type"] == slot_type), 
-                                                                              "max_item_in_slot"].to_numpy()[0]
-                    qty = max_item_in_slot.astype(int)
-                    max_qty = max_item_in_slot.astype(int)
-
-                    # calculate the item weight and total item weight
-                    item_weight = items_slots_configuration_selected.loc[(items_slots_configuration_selected["item_id"]==item_id) &
-                                                                         (items_slots_configuration_selected["slot_type"] == slot_type),
-                                                                         "item_weight"].to_numpy()[0]
-                    total_item_weight = (item_weight * qty).round(3)                            
-
-                    # assign the item to the slot
-                    slot_id = slot_available[i]
-                    pod.loc[(pod["pod_id"] == pod_id) & (pod["slot_id"] == slot_id), "item"] = item_id
-                    pod.loc[(pod["pod_id"] == pod_id) & (pod["slot_id"] == slot_id), "qty"] = qty
-                    pod.loc[(pod["pod_id"] == pod_id) & (pod["slot_id"] == slot_id), "max_qty"] = max_qty
-                    pod.loc[(pod["pod_id"] == pod_id) & (pod["slot_id"] == slot_id), "item_weight"] = item_weight
-                    pod.loc[(pod["pod_id"] == pod_id) & (pod["slot_id"] == slot_id), "total_item_weight"] = total_item_weight
-
-            else:                
-                break
-
-        pods.loc[pods["pod_id"] == pod_id] = pod.loc[pod["pod_id"]==pod_id].copy()
-  
     # make sure the qty and max_qty are integer
     pods[["item", "qty", "max_qty"]] = pods[["item", "qty", "max_qty"]].astype(int)
 
@@ -2,10 +2,10 @@ import csv
 import random
 import os
 from pathlib import Path
-import numpy as np
 import pandas as pd
 from lib.file import *
 from lib.constant import *
+from lib.generator.item_pod_generator import config_items_slots, gen_items, gen_pods, assign_items_to_pods
 
 def generate_pod(pod_types=[0], pod_num=[300], total_sku=500, 
             items_class_conf={"A": 0.1, "B": 0.3, "C": 0.6},
@@ -114,387 +114,4 @@ def generate_pod(pod_types=[0], pod_num=[300], total_sku=500,
     else:     
         pods = None
 
-    return     
-
-def config_items_slots(dev_mode=False):
-    working_path = get_working_path(dev_mode)
-
-    print("Setting up item slot configuration based on Item and Pod dictionary (see data/v2/ folder)...")
-
-    # check if file not exists
-    items_slots_path = PARENT_DIRECTORY + "/data/output/items_slots_configuration.csv"
-    if not os.path.exists(items_slots_path):
-
-        pods_dictionary_path = working_path + "/data/input/pods_dictionary.csv"
-        pods_dictionary = pd.read_csv(pods_dictionary_path, index_col=False)
-
-        item_path = working_path + "/data/input/items_dictionary.csv"
-        item_df = pd.read_csv(item_path, index_col=False)
-        item_df = item_df[["item_code", "box_volume",
-                        "item_volume", "number_of_item_in_a_box"]].copy()
-
-        # getl slot type from pod_dictionary
-        items_slots_configuration = pd.DataFrame()
-        slot_types = np.sort(pods_dictionary["slot_type"].unique())
-        for slot_type in slot_types:
-            # get slot volume
-            slot_volume = pods_dictionary.loc[pods_dictionary["slot_type"]
-                                    == slot_type, "slot_volume"].values[0]
-            item_df["slot_type"] = slot_type
-            item_df["slot_volume"] = slot_volume
-            item_df["max_box_in_slot"] = (
-                slot_volume / item_df["box_volume"]).astype(int)
-            item_df["max_item_in_slot"] = item_df["max_box_in_slot"] * \
-                item_df["number_of_item_in_a_box"]
-
-            items_slots_configuration = pd.concat(
-                [items_slots_configuration, item_df], axis=0)
-
-        items_slots_configuration.to_csv(items_slots_path, index=False)
-
-    else:
-        print("    Item slot configuration already exists. Delete the file to reconfigure.")
-        print()
-
-def gen_items(pod_types=[0], 
-              total_sku=500, 
-              items_class_conf={"A": 0.1, "B": 0.3, "C": 0.6}, 
-              items_pods_inventory_levels={"A": 0.3, "B": 0.4, "C": 0.5}, 
-              items_warehouse_inventory_levels={"A": 0.4, "B": 0.5, "C": 0.6},
-              select_option=1, 
-              dev_mode=False):
-        
-
-        # Generate or select items based on class of items.
-        # The items must align with the designated slot type within the pod.
-
-        # get the working path
-        working_path = get_working_path(dev_mode)
-
-        # get item slot configuration
-        items_slots_configuration_path = PARENT_DIRECTORY + "/data/output/items_slots_configuration.csv"
-        items_slots_configuration = pd.read_csv(items_slots_configuration_path, index_col=False)
-
-        # get pod configuration
-        pods_dictionary_path = working_path + "/data/input/pods_dictionary.csv"
-        pods_dictionary = pd.read_csv(pods_dictionary_path, index_col=False)
-
-        if check_items_pods_feasibility(total_sku, pod_types, pods_dictionary):
-            
-            # get list of item id that can be stored in the pod type (and slot type)
-            item_code_arr = list()
-            for pod_type in pod_types:
-                slot_types = pods_dictionary.loc[pods_dictionary["pod_type"]
-                                        == pod_type, "slot_type"].unique()
-                slot_types = np.sort(slot_types)
-
-                # print(slot_types)
-                for slot_type in slot_types:
-                    # print(slot_type)
-                    item_code = items_slots_configuration.loc[(items_slots_configuration["slot_type"] == slot_type) & (
-                        items_slots_configuration["max_box_in_slot"] > 0), "item_code"]
-                    item_code_arr = item_code_arr + item_code.to_list()
-
-            # remove duplicates
-            item_code_arr = np.unique(item_code_arr)
-
-            # retrieve item details corresponding to the list of item IDs compatible with the pod's slot specifications
-            item_path = working_path + "/data/input/items_dictionary.csv"
-            item_df = pd.read_csv(item_path, index_col=False)
-
-            item_df = item_df.loc[item_df["item_code"].isin(item_code_arr)].copy()
-            item_df = item_df[["item_code", "item_class", "item_order_frequency", "item_initial_quantity_inventory", "box_length", "box_width", "box_height", "box_volume", "box_weight", "number_of_item_in_a_box",
-                            "item_volume", "item_unit", "item_quantity_order_unique"]].copy()
-
-            # select items according to the class and its proportion
-            items = pd.DataFrame()
-            for class_name, conf in items_class_conf.items():
-
-                # get list of the item's code based on the class
-                item = item_df.loc[item_df["item_class"] == class_name].copy()
-                item = item.sort_values(by="item_order_frequency", ascending=False)
-
-                # print(items_inventory_levels)
-                item["item_pod_inventory_level"] = items_pods_inventory_levels[class_name]
-                item["item_warehouse_inventory_level"] = items_warehouse_inventory_levels[class_name]
-
-                # calculate the probability of order frequency for each item
-                item_probability = item["item_order_frequency"] / \
-                    item["item_order_frequency"].sum()
-
-                # select option 1: select items based on the probability of order frequency for each class.
-                # else: select items based on the top n-percent of the class ratio
-                if select_option == 1:
-
-                    # select items based on the probability of order frequency for each class.
-                    item_code = np.random.choice(item["item_code"].to_list(), size=int(
-                        total_sku*conf), p=item_probability, replace=False)
-                    items = pd.concat(
-                        [items, item.loc[item["item_code"].isin(item_code)]])
-                else:
-
-                    # select items based on the top n-percent of the class ratio
-                    item_top = item.head(int(total_sku*conf))
-                    items = pd.concat([items, item_top])
-
-            # save items selected to csv
-            items.reset_index(drop=True, inplace=True)
-            items.index.name = "item_id"
-
-            items_weight = items["box_weight"] / items["number_of_item_in_a_box"]
-            items.insert(11, "item_weight", items_weight.round(3))
-            items[["item_order_frequency", "number_of_item_in_a_box"]] = items[[
-                "item_order_frequency", "number_of_item_in_a_box"]].astype(int)
-
-            items.to_csv(PARENT_DIRECTORY + "/data/output/items.csv", index=True)
-
-        else:
-            items = None
-
-        return items
-
-def gen_pods(pod_num, pod_types, dev_mode=True):
-    # get the working path
-    working_path = get_working_path(dev_mode)
-
-    # get pod configuration
-    pods_dictionary_path = working_path + "/data/input/pods_dictionary.csv"
-    pods_dictionary = pd.read_csv(pods_dictionary_path, index_col=False)
-
-    # generate pods based on the pod specification (types and the number of pods)
-    counter_id = 0
-    pods = pd.DataFrame()
-    for i, p in enumerate(pod_types):
-
-        pod_slot_num = pods_dictionary.loc[pods_dictionary["pod_type"] == p].shape[0]
-        pod_slot_id = pods_dictionary.loc[pods_dictionary["pod_type"]
-                                == p, "slot_sequence"].to_list()
-        slot_type = pods_dictionary.loc[pods_dictionary["pod_type"]
-                                == p, "slot_type"].to_list()       
-
-        pod_type = [p] * pod_slot_num
-        pod_face = pods_dictionary.loc[pods_dictionary["pod_type"] == p, "pod_face"].to_list()
-
-        for _ in range(pod_num[i]):
-            pod_id = [counter_id] * pod_slot_num
-            counter_id += 1
-
-            pod = pd.DataFrame({"pod_id": pod_id,
-                                "pod_type": pod_type,
-                                "slot_id": pod_slot_id,
-                                "slot_type": slot_type,
-                                "item": np.nan,
-                                "unusedColumn1": 0,
-                                "unusedColumn2": 0,
-                                "unusedColumn3": 0,
-                                "qty": np.nan,
-                                "max_qty": np.nan,
-                                'due_date': 99999,
-                                'facing': pod_face,
-                                'pick_ind': 0
-                                })
-            pods = pd.concat([pods, pod], axis=0)
-
-    pods.reset_index(drop=True, inplace=True)
-    return pods
-
-def assign_items_to_pods(pods, items, items_pods_class_conf, dev_mode=False):
-    working_path = get_working_path(dev_mode)
-    pods_dictionary_path = working_path + "/data/input/pods_dictionary.csv"
-    pods_dictionary = pd.read_csv(pods_dictionary_path, index_col=False)
-
-    # get the slot types from pod generated (or defined pod types)
-    slot_types = pods_dictionary.loc[pods_dictionary["pod_type"].isin(pods.loc[:, "pod_type"]), 
-                                    ["slot_type", "slot_volume"]].sort_values(by="slot_volume", ascending=False).loc[:, "slot_type"].unique()
-    slot_volumes = pods_dictionary.loc[pods_dictionary["pod_type"].isin(pods.loc[:, "pod_type"]), 
-                                    ["slot_type", "slot_volume"]].sort_values(by="slot_volume", ascending=False).loc[:, "slot_volume"].unique() 
-    pods["slot_sequence"] = np.arange(0, pods.shape[0]) 
-
-    # get the item_slot_configuration based on the items and slot types    
-    item_slot_configuration_path = PARENT_DIRECTORY + "/data/output/items_slots_configuration.csv"
-    items_slots_configuration = pd.read_csv(item_slot_configuration_path, index_col=False)    
-    items_slots_configuration_selected = items_slots_configuration.loc[(items_slots_configuration["item_code"].isin(items["item_code"].unique())) & 
-                                                                (items_slots_configuration["slot_type"].isin(slot_types)) & 
-                                                                (items_slots_configuration["max_box_in_slot"] > 0)]
-    
-    # merge the item_slot_configuration with the items to get the item_slot_needed and know each item_id's slot_type
-    items["item_id"] = items.index
-    items_slots_configuration_selected = items_slots_configuration_selected.merge(items[["item_id", 
-                                                                                        "item_code", 
-                                                                                        "item_class",                                                                                          
-                                                                                        "box_weight", 
-                                                                                        "item_weight",
-                                                                                        "item_order_frequency", 
-                                                                                        "item_initial_quantity_inventory", 
-                                                                                        "item_pod_inventory_level",
-                                                                                        "item_warehouse_inventory_level"]
-                                                                                        ].copy(), how='inner', on='item_code')
-    items_slots_configuration_selected["item_slot_needed"] = np.ceil(
-        (items_slots_configuration_selected["item_initial_quantity_inventory"] / items_slots_configuration_selected["number_of_item_in_a_box"]) / items_slots_configuration_selected["max_box_in_slot"]).astype(int)
-
-    # assign item to the pod based on the slot volume
-    for s in range(len(slot_volumes)):
-        
-        # Filtering the item_slot_configuration based on the slot volume
-        if s == (len(slot_volumes)-1):
-            # the biggest slot
-            items_slots_volume_filtered = items_slots_configuration_selected.loc[(items_slots_configuration_selected["box_volume"] < slot_volumes[s]), 
-                                                    ["item_id", "item_class", "slot_type",                                                          
-                                                        "number_of_item_in_a_box", "max_box_in_slot", "max_item_in_slot", "item_weight", 
-                                                        "item_initial_quantity_inventory", "item_pod_inventory_level", "item_warehouse_inventory_level"
-                                                        ]].sort_values(by=["item_class", "item_initial_quantity_inventory"], ascending=[True, False])
-
-            # print(s, slot_volumes[s], len(a))
-        else:
-            items_slots_volume_filtered = items_slots_configuration_selected.loc[(items_slots_configuration_selected["box_volume"] < slot_volumes[s]) & 
-                                                    (items_slots_configuration_selected["box_volume"] >= slot_volumes[s+1]), 
-                                                    ["item_id", "item_class", "slot_type",                                                          
-                                                        "number_of_item_in_a_box", "max_box_in_slot", "max_item_in_slot", "item_weight", 
-                                                        "item_initial_quantity_inventory", "item_pod_inventory_level", "item_warehouse_inventory_level"
-                                                        ]].sort_values(by=["item_class", "item_initial_quantity_inventory"], ascending=[True, False])                                            
-            # print(s, slot_volumes[s], slot_volumes[s+1], len(a))
-        
-        if len(items_slots_volume_filtered) > 0:
-            item_fitted = items_slots_volume_filtered.loc[:, "item_id"].unique()
-            slot_fitted = items_slots_volume_filtered.loc[:, "slot_type"].unique()
-            # print("    ", item_fitted, slot_fitted)
-    
-            for item_id in item_fitted:
-                item_initial_quantity_needed = items.loc[items["item_id"] == item_id, "item_initial_quantity_inventory"].values[0]
-                while (item_initial_quantity_needed > 0):
-                    # print(item_id, item_initial_quantity_needed)
-                    pod_available = list(set(pods.loc[(pods["item"] != item_id) & (pods["item"].isnull()) & (pods["slot_type"].isin(slot_fitted)), "pod_id"].unique().tolist()) - 
-                                        set(pods.loc[(pods["item"] == item_id) & (pods["item"].notnull()) & (pods["slot_type"].isin(slot_fitted)), "pod_id"].unique().tolist()))    
-                    # print("  len(pod_available):", len(pod_available))
-                    # print("  pod_available:", pod_available)
-                    if len(pod_available) == 0:
-                        print("    All pod is unavailable for item_id:", item_id, item_initial_quantity_needed)
-                        print("    Break the loop")
-                        break
-                    else:
-                        pod_id = np.random.choice(pod_available)
-                        pod = pods.loc[pods["pod_id"] == pod_id]
-                        slot_available = pod.loc[(pod["item"] != item_id) & (pod["item"].isnull()) & (pod["slot_type"].isin(slot_fitted)), "slot_id"].unique()
-                        # print("    pod_id:", pod_id)
-                        # print("    slot_available:", slot_available, len(slot_available))
-                        if len(slot_available) == 0:
-                            print("      All slot is unavailable in pod_id", pod_id)
-                            break
-                        else:
-                            slot_id = np.random.choice(slot_available)
-                            slot_type = pod.loc[pod["slot_id"] == slot_id, "slot_type"].values[0] 
-
-                            max_item_in_slot = items_slots_volume_filtered.loc[(items_slots_volume_filtered["item_id"] == item_id) & 
-                                                                            (items_slots_volume_filtered["slot_type"] == slot_type),
-                                                                            "max_item_in_slot"].to_numpy()[0]
-
-                            item_weight = items_slots_volume_filtered.loc[(items_slots_volume_filtered["item_id"] == item_id) &
-                                                                        (items_slots_volume_filtered["slot_type"] == slot_type), 
-                                                                        "item_weight"].to_numpy()[0]
-                            
-                            qty = max_item_in_slot.astype(int)
-                            max_qty = max_item_in_slot.astype(int)
-                            total_item_weight = (item_weight * qty).round(3)
-                            
-                            item_inventory_level = items_slots_volume_filtered.loc[(items_slots_volume_filtered["item_id"] == item_id), "item_pod_inventory_level"].to_numpy()[0]
-                            item_global_level = items_slots_volume_filtered.loc[(items_slots_volume_filtered["item_id"] == item_id), "item_warehouse_inventory_level"].to_numpy()[0]
-
-                            
-                            pods.loc[(pods["pod_id"] == pod_id) & (pods["slot_id"] == slot_id), "item"] = item_id
-                            pods.loc[(pods["pod_id"] == pod_id) & (pods["slot_id"] == slot_id), "qty"] = qty
-                            pods.loc[(pods["pod_id"] == pod_id) & (pods["slot_id"] == slot_id), "max_qty"] = max_qty
-                            pods.loc[(pods["pod_id"] == pod_id) & (pods["slot_id"] == slot_id), "item_weight"] = item_weight
-                            pods.loc[(pods["pod_id"] == pod_id) & (pods["slot_id"] == slot_id), "total_item_weight"] = total_item_weight
-                            pods.loc[(pods["pod_id"] == pod_id) & (pods["slot_id"] == slot_id), "item_pod_inventory_level"] = item_inventory_level
-                            pods.loc[(pods["pod_id"] == pod_id) & (pods["slot_id"] == slot_id), "item_warehouse_inventory_level"] = item_global_level
-                            
-                            item_initial_quantity_needed -= qty 
-                            # print("      ", slot_id, slot_type)
-                            # print("      ", number_of_item_in_a_box, max_box_in_slot, qty, max_qty, item_initial_quantity_needed)
-    
-    # Fill slot that still empty with the item based on the class_pod_conf
-    pod_still_available = pods.loc[pods["item"].isnull(), "pod_id"].unique().tolist()
-
-    # calculate the class_pod_conf value, to get the threshold to assign the item to the pod.
-    items = pd.merge(items, pd.DataFrame(list(items_pods_class_conf.items()), columns=['item_class', 'item_pod_class_ratio']), on='item_class', how='left')
-    
-    for pod_id in pod_still_available:
-        pod = pods.loc[pods["pod_id"] == pod_id].copy()
-        slot_types = pod.loc[pod["item"].isnull(), "slot_type"].unique()
-        for slot_type in slot_types:
-            
-            # get the item that already assigned to the pod. We will exclude this item because a pod cannot has the same item in multiple slot.
-            item_exist = pod.loc[(pod["item"].notnull()), "item"].unique().astype(int)
-            
-            # get the item that can be stored in the slot type
-            item_slot_matched = items_slots_configuration_selected.loc[items_slots_configuration_selected["slot_type"]==slot_type, 
-                                                                    "item_code"].unique().tolist()
-            
-            # get the item that still available to be stored in the slot type
-            item_available = items.loc[(~items.index.isin(item_exist)) & (items["item_code"].isin(item_slot_matched)), 
-                                    ["item_code", "item_pod_class_ratio"]]
-            
-            # get the item based on the class_pod_conf
-            item_probability = item_available["item_pod_class_ratio"] / item_available["item_pod_class_ratio"].sum()
-            item_available = item_available.index.tolist()
-            
-            # get the slot that still empty
-            slot_available = pod.loc[(pod["item"].isnull()) & (pod["slot_type"]==slot_type), "slot_id"].unique()
-        
-            if len(item_available) > 0:
-
-                # select the item based on the class_pod_conf probability
-                item_selected = np.random.choice(item_available, size=len(slot_available), p=item_probability, replace=False)
-            
-                for i, item_id in enumerate(item_selected):
-
-                    # calculate the qty and max_qty based on the item's selected
-                    max_item_in_slot = items_slots_configuration_selected.loc[(items_slots_configuration_selected["item_id"]==item_id) &
-                                                                            (items_slots_configuration_selected["slot_type"] == slot_type), 
-                                                                            "max_item_in_slot"].to_numpy()[0]
-                    qty = max_item_in_slot.astype(int)
-                    max_qty = max_item_in_slot.astype(int)
-
-                    # calculate the item weight and total item weight
-                    item_weight = items_slots_configuration_selected.loc[(items_slots_configuration_selected["item_id"]==item_id) &
-                                                                        (items_slots_configuration_selected["slot_type"] == slot_type),
-                                                                        "item_weight"].to_numpy()[0]
-                    total_item_weight = (item_weight * qty).round(3)                            
-
-                    item_inventory_level = items_slots_configuration_selected.loc[(items_slots_configuration_selected["item_id"] == item_id), "item_pod_inventory_level"].to_numpy()[0]
-                    item_global_level = items_slots_configuration_selected.loc[(items_slots_configuration_selected["item_id"] == item_id), "item_warehouse_inventory_level"].to_numpy()[0]
-                    
-                    # assign the item to the slot
-                    slot_id = slot_available[i]
-                    pod.loc[(pod["pod_id"] == pod_id) & (pod["slot_id"] == slot_id), "item"] = item_id
-                    pod.loc[(pod["pod_id"] == pod_id) & (pod["slot_id"] == slot_id), "qty"] = qty
-                    pod.loc[(pod["pod_id"] == pod_id) & (pod["slot_id"] == slot_id), "max_qty"] = max_qty
-                    pod.loc[(pod["pod_id"] == pod_id) & (pod["slot_id"] == slot_id), "item_weight"] = item_weight
-                    pod.loc[(pod["pod_id"] == pod_id) & (pod["slot_id"] == slot_id), "total_item_weight"] = total_item_weight
-                    pod.loc[(pods["pod_id"] == pod_id) & (pods["slot_id"] == slot_id), "item_pod_inventory_level"] = item_inventory_level
-                    pod.loc[(pods["pod_id"] == pod_id) & (pods["slot_id"] == slot_id), "item_warehouse_inventory_level"] = item_global_level
-
-            else:                
-                break
-
-        pods.loc[pods["pod_id"] == pod_id] = pod.loc[pod["pod_id"]==pod_id].copy()
-
-    # make sure the qty and max_qty are integer
-    pods[["item", "qty", "max_qty"]] = pods[["item", "qty", "max_qty"]].astype(int)
-
-    # save the pods to csv
-    pods.to_csv(PARENT_DIRECTORY + "/data/output/pods.csv", index=False)
-    
-    return pods
-
-def check_items_pods_feasibility(total_sku, pod_types, pods_dictionary):
-        feasible = True
-        for pod_type in pod_types:
-            total_slot = pods_dictionary.loc[pods_dictionary["pod_type"] == pod_type].shape[0]
-            if  total_slot > total_sku:
-                print("Pod type", pod_type, "has more slot ("+str(total_slot)+") than total SKU ("+str(total_sku)+").")
-                print("In this system we asume that each pod cannot store same item in multiple slot.")
-                print("Please adjust the number of items before we can continue to generate the items and pods.")
-                feasible = False
-                break
-        return feasible
\ No newline at end of file
+    return
@@ -0,0 +1,133 @@
+"""
+SKU 到 pod 的 slotting 引擎
+
+所有 slot、pod 與品項需求都以 NumPy 陣列表示，取代逐筆 pods.loc 布林遮罩與逐 pod 的 np.random.choice：
+- place_items: 依品項需求量放置，每個品項一次抽出不重複的 pod，再在每個 pod 內隨機挑一個空 slot
+- fill_slots: 以加權不放回抽樣 (Efraimidis-Spirakis，key = Exp(1) / w) 一次替所有 pod 的空 slot 選品項
+- draw_slot_classes: ABC 分類補貨，依各類別比例替每個空 slot 抽類別
+
+可行性檢查：品項只會放進容量 > 0 的 slot 類型，同一個 pod 不會放兩次相同品項；
+候選不足時少放並回報缺口，而不是拋出例外。
+
+亂數來源預設為 np.random 模組 (與原本的產生器共用全域種子)，也可傳入 np.random.Generator。
+"""
+import numpy as np
+
+EMPTY = -1
+
+
+class SlotTable:
+    """
+    pod slot 的陣列表示
+
+    Attributes:
+        pod: 每個 slot 所屬 pod 的索引 (0 .. num_pods-1)
+        slot_type: 每個 slot 的類型索引 (對應容量矩陣的欄)
+        item: 每個 slot 放置的品項索引，EMPTY 表示空 slot
+        qty: 每個 slot 的數量
+        contains: pod × 品項 的布林矩陣，pod 內已有該品項時為 True
+    """
+
+    def __init__(self, slot_pod, slot_type, num_items: int, rng=None):
+        self.pod_ids, self.pod = np.unique(np.asarray(slot_pod), return_inverse=True)
+        self.slot_type = np.asarray(slot_type, dtype=np.int64)
+        self.num_pods = len(self.pod_ids)
+        self.item = np.full(len(self.pod), EMPTY, dtype=np.int64)
+        self.qty = np.zeros(len(self.pod), dtype=np.int64)
+        self.contains = np.zeros((self.num_pods, num_items), dtype=bool)
+        self.rng = np.random if rng is None else rng
+
+    def empty_slots(self) -> np.ndarray:
+        return np.flatnonzero(self.item == EMPTY)
+
+    def _assign(self, slots, items, capacity):
+        self.item[slots] = items
+        self.qty[slots] = capacity[items, self.slot_type[slots]]
+        self.contains[self.pod[slots], items] = True
+
+    def place_items(self, item_order, item_needed, capacity) -> np.ndarray:
+        """
+        依需求量放置品項：每個 slot 放滿 capacity 的數量，直到累計數量達到需求
+
+        每個品項在可用的 pod (有相容空 slot 且尚未存放此品項) 中均勻抽出不重複的 pod，
+        與逐次隨機挑 pod 的結果分佈相同。
+
+        Args:
+            item_order: 依序處理的品項索引
+            item_needed: 各品項需要放置的數量 (以品項索引為索引)
+            capacity: 品項 × slot 類型 的容量矩陣，0 表示放不下
+
+        Returns:
+            ndarray: 各品項未能放置的數量
+        """
+        shortage = np.zeros(len(item_needed), dtype=np.int64)
+        for item in item_order:
+            needed = item_needed[item]
+            if needed <= 0:
+                continue
+            slot_capacity = capacity[item, self.slot_type]
+            candidates = np.flatnonzero((self.item == EMPTY) & (slot_capacity > 0) & ~self.contains[self.pod, item])
+            if len(candidates) == 0:
+                shortage[item] = needed
+                continue
+
+            # 每個 pod 隨機挑一個空 slot，再把 pod 隨機排序
+            keys = self.rng.random(len(candidates))
+            candidates = candidates[np.lexsort((keys, self.pod[candidates]))]
+            pods = self.pod[candidates]
+            first = np.ones(len(candidates), dtype=bool)
+            first[1:] = pods[1:] != pods[:-1]
+            slots = candidates[first]
+            slots = slots[self.rng.permutation(len(slots))]
+
+            filled = np.cumsum(slot_capacity[slots])
+            count = min(int(np.searchsorted(filled, needed)) + 1, len(slots))
+            self._assign(slots[:count], np.full(count, item), capacity)
+            shortage[item] = max(needed - filled[count - 1], 0)
+        return shortage
+
+    def fill_slots(self, targets, item_weight, capacity) -> np.ndarray:
+        """
+        以加權不放回抽樣替 targets 中的空 slot 選品項，每個 pod 內的品項不重複
+
+        Args:
+            targets: 要填的 slot 索引，需為同一種 slot 類型
+            item_weight: 各品項被選中的權重，0 表示不選
+            capacity: 品項 × slot 類型 的容量矩陣
+
+        Returns:
+            ndarray: 沒有可用品項而保持空白的 slot 索引
+        """
+        targets = np.asarray(targets, dtype=np.int64)
+        if len(targets) == 0:
+            return targets
+        slot_type = self.slot_type[targets[0]]
+        eligible = np.flatnonzero((capacity[:, slot_type] > 0) & (item_weight > 0))
+
+        # 依 pod 分組 (組內保持 slot 順序)，每個 pod 需要選 counts 個品項
+        targets = targets[np.argsort(self.pod[targets], kind='stable')]
+        counts = np.bincount(self.pod[targets], minlength=self.num_pods)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        rows = np.flatnonzero(counts)
+        if len(eligible) == 0:
+            return targets
+
+        keys = self.rng.exponential(size=(len(rows), len(eligible))) / item_weight[eligible]
+        keys[self.contains[np.ix_(rows, eligible)]] = np.inf
+        ranked = np.argsort(keys, axis=1)
+        depth = min(int(counts.max()), len(eligible))
+        ranked = ranked[:, :depth]
+        taken = (np.arange(depth) < counts[rows, None]) & np.isfinite(np.take_along_axis(keys, ranked, axis=1))
+
+        row_index, rank = np.nonzero(taken)
+        pods = rows[row_index]
+        slots = targets[starts[pods] + rank]
+        self._assign(slots, eligible[ranked[row_index, rank]], capacity)
+        return targets[self.item[targets] == EMPTY]
+
+    def draw_slot_classes(self, slots, class_ratios) -> np.ndarray:
+        """依類別比例 (例如 ABC 的 {'A': 0.6, 'B': 0.3, 'C': 0.1}) 替每個 slot 抽一個類別索引"""
+        ratios = np.asarray(class_ratios, dtype=float)
+        thresholds = np.cumsum(ratios / ratios.sum())
+        draws = self.rng.random(len(slots))
+        return np.minimum(np.searchsorted(thresholds, draws, side='left'), len(ratios) - 1)
@@ -2,9 +2,9 @@ import time
 
 from typing import List
 
-from sklearn.cluster import KMeans
 from lib.types.netlogo_coordinate import NetLogoCoordinate
 from world.warehouse import Warehouse
+from world.layout import Layout, LayoutGeometry
 from world.entities.intersection import Intersection
 from world.entities.order import Order
 from lib.generator.order_generator import *
@@ -12,18 +12,24 @@ from lib.enum.area_path_type import AreaPathType
 from world.entities.pod import Pod
 from world.managers.pod_manager import PodManager
 from lib.generator.pod_generator import *
+from lib.generator.backlog_batching import build_order_sku_matrix, jaccard_similarity_matrix, cluster_orders
 from pandas import DataFrame
 from lib.math import *
 from lib.constant import *
 
 pods_path = os.path.join(PARENT_DIRECTORY, 'data/output/pods.csv')
 
-def init_robots(warehouse: Warehouse):
-    num_robot = 20 # Number of robots
+def init_robots(warehouse: Warehouse, num_robot: int = 20):
+    # num_robot: Number of robots
     
     robots = []
-    x_range = (5,43)
-    y_range=(0,30)
+    # 出生範圍由版面推導 (站點區塊之間的所有格子)，預設 31x49 版面為 x 5-43、y 0-30
+    if warehouse.geometry is not None:
+        x_range = warehouse.geometry.spawn_columns
+        y_range = warehouse.geometry.spawn_rows
+    else:
+        x_range = (5,43)
+        y_range=(0,30)
 
     # Initialize a set to keep track of used coordinates
     used_coordinates = set()
@@ -53,12 +59,24 @@ def init_robots(warehouse: Warehouse):
 
         # Add the robot to the warehouse, which likely involves adding it to some internal list or map
 
-def draw_layout(warehouse: Warehouse, process_id=None):
+def draw_layout(warehouse: Warehouse, process_id=None, num_robot: int = 20, layout=None, grid=None):
     """
     兩階段策略解決並行訓練文件競爭問題：
     第一階段：集中生成母版文件
     第二階段：分別複製個人副本
+
+    Args:
+        layout: 選用，Layout 物件或 Layout 參數 dict；在記憶體中產生版面，不寫入也不讀回 generated_pod.csv
+        grid: 選用，(rows, cols) 的 AreaPathType 陣列，直接作為版面使用
+        (貨架 SKU 仍來自 pods.csv，自訂版面的貨架數需與其相容)
     """
+    if layout is not None:
+        warehouse.layout = Layout(**layout) if isinstance(layout, dict) else layout
+    if grid is not None:
+        warehouse.layout.grid = np.asarray(grid)
+    elif layout is not None and warehouse.layout.grid is None:
+        warehouse.layout.generate(export=False)
+
     lock_file_path = os.path.join(PARENT_DIRECTORY, 'data/output/generator.lock')
     
     # 第一階段：集中生成母版文件
@@ -69,7 +87,7 @@ def draw_layout(warehouse: Warehouse, process_id=None):
         _create_process_specific_files(process_id)
     
     # 執行後續處理
-    draw_layout_from_generated_file(warehouse, process_id)
+    draw_layout_from_generated_file(warehouse, process_id, num_robot)
 
 
 def _ensure_master_files_exist(warehouse: Warehouse, lock_file_path: str):
@@ -83,8 +101,8 @@ def _ensure_master_files_exist(warehouse: Warehouse, lock_file_path: str):
         os.path.join(PARENT_DIRECTORY, 'data/output/pods.csv')
     ]
     
-    # 檢查是否所有母版文件都存在
-    all_files_exist = all(os.path.exists(file_path) for file_path in master_files)
+    # 檢查是否所有母版文件都存在 (被截斷成空檔的也視為不存在，否則 read_csv 會拋出 EmptyDataError)
+    all_files_exist = all(_is_non_empty_file(file_path) for file_path in master_files)
     
     if all_files_exist:
         # 所有文件都存在，無需重新生成
@@ -95,7 +113,7 @@ def _ensure_master_files_exist(warehouse: Warehouse, lock_file_path: str):
         time.sleep(1)
     
     # 雙重檢查：再次檢查文件是否存在
-    all_files_exist = all(os.path.exists(file_path) for file_path in master_files)
+    all_files_exist = all(_is_non_empty_file(file_path) for file_path in master_files)
     if all_files_exist:
         return
     
@@ -106,8 +124,11 @@ def _ensure_master_files_exist(warehouse: Warehouse, lock_file_path: str):
         
         print(f"Process {os.getpid()} generating master files...")
         
-        # 生成母版文件
-        warehouse.layout.generate()
+        # 生成母版文件；已指定版面時母版仍用預設 Layout，不覆蓋記憶體中的版面
+        if warehouse.layout.grid is None:
+            warehouse.layout.generate()
+        else:
+            Layout().generate()
         
         print(f"Process {os.getpid()} master files generation complete.")
         
@@ -117,6 +138,10 @@ def _ensure_master_files_exist(warehouse: Warehouse, lock_file_path: str):
             os.remove(lock_file_path)
 
 
+def _is_non_empty_file(file_path: str) -> bool:
+    return os.path.exists(file_path) and os.path.getsize(file_path) > 0
+
+
 def _create_process_specific_files(process_id: int):
     """
     第二階段：為每個進程複製個人副本
@@ -135,8 +160,8 @@ def _create_process_specific_files(process_id: int):
         master_path = os.path.join(PARENT_DIRECTORY, master_file)
         process_path = os.path.join(PARENT_DIRECTORY, process_file)
         
-        # 如果個人副本已經存在，跳過
-        if os.path.exists(process_path):
+        # 如果個人副本已經存在 (且不是空檔)，跳過
+        if _is_non_empty_file(process_path):
             continue
         
         # 複製母版文件到個人副本
@@ -150,8 +175,12 @@ def _create_process_specific_files(process_id: int):
             print(f"Process {process_id}: Warning - Master file {master_file} not found")
 
 
-def draw_layout_from_generated_file(warehouse: Warehouse, process_id=None):
-    draw_storage_from_generated_file(warehouse, process_id)
+def draw_layout_from_generated_file(warehouse: Warehouse, process_id=None, num_robot: int = 20):
+    if warehouse.layout.grid is not None:
+        # 本程序剛產生或指定的版面直接使用，不必再讀回 CSV
+        draw_storage_from_grid(warehouse, warehouse.layout.grid)
+    else:
+        draw_storage_from_generated_file(warehouse, process_id)
 
     # Config Orders
     assign_skus_to_pods(warehouse.pod_manager, process_id)
@@ -187,7 +216,7 @@ def draw_layout_from_generated_file(warehouse: Warehouse, process_id=None):
         if process_id:
             _copy_order_files_to_process(process_id)
     
-    init_robots(warehouse)
+    init_robots(warehouse, num_robot)
     # Assign backlog clustering
     assign_backlog_orders(warehouse, process_id)
 
@@ -224,46 +253,20 @@ def _copy_order_files_to_process(process_id: int):
                 print(f"Process {process_id}: Failed to copy order file {master_file}: {e}")
 
 def cluster_backlog_orders(jaccard_similarities, total_station, station_capacity_df):
-    jaccard_similarities_list = [similarities for similarities in jaccard_similarities.values()]
-    # print(jaccard_similarities_list)
-    cluster_labels = [-1] * len(jaccard_similarities_list)
-    station_remaining_capacity = station_capacity_df['capacity_left'].tolist()
-
-    # K-Means clustering
-    kmeans = KMeans(n_clusters=total_station)
-    kmeans.fit(jaccard_similarities_list)
-
-    cluster_labels1 = kmeans.labels_
-
-    cluster_distances = []
-
-    # calculate distances for each order
-    for i, label in enumerate(cluster_labels1):
-        centroid = kmeans.cluster_centers_[label]
-        distance = np.linalg.norm(jaccard_similarities_list[i] - centroid)
-        cluster_distances.append((i, label, distance))
-        
-    cluster_distances.sort(key=lambda x: x[2])
-
-    # assign each backlog order to a cluster
-    for order_idx, label, distance in cluster_distances:
-        station_id = station_capacity_df.iloc[label]['id_station']
-        if station_remaining_capacity[label] > 0:
-            cluster_labels[order_idx] = station_id
-            station_remaining_capacity[label] -= 1
-        else:
-            cluster_labels[order_idx] = None
+    # jaccard_similarities: 訂單 × 訂單 相似度矩陣 (見 backlog_batching.jaccard_similarity_matrix)
+    station_capacity_df = station_capacity_df.iloc[:total_station]
+    cluster_labels = cluster_orders(jaccard_similarities,
+                                    station_capacity_df['id_station'].tolist(),
+                                    station_capacity_df['capacity_left'].to_numpy(dtype=np.int64))
 
     print("cluster label:")
     print(cluster_labels)
 
     return cluster_labels
 
-def assign_cluster_labels(warehouse: Warehouse, data_backlog_order_df, full_order, cluster_labels, station_capacity_df, process_id=None):
-    order_dum_to_cluster = dict(zip(full_order.index, cluster_labels))
-    temp = float('inf')
-    new_order = None
- 
+def assign_cluster_labels(warehouse: Warehouse, data_backlog_order_df, order_ids, cluster_labels, station_capacity_df, process_id=None):
+    order_dum_to_cluster = dict(zip(order_ids, cluster_labels))
+
     if process_id:
         order_path = os.path.join(PARENT_DIRECTORY, f'data/output/generated_order_{process_id}.csv')
     else:
@@ -275,7 +278,7 @@ def assign_cluster_labels(warehouse: Warehouse, data_backlog_order_df, full_orde
     else:
         file_path = PARENT_DIRECTORY + f"/data/input/assign_order_{os.getpid()}.csv"
     if os.path.exists(file_path):
-        assign_order_df = pd.read_csv(file_path)
+        assign_order_df = pd.read_csv(file_path, dtype={'assigned_station': object})
         # pass
     else:
         assign_order_df = orders_df.copy()
@@ -284,37 +287,32 @@ def assign_cluster_labels(warehouse: Warehouse, data_backlog_order_df, full_orde
         assign_order_df['status'] = -3
         assign_order_df.to_csv(file_path, index=False)      
     
-    unique_orders = set()
-    order_sku_map = {}
-    new_order = None
-    for index, row in data_backlog_order_df.iterrows():
-        order_dum = row['order_id']
-        station_id = order_dum_to_cluster[order_dum]
-       
-        if station_id is not None and order_dum not in unique_orders:
-            unique_orders.add(order_dum)
-            new_order = warehouse.order_manager.createOrder(order_dum, 0)
-            # print("order: ", new_order.id)
-            # print("station: ", station_id)
-            
-            assign_order_df.loc[assign_order_df['order_id'] == new_order.id, 'assigned_station'] = station_id
-            assign_order_df.loc[assign_order_df['order_id'] == new_order.id, 'status'] = -1
-            
-            assign_order_df.to_csv(file_path, index=False)
-            new_order.assignStation(station_id)
-            station = warehouse.station_manager.getStationById(station_id)
-            
-            order_sku_map[order_dum] = 0
-
-        if order_dum in unique_orders:
-            order = warehouse.order_manager.getOrderById(order_dum)
-            order.addSKU(row['item_id'], row['item_quantity'])
-            order_sku_map[order_dum] += 1
-        if order_dum in order_sku_map:
-            order = warehouse.order_manager.getOrderById(order_dum)
-            expected_sku_count = data_backlog_order_df[data_backlog_order_df['order_id'] == order_dum].shape[0]
-            if order_sku_map[order_dum] == expected_sku_count:
-                station.addOrder(order_dum, order)
+    # 只處理分配到站點的訂單，依第一次出現的順序建立
+    station_by_order = {order_dum: station_id for order_dum, station_id in order_dum_to_cluster.items()
+                        if station_id is not None}
+    assigned_rows = data_backlog_order_df[data_backlog_order_df['order_id'].isin(list(station_by_order))]
+    grouped = assigned_rows.groupby('order_id', sort=False)
+    items = grouped['item_id'].agg(lambda values: values.tolist())
+    quantities = grouped['item_quantity'].agg(lambda values: values.tolist())
+
+    # 一次更新分配表並寫檔
+    # 以 object 型別對應，未分配的訂單為 NaN 時數字站點編號才不會變成 float64 (寫成 0.0)
+    assigned_station = assign_order_df['order_id'].map(pd.Series(station_by_order, dtype=object))
+    is_assigned = assigned_station.notna()
+    assign_order_df['assigned_station'] = assigned_station.where(is_assigned, assign_order_df['assigned_station'])
+    assign_order_df.loc[is_assigned, 'status'] = -1
+    assign_order_df.to_csv(file_path, index=False)
+
+    orders_by_station = {}
+    new_orders = warehouse.order_manager.createOrders(items.index, 0)
+    for new_order, order_items, order_quantities in zip(new_orders, items, quantities):
+        station_id = station_by_order[new_order.id]
+        new_order.assignStation(station_id)
+        new_order.addSKUs(order_items, order_quantities)
+        orders_by_station.setdefault(station_id, []).append(new_order)
+
+    for station_id, station_orders in orders_by_station.items():
+        warehouse.station_manager.getStationById(station_id).addOrders(station_orders)
     
     return station_capacity_df
 
@@ -346,29 +344,37 @@ def assign_backlog_orders(warehouse: Warehouse, process_id=None):
 
     if len(unassigned_backlog_order) > 0:
         total_station = len(station_id_cap_df)
-        full_order, jaccard_similarities = compute_jaccard_similarity(unassigned_backlog_order)
+        order_ids, _, incidence = build_order_sku_matrix(unassigned_backlog_order)
+        jaccard_similarities = jaccard_similarity_matrix(incidence)
         cluster_labels = cluster_backlog_orders(jaccard_similarities, total_station, station_id_cap_df)
-        station_id_cap_df = assign_cluster_labels(warehouse, unassigned_backlog_order, full_order, cluster_labels, station_id_cap_df, process_id)
+        station_id_cap_df = assign_cluster_labels(warehouse, unassigned_backlog_order, order_ids, cluster_labels, station_id_cap_df, process_id)
 
 def draw_storage_from_generated_file(warehouse: Warehouse, process_id=None):
     if process_id:
         pod_path = os.path.join(PARENT_DIRECTORY, f'data/output/generated_pod_{process_id}.csv')
     else:
         pod_path = os.path.join(PARENT_DIRECTORY, 'data/output/generated_pod.csv')
+    draw_storage_from_grid(warehouse, pd.read_csv(pod_path, header=None).to_numpy())
+
+def draw_storage_from_grid(warehouse: Warehouse, grid):
+    # grid: (rows, cols) array of AreaPathType values, e.g. from warehouse.layout.generate(export=False)
     warehouse.graph_pod.key = 'pod'
-    data = pd.read_csv(pod_path, header=None)
-    totalRows = len(data)
-    totalCols = 0
-    for y, row in data.iterrows():
-        totalCols += len(list(row.items()))
-        # Invert Y only to draw
-        for x, value in row.items():
-            # how to get the length of row.items() when the type is iterable
-            create_storage_object(warehouse, x, y, row, totalRows, value, data)
-    
-    warehouse.setWarehouseSize([totalRows, totalCols])
+    cells = np.asarray(grid, dtype=np.int64)
+    data = pd.DataFrame(cells)
+    # 座標範圍、RL 路口與主要路口都由版面推導，不再假設預設的 31x49 版面
+    warehouse.setLayoutGeometry(LayoutGeometry(cells))
+    totalRows = len(cells)
+    for (y, x), value in np.ndenumerate(cells):
+        create_storage_object(warehouse, x, y, cells[y], totalRows, int(value), data, cells)
+
+    # 欄數沿用原本逐列累加的結果 (rows * cols)，zoning 懲罰的面積以此計算
+    warehouse.setWarehouseSize([totalRows, cells.size])
+
+def create_storage_object(warehouse: Warehouse, x, y, row, totalRows, value, data: DataFrame, cells=None):
+    # cells: data 的 ndarray，鄰格查詢用陣列索引取代 data.iloc (大型版面逐格呼叫時差異明顯)
+    if cells is None:
+        cells = data.to_numpy()
 
-def create_storage_object(warehouse: Warehouse, x, y, row, totalRows, value, data: DataFrame):
     def add_edges(graph, obj_key, coordinates, weight):
         for coord in coordinates:
             graph.addEdge(obj_key, coord, weight=weight)
@@ -379,10 +385,10 @@ def create_storage_object(warehouse: Warehouse, x, y, row, totalRows, value, dat
 
         def add_approaching_path(value, direction, increment):
             coord = increment
-            while data.iloc[coord[1], coord[0]] in value:
+            while cells[coord[1], coord[0]] in value:
                 approaching_path_coordinates.append(coord)
                 coord = (coord[0] + direction[0], coord[1] + direction[1])
-            if data.iloc[coord[1], coord[0]] == 3:
+            if cells[coord[1], coord[0]] == 3:
                 intersection.addConnectedIntersectionId(coord[0], coord[1])
 
         if obj_right_value in [4, 6, 7]:
@@ -397,14 +403,10 @@ def create_storage_object(warehouse: Warehouse, x, y, row, totalRows, value, dat
         for each_approaching_coordinate in approaching_path_coordinates:
             intersection.approaching_path_coordinates.append(each_approaching_coordinate)
 
-        if obj.pos_x == 15:
+        rl_model_name = warehouse.geometry.rlModelName(obj.pos_x, obj.pos_y)
+        if rl_model_name is not None:
             intersection.use_reinforcement_learning = True
-            if obj.pos_y == 0:
-                intersection.setRLModelName("BOTTOM")
-            elif obj.pos_y == 30:
-                intersection.setRLModelName("TOP")
-            else:
-                intersection.setRLModelName("MIDDLE")
+            intersection.setRLModelName(rl_model_name)
 
         intersection_edges = [
             (obj_left_value, obj_left_coordinate),
@@ -427,10 +429,10 @@ def create_storage_object(warehouse: Warehouse, x, y, row, totalRows, value, dat
     obj_above_coordinate = f"{x},{y - 1}"
     obj_below_coordinate = f"{x},{y + 1}"
 
-    obj_left_value = data.iloc[y, x - 1] if x > 0 else None
-    obj_right_value = data.iloc[y, x + 1] if x < len(row) - 1 else None
-    obj_above_value = data.iloc[y - 1, x] if y > 0 else None
-    obj_below_value = data.iloc[y + 1, x] if y < totalRows - 1 else None
+    obj_left_value = cells[y, x - 1] if x > 0 else None
+    obj_right_value = cells[y, x + 1] if x < len(row) - 1 else None
+    obj_above_value = cells[y - 1, x] if y > 0 else None
+    obj_below_value = cells[y + 1, x] if y < totalRows - 1 else None
 
     weight = 3 if x <= 7 else 1
     turning_weight = 5
@@ -8,15 +8,11 @@ def jaccard_similarity(set1, set2):
     return intersection / union  
 
 def compute_jaccard_similarity(data):
-    similarity_dict = {}
+    # 以稀疏矩陣乘積計算，回傳格式與逐對計算相同: (每筆訂單的 SKU 集合, {order_id: 相似度列表})
+    from lib.generator.backlog_batching import build_order_sku_matrix, jaccard_similarity_matrix
+
     grouped = data.groupby('order_id')['item_id'].apply(set)
-    for order_dum, items in grouped.items():
-        similarities = []
-        for other_order_dum, other_items in grouped.items():
-            if order_dum == other_order_dum:
-                similarities.append(1.0)  # similarity with itself is 1
-            else:
-                similarity = jaccard_similarity(items, other_items)
-                similarities.append(similarity)
-        similarity_dict[order_dum] = similarities
-    return grouped, similarity_dict
\ No newline at end of file
+    order_ids, _, incidence = build_order_sku_matrix(data)
+    similarity = jaccard_similarity_matrix(incidence).toarray()
+    similarity_dict = dict(zip(order_ids, similarity))
+    return grouped, similarity_dict
@@ -0,0 +1,119 @@
+"""
+訓練指標紀錄 (append-only)
+
+訓練過程中每個 episode (DQN) 或每一代 (NERL) 追加一筆結構化紀錄到 <training_dir>/metrics.jsonl，
+分析工具不必再用正規表達式重新解析整份訓練日誌或逐一讀取每一代的 JSON：
+
+- MetricsWriter.append: 一筆紀錄一行 JSON，寫入後立即 flush，訓練中途也能讀取
+- MetricsReader.read_new: 記住已讀取的位元組位置，每次只解析新增的尾端；尚未寫完的最後一行留到下次
+- MetricsReader.frame: 累積的紀錄轉成 DataFrame (每個欄位一欄)
+- get_reader / read_metrics: 每個檔案共用一個常駐的 MetricsReader，監看訓練時重複讀取只解析新增的紀錄
+
+numpy 純量與陣列在寫入時轉成 Python 原生型別。
+"""
+import json
+import os
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+METRICS_FILENAME = "metrics.jsonl"
+
+
+def metrics_path(training_dir) -> str:
+    return os.path.join(str(training_dir), METRICS_FILENAME)
+
+
+def _jsonable(value):
+    if isinstance(value, dict):
+        return {str(_jsonable(key)): _jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(item) for item in value]
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+class MetricsWriter:
+    """把訓練紀錄追加到 metrics.jsonl (每次開檔追加，物件本身可 pickle)"""
+
+    def __init__(self, training_dir):
+        self.path = metrics_path(training_dir)
+
+    def append(self, record: Dict[str, Any]):
+        line = json.dumps(_jsonable(record), ensure_ascii=False)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+            f.flush()
+
+
+class MetricsReader:
+    """增量讀取 metrics.jsonl，只解析上次讀取後新增的部分"""
+
+    def __init__(self, path):
+        path = str(path)
+        self.path = metrics_path(path) if os.path.isdir(path) else path
+        self.offset = 0
+        self.inode = None
+        self.records: List[Dict[str, Any]] = []
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def read_new(self) -> List[Dict[str, Any]]:
+        """讀取新增的完整紀錄並回傳，檔案被截斷或取代 (重新訓練) 時從頭讀起"""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return []
+        if stat.st_size < self.offset or stat.st_ino != self.inode:
+            self.offset = 0
+            self.inode = stat.st_ino
+            self.records = []
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            tail = f.read()
+        end = tail.rfind(b'\n') + 1
+        new_records = []
+        for line in tail[:end].splitlines():
+            if not line.strip():
+                continue
+            try:
+                new_records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+        self.offset += end
+        self.records.extend(new_records)
+        return new_records
+
+    def frame(self) -> pd.DataFrame:
+        """目前為止所有紀錄的 DataFrame"""
+        self.read_new()
+        return pd.DataFrame(self.records)
+
+
+# 以 metrics.jsonl 的絕對路徑為鍵，常駐的 reader 記住各檔案已讀取的位置
+_readers: Dict[str, MetricsReader] = {}
+
+
+def get_reader(training_dir) -> MetricsReader:
+    """訓練目錄對應的常駐 MetricsReader"""
+    path = os.path.abspath(metrics_path(training_dir))
+    reader = _readers.get(path)
+    if reader is None:
+        reader = _readers[path] = MetricsReader(path)
+    return reader
+
+
+def read_metrics(training_dir) -> List[Dict[str, Any]]:
+    """
+    讀取訓練目錄的所有紀錄，沒有 metrics.jsonl 時回傳空列表
+
+    透過常駐的 reader 只解析上次呼叫後新增的紀錄；回傳紀錄的複本，呼叫端可以自由修改
+    """
+    reader = get_reader(training_dir)
+    reader.read_new()
+    return [dict(record) for record in reader.records]
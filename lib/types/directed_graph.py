@@ -1,4 +1,7 @@
+import math
+
 import networkx as nx
+import numpy as np
 
 from lib.types.netlogo_coordinate import NetLogoCoordinate
 class DirectedGraph:
@@ -7,6 +10,46 @@ class DirectedGraph:
     def __init__(self):
         """Initialize an instance with a directed graph."""
         self.graph = nx.DiGraph()
+        self._node_index = None
+        self._node_coordinates = None
+        self.edge_listeners = []
+        # 每次節點或邊改變時遞增，讓快取 (例如斷點的 layout 檔) 判斷圖是否變過
+        self.revision = 0
+
+    def _invalidateNodeIndex(self):
+        self._node_index = None
+        self._node_coordinates = None
+        self.revision = getattr(self, 'revision', 0) + 1
+
+    def getNodeIndex(self):
+        """Return a mapping from node key to its position in node-aligned arrays.
+
+        Returns:
+            dict: node (str) -> index (int)
+        """
+        if getattr(self, '_node_index', None) is None:
+            nodes = list(self.graph.nodes)
+            self._node_index = {node: index for index, node in enumerate(nodes)}
+            self._node_coordinates = np.array([list(map(int, node.split(","))) for node in nodes],
+                                              dtype=float).reshape(-1, 2)
+        return self._node_index
+
+    def getNodeCoordinates(self):
+        """Return an (n, 2) array of node [x, y], aligned with getNodeIndex()."""
+        self.getNodeIndex()
+        return self._node_coordinates
+
+    def addEdgeListener(self, listener):
+        """Register an object notified through onEdgeChanged(graph, start, end, old_weight, new_weight)."""
+        if not hasattr(self, 'edge_listeners'):
+            self.edge_listeners = []
+        if not any(existing is listener for existing in self.edge_listeners):
+            self.edge_listeners.append(listener)
+
+    def _notifyEdgeChanged(self, start, end, old_weight, new_weight):
+        self.revision = getattr(self, 'revision', 0) + 1
+        for listener in getattr(self, 'edge_listeners', ()):
+            listener.onEdgeChanged(self, start, end, old_weight, new_weight)
 
     @staticmethod
     def nodeValid(node):
@@ -29,6 +72,7 @@ class DirectedGraph:
         """
         if self.nodeValid(node):
             self.graph.add_node(node)
+            self._invalidateNodeIndex()
 
     def addEdge(self, start, end, weight):
         """Add an edge between two nodes with a weight if both nodes are valid.
@@ -39,7 +83,26 @@ class DirectedGraph:
             weight (float): The weight of the edge.
         """
         if self.nodeValid(start) and self.nodeValid(end):
+            old_weight = self.graph[start][end]['weight'] if self.graph.has_edge(start, end) else None
             self.graph.add_edge(start, end, weight=weight)
+            self._invalidateNodeIndex()
+            self._notifyEdgeChanged(start, end, old_weight, weight)
+
+    def setEdgeWeight(self, start, end, weight):
+        """Change the weight of an existing edge.
+
+        Args:
+            start (str): The start node.
+            end (str): The end node.
+            weight (float): The new weight of the edge.
+        """
+        if not self.graph.has_edge(start, end):
+            return
+        old_weight = self.graph[start][end]['weight']
+        if old_weight == weight:
+            return
+        self.graph[start][end]['weight'] = weight
+        self._notifyEdgeChanged(start, end, old_weight, weight)
     
     def add_all_direction_paths(self, obj_key, weight):
         x, y = map(int, obj_key.split(','))
@@ -110,6 +173,51 @@ class DirectedGraph:
         except nx.NetworkXNoPath:
             return None
 
+    def dijkstraWithNodePenalties(self, start, end, node_penalties, avoid=None, edge_costs=None, avoid_cost=10000):
+        """Find the shortest path using per-node zone penalties, without copying the graph.
+
+        Edges leading to or from a penalised node use that node's penalty as weight
+        (the destination node takes precedence), matching dijkstraModified.
+
+        Args:
+            start (str): The start node.
+            end (str): The end node.
+            node_penalties (np.ndarray): Penalty of each node aligned with getNodeIndex(), NaN for no penalty.
+                None uses the plain edge weights.
+            avoid (list, optional): Nodes to avoid in the path.
+            edge_costs (callable, optional): (start, end) -> extra cost added on top of the edge weight,
+                e.g. the live congestion cost.
+            avoid_cost (int): Extra weight per avoided endpoint, 10000 as in dijkstraModified,
+                1000 as in dijkstra. Like those, it is applied twice when the reverse edge also exists.
+
+        Returns:
+            list or None: The path from start to end if one exists, otherwise None.
+        """
+        node_index = self.getNodeIndex()
+        avoid = set(avoid) if avoid else set()
+
+        def weight(u, v, data):
+            cost = data['weight']
+            if node_penalties is not None:
+                penalty = node_penalties[node_index[v]]
+                if math.isnan(penalty):
+                    penalty = node_penalties[node_index[u]]
+                if not math.isnan(penalty):
+                    cost = penalty
+            if edge_costs is not None:
+                cost += edge_costs(u, v)
+            if avoid:
+                avoided = (u in avoid) + (v in avoid)
+                if avoided:
+                    # dijkstra/dijkstraModified visit a neighbour once as successor and once as predecessor
+                    cost += avoid_cost * avoided * (2 if self.graph.has_edge(v, u) else 1)
+            return cost
+
+        try:
+            return nx.shortest_path(self.graph, source=start, target=end, weight=weight, method='dijkstra')
+        except (nx.NetworkXNoPath, nx.NodeNotFound):
+            return None
+
     def dijkstra(self, start, end, avoid=None):
         """Find the shortest path between two nodes using Dijkstra's algorithm, avoiding specified nodes.
 
@@ -1,4 +1,3 @@
-import pickle
 import os
 import traceback
 from typing import List
@@ -8,6 +7,7 @@ import subprocess
 import sys
 from lib.file import *
 from world.warehouse import Warehouse
+from world.checkpoint import saveWarehouse, loadWarehouse
 from evaluation.performance_report_generator import generate_performance_report_from_warehouse, PerformanceReportGenerator
 
 # 創建一個全局變量，用於存儲PerformanceReportGenerator實例
@@ -31,7 +31,12 @@ def get_state_filename():
         return os.path.join(state_dir, f'netlogo_{sim_id}.state')
     return os.path.join(state_dir, 'netlogo.state')
 
-def setup():
+def setup(layout=None, grid=None):
+    """
+    Args:
+        layout: 選用，Layout 物件或 Layout 參數 dict (見 draw_layout)
+        grid: 選用，直接使用的版面陣列
+    """
     try:
         # Initialize the simulation warehouse
         assignment_path = PARENT_DIRECTORY + f"/data/input/assign_order_{os.getpid()}.csv"
@@ -40,7 +45,7 @@ def setup():
         warehouse = Warehouse()
         
         # Populate the warehouse with objects and connections
-        draw_layout(warehouse, process_id=os.getpid())
+        draw_layout(warehouse, process_id=os.getpid(), layout=layout, grid=grid)
         # print(warehouse.intersection_manager.intersections[0].intersection_coordinate)
 
         # 創建性能報告生成器
@@ -54,8 +59,7 @@ def setup():
 
         # Save the warehouse state for future ticks
         state_file = get_state_filename()
-        with open(state_file, 'wb') as config_dictionary_file:
-            pickle.dump(warehouse, config_dictionary_file)
+        saveWarehouse(state_file, warehouse)
 
         return next_result
 
@@ -72,8 +76,7 @@ def tick():
 
         # Load the simulation state
         state_file = get_state_filename()
-        with open(state_file, 'rb') as file:
-            warehouse: Warehouse = pickle.load(file)
+        warehouse: Warehouse = loadWarehouse(state_file)
         # print("DEBUG: State loaded.")
 
         # Check Robot debug level before printing
@@ -113,8 +116,7 @@ def tick():
 
         # print("DEBUG: Saving state...")
 
-        with open(state_file, 'wb') as config_dictionary_file:
-            pickle.dump(warehouse, config_dictionary_file)
+        saveWarehouse(state_file, warehouse)
         # print("DEBUG: State saved.")
 
         return [next_result, warehouse.total_energy, len(warehouse.job_queue), warehouse.stop_and_go,
@@ -158,8 +160,7 @@ def set_traffic_controller(controller_type, **kwargs):
     try:
         # 加載模擬狀態
         state_file = get_state_filename()
-        with open(state_file, 'rb') as file:
-            warehouse: Warehouse = pickle.load(file)
+        warehouse: Warehouse = loadWarehouse(state_file)
         
         # 設置交通控制器
         success = warehouse.set_traffic_controller(controller_type, **kwargs)
@@ -174,8 +175,7 @@ def set_traffic_controller(controller_type, **kwargs):
             print(f"Updated performance reporter controller name to: {controller_type}")
         
         # 保存模擬狀態
-        with open(state_file, 'wb') as config_dictionary_file:
-            pickle.dump(warehouse, config_dictionary_file)
+        saveWarehouse(state_file, warehouse)
             
         print(f"交通控制器已設置為: {controller_type}")
         return success
@@ -236,16 +236,14 @@ def set_dqn_controller(exploration_rate=0.6, load_model_tick=None):
     # 如果設置成功且指定了模型，嘗試加載模型
     if result and load_model_tick is not None:
         try:
-            with open(state_file, 'rb') as file:
-                warehouse: Warehouse = pickle.load(file)
+            warehouse: Warehouse = loadWarehouse(state_file)
                 
             # 嘗試加載特定ticks的模型
             if hasattr(warehouse.intersection_manager, 'controller'):
                 load_success = warehouse.intersection_manager.controller.load_model(tick=load_model_tick)
                 
                 # 保存更新後的狀態
-                with open(state_file, 'wb') as file:
-                    pickle.dump(warehouse, file)
+                saveWarehouse(state_file, warehouse)
                     
                 print(f"DQN model loading {'successful' if load_success else 'failed'} for tick {load_model_tick}")
                 return load_success
@@ -274,16 +272,14 @@ def set_nerl_controller(exploration_rate=0.6, load_model_tick=None):
     # 如果設置成功且指定了模型，嘗試加載模型
     if result and load_model_tick is not None:
         try:
-            with open(state_file, 'rb') as file:
-                warehouse: Warehouse = pickle.load(file)
+            warehouse: Warehouse = loadWarehouse(state_file)
                 
             # 嘗試加載特定ticks的模型
             if hasattr(warehouse.intersection_manager, 'controller'):
                 load_success = warehouse.intersection_manager.controller.load_model(tick=load_model_tick)
                 
                 # 保存更新後的狀態
-                with open(state_file, 'wb') as file:
-                    pickle.dump(warehouse, file)
+                saveWarehouse(state_file, warehouse)
                     
                 print(f"NERL model loading {'successful' if load_success else 'failed'} for tick {load_model_tick}")
                 return load_success
@@ -367,8 +363,7 @@ def set_nerl_training_mode(is_training=True):
     try:
         # 加載模擬狀態
         state_file = get_state_filename()
-        with open(state_file, 'rb') as file:
-            warehouse: Warehouse = pickle.load(file)
+        warehouse: Warehouse = loadWarehouse(state_file)
         
         # 檢查當前控制器是否為NERL
         if warehouse.current_controller != "nerl":
@@ -381,8 +376,7 @@ def set_nerl_training_mode(is_training=True):
             controller.set_training_mode(is_training)
             
             # 保存更新後的狀態
-            with open(state_file, 'wb') as file:
-                pickle.dump(warehouse, file)
+            saveWarehouse(state_file, warehouse)
                 
             mode_str = "訓練" if is_training else "評估"
             print(f"NERL控制器已設置為{mode_str}模式")
@@ -411,8 +405,7 @@ def set_dqn_training_mode(is_training=True):
     try:
         # 加載模擬狀態
         state_file = get_state_filename()
-        with open(state_file, 'rb') as file:
-            warehouse: Warehouse = pickle.load(file)
+        warehouse: Warehouse = loadWarehouse(state_file)
         
         # 檢查當前控制器是否為DQN
         if warehouse.current_controller != "dqn":
@@ -425,8 +418,7 @@ def set_dqn_training_mode(is_training=True):
             controller.set_training_mode(is_training)
             
             # 保存更新後的狀態
-            with open(state_file, 'wb') as file:
-                pickle.dump(warehouse, file)
+            saveWarehouse(state_file, warehouse)
                 
             mode_str = "training" if is_training else "evaluation"
             print(f"DQN controller set to {mode_str} mode")
@@ -446,8 +438,7 @@ def get_all_intersections():
     try:
         # 加載模擬狀態
         state_file = get_state_filename()
-        with open(state_file, 'rb') as file:
-            warehouse: Warehouse = pickle.load(file)
+        warehouse: Warehouse = loadWarehouse(state_file)
         
         # 收集所有路口的坐標
         intersection_data = []
@@ -475,8 +466,7 @@ def generate_report():
     try:
         # 加載模擬狀態
         state_file = get_state_filename()
-        with open(state_file, 'rb') as file:
-            warehouse: Warehouse = pickle.load(file)
+        warehouse: Warehouse = loadWarehouse(state_file)
         
         # 確保使用全局的performance_reporter
         global performance_reporter
@@ -524,23 +514,30 @@ def training_setup(controller_type: str, controller_kwargs: dict):
 
     Args:
         controller_type (str): 要設定的控制器類型 (e.g., 'dqn', 'nerl')
-        controller_kwargs (dict): 傳遞給控制器建構函式的參數字典
+        controller_kwargs (dict): 傳遞給控制器建構函式的參數字典；
+            layout (Layout 物件或參數 dict) 與 grid (版面陣列) 交給 draw_layout，不傳給控制器
     """
     try:
         warehouse = Warehouse()
         
         # 從 controller_kwargs 中獲取 process_id，如果沒有則使用當前進程 ID
         process_id = controller_kwargs.get('process_id', os.getpid())
+        num_robots = controller_kwargs.get('num_robots', 20)
         
         # 步驟 1: 畫出佈局並生成必要的數據檔案
-        draw_layout(warehouse, process_id=process_id)
+        draw_layout(warehouse, process_id=process_id, num_robot=num_robots,
+                    layout=controller_kwargs.get('layout'), grid=controller_kwargs.get('grid'))
         
         # 步驟 2: 初始化倉庫，這一步會載入初始訂單
         warehouse.initWarehouse()
         
+        # 選用功能 (例如 congestion_costs) 是倉庫設定，不傳給控制器
+        warehouse.configureFeatures(**{k: controller_kwargs[k] for k in Warehouse.FEATURES if k in controller_kwargs})
+        
         # 步驟 3: 根據傳入的參數，設定正確的控制器
-        # 移除 process_id 以防止傳遞給控制器
-        filtered_kwargs = {k: v for k, v in controller_kwargs.items() if k != 'process_id'}
+        # 移除 process_id、num_robots、版面與選用功能以防止傳遞給控制器
+        excluded = ('process_id', 'num_robots', 'layout', 'grid') + Warehouse.FEATURES
+        filtered_kwargs = {k: v for k, v in controller_kwargs.items() if k not in excluded}
         warehouse.set_traffic_controller(controller_type, **filtered_kwargs)
         
         return warehouse
@@ -593,7 +590,11 @@ def get_intersections_needing_action(warehouse: Warehouse):
         return {}
         
     states = {}
-    for intersection in warehouse.intersection_manager.intersections:
+    intersection_manager = warehouse.intersection_manager
+    for intersection in intersection_manager.intersections:
+        # 決策排程：未到決策時間的路口維持目前方向
+        if not intersection_manager.isDecisionDue(intersection, warehouse._tick):
+            continue
         # 優化：只收集有機器人的路口狀態
         if len(intersection.horizontal_robots) > 0 or len(intersection.vertical_robots) > 0:
             state = controller.get_state(intersection, warehouse._tick, warehouse)
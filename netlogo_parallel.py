@@ -1,7 +1,6 @@
 """
 NetLogo 並行版本 - 支援多個獨立的狀態檔案
 """
-import pickle
 import os
 import traceback
 from typing import List
@@ -11,6 +10,7 @@ import subprocess
 import sys
 from lib.file import *
 from world.warehouse import Warehouse
+from world.checkpoint import saveWarehouse, loadWarehouse
 from evaluation.performance_report_generator import generate_performance_report_from_warehouse, PerformanceReportGenerator
 
 # 創建一個全局變量，用於存儲PerformanceReportGenerator實例
@@ -58,8 +58,7 @@ def setup():
 
         # Save the warehouse state with unique filename
         state_file = get_state_filename()
-        with open(state_file, 'wb') as config_dictionary_file:
-            pickle.dump(warehouse, config_dictionary_file)
+        saveWarehouse(state_file, warehouse)
         
         print(f"已創建狀態檔案: {state_file}")
         return next_result
@@ -72,8 +71,7 @@ def tick():
     try:
         # Load the simulation state from unique file
         state_file = get_state_filename()
-        with open(state_file, 'rb') as file:
-            warehouse: Warehouse = pickle.load(file)
+        warehouse: Warehouse = loadWarehouse(state_file)
 
         # Update each object with the current warehouse context
         global performance_reporter
@@ -93,8 +91,7 @@ def tick():
         next_result = warehouse.generateResult()
 
         # Save state back to unique file
-        with open(state_file, 'wb') as config_dictionary_file:
-            pickle.dump(warehouse, config_dictionary_file)
+        saveWarehouse(state_file, warehouse)
 
         return [next_result, warehouse.total_energy, len(warehouse.job_queue), warehouse.stop_and_go,
                 warehouse.total_turning, warehouse._tick]
@@ -14,7 +14,7 @@ from sklearn.cluster import KMeans
 PARENT_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(PARENT_DIRECTORY)
 
-from lib.generator.order_generator import compute_jaccard_similarity
+from lib.math import compute_jaccard_similarity
 
 
 def get_station_capacity(num_stations=6, max_orders_per_station=10):
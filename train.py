@@ -7,7 +7,6 @@ import sys
 import subprocess
 import time
 import platform
-import pickle
 from datetime import datetime
 import multiprocessing
 import torch
@@ -24,6 +23,7 @@ from ai.controllers.nerl_controller import NEController
 from ai.controllers.dqn_controller import DQNController
 from lib.logger import get_logger, set_current_tick
 from lib.time_manager import TimeManager
+from world.checkpoint import loadWarehouse
 # --- 延遲初始化：步驟 2 ---
 from ai.utils import get_device
 # --- 結束 ---
@@ -390,15 +390,14 @@ def run_nerl_training(generations, population_size, evaluation_ticks, reward_mod
         if gen == 0:
             # 建立臨時倉庫來檢查訂單數量
             # 注意：netlogo.setup() 返回的是 result，不是 warehouse
-            # 我們需要直接從 pickle 檔案讀取 warehouse
+            # 我們需要直接從狀態檔讀取 warehouse
             netlogo.setup()  # 初始化倉庫
             try:
-                with open('netlogo.state', 'rb') as file:
-                    temp_warehouse = pickle.load(file)
-                    logger.info(f"Initial order status for NERL training:")
-                    logger.info(f"  - Backlog orders loaded: {len([o for o in temp_warehouse.order_manager.orders if o.id < 0])}")
-                    logger.info(f"  - Total orders in system: {len(temp_warehouse.order_manager.orders)}")
-                    del temp_warehouse
+                temp_warehouse = loadWarehouse(netlogo.get_state_filename())
+                logger.info(f"Initial order status for NERL training:")
+                logger.info(f"  - Backlog orders loaded: {len([o for o in temp_warehouse.order_manager.orders if o.id < 0])}")
+                logger.info(f"  - Total orders in system: {len(temp_warehouse.order_manager.orders)}")
+                del temp_warehouse
             except Exception as e:
                 logger.warning(f"Could not load warehouse state for order status: {e}")
         
@@ -524,7 +523,8 @@ def run_nerl_training(generations, population_size, evaluation_ticks, reward_mod
         logger.info(f"Best fitness achieved: {nerl_controller.best_fitness:.4f}")
 
 
-def run_dqn_training(training_ticks, reward_mode="step", training_dir=None, log_file_path=None, batch_size=512, variant=None):
+def run_dqn_training(training_ticks, reward_mode="step", training_dir=None, log_file_path=None, batch_size=512, variant=None,
+                     decision_interval=1, warehouse_features=None):
     """
     執行DQN模型訓練循環
     
@@ -548,8 +548,12 @@ def run_dqn_training(training_ticks, reward_mode="step", training_dir=None, log_
         'reward_mode': reward_mode, 
         'training_dir': training_dir, 
         'log_file_path': log_file_path,
-        'batch_size': batch_size
+        'batch_size': batch_size,
+        'decision_interval': decision_interval
     }
+    # 倉庫選用功能 (例如 congestion_costs) 由 training_setup 套用到倉庫
+    if warehouse_features:
+        controller_kwargs.update(warehouse_features)
     # 呼叫新的 training_setup，並明確指定控制器類型
     warehouse = netlogo.training_setup(controller_type="dqn", controller_kwargs=controller_kwargs)
     # --- 【修改結束】 ---
@@ -593,10 +597,8 @@ def run_dqn_training(training_ticks, reward_mode="step", training_dir=None, log_
         logger.info(f"  - Unfinished orders: {len(warehouse.order_manager.unfinished_orders)}")
         logger.info(f"  - Job queue length: {len(warehouse.job_queue)}")
     
-    # 死鎖檢測變數
+    # 死鎖檢測變數（進展由 warehouse.deadlock_detector 在模擬中增量追蹤）
     no_movement_ticks = 0
-    last_completed_orders = 0
-    last_robot_positions = {}
     deadlock_threshold = 500  # 連續 500 ticks 沒有進展就判定死鎖（約 75 秒模擬時間）
     
     # 訓練循環
@@ -629,36 +631,15 @@ def run_dqn_training(training_ticks, reward_mode="step", training_dir=None, log_
         
         # 死鎖檢測
         if python_tick % 10 == 0:  # 每 10 ticks 檢查一次
-            # 檢查是否有訂單完成
-            current_completed_orders = len([j for j in warehouse.job_manager.jobs if j.is_finished])
-            
-            # 檢查機器人是否有移動
-            robots_moved = False
-            current_positions = {}
-            for robot in warehouse.robot_manager.robots:
-                current_pos = (robot.pos_x, robot.pos_y)
-                current_positions[robot.id] = current_pos
-                
-                if robot.id in last_robot_positions:
-                    if last_robot_positions[robot.id] != current_pos:
-                        robots_moved = True
-                        break
-            
-            # 判斷是否有進展
-            if current_completed_orders > last_completed_orders or robots_moved:
-                no_movement_ticks = 0  # 重置計數器
-            else:
-                no_movement_ticks += 10
-            
-            # 更新記錄
-            last_completed_orders = current_completed_orders
-            last_robot_positions = current_positions.copy()
+            # 距離上一次機器人換格、狀態改變或任務完成的 tick 數
+            no_movement_ticks = warehouse.deadlock_detector.ticksSinceProgress()
             
             # 檢查是否死鎖
             if no_movement_ticks >= deadlock_threshold:
                 logger.warning(f"WARNING: System appears to be deadlocked!")
                 logger.warning(f"  - No robot movement for {no_movement_ticks} ticks")
-                logger.warning(f"  - Completed orders: {current_completed_orders}")
+                logger.warning(f"  - Completed jobs: {len([j for j in warehouse.job_manager.jobs if j.is_finished])}")
+                logger.warning(f"  - Robots in wait cycles: {len(warehouse.deadlock_detector.robots_in_cycle)}")
                 # 正確報告訂單數量
                 total_orders = len(warehouse.order_manager.orders)
                 unfinished_orders = len(warehouse.order_manager.unfinished_orders)
@@ -760,6 +741,8 @@ def run_dqn_training(training_ticks, reward_mode="step", training_dir=None, log_
             "epsilon_start": 1.0,
             "epsilon_end": dqn_controller.dqn.epsilon_min,
             "memory_size": dqn_controller.dqn.memory.maxlen,
+            "decision_interval": decision_interval,
+            "warehouse_features": warehouse_features or {},
             "variant": variant if variant else "default"
         }
         final_results = {
@@ -774,6 +757,298 @@ def run_dqn_training(training_ticks, reward_mode="step", training_dir=None, log_
     logger.info(f"Training completed {training_ticks} ticks")
 
 
+def dqn_env_worker(conn, env_index, reward_mode, log_level, log_file_path, batch_size, seed, decision_interval=1,
+                   warehouse_features=None):
+    """
+    多環境 DQN 訓練的環境工作進程。
+    
+    每個進程擁有獨立的 Warehouse 與只收集轉換的 DQNController（get_state/get_reward 與單環境訓練相同），
+    依 learner 的指令推進模擬，並回傳這段期間收集到的轉換。
+    
+    指令:
+        ('step', (weights, epsilon, num_ticks)): 載入最新權重並推進 num_ticks 個 tick
+        ('close', None): 結束 episode（global 模式會分配全局獎勵）並回傳剩餘轉換
+    """
+    import random
+    import numpy as np
+
+    process_id = os.getpid()
+    worker_logger = get_logger(name=f"DQN-Env-{env_index}", level=log_level, log_file_path=log_file_path)
+
+    # 每個環境使用不同的隨機種子，避免所有環境產生相同的軌跡
+    random.seed(seed + env_index)
+    np.random.seed(seed + env_index)
+    torch.manual_seed(seed + env_index)
+
+    try:
+        controller_kwargs = {
+            'reward_mode': reward_mode,
+            'log_file_path': log_file_path,
+            'batch_size': batch_size,
+            'inference_backend': 'numpy',  # 單一路口推論，NumPy 比 torch 快
+            'decision_interval': decision_interval,
+            'process_id': process_id
+        }
+        if warehouse_features:
+            controller_kwargs.update(warehouse_features)
+        warehouse = netlogo.training_setup(controller_type="dqn", controller_kwargs=controller_kwargs)
+        dqn_controller = warehouse.intersection_manager.controllers.get('dqn') if warehouse else None
+        if dqn_controller is None:
+            conn.send(('error', f"Env {env_index}: warehouse or DQN controller setup failed"))
+            return
+
+        dqn_controller.set_training_mode(True)
+        dqn_controller.set_learning_enabled(False)
+        dqn_controller.reset_episode_stats()
+        worker_logger.info(f"DQN env {env_index} ready (pid {process_id})")
+
+        ticks_run = 0
+        env_start = time.time()
+        while True:
+            command, payload = conn.recv()
+
+            if command == 'step':
+                weights, epsilon, num_ticks = payload
+                if weights is not None:
+                    dqn_controller.dqn.set_policy_weights(weights)
+                dqn_controller.dqn.epsilon = epsilon
+
+                status = "OK"
+                for _ in range(num_ticks):
+                    warehouse, status = netlogo.training_tick(warehouse)
+                    ticks_run += 1
+                    if reward_mode == "global":
+                        dqn_controller.reward_system.update_spillback_penalty(warehouse)
+                    if status != "OK" and ("critical" in status.lower() or "fatal" in status.lower()):
+                        break
+
+                conn.send(('transitions', {
+                    'transitions': dqn_controller.dqn.drain_memory(),
+                    'warehouse_tick': warehouse._tick,
+                    'ticks_since_progress': warehouse.deadlock_detector.ticksSinceProgress(),
+                    'total_reward': dqn_controller.current_episode_data['total_reward'],
+                    'status': status
+                }))
+
+            elif command == 'close':
+                if reward_mode == "global":
+                    dqn_controller.process_episode_end(warehouse, ticks_run)
+                # 系統指標隨 episode 摘要回傳，由 learner 寫入 metrics.jsonl
+                dqn_controller.reward_system.update_episode_metrics(warehouse, time.time() - env_start)
+                actions = dqn_controller.current_episode_data['actions']
+                conn.send(('closed', {
+                    'env_index': env_index,
+                    'transitions': dqn_controller.dqn.drain_memory(),
+                    'warehouse_tick': warehouse._tick,
+                    'completed_orders': len(warehouse.order_manager.finished_orders),
+                    'completed_jobs': len([j for j in warehouse.job_manager.jobs if j.is_finished]),
+                    'total_energy': warehouse.total_energy,
+                    'total_reward': dqn_controller.current_episode_data['total_reward'],
+                    'steps': dqn_controller.current_episode_data['steps'],
+                    'action_distribution': {int(action): int(count) for action, count in
+                                            zip(*np.unique(actions, return_counts=True))} if actions else {},
+                    'system_metrics': dqn_controller.reward_system.get_episode_summary()
+                }))
+                break
+
+    except Exception as e:
+        worker_logger.error(f"DQN env {env_index} 發生嚴重錯誤: {e}", exc_info=True)
+        try:
+            conn.send(('error', f"Env {env_index}: {e}"))
+        except Exception:
+            pass
+
+    finally:
+        try:
+            netlogo.cleanup_temp_files(process_id)
+        except Exception as cleanup_error:
+            worker_logger.warning(f"清理臨時檔案時發生錯誤: {cleanup_error}")
+        conn.close()
+
+
+def run_vector_dqn_training(training_ticks, num_envs, reward_mode="step", training_dir=None, log_file_path=None,
+                            batch_size=512, variant=None, sync_interval=200, seed=42, decision_interval=1,
+                            warehouse_features=None):
+    """
+    多環境 DQN 訓練
+    
+    num_envs 個 Warehouse 在獨立進程中同時推進，轉換合併到 learner 的記憶庫，
+    由單一 learner 執行 DeepQNetwork.replay，並每 sync_interval 個 tick 將策略網絡權重廣播給所有環境。
+    
+    Args:
+        training_ticks: 每個環境的訓練時間步數
+        num_envs: 環境（工作進程）數量
+        reward_mode: 獎勵模式，"global"或"step"
+        sync_interval: 權重廣播間隔（tick）
+    """
+    import numpy as np
+
+    start_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    run_start = time.time()
+
+    logger.info("--- Starting Vectorised DQN Training ---")
+    logger.info(f"Training Ticks per env: {training_ticks}, Envs: {num_envs}, Sync Interval: {sync_interval}")
+    logger.info(f"Reward Mode: {reward_mode}")
+
+    # learner：不綁定倉庫的 DQN 控制器，負責回放、目標網絡更新與模型保存
+    learner = DQNController(reward_mode=reward_mode, training_dir=training_dir,
+                            log_file_path=log_file_path, batch_size=batch_size)
+    learner.set_training_mode(True)
+    learner.reset_episode_stats()
+    dqn = learner.dqn
+
+    ctx = multiprocessing.get_context('spawn')
+    connections = []
+    processes = []
+    for env_index in range(num_envs):
+        parent_conn, child_conn = ctx.Pipe()
+        process = ctx.Process(target=dqn_env_worker,
+                              args=(child_conn, env_index, reward_mode, logger.level, log_file_path, batch_size, seed,
+                                    decision_interval, warehouse_features),
+                              daemon=True)
+        process.start()
+        child_conn.close()
+        connections.append(parent_conn)
+        processes.append(process)
+
+    # 與單環境訓練相同的節奏（以倉庫 tick 計）：每 32 tick 回放、每 1000 tick 更新目標網絡、每 5000 tick 保存模型
+    replay_interval = 32
+    target_update_interval = 1000
+    save_interval = 5000
+    deadlock_threshold = 500
+    replay_credit = 0.0
+    last_warehouse_tick = 0.0
+    ticks_done = 0
+    env_summaries = []
+
+    try:
+        while ticks_done < training_ticks:
+            num_ticks = min(sync_interval, training_ticks - ticks_done)
+            weights = dqn.get_policy_weights()
+            for conn in connections:
+                conn.send(('step', (weights, dqn.epsilon, num_ticks)))
+
+            results = []
+            for conn in connections:
+                message_type, payload = conn.recv()
+                if message_type == 'error':
+                    raise RuntimeError(payload)
+                results.append(payload)
+            ticks_done += num_ticks
+
+            # 合併所有環境的轉換
+            for payload in results:
+                dqn.add_transitions(payload['transitions'])
+                learner.current_episode_data['steps'] += len(payload['transitions'])
+
+            # 回放次數與環境前進的總倉庫 tick 數成正比
+            warehouse_tick = max(payload['warehouse_tick'] for payload in results)
+            replay_credit += (warehouse_tick - last_warehouse_tick) * num_envs / replay_interval
+            while replay_credit >= 1 and len(dqn.memory) >= learner.batch_size:
+                metrics = dqn.replay()
+                replay_credit -= 1
+                if metrics:
+                    learner.current_episode_data['losses'].append(metrics['loss'])
+                    learner.current_episode_data['q_values'].append(metrics['avg_q_value'])
+
+            if int(warehouse_tick) // target_update_interval > int(last_warehouse_tick) // target_update_interval:
+                dqn.update_target_model()
+                logger.debug("Target network updated")
+            if int(warehouse_tick) // save_interval > int(last_warehouse_tick) // save_interval:
+                learner.save_model(tick=int(warehouse_tick))
+            last_warehouse_tick = warehouse_tick
+
+            stalled_envs = [i for i, payload in enumerate(results) if payload['ticks_since_progress'] >= deadlock_threshold]
+            if stalled_envs:
+                logger.warning(f"Envs {stalled_envs} have made no progress for {deadlock_threshold}+ ticks")
+
+            if logger.isEnabledFor(logging.INFO):
+                mean_reward = sum(payload['total_reward'] for payload in results) / num_envs
+                logger.info(f"Vector DQN progress: {ticks_done}/{training_ticks} ticks | memory: {len(dqn.memory)} | "
+                            f"epsilon: {dqn.epsilon:.4f} | mean env reward: {mean_reward:.2f}")
+
+        # 結束所有環境（global 模式在此分配全局獎勵）
+        for conn in connections:
+            conn.send(('close', None))
+        for conn in connections:
+            message_type, payload = conn.recv()
+            if message_type == 'error':
+                logger.error(payload)
+                continue
+            dqn.add_transitions(payload['transitions'])
+            env_summaries.append(payload)
+
+        if reward_mode == "global" and len(dqn.memory) >= learner.batch_size:
+            logger.info("Performing final replay training with global rewards...")
+            for _ in range(10):
+                dqn.replay()
+
+    finally:
+        for conn in connections:
+            conn.close()
+        for process in processes:
+            process.join(timeout=30)
+            if process.is_alive():
+                process.terminate()
+
+    # 每個環境各算一個 episode；損失與 Q 值來自共用的 learner
+    losses = learner.current_episode_data['losses']
+    q_values = learner.current_episode_data['q_values']
+    for summary in env_summaries:
+        learner.record_episode({
+            'env_index': summary['env_index'],
+            'end_tick': summary['warehouse_tick'],
+            'total_reward': summary['total_reward'],
+            'steps': summary['steps'],
+            'avg_loss': np.mean(losses) if losses else 0.0,
+            'avg_q_value': np.mean(q_values) if q_values else 0.0,
+            'action_distribution': summary['action_distribution'],
+            'system_metrics': summary['system_metrics']
+        })
+
+    try:
+        learner.save_training_history()
+        learner.save_model(tick=training_ticks, is_final=True)
+        logger.info("Final DQN model and training data saved successfully!")
+    except Exception as e:
+        logger.error(f"ERROR saving final DQN model or training data: {e}")
+
+    completed_orders = sum(summary['completed_orders'] for summary in env_summaries)
+    logger.info("--- Vectorised DQN Training Summary ---")
+    logger.info(f"  Ticks per env: {ticks_done}, Envs: {num_envs}")
+    logger.info(f"  Completed Orders (all envs): {completed_orders}")
+    logger.info(f"  Transitions collected: {learner.current_episode_data['steps']}")
+    logger.info(f"  Final Epsilon: {dqn.epsilon:.4f}")
+    logger.info(f"  Wall time: {time.time() - run_start:.1f}s")
+
+    end_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    if training_dir:
+        config = {
+            "training_ticks": training_ticks,
+            "num_envs": num_envs,
+            "sync_interval": sync_interval,
+            "decision_interval": decision_interval,
+            "warehouse_features": warehouse_features or {},
+            "batch_size": dqn.batch_size,
+            "learning_rate": dqn.learning_rate,
+            "gamma": dqn.gamma,
+            "epsilon_start": 1.0,
+            "epsilon_end": dqn.epsilon_min,
+            "memory_size": dqn.memory.maxlen,
+            "variant": variant if variant else "default"
+        }
+        final_results = {
+            "total_ticks": ticks_done,
+            "completed_orders": completed_orders,
+            "completed_orders_per_env": [summary['completed_orders'] for summary in env_summaries],
+            "final_epsilon": dqn.epsilon,
+            "cumulative_step_reward": sum(summary['total_reward'] for summary in env_summaries)
+        }
+        learner.save_metadata(start_time, end_time, config, final_results)
+
+    logger.info("--- Vectorised DQN Training Finished ---")
+
+
 def main():
     """主函數，用於解析參數並啟動訓練。"""
     parser = argparse.ArgumentParser(description="RMFS Controller Training Script with Unified Reward System")
@@ -789,11 +1064,27 @@ def main():
     # DQN specific parameters
     parser.add_argument('--training_ticks', type=int, default=10000, help="Number of training ticks for DQN.")
     parser.add_argument('--batch_size', type=int, default=8192, help="Batch size for DQN training (optimized for RTX 4090).")
+    parser.add_argument('--num_envs', type=int, default=1,
+                        help="DQN 並行環境數。大於1時使用多環境訓練（每個環境一個進程，單一 learner）。")
+    parser.add_argument('--sync_interval', type=int, default=200,
+                        help="多環境 DQN 訓練中，learner 廣播策略網絡權重的間隔 (ticks)。")
     
     # 並行化參數 (新增)
     parser.add_argument('--parallel_workers', type=int, default=1, 
                         help="用於 NERL 個體評估的並行進程數。預設為1 (序列執行)。建議設為 CPU 核心數 - 1。")
                         
+    # 決策間隔：控制器每隔幾個 tick 才對同一路口做一次決策
+    parser.add_argument('--decision_interval', type=int, default=1,
+                        help="AI 做決策的間隔 ticks（預設 1 表示每個 tick 都決策），路口依 ID 錯開決策時間")
+
+    # 倉庫選用功能
+    parser.add_argument('--congestion_costs', action='store_true',
+                        help="路徑規劃加入動態擁塞成本（依邊的佔用與路口排隊平滑計算）")
+    parser.add_argument('--reservations', action='store_true',
+                        help="機器人取得新路徑時預約前方格子的時空區間，延後出發以避開衝突")
+    parser.add_argument('--predictive_replenishment', action='store_true',
+                        help="依訂單積壓與到達率預測缺貨，提前把貨架排進補貨台")
+
     # NetLogo visualization parameter
     parser.add_argument('--netlogo', action='store_true', help="Launch NetLogo GUI for visualization")
     
@@ -878,6 +1169,17 @@ def main():
     reward_mode = args.reward_mode
     
     logger.info(f"Training {args.agent.upper()} controller with {reward_mode} reward mode")
+
+    # 倉庫選用功能，經由 controller_kwargs 傳給 netlogo.training_setup
+    warehouse_features = {}
+    if args.congestion_costs:
+        warehouse_features['congestion_costs'] = True
+    if args.reservations:
+        warehouse_features['reservations'] = True
+    if args.predictive_replenishment:
+        warehouse_features['predictive_replenishment'] = True
+    if warehouse_features:
+        logger.info(f"Warehouse features: {warehouse_features}")
     logger.info(f"Training directory: {training_dir}")
 
     if args.agent == 'nerl':
@@ -910,13 +1212,23 @@ def main():
         
         # 合併參數
         nerl_params = {**base_nerl_params, **variant_params}
+        if args.decision_interval > 1:
+            nerl_params['decision_interval'] = args.decision_interval
+        nerl_params.update(warehouse_features)
         
         # 將 training_dir 和 log_file_path 傳遞給訓練函式
         run_nerl_training(args.generations, args.population, args.eval_ticks, reward_mode, 
                           training_dir, args.parallel_workers, log_file_path, nerl_params)
     elif args.agent == 'dqn':
         # 將 training_dir 和 log_file_path 傳遞給訓練函式
-        run_dqn_training(args.training_ticks, reward_mode, training_dir, log_file_path, args.batch_size, args.variant)
+        if args.num_envs > 1:
+            run_vector_dqn_training(args.training_ticks, args.num_envs, reward_mode, training_dir, log_file_path,
+                                    args.batch_size, args.variant, args.sync_interval,
+                                    decision_interval=args.decision_interval,
+                                    warehouse_features=warehouse_features)
+        else:
+            run_dqn_training(args.training_ticks, reward_mode, training_dir, log_file_path, args.batch_size, args.variant,
+                             decision_interval=args.decision_interval, warehouse_features=warehouse_features)
     else:
         logger.error("Invalid agent specified.")
     
@@ -1,11 +1,12 @@
 
 import argparse
-import json
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 from pathlib import Path
 
+from evaluation.results_index import ResultsIndex
+
 def setup_plot_style():
     """設定 Matplotlib/Seaborn 圖表的全域樣式。"""
     plt.style.use('seaborn-v0_8-darkgrid')
@@ -28,34 +29,36 @@ def parse_evaluation_data(input_dir):
     all_results_data = []
     print(f"Scanning for evaluation files in: {input_dir}")
 
-    json_files = list(input_dir.rglob("evaluation_results*.json"))
-    print(f"Found {len(json_files)} result files.")
+    with ResultsIndex(input_dir) as index:
+        refreshed = index.refresh()
+        files = index.files()
+        print(f"Found {len(files)} result files ({refreshed['parsed']} parsed, {refreshed['unchanged']} cached).")
+
+        for _, row in files.iterrows():
+            experiment_name = row['experiment']
+            print(f"  Processing: {experiment_name}")
+
+            if row['error'] or row['layout'] != 'grouped':
+                reason = row['error'] or "results is not a {controller: results} mapping"
+                print(f"    -> ERROR: Failed to process {row['path']}. Reason: {reason}")
+                continue
+
+            # 取得 results 字典中的第一個控制器結果（通常只有一個），找到 run_id 為 0 的那一筆
+            first_run = index.run_records(
+                "file = ? AND group_index = 0 AND run_id = 0 "
+                "AND run_index = (SELECT MIN(run_index) FROM runs WHERE file = ? AND group_index = 0 AND run_id = 0)",
+                (row['path'], row['path']))
 
-    for json_file in json_files:
-        experiment_name = json_file.parent.name
-        print(f"  Processing: {experiment_name}")
-        
-        try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            # 取得 results 字典中的第一個控制器結果（通常只有一個）
-            results_key = next(iter(data.get('results', {})))
-            controller_results = data['results'][results_key]
-            
-            # 找到 run_id 為 0 的那一筆
-            first_run = next((run for run in controller_results.get('individual_runs', []) if run.get('run_id') == 0), None)
-            
             if first_run:
+                first_run = first_run[0]
+                first_run.pop('source_file')
+                first_run.pop('eval_ticks_config')
                 # 加上實驗名稱
                 first_run['experiment_name'] = experiment_name
                 all_results_data.append(first_run)
                 print(f"    -> Extracted data for run_id 0.")
             else:
-                print(f"    -> WARNING: Could not find run_id 0 in {json_file}")
-
-        except Exception as e:
-            print(f"    -> ERROR: Failed to process {json_file}. Reason: {e}")
+                print(f"    -> WARNING: Could not find run_id 0 in {row['path']}")
             
     return all_results_data
 
@@ -6,11 +6,9 @@ Enhanced version with robust data validation and English labels
 
 import os
 import json
-import matplotlib.pyplot as plt
 import pandas as pd
 import numpy as np
 from pathlib import Path
-import seaborn as sns
 from datetime import datetime
 import argparse
 import warnings
@@ -18,6 +16,8 @@ warnings.filterwarnings('ignore')
 
 # 導入編碼處理器
 from encoding_handler import EncodingHandler
+from evaluation.chart_renderer import ChartRenderer
+from lib.metrics_log import read_metrics
 
 # 跨平台字體設置
 import platform
@@ -54,9 +54,8 @@ def setup_cross_platform_fonts():
 # 執行跨平台字體設置
 setup_cross_platform_fonts()
 
-# Set clean style
-sns.set_style("whitegrid")
-plt.style.use('default')
+# 圖表在渲染程序中以 matplotlib 預設樣式繪製
+CHART_STYLE = 'default'
 
 class RobustDataValidator:
     """Robust data validation and extraction"""
@@ -130,13 +129,14 @@ class RobustDataValidator:
             return [default_item] * (expected_length or 1)
 
 class EnhancedRMFSVisualizer:
-    def __init__(self, results_dir="models/training_runs", test_mode=False):
+    def __init__(self, results_dir="models/training_runs", test_mode=False, chart_options=None):
         self.results_dir = Path(results_dir)
         self.output_dir = Path("analysis_results")
         self.output_dir.mkdir(exist_ok=True)
         self.test_mode = test_mode
         self.validator = RobustDataValidator()
         self.encoder = EncodingHandler()
+        self.chart_options = chart_options or {}
         
         self.encoder.safe_print(f"Results directory: {self.results_dir}")
         self.encoder.safe_print(f"Output directory: {self.output_dir}")
@@ -272,7 +272,15 @@ class EnhancedRMFSVisualizer:
             try:
                 # Load generation data for NERL
                 generations_data = []
-                if controller_type == 'nerl':
+                metrics_records = read_metrics(run_dir)
+                if controller_type == 'nerl' and metrics_records:
+                    # 訓練時寫入的 metrics.jsonl，每一代一行
+                    self.encoder.print_chart(f"Found {len(metrics_records)} generations in metrics log")
+                    for gen_data in metrics_records:
+                        validated_gen = self.validate_generation_data(gen_data)
+                        if validated_gen:
+                            generations_data.append(validated_gen)
+                elif controller_type == 'nerl':
                     gen_dirs = sorted([d for d in run_dir.glob("gen*") if d.is_dir()])
                     self.encoder.print_chart(f"Found {len(gen_dirs)} generations")
                     
@@ -296,7 +304,9 @@ class EnhancedRMFSVisualizer:
                 if controller_type == 'dqn':
                     # Try to find training log or create from metadata
                     training_log = run_dir / "training.log"
-                    if training_log.exists():
+                    if metrics_records:
+                        training_progress = self.create_dqn_progress_from_metrics(metrics_records)
+                    elif training_log.exists():
                         training_progress = self.parse_dqn_training_log(training_log)
                     else:
                         # Create basic progress from metadata
@@ -436,6 +446,22 @@ class EnhancedRMFSVisualizer:
         # This is a placeholder - implement based on your actual log format
         return []
     
+    def create_dqn_progress_from_metrics(self, records):
+        """Create DQN progress from the per-episode metrics log"""
+        progress = []
+        for index, record in enumerate(records):
+            system_metrics = self.validator.safe_get(record, 'system_metrics', {}) or {}
+            progress.append({
+                'episode': self.validator.safe_get(record, 'episode', index + 1),
+                'step': self.validator.validate_numeric(self.validator.safe_get(record, 'end_tick', 0)),
+                'cumulative_reward': self.validator.validate_numeric(
+                    self.validator.safe_get(record, 'total_reward', 0)),
+                'completed_orders': self.validator.validate_numeric(
+                    self.validator.safe_get(system_metrics, 'completed_orders', 0)),
+                'epsilon': self.validator.validate_numeric(self.validator.safe_get(record, 'epsilon', 0))
+            })
+        return progress
+    
     def create_dqn_progress_from_metadata(self, metadata):
         """Create basic DQN progress from metadata"""
         results = self.validator.safe_get(metadata, 'results', {})
@@ -454,7 +480,6 @@ class EnhancedRMFSVisualizer:
     
     def plot_individual_training_curves(self, training_data):
         """Generate individual training curve plots for each training run"""
-        plots_created = []
         
         # 創建顏色分配函數
         def get_line_color_for_config(controller_type, reward_mode, variant):
@@ -481,6 +506,24 @@ class EnhancedRMFSVisualizer:
             key = f"{controller_type}_{reward_mode}_{variant_key}"
             return color_map.get(key, '#2E8B57')  # 默認深綠色
         
+        # 檔名固定，內容沒變的圖表由 ChartRenderer 的 manifest 跳過不重畫
+        specs = []
+
+        def line_spec(name, title, ylabel, layers, legend=False, figsize=(10, 6)):
+            return {
+                'name': name,
+                'figsize': figsize,
+                'style': CHART_STYLE,
+                'axes': [{
+                    'layers': layers,
+                    'title': {'label': title, 'fontsize': 14, 'fontweight': 'bold'},
+                    'xlabel': 'Generation',
+                    'ylabel': ylabel,
+                    'legend': legend,
+                    'grid': {'alpha': 0.3},
+                }],
+            }
+
         # 為每個訓練運行生成獨立的圖表
         for run_name, data in training_data.items():
             if not data['generations'] or data['controller_type'] != 'nerl':
@@ -496,63 +539,36 @@ class EnhancedRMFSVisualizer:
                 run_label = f"NERL {data['reward_mode'].upper()}"
             
             generations = [g['generation'] for g in data['generations']]
-            
-            # 1. 個別適應度進化圖
-            fig, ax = plt.subplots(figsize=(10, 6))
-            best_fitness = [g['best_fitness'] for g in data['generations']]
-            ax.plot(generations, best_fitness, 'o-', color=color, linewidth=2, markersize=6)
-            ax.set_title(f'{run_label} - Fitness Evolution', fontsize=14, fontweight='bold')
-            ax.set_xlabel('Generation')
-            ax.set_ylabel('Best Fitness Score')
-            ax.grid(True, alpha=0.3)
+            line_style = {'color': color, 'linewidth': 2, 'markersize': 6}
             
             # 清理run_name用於文件名
             safe_run_name = run_name.replace(':', '_').replace(' ', '_')
-            filename = f"fitness_{safe_run_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
-            filepath = self.output_dir / filename
-            plt.savefig(filepath, dpi=300, bbox_inches='tight')
-            plt.close()
-            plots_created.append(filepath)
-            self.encoder.safe_print(f"✅ Created: {filename}")
+            
+            # 1. 個別適應度進化圖
+            best_fitness = [g['best_fitness'] for g in data['generations']]
+            specs.append(line_spec(
+                f"fitness_{safe_run_name}", f'{run_label} - Fitness Evolution', 'Best Fitness Score',
+                [{'kind': 'plot', 'args': [generations, best_fitness, 'o-'], 'kwargs': line_style}]))
             
             # 2. 個別完成率進化圖
-            fig, ax = plt.subplots(figsize=(10, 6))
             completion_rates = [g['best_individual_metrics']['completion_rate'] * 100 
                               for g in data['generations']]
-            ax.plot(generations, completion_rates, 's-', color=color, linewidth=2, markersize=6)
-            ax.set_title(f'{run_label} - Completion Rate Evolution', fontsize=14, fontweight='bold')
-            ax.set_xlabel('Generation')
-            ax.set_ylabel('Completion Rate (%)')
-            ax.grid(True, alpha=0.3)
-            
-            filename = f"completion_rate_{safe_run_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
-            filepath = self.output_dir / filename
-            plt.savefig(filepath, dpi=300, bbox_inches='tight')
-            plt.close()
-            plots_created.append(filepath)
-            self.encoder.safe_print(f"✅ Created: {filename}")
+            specs.append(line_spec(
+                f"completion_rate_{safe_run_name}", f'{run_label} - Completion Rate Evolution',
+                'Completion Rate (%)',
+                [{'kind': 'plot', 'args': [generations, completion_rates, 's-'], 'kwargs': line_style}]))
             
             # 3. 個別能源效率進化圖
             energy_per_order = [g['best_individual_metrics']['energy_per_order'] 
                               for g in data['generations']]
             if any(e > 0 for e in energy_per_order):
-                fig, ax = plt.subplots(figsize=(10, 6))
-                ax.plot(generations, energy_per_order, '^-', color=color, linewidth=2, markersize=6)
-                ax.set_title(f'{run_label} - Energy Efficiency Evolution', fontsize=14, fontweight='bold')
-                ax.set_xlabel('Generation')
-                ax.set_ylabel('Energy per Order')
-                ax.grid(True, alpha=0.3)
-                
-                filename = f"energy_efficiency_{safe_run_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
-                filepath = self.output_dir / filename
-                plt.savefig(filepath, dpi=300, bbox_inches='tight')
-                plt.close()
-                plots_created.append(filepath)
-                self.encoder.safe_print(f"✅ Created: {filename}")
+                specs.append(line_spec(
+                    f"energy_efficiency_{safe_run_name}", f'{run_label} - Energy Efficiency Evolution',
+                    'Energy per Order',
+                    [{'kind': 'plot', 'args': [generations, energy_per_order, '^-'], 'kwargs': line_style}]))
         
         # 4. Robot Utilization 比較圖（時間序列）
-        fig, ax = plt.subplots(figsize=(12, 8))
-        
+        utilization_layers = []
         for run_name, data in training_data.items():
             if not data['generations'] or data['controller_type'] != 'nerl':
                 continue
@@ -569,22 +585,24 @@ class EnhancedRMFSVisualizer:
             else:
                 label = f"NERL {data['reward_mode'].upper()}"
             
-            ax.plot(generations, robot_utilization, 'o-', color=color, label=label, 
-                   linewidth=2, markersize=6)
+            utilization_layers.append({'kind': 'plot', 'args': [generations, robot_utilization, 'o-'],
+                                       'kwargs': {'color': color, 'label': label, 'linewidth': 2, 'markersize': 6}})
         
-        ax.set_title('Robot Utilization Over Time', fontsize=14, fontweight='bold')
-        ax.set_xlabel('Generation')
-        ax.set_ylabel('Robot Utilization (%)')
-        ax.legend()
-        ax.grid(True, alpha=0.3)
-        
-        filename = f"robot_utilization_timeline_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
-        filepath = self.output_dir / filename
-        plt.savefig(filepath, dpi=300, bbox_inches='tight')
-        plt.close()
-        plots_created.append(filepath)
-        self.encoder.safe_print(f"✅ Created: {filename}")
+        specs.append(line_spec(
+            "robot_utilization_timeline", 'Robot Utilization Over Time', 'Robot Utilization (%)',
+            utilization_layers, legend=bool(utilization_layers), figsize=(12, 8)))
         
+        return self._render_charts(specs)
+    
+    def _render_charts(self, specs):
+        """把一批圖表 spec 交給渲染程序池，回傳成功輸出的檔案路徑"""
+        renderer = ChartRenderer(self.output_dir, **self.chart_options)
+        plots_created = []
+        for path in renderer.render(specs):
+            if path is None:
+                continue
+            plots_created.append(Path(path))
+            self.encoder.safe_print(f"✅ Created: {Path(path).name}")
         return plots_created
     
     def plot_final_comparison(self, training_data):
@@ -642,7 +660,6 @@ class EnhancedRMFSVisualizer:
             return []
         
         df = pd.DataFrame(comparison_data)
-        plots_created = []
         
         # Individual comparison plots
         metrics = [
@@ -680,64 +697,57 @@ class EnhancedRMFSVisualizer:
             # 返回對應顏色，如果沒有找到則使用灰色
             return color_map.get(key, '#808080')
         
+        colors_list = [get_color_for_config(row['controller_type'], row['reward_mode'], row['variant'])
+                       for _, row in df.iterrows()]
+        
+        # 創建顏色圖例
+        legend_patches = []
+        seen_configs = set()
+        for _, row in df.iterrows():
+            controller_type = row['controller_type']
+            reward_mode = row['reward_mode']
+            variant = row['variant']
+            config_key = f"{controller_type}_{reward_mode}_{variant}"
+            
+            if config_key not in seen_configs:
+                color = get_color_for_config(controller_type, reward_mode, variant)
+                if variant and variant != 'default':
+                    legend_label = f"{controller_type.upper()} {reward_mode} {variant}"
+                else:
+                    legend_label = f"{controller_type.upper()} {reward_mode}"
+                legend_patches.append({'facecolor': color, 'label': legend_label})
+                seen_configs.add(config_key)
+        
+        specs = []
         for metric_key, title, ylabel in metrics:
             if df[metric_key].sum() == 0:  # Skip if all values are 0
                 continue
-                
-            fig, ax = plt.subplots(figsize=(12, 8))  # 增加圖表尺寸以容納更多資訊
-            
-            # 為每個配置分配不同顏色
-            colors_list = []
-            for _, row in df.iterrows():
-                color = get_color_for_config(row['controller_type'], row['reward_mode'], row['variant'])
-                colors_list.append(color)
-            
-            bars = ax.bar(range(len(df)), df[metric_key], color=colors_list)
-            
-            ax.set_title(f'{title} Comparison', fontsize=14, fontweight='bold')
-            ax.set_ylabel(ylabel)
-            ax.set_xticks(range(len(df)))
-            ax.set_xticklabels(df['name'], rotation=45, ha='right')
             
+            values = [float(v) for v in df[metric_key]]
+            layers = [{'kind': 'bar', 'args': [list(range(len(df))), values], 'kwargs': {'color': colors_list}}]
             # Add value labels on bars
-            for i, bar in enumerate(bars):
-                height = bar.get_height()
+            for i, height in enumerate(values):
                 if height > 0:
-                    ax.text(bar.get_x() + bar.get_width()/2., height + height*0.01,
-                           f'{height:.1f}', ha='center', va='bottom', fontweight='bold')
-            
-            # 創建顏色圖例
-            from matplotlib.patches import Patch
-            legend_elements = []
-            seen_configs = set()
-            
-            for _, row in df.iterrows():
-                controller_type = row['controller_type']
-                reward_mode = row['reward_mode']
-                variant = row['variant']
-                config_key = f"{controller_type}_{reward_mode}_{variant}"
-                
-                if config_key not in seen_configs:
-                    color = get_color_for_config(controller_type, reward_mode, variant)
-                    if variant and variant != 'default':
-                        legend_label = f"{controller_type.upper()} {reward_mode} {variant}"
-                    else:
-                        legend_label = f"{controller_type.upper()} {reward_mode}"
-                    legend_elements.append(Patch(facecolor=color, label=legend_label))
-                    seen_configs.add(config_key)
-            
-            if legend_elements:
-                ax.legend(handles=legend_elements, loc='upper right', bbox_to_anchor=(1.15, 1))
-            
-            plt.tight_layout()
-            
-            filename = f"{metric_key}_comparison_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
-            filepath = self.output_dir / filename
-            plt.savefig(filepath, dpi=300, bbox_inches='tight')
-            plt.close()
-            plots_created.append(filepath)
-            self.encoder.safe_print(f"✅ Created: {filename}")
+                    layers.append({'kind': 'text', 'args': [i, height + height * 0.01, f'{height:.1f}'],
+                                   'kwargs': {'ha': 'center', 'va': 'bottom', 'fontweight': 'bold'}})
+            
+            specs.append({
+                'name': f"{metric_key}_comparison",
+                'figsize': (12, 8),  # 增加圖表尺寸以容納更多資訊
+                'style': CHART_STYLE,
+                'tight_layout': True,
+                'axes': [{
+                    'layers': layers,
+                    'title': {'label': f'{title} Comparison', 'fontsize': 14, 'fontweight': 'bold'},
+                    'ylabel': ylabel,
+                    'xticks': list(range(len(df))),
+                    'xticklabels': {'labels': list(df['name']), 'rotation': 45, 'ha': 'right'},
+                    'legend': {'patches': legend_patches, 'loc': 'upper right', 'bbox_to_anchor': (1.15, 1)}
+                              if legend_patches else False,
+                }],
+            })
         
+        plots_created = self._render_charts(specs)
         return plots_created, df
     
     def generate_report(self, training_data, comparison_df=None):
@@ -867,10 +877,19 @@ def main():
                        help='Training results directory path')
     parser.add_argument('--test', action='store_true',
                        help='Run in test mode with simulated data')
+    parser.add_argument('--dpi', type=int, default=None,
+                       help='Chart resolution (default 300, 100 with --preview)')
+    parser.add_argument('--format', dest='chart_format', default=None,
+                       help='Chart file format (png, pdf, svg ...)')
+    parser.add_argument('--preview', action='store_true',
+                       help='Render low-resolution preview charts')
+    parser.add_argument('--workers', type=int, default=None,
+                       help='Number of chart rendering processes')
     
     args = parser.parse_args()
     
-    visualizer = EnhancedRMFSVisualizer(args.results_dir, test_mode=args.test)
+    chart_options = {'dpi': args.dpi, 'fmt': args.chart_format, 'preview': args.preview, 'workers': args.workers}
+    visualizer = EnhancedRMFSVisualizer(args.results_dir, test_mode=args.test, chart_options=chart_options)
     results = visualizer.run_analysis()
     
     return results
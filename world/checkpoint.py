@@ -0,0 +1,388 @@
+"""
+倉庫狀態的精簡斷點格式
+
+整個 Warehouse 直接 pickle 時，約三分之一的大小是兩張 networkx 路網圖，而它們在模擬過程中幾乎不變；
+機器人、貨架、路口這類數量多、欄位多為數值的物件，逐一 pickle 也很浪費。這裡把斷點拆成三部分：
+
+- layout 檔：路網圖的節點與邊陣列，以內容雜湊命名，同一個佈局只寫一次，之後的斷點都引用它
+- 動態陣列：Robot / Pod / Intersection 的數值與字串欄位逐欄打包成 numpy 陣列，另外存亂數狀態
+- 剩餘物件：其他狀態 (訂單、任務、控制器等) 仍用 pickle protocol 5，但上述物件只留下非純量欄位
+
+斷點本身是 npz (zip) 檔，可選擇壓縮。meta 記錄格式版本，版本不符時拒絕讀取。
+讀取舊的純 pickle 狀態檔時自動退回 pickle.load，既有的 states/*.state 仍可使用。
+"""
+import hashlib
+import io
+import json
+import os
+import pickle
+import random
+import sys
+import threading
+import weakref
+from typing import Any, Dict, List, Optional, Tuple
+
+import networkx as nx
+import numpy as np
+
+from world.entities.intersection import Intersection
+from world.entities.pod import Pod
+from world.entities.robot import Robot
+
+FORMAT_VERSION = 1
+
+# 依類別打包的物件，名稱同時是陣列欄位的前綴
+PACKED_TYPES = {
+    'robot': Robot,
+    'pod': Pod,
+    'intersection': Intersection,
+}
+
+_GRAPH_ARRAYS = ('nodes', 'src', 'dst', 'weight', 'pred_order')
+_NUMBER_FLOAT, _NUMBER_INT, _NUMBER_BOOL = 0, 1, 2
+_MAX_EXACT_INT = 2 ** 53
+
+# 已讀過的 layout 檔，同一個程序重複讀取斷點時不必再解析
+_LAYOUT_CACHE: Dict[str, Dict[str, Tuple[np.ndarray, ...]]] = {}
+# DirectedGraph -> (revision, layout 檔路徑)，圖沒變時保存斷點不必重新轉換路網圖
+_WRITTEN_LAYOUTS = weakref.WeakKeyDictionary()
+_load_context = threading.local()
+
+
+# === 路網圖 (靜態) ===
+
+def _graphArrays(graph: nx.DiGraph):
+    """
+    把路網圖轉成 (節點, 起點索引, 終點索引, 權重, 前驅順序)
+
+    邊依後繼 (succ) 的迭代順序排列，前驅順序是依 pred 迭代順序排列的邊索引，
+    重建後兩個方向的鄰接順序都與原圖相同，最短路徑遇到同長度路徑時的選擇才會一致。
+    """
+    nodes = list(graph.nodes)
+    index = {node: i for i, node in enumerate(nodes)}
+    edges = list(graph.edges(data='weight'))
+    edge_index = {(u, v): i for i, (u, v, _) in enumerate(edges)}
+    src = np.fromiter((index[u] for u, _, _ in edges), dtype=np.int32, count=len(edges))
+    dst = np.fromiter((index[v] for _, v, _ in edges), dtype=np.int32, count=len(edges))
+    weight = np.array([w for _, _, w in edges], dtype=np.float64)
+    pred_order = np.fromiter((edge_index[(u, v)] for v, predecessors in graph.pred.items() for u in predecessors),
+                             dtype=np.int32, count=len(edges))
+    return np.array(nodes, dtype=str), src, dst, weight, pred_order
+
+
+def _buildGraph(nodes, src, dst, weight, pred_order) -> nx.DiGraph:
+    """
+    從陣列重建路網圖
+
+    直接填入 DiGraph 內部的鄰接字典，比逐條 add_edge 快很多；路網圖的邊只有 weight 屬性。
+    """
+    graph = nx.DiGraph()
+    node_list = nodes.tolist()
+    node_attr, succ, pred = graph._node, graph._succ, graph._pred
+    for node in node_list:
+        node_attr[node] = {}
+        succ[node] = {}
+        pred[node] = {}
+    edge_data = []
+    for u, v, w in zip(src.tolist(), dst.tolist(), weight.tolist()):
+        data = {'weight': w}
+        succ[node_list[u]][node_list[v]] = data
+        edge_data.append((node_list[u], node_list[v], data))
+    for i in pred_order.tolist():
+        u, v, data = edge_data[i]
+        pred[v][u] = data
+    return graph
+
+
+def _staticGraphs(warehouse) -> Dict[str, Any]:
+    return {'graph': warehouse.graph, 'graph_pod': warehouse.graph_pod}
+
+
+def _writeLayout(layout_dir: str, graphs: Dict[str, Any]) -> str:
+    """寫出 layout 檔 (已存在時略過)，回傳檔名"""
+    first_graph = next(iter(graphs.values()))
+    revisions = tuple(getattr(graph, 'revision', None) for graph in graphs.values())
+    cache_key = (revisions, tuple(map(id, graphs.values())), layout_dir)
+    written = _WRITTEN_LAYOUTS.get(first_graph)
+    if written is not None and None not in revisions and written[0] == cache_key and os.path.exists(written[1]):
+        return os.path.basename(written[1])
+
+    arrays = {}
+    digest = hashlib.sha1()
+    for name, graph in graphs.items():
+        for suffix, array in zip(_GRAPH_ARRAYS, _graphArrays(graph.graph)):
+            arrays[f'{name}_{suffix}'] = array
+            digest.update(array.tobytes())
+    layout_name = f'layout_{digest.hexdigest()[:16]}.npz'
+    layout_path = os.path.join(layout_dir, layout_name)
+    _WRITTEN_LAYOUTS[first_graph] = (cache_key, layout_path)
+    if not os.path.exists(layout_path):
+        tmp_path = layout_path + '.tmp'
+        with open(tmp_path, 'wb') as file:
+            np.savez(file, **arrays)
+        os.replace(tmp_path, layout_path)
+    return layout_name
+
+
+def _readLayout(layout_path: str):
+    key = os.path.abspath(layout_path)
+    layout = _LAYOUT_CACHE.get(key)
+    if layout is None:
+        with np.load(layout_path) as data:
+            layout = {}
+            for name in ('graph', 'graph_pod'):
+                layout[name] = tuple(data[f'{name}_{suffix}'] for suffix in _GRAPH_ARRAYS)
+        _LAYOUT_CACHE[key] = layout
+    return layout
+
+
+# === 物件欄位打包 ===
+
+def _numberCode(value) -> Optional[int]:
+    value_type = type(value)
+    if value_type is bool:
+        return _NUMBER_BOOL
+    if value_type is int:
+        return _NUMBER_INT if -_MAX_EXACT_INT < value < _MAX_EXACT_INT else None
+    if value_type is float:
+        return _NUMBER_FLOAT
+    return None
+
+
+def _packObjects(prefix: str, objects: List[Any], arrays: Dict[str, np.ndarray]) -> Dict[str, List[str]]:
+    """
+    把所有物件共有的純量欄位打包成陣列
+
+    數值欄位合併成一個 (物件數, 欄位數) 的 float64 矩陣，另以型別碼還原 int / bool；
+    字串欄位 (可為 None) 合併成一個字串矩陣。回傳 {'num': 欄位, 'str': 欄位}。
+    """
+    fields = {'num': [], 'str': []}
+    if not objects:
+        return fields
+    common = set(vars(objects[0]))
+    for obj in objects[1:]:
+        common &= vars(obj).keys()
+
+    numbers, codes, strings = [], [], []
+    for field in sorted(common):
+        values = [vars(obj)[field] for obj in objects]
+        field_codes = [_numberCode(value) for value in values]
+        if None not in field_codes:
+            fields['num'].append(field)
+            numbers.append(values)
+            codes.append(field_codes)
+        elif all(value is None or type(value) is str for value in values):
+            fields['str'].append(field)
+            strings.append(values)
+
+    if numbers:
+        arrays[f'{prefix}.num'] = np.array(numbers, dtype=np.float64).T
+        arrays[f'{prefix}.num_type'] = np.array(codes, dtype=np.uint8).T
+    if strings:
+        arrays[f'{prefix}.str'] = np.array([['' if value is None else value for value in values]
+                                            for values in strings], dtype=str).T
+        arrays[f'{prefix}.str_none'] = np.array([[value is None for value in values] for values in strings],
+                                                dtype=bool).T
+    return fields
+
+
+def _unpackFields(prefix: str, fields: Dict[str, List[str]], arrays) -> List[Dict[str, Any]]:
+    """還原成每個物件一個欄位字典"""
+    rows = None
+    if fields['num']:
+        rows = [dict(zip(fields['num'],
+                         [int(value) if code == _NUMBER_INT else bool(value) if code == _NUMBER_BOOL else value
+                          for value, code in zip(values, value_codes)]))
+                for values, value_codes in zip(arrays[f'{prefix}.num'].tolist(),
+                                               arrays[f'{prefix}.num_type'].tolist())]
+    if fields['str']:
+        string_rows = [dict(zip(fields['str'], [None if is_none else value for value, is_none in zip(values, nones)]))
+                       for values, nones in zip(arrays[f'{prefix}.str'].tolist(),
+                                                arrays[f'{prefix}.str_none'].tolist())]
+        if rows is None:
+            rows = string_rows
+        else:
+            for row, string_row in zip(rows, string_rows):
+                row.update(string_row)
+    return rows or []
+
+
+def _restorePacked(cls, prefix: str, index: int):
+    """pickle 還原時呼叫：先建立物件並填入打包欄位，其餘欄位由 pickle 的 state 補上"""
+    obj = cls.__new__(cls)
+    obj.__dict__.update(_load_context.packed[prefix][index])
+    return obj
+
+
+def _restoreGraph(name: str):
+    return _buildGraph(*_load_context.layout[name])
+
+
+class _CheckpointPickler(pickle.Pickler):
+    """
+    以 dispatch_table 攔截路網圖與打包的物件，其餘物件照常 pickle
+
+    dispatch_table 由 C 層依型別查找，只有這幾種型別會呼叫到 Python 函式。
+    """
+
+    def __init__(self, file, graphs: Dict[str, Any], packed: Dict[type, Tuple[str, Dict[int, int], set]]):
+        super().__init__(file, protocol=5)
+        self._graph_names = {id(graph.graph): name for name, graph in graphs.items()}
+        self._packed = packed
+        self.dispatch_table = {nx.DiGraph: self._reduceGraph}
+        for cls in packed:
+            self.dispatch_table[cls] = self._reduceObject
+
+    def _reduceGraph(self, graph):
+        name = self._graph_names.get(id(graph))
+        if name is None:
+            return graph.__reduce_ex__(5)
+        return _restoreGraph, (name,)
+
+    def _reduceObject(self, obj):
+        prefix, indices, fields = self._packed[type(obj)]
+        index = indices.get(id(obj))
+        if index is None:
+            return obj.__reduce_ex__(5)
+        state = {key: value for key, value in vars(obj).items() if key not in fields}
+        return _restorePacked, (type(obj), prefix, index), state
+
+
+# === 亂數狀態 ===
+
+def _packRandomState(arrays: Dict[str, np.ndarray], meta: Dict[str, Any]):
+    version, internal, gauss = random.getstate()
+    arrays['rng.python'] = np.array(internal, dtype=np.uint64)
+    meta['rng_python'] = [version, gauss]
+
+    name, keys, pos, has_gauss, cached_gaussian = np.random.get_state()
+    arrays['rng.numpy'] = keys
+    meta['rng_numpy'] = [name, int(pos), int(has_gauss), float(cached_gaussian)]
+
+    if 'torch' in sys.modules:
+        arrays['rng.torch'] = sys.modules['torch'].get_rng_state().numpy()
+
+
+def _restoreRandomState(arrays, meta: Dict[str, Any]):
+    version, gauss = meta['rng_python']
+    random.setstate((version, tuple(int(value) for value in arrays['rng.python'].tolist()), gauss))
+
+    name, pos, has_gauss, cached_gaussian = meta['rng_numpy']
+    np.random.set_state((name, arrays['rng.numpy'], pos, has_gauss, cached_gaussian))
+
+    if 'rng.torch' in arrays and 'torch' in sys.modules:
+        torch = sys.modules['torch']
+        torch.set_rng_state(torch.from_numpy(arrays['rng.torch'].copy()))
+
+
+# === 公開介面 ===
+
+def saveCheckpoint(path: str, warehouse, extra: Optional[Dict[str, Any]] = None,
+                   compress: bool = False) -> str:
+    """
+    寫出斷點
+
+    Args:
+        path: 斷點檔路徑
+        warehouse: 要保存的倉庫
+        extra: 一併保存的其他資料 (可 pickle 即可)，讀取時原樣回傳
+        compress: 是否壓縮 (zip deflate)，檔案較小但存取較慢
+
+    Returns:
+        str: 斷點檔路徑
+    """
+    path = str(path)
+    # layout 檔放在斷點旁邊
+    layout_dir = os.path.dirname(os.path.abspath(path))
+    os.makedirs(layout_dir, exist_ok=True)
+    graphs = _staticGraphs(warehouse)
+    layout_name = _writeLayout(layout_dir, graphs)
+
+    arrays: Dict[str, np.ndarray] = {}
+    meta: Dict[str, Any] = {'format_version': FORMAT_VERSION, 'layout': layout_name, 'packed': {}}
+    groups = {
+        'robot': warehouse.robot_manager.robots,
+        'pod': warehouse.pod_manager.pods,
+        'intersection': warehouse.intersection_manager.intersections,
+    }
+    packed = {}
+    for prefix, objects in groups.items():
+        cls = PACKED_TYPES[prefix]
+        objects = [obj for obj in objects if type(obj) is cls]
+        fields = _packObjects(prefix, objects, arrays)
+        meta['packed'][prefix] = fields
+        packed[cls] = (prefix, {id(obj): i for i, obj in enumerate(objects)}, set(fields['num'] + fields['str']))
+    _packRandomState(arrays, meta)
+
+    buffer = io.BytesIO()
+    _CheckpointPickler(buffer, graphs, packed).dump({'warehouse': warehouse, 'extra': extra})
+    arrays['residual'] = np.frombuffer(buffer.getbuffer(), dtype=np.uint8)
+    arrays['meta'] = np.frombuffer(json.dumps(meta).encode('utf-8'), dtype=np.uint8)
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as file:
+        (np.savez_compressed if compress else np.savez)(file, **arrays)
+    os.replace(tmp_path, path)
+    return path
+
+
+def isCheckpoint(path: str) -> bool:
+    """是否為本格式的斷點 (npz 為 zip 檔，舊的 pickle 狀態檔不是)"""
+    with open(path, 'rb') as file:
+        return file.read(4) == b'PK\x03\x04'
+
+
+def loadCheckpoint(path: str, restore_random_state: bool = False):
+    """
+    讀取斷點
+
+    Args:
+        path: 斷點檔路徑，舊的純 pickle 狀態檔也可讀
+        restore_random_state: 是否還原 random / numpy / torch 的亂數狀態
+
+    Returns:
+        (warehouse, extra)
+    """
+    path = str(path)
+    if not isCheckpoint(path):
+        with open(path, 'rb') as file:
+            state = pickle.load(file)
+        if isinstance(state, dict) and 'warehouse' in state:
+            return state['warehouse'], state
+        return state, None
+
+    with np.load(path) as data:
+        arrays = {key: data[key] for key in data.files}
+    meta = json.loads(arrays['meta'].tobytes().decode('utf-8'))
+    if meta.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"不支援的斷點格式版本 {meta.get('format_version')} (目前為 {FORMAT_VERSION}): {path}")
+
+    layout_path = os.path.join(os.path.dirname(os.path.abspath(path)), meta['layout'])
+    _load_context.layout = _readLayout(layout_path)
+    _load_context.packed = {prefix: _unpackFields(prefix, fields, arrays) for prefix, fields in meta['packed'].items()}
+    try:
+        state = pickle.loads(arrays['residual'].tobytes())
+    finally:
+        _load_context.layout = None
+        _load_context.packed = None
+
+    # 讀回的路網圖與 layout 檔一致，下次保存時可直接引用
+    graphs = _staticGraphs(state['warehouse'])
+    layout_dir = os.path.dirname(layout_path)
+    revisions = tuple(getattr(graph, 'revision', None) for graph in graphs.values())
+    _WRITTEN_LAYOUTS[graphs['graph']] = ((revisions, tuple(map(id, graphs.values())), layout_dir), layout_path)
+
+    if restore_random_state:
+        _restoreRandomState(arrays, meta)
+    return state['warehouse'], state['extra']
+
+
+def saveWarehouse(path: str, warehouse, compress: bool = False) -> str:
+    """只保存倉庫的斷點，用於 netlogo 狀態檔"""
+    return saveCheckpoint(path, warehouse, compress=compress)
+
+
+def loadWarehouse(path: str):
+    """讀取倉庫 (新格式或舊的 pickle 狀態檔)"""
+    warehouse, _ = loadCheckpoint(path)
+    return warehouse
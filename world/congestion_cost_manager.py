@@ -0,0 +1,188 @@
+"""
+擁塞成本管理器
+為路徑規劃提供動態的邊成本：每條邊維護一個指數平滑的佔用/排隊成本
+
+機器人換格時以 O(1) 更新該邊的即時佔用數，路口的排隊資料在每次刷新時加到駛入路口的邊上。
+每隔 refresh_interval 個 tick 將即時樣本平滑進成本表；只有與路徑規劃使用中的成本相差超過 tolerance 時，
+才發布新的成本表並遞增 cost_epoch (路徑快取鍵的一部分)，避免平滑值的微小變化讓整個路徑快取失效。
+路徑規劃透過 getEdgeCostFunction() 直接讀取已發布的成本表，不需要複製圖。
+預設關閉，關閉時路徑與靜態權重完全相同。
+"""
+from typing import Callable, Dict, Optional, Tuple
+import numpy as np
+
+# 成本表初始容量，邊數超過時加倍
+INITIAL_EDGE_CAPACITY = 1024
+
+
+class CongestionCostManager:
+    """每條邊的指數平滑擁塞成本"""
+
+    def __init__(self, warehouse, refresh_interval: int = 10, smoothing: float = 0.3,
+                 occupancy_cost: float = 2.0, queue_cost: float = 1.0, tolerance: float = 1.0):
+        """
+        Args:
+            refresh_interval: 每隔幾個 tick 刷新一次成本表
+            smoothing: 指數平滑係數 (0-1]，越大越重視最新樣本
+            occupancy_cost: 每台佔用該邊的機器人增加的成本
+            queue_cost: 路口每台排隊的機器人在駛入邊上增加的成本
+            tolerance: 任一條邊的成本變化超過此值時才發布新的成本表 (預設為一台機器人穩定佔用成本的一半，
+                       機器人只經過一個刷新週期的邊不會觸發)
+        """
+        self.warehouse = warehouse
+        self.enabled = False
+        self.refresh_interval = refresh_interval
+        self.smoothing = smoothing
+        self.occupancy_cost = occupancy_cost
+        self.queue_cost = queue_cost
+        self.tolerance = tolerance
+        # (起點 key, 終點 key) -> 成本表索引
+        self.edge_index: Dict[Tuple[str, str], int] = {}
+        # 每條邊目前的機器人數 (由機器人移動即時維護)
+        self.occupancy = np.zeros(INITIAL_EDGE_CAPACITY, dtype=np.float64)
+        # 平滑後的擁塞成本，以及路徑規劃使用中 (已發布) 的成本
+        self.edge_costs = np.zeros(INITIAL_EDGE_CAPACITY, dtype=np.float64)
+        self.published_costs = np.zeros(INITIAL_EDGE_CAPACITY, dtype=np.float64)
+        # 機器人名稱 -> 最後所在格子 key / 目前所在邊
+        self.robot_cells: Dict[str, str] = {}
+        self.robot_edges: Dict[str, int] = {}
+        self.last_refresh_tick = None
+        self.cost_epoch = 0  # 每次發布新的成本表時遞增，作為路徑快取鍵
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # 舊版本保存的狀態沒有已發布的成本表，以當時的成本表為準
+        if 'published_costs' not in state:
+            self.published_costs = self.edge_costs.copy()
+            self.tolerance = 1.0
+
+    def setEnabled(self, enabled: bool):
+        self.enabled = enabled
+        if not enabled:
+            self.reset()
+
+    def setRefreshInterval(self, refresh_interval: int):
+        self.refresh_interval = max(1, int(refresh_interval))
+        self.last_refresh_tick = None
+
+    def reset(self):
+        """清除所有佔用與成本"""
+        self.occupancy[:] = 0
+        self.edge_costs[:] = 0
+        self.published_costs[:] = 0
+        self.robot_cells.clear()
+        self.robot_edges.clear()
+        self.last_refresh_tick = None
+        self.cost_epoch += 1
+
+    def _edgeId(self, start: str, end: str) -> int:
+        edge = (start, end)
+        edge_id = self.edge_index.get(edge)
+        if edge_id is None:
+            edge_id = len(self.edge_index)
+            self.edge_index[edge] = edge_id
+            if edge_id >= len(self.occupancy):
+                self.occupancy = np.concatenate([self.occupancy, np.zeros_like(self.occupancy)])
+                self.edge_costs = np.concatenate([self.edge_costs, np.zeros_like(self.edge_costs)])
+                self.published_costs = np.concatenate([self.published_costs, np.zeros_like(self.published_costs)])
+        return edge_id
+
+    # === 資料來源 ===
+
+    def recordMove(self, robot_name: str, x: int, y: int):
+        """記錄機器人所在格子，換格時把它從舊邊移到 (舊格子 -> 新格子) 這條邊"""
+        if not self.enabled:
+            return
+        cell = f"{x},{y}"
+        previous_cell = self.robot_cells.get(robot_name)
+        if previous_cell == cell:
+            return
+        self.robot_cells[robot_name] = cell
+        if previous_cell is None:
+            return
+
+        previous_edge = self.robot_edges.get(robot_name)
+        if previous_edge is not None:
+            self.occupancy[previous_edge] -= 1
+        edge_id = self._edgeId(previous_cell, cell)
+        self.occupancy[edge_id] += 1
+        self.robot_edges[robot_name] = edge_id
+
+    def _queueSample(self) -> np.ndarray:
+        """路口水平/垂直方向的排隊數，加到從該方向駛入路口的邊上"""
+        graph = self.warehouse.graph.graph
+        queued_edges = []
+        for intersection in self.warehouse.intersection_manager.getAllIntersections():
+            x, y = intersection.pos_x, intersection.pos_y
+            target = f"{x},{y}"
+            approaches = (
+                (len(intersection.horizontal_robots), ((x - 1, y), (x + 1, y))),
+                (len(intersection.vertical_robots), ((x, y - 1), (x, y + 1)))
+            )
+            for queue_length, neighbors in approaches:
+                if queue_length == 0:
+                    continue
+                for nx, ny in neighbors:
+                    source = f"{nx},{ny}"
+                    if graph.has_edge(source, target):
+                        queued_edges.append((self._edgeId(source, target), queue_length))
+
+        sample = np.zeros(len(self.occupancy), dtype=np.float64)
+        for edge_id, queue_length in queued_edges:
+            sample[edge_id] += queue_length
+        return sample
+
+    # === 刷新 ===
+
+    def isRefreshDue(self, tick: int) -> bool:
+        return self.last_refresh_tick is None or tick - self.last_refresh_tick >= self.refresh_interval
+
+    def update(self, tick: int):
+        """每個整數 tick 呼叫一次，到達刷新週期時平滑新的樣本"""
+        if not self.enabled or not self.isRefreshDue(tick):
+            return
+        queue = self._queueSample()
+        sample = self.occupancy_cost * np.maximum(self.occupancy, 0) + self.queue_cost * queue
+        self.edge_costs *= (1.0 - self.smoothing)
+        self.edge_costs += self.smoothing * sample
+        self.last_refresh_tick = tick
+        if np.max(np.abs(self.edge_costs - self.published_costs)) > self.tolerance:
+            self.published_costs[:] = self.edge_costs
+            self.cost_epoch += 1
+
+    # === 查詢 ===
+
+    def getEdgeCost(self, start: str, end: str) -> float:
+        edge_id = self.edge_index.get((start, end))
+        return float(self.published_costs[edge_id]) if edge_id is not None else 0.0
+
+    def getEdgeCostFunction(self) -> Optional[Callable[[str, str], float]]:
+        """
+        回傳給路徑規劃使用的 (start, end) -> 額外成本 函式
+
+        直接讀取已發布的成本表 (與 cost_epoch 一致)，關閉時回傳 None。
+        """
+        if not self.enabled:
+            return None
+        edge_index = self.edge_index
+        edge_costs = self.published_costs
+
+        def edge_cost(start, end):
+            edge_id = edge_index.get((start, end))
+            return edge_costs[edge_id] if edge_id is not None else 0.0
+
+        return edge_cost
+
+    def getCostEpoch(self):
+        return self.cost_epoch if self.enabled else None
+
+    def getStats(self):
+        used = len(self.edge_index)
+        costs = self.edge_costs[:used]
+        return {
+            'edges': used,
+            'occupied_edges': int(np.count_nonzero(self.occupancy[:used] > 0)),
+            'max_cost': float(costs.max()) if used else 0.0,
+            'mean_cost': float(costs.mean()) if used else 0.0,
+            'cost_epoch': self.cost_epoch
+        }
@@ -0,0 +1,140 @@
+"""
+死鎖偵測器
+追蹤每台機器人的最後進展時間與「等待誰」(waits-for) 關係，供模擬、控制器與訓練迴圈共用
+
+所有更新都在機器人本來就會執行的地方 (移動、衝突處理) 以 O(1) 完成，
+循環等待在新增等待邊時沿著等待鏈增量偵測，不需要每隔幾個 tick 掃描整個倉庫。
+時間單位為模擬步數 (每次 Warehouse.tick 為一步)，與 Robot.idle_time 相同。
+"""
+from typing import Dict, List, Optional, Set
+
+
+class DeadlockDetector:
+    """共用的死鎖偵測服務"""
+
+    def __init__(self, warehouse):
+        self.warehouse = warehouse
+        self.current_step = 0
+        # 機器人名稱 -> 最後一次進展的步數
+        self.last_progress_step: Dict[str, int] = {}
+        # 機器人名稱 -> 最後所在格子
+        self.last_cell: Dict[str, tuple] = {}
+        # 整個系統最後一次進展的步數（任一機器人換格、狀態改變或任務完成）
+        self.last_system_progress_step = 0
+        # waits-for 圖：每台機器人最多等待一台機器人
+        self.waits_for: Dict[str, str] = {}
+        # 目前處於循環等待中的機器人
+        self.robots_in_cycle: Set[str] = set()
+        self.cycles_detected = 0
+
+    def step(self):
+        """每個 Warehouse.tick 呼叫一次"""
+        self.current_step += 1
+
+    # === 進展追蹤 ===
+
+    def recordProgress(self, robot_name: str):
+        """記錄機器人有進展，並清除它的等待邊"""
+        self.last_progress_step[robot_name] = self.current_step
+        self.last_system_progress_step = self.current_step
+        self.clearWait(robot_name)
+
+    def recordPosition(self, robot_name: str, x: int, y: int):
+        """記錄機器人所在格子，換格時視為進展"""
+        cell = (x, y)
+        if self.last_cell.get(robot_name) != cell:
+            self.last_cell[robot_name] = cell
+            self.recordProgress(robot_name)
+
+    def recordSystemProgress(self):
+        """記錄系統層級的進展（例如完成任務）"""
+        self.last_system_progress_step = self.current_step
+
+    def ticksSinceProgress(self) -> int:
+        """整個系統距離上一次進展的步數"""
+        return self.current_step - self.last_system_progress_step
+
+    def robotStallTime(self, robot_name: str) -> int:
+        """機器人距離上一次進展的步數"""
+        return self.current_step - self.last_progress_step.get(robot_name, 0)
+
+    # === waits-for 圖 ===
+
+    def recordWait(self, robot_name: str, blocker_name: str) -> Optional[List[str]]:
+        """
+        記錄 robot_name 正在等待 blocker_name
+
+        Returns:
+            list: 如果這條邊形成循環等待，回傳循環中的機器人，否則為 None
+        """
+        if robot_name == blocker_name:
+            return None
+        if self.waits_for.get(robot_name) == blocker_name:
+            return self._cycleThrough(robot_name) if robot_name in self.robots_in_cycle else None
+
+        self.clearWait(robot_name)
+        self.waits_for[robot_name] = blocker_name
+
+        # 每台機器人只有一條出邊，沿著等待鏈走即可判斷是否回到自己
+        cycle = [robot_name]
+        current = blocker_name
+        while current is not None and current != robot_name and len(cycle) <= len(self.waits_for):
+            cycle.append(current)
+            current = self.waits_for.get(current)
+
+        if current == robot_name:
+            self.robots_in_cycle.update(cycle)
+            self.cycles_detected += 1
+            return cycle
+        return None
+
+    def clearWait(self, robot_name: str):
+        """移除機器人的等待邊，若它在循環中則整個循環解除"""
+        if robot_name in self.robots_in_cycle:
+            for member in self._cycleThrough(robot_name):
+                self.robots_in_cycle.discard(member)
+        self.waits_for.pop(robot_name, None)
+
+    def _cycleThrough(self, robot_name: str) -> List[str]:
+        """沿著等待鏈收集從 robot_name 出發的循環成員"""
+        cycle = [robot_name]
+        current = self.waits_for.get(robot_name)
+        while current is not None and current != robot_name and current not in cycle:
+            cycle.append(current)
+            current = self.waits_for.get(current)
+        return cycle
+
+    def isInWaitCycle(self, robot_name: str) -> bool:
+        return robot_name in self.robots_in_cycle
+
+    def hasWaitCycle(self) -> bool:
+        return len(self.robots_in_cycle) > 0
+
+    # === 給控制器與訓練迴圈的查詢 ===
+
+    def hasCycleAtIntersection(self, intersection) -> bool:
+        """路口上是否有機器人處於循環等待"""
+        if not self.robots_in_cycle:
+            return False
+        return any(name in self.robots_in_cycle
+                   for name in list(intersection.horizontal_robots) + list(intersection.vertical_robots))
+
+    @staticmethod
+    def getIntersectionMaxWaitTimes(intersection, tick):
+        """計算路口水平與垂直方向機器人的最大等待時間"""
+        max_wait_time_h = 0
+        max_wait_time_v = 0
+
+        for robot in intersection.horizontal_robots.values():
+            if robot.current_intersection_start_time is not None:
+                max_wait_time_h = max(max_wait_time_h, tick - robot.current_intersection_start_time)
+
+        for robot in intersection.vertical_robots.values():
+            if robot.current_intersection_start_time is not None:
+                max_wait_time_v = max(max_wait_time_v, tick - robot.current_intersection_start_time)
+
+        return max_wait_time_h, max_wait_time_v
+
+    def isDeadlocked(self, threshold: int) -> bool:
+        """系統是否處於死鎖：存在循環等待，或超過 threshold 步沒有任何進展"""
+        return self.hasWaitCycle() or self.ticksSinceProgress() >= threshold
@@ -261,10 +261,8 @@ class Intersection(Object):
         self.connected_intersection_ids.append(intersection_id)
 
     def shouldSaveRobotInfo(self):
-        if self.coordinate.x == 15:
-            return True
-        else:
-            return False
+        # RL 路口由版面推導 (預設版面即 x == 15 那一欄)
+        return self.use_reinforcement_learning
 
     def setRLModelName(self, model_name):
         self.RL_model_name = f"IntersectionModel_{model_name}"
@@ -12,6 +12,7 @@ class Job:
         self.replenishment_delay_per_sku = 80
         self.replenishment_delay = 80
         self.is_finished = False
+        self.finish_at_station = False # finish when the station service completes instead of on dispatch
 
     def __str__(self):
         return f"Job: {self.id}, {self.pod_coordinate}, {self.station_id}, {self.orders}"
@@ -32,6 +33,10 @@ class Job:
         """Check if the job is being processed based on delays."""
         return self.picking_delay > 0 or self.replenishment_delay > 0
 
+    def remainingDelay(self):
+        """Ticks left before the job finishes processing at the station."""
+        return self.picking_delay + self.replenishment_delay
+
     def decrementDelay(self):
         """Decrement the picking or replenishment delay."""
         if self.picking_delay > 0:
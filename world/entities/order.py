@@ -25,6 +25,11 @@ class Order:
             'quantity_delivered': 0
         }
 
+    def addSKUs(self, skus, total_quantities):
+        """Add several SKUs at once; a repeated SKU keeps its last quantity, as with addSKU."""
+        for sku, total_quantity in zip(skus, total_quantities):
+            self.addSKU(sku, total_quantity)
+
     def hasSKU(self, sku):
         if sku in self.skus:
             return True
@@ -14,6 +14,7 @@ class Pod(Object):
         self.is_idle = True
         self.station = None
         self.need_replenishment = False
+        self.stock_listeners = set() # stations notified when a SKU goes in or out of stock
 
     def __eq__(self, other):
         if isinstance(other, Pod):
@@ -29,13 +30,28 @@ class Pod(Object):
     def setPodManager(self, pod_manager):
         self.pod_manager = pod_manager
 
+    def addStockListener(self, station):
+        self.stock_listeners.add(station)
+
+    def removeStockListener(self, station):
+        self.stock_listeners.discard(station)
+
+    def _setQuantity(self, sku, qty):
+        was_in_stock = sku in self.skus and self.skus[sku]['current_qty'] > 0
+        self.skus[sku]['current_qty'] = qty
+        if was_in_stock != (qty > 0):
+            for station in getattr(self, 'stock_listeners', ()):
+                station.updateIncomingSKU(sku, qty > 0)
+
     def addSKU(self, sku, limit_qty, current_qty, threshold):
         """Add a new SKU with its limit, current quantity, and threshold."""
+        previous_qty = self.skus[sku]['current_qty'] if sku in self.skus else 0
         self.skus[sku] = {
             'limit_qty': limit_qty,
-            'current_qty': current_qty,
+            'current_qty': previous_qty,
             'threshold': threshold
         }
+        self._setQuantity(sku, current_qty)
 
     def isNeedReplenishment(self):
         """Check if 50% or more SKUs are below their threshold to determine if the pod needs to move to a
@@ -55,10 +71,10 @@ class Pod(Object):
     def replenishAllSKU(self):
         """Replenish all SKUs by setting each SKU's current quantity to its limit quantity."""
         for sku in self.skus:
-            self.skus[sku]['current_qty'] = self.skus[sku]['limit_qty']
+            self._setQuantity(sku, self.skus[sku]['limit_qty'])
 
     def pickSKU(self, sku, qty):
-        self.skus[sku]['current_qty'] -= qty
+        self._setQuantity(sku, self.skus[sku]['current_qty'] - qty)
 
     def getQuantity(self, sku):
         return self.skus[sku]['current_qty']
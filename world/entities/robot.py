@@ -55,6 +55,8 @@ class Robot(Object):
         self.traffic_policy = []
         self.latest_tick = 0
         self.route_stop_points = []
+        self.route_nodes = None  # full node path of the last planned route, used for route repair
+        self.route_graph_key = None
         self.job: Optional[Job] = None
         self.turning_delay = 0
         self.taking_pod_delay = 0
@@ -228,7 +230,7 @@ class Robot(Object):
         # 安全檢查：確保坐標在有效範圍內
         pos_x = round(self.pos_x)
         pos_y = round(self.pos_y)
-        warehouse_dimension = self.robot_manager.warehouse.DIMENSION
+        warehouse_dimension = self.robot_manager.warehouse.landscape.dimension
         if pos_x < 0 or pos_x >= warehouse_dimension or pos_y < 0 or pos_y >= warehouse_dimension:
             # 如果坐標超出範圍，返回None避免潛在錯誤
             return None
@@ -303,6 +305,8 @@ class Robot(Object):
 
     def neutralizeRobotState(self):
         self.route_stop_points = []
+        self.route_nodes = None
+        self.robot_manager.warehouse.reservation_table.release(self.robotName())
 
     def updateCurrentPosition(self):
         self.coordinate = NetLogoCoordinate(round(self.pos_x), round(self.pos_y))
@@ -311,7 +315,11 @@ class Robot(Object):
 
     def pickingItemInPod(self):
         if self.job is not None and self.isBeingProcessOnStation():
+            station: Station = self.robot_manager.warehouse.station_manager.getStationById(self.job.station_id)
+            station.startService(self.robotName(), self.job.remainingDelay())
             self.job.decrementDelay()
+            if not self.job.isBeingProcessed():
+                station.completeService(self.robotName(), self.job.id)
             return True
 
     def isInStationPath(self):
@@ -356,7 +364,7 @@ class Robot(Object):
             self.handleDirectional(next_destination_coordinate)
             return
 
-        if self.notAbleToMove(next_destination_coordinate):
+        if self.waitingForReservation() or self.notAbleToMove(next_destination_coordinate):
             self.updateIdleState()
             return
 
@@ -364,6 +372,15 @@ class Robot(Object):
 
         self.executeMove(candidate_conflict_coordinate, next_destination_coordinate)
 
+    def waitingForReservation(self):
+        # 協同規劃模式：靜止時等到預約的出發時間，並讓出被其他機器人預約的格子
+        reservation_table = self.robot_manager.warehouse.reservation_table
+        if not reservation_table.enabled or self.isInStationPath():
+            return False
+        next_cell = self._calculateNextBlocks(round(self.pos_x), round(self.pos_y), self.heading, 1,
+                                              include_self=False)[0]
+        return reservation_table.mustWait(self, tuple(next_cell))
+
     def updateIdleState(self):
         self.idle_time += 1
         self.velocity = 0
@@ -415,6 +432,8 @@ class Robot(Object):
 
     def executeMove(self, candidate_conflict_coordinate, next_destination_coordinate):
         self.idle_time = 0
+        # 沒有被阻擋，不再等待其他機器人
+        self.robot_manager.warehouse.deadlock_detector.clearWait(self.robotName())
         if candidate_conflict_coordinate and candidate_conflict_coordinate != next_destination_coordinate:
             self.handleNextMovement(candidate_conflict_coordinate, is_next_route_stop=False)
         else:
@@ -423,7 +442,10 @@ class Robot(Object):
         self.drawNextPosition()
 
     def eligibleToReroute(self):
-        if self.idle_time <= 50 or self.current_state == "delivering_pod":
+        # 處於循環等待的機器人不需要等滿 50 個 tick 才重新規劃
+        in_wait_cycle = self.robot_manager.warehouse.deadlock_detector.isInWaitCycle(self.robotName())
+        min_idle_time = 10 if in_wait_cycle else 50
+        if self.idle_time <= min_idle_time or self.current_state == "delivering_pod":
             return False
 
         if self.isInStationPath():
@@ -434,6 +456,9 @@ class Robot(Object):
             else:
                 return False
 
+        if in_wait_cycle:
+            return True
+
         # Calculate next step coordinates
         next_step_coordinates = self._calculateNextBlocks(
             round(self.pos_x), round(self.pos_y), self.heading, 1, include_self=False)
@@ -569,6 +594,7 @@ class Robot(Object):
                     neighbor_robot_distance_to_conflict = abs(neighbor['x'] - next_x) + abs(neighbor['y'] - next_y)
 
                     if neighbor_robot_distance_to_conflict < self_distance_to_conflict:
+                        self.robot_manager.warehouse.deadlock_detector.recordWait(self.robotName(), neighbor['label'])
                         return True
                     else:
                         continue
@@ -693,7 +719,12 @@ class Robot(Object):
                 self.pos_x += distance_delta
             elif self.heading == 270:
                 self.pos_x -= distance_delta
+        previous_coordinate = self.coordinate
         self.coordinate = NetLogoCoordinate(round(self.pos_x), round(self.pos_y))
+        self.robot_manager.warehouse.deadlock_detector.recordPosition(self.robotName(), self.coordinate.x, self.coordinate.y)
+        self.robot_manager.warehouse.congestion_cost_manager.recordMove(self.robotName(), self.coordinate.x, self.coordinate.y)
+        if previous_coordinate.x != self.coordinate.x or previous_coordinate.y != self.coordinate.y:
+            self.robot_manager.warehouse.reservation_table.onCellEntered(self, self.coordinate.x, self.coordinate.y)
 
         if self.acceleration != 0:
             self.velocity += (self.acceleration * TICK_TO_SECOND)
@@ -842,14 +873,19 @@ class Robot(Object):
 
                 nodes_to_avoid.append(self.coordinateToStringKey(*avoid_coord))
 
+        route_service = self.robot_manager.warehouse.route_service
         node_routes = None
-        if self.robot_manager.warehouse.zoning:
-            zone_boundary, penalties = self.createZone(method="kmeans")
-            node_routes = graph.dijkstraModified(start,end, penalties, zone_boundary, nodes_to_avoid)
-        else:
-            node_routes = graph.dijkstra(start, end, nodes_to_avoid) # This one is baseline
-        
+        route_nodes = getattr(self, 'route_nodes', None)
+        if nodes_to_avoid and route_nodes and route_nodes[-1] == end and self.route_graph_key == graph.key:
+            # reroute: only replan the blocked part of the current route
+            node_routes = route_service.repairRoute(graph, route_nodes, start, nodes_to_avoid)
+        if node_routes is None:
+            node_routes = route_service.getRoute(graph, start, end, nodes_to_avoid)
+
+        self.route_nodes = node_routes
+        self.route_graph_key = graph.key
         self.setPath(self._transformRouteToList(node_routes))
+        self.robot_manager.warehouse.reservation_table.planRoute(self, node_routes)
 
     def createZone(self, method):
         robot_objects = self.robot_manager.warehouse.landscape.getRobotObject()
@@ -983,6 +1019,8 @@ class Robot(Object):
         更新機器人狀態並記錄活動時間
         """
         old_state = self.current_state
+        if old_state != new_state:
+            self.robot_manager.warehouse.deadlock_detector.recordProgress(self.robotName())
         
         # 如果從非閒置變為閒置，計算活動時間
         if self.current_state != 'idle' and new_state == 'idle':
@@ -1,11 +1,23 @@
-from typing import List, Optional, Dict, TYPE_CHECKING
+import heapq
+from collections import deque
+from typing import List, Optional, Dict, Set, NamedTuple, TYPE_CHECKING
 from pandas import DataFrame
 from world.entities.object import Object
+from lib.constant import TICK_TO_SECOND
 from lib.types.netlogo_coordinate import NetLogoCoordinate
 from .order import Order
 if TYPE_CHECKING:
     from world.managers.station_manager import StationManager
 
+class ServiceCompletion(NamedTuple):
+    """站點完成一次服務時發出的事件，時間單位為模擬秒 (warehouse._tick)"""
+    time: float
+    station_id: int
+    robot_id: str
+    job_id: Optional[int]
+    waiting_time: float  # 進站到開始服務
+    service_time: float  # 開始服務到完成
+
 class Station(Object):
     def __init__(self, id: int, station_type: str, x: int, y: int, data: DataFrame):
         super().__init__(id, station_type, x, y)
@@ -19,9 +31,27 @@ class Station(Object):
         self.short_path_threshold = 4
         self.robot_ids = {}
         self.is_using_short_route = True
-        self.skus = {} # {A:15, B: 10}
+        self.skus = {} # {A:15, B: 10}, kept in sync with skus_in_station
         self.skus_in_station = {} # {A:[5,10], B:[10]}
-        self.incoming_pod: List[int] = []
+        self.incoming_pod: Set[int] = set()
+        self._initServiceModel()
+
+    def _initServiceModel(self):
+        # 排隊服務模型：進站的機器人先進 FIFO 佇列，開始服務時移到 in_service 並排入完成時間 heap
+        self.service_queue = deque()
+        self.arrival_times: Dict[str, float] = {}
+        self.in_service: Dict[str, tuple] = {}  # robot_id -> (開始時間, 預計完成時間)
+        self.completion_heap = []  # (預計完成時間, 序號, robot_id)，離開的項目延後清除
+        self._completion_counter = 0
+        self.arrivals = 0
+        self.completions = 0
+        self.total_waiting_time = 0.0
+        self.total_service_time = 0.0
+
+    def _ensureServiceModel(self):
+        # 舊版狀態檔的站點沒有排隊服務欄位
+        if not hasattr(self, 'service_queue'):
+            self._initServiceModel()
 
     def setStationManager(self, station_manager):
         self.station_manager = station_manager
@@ -34,12 +64,19 @@ class Station(Object):
             if sku not in self.skus_in_station:
                 self.skus_in_station[sku] = []
             self.skus_in_station[sku].append(value)
+            self.skus[sku] = self.skus.get(sku, 0) + value
+
+    def addOrders(self, orders: List[Order]):
+        for order in orders:
+            self.addOrder(order.id, order)
 
     def reduceSKUFromStation(self, sku, value):
         if sku in self.skus_in_station and value in self.skus_in_station[sku]:
             self.skus_in_station[sku].remove(value)
+            self.skus[sku] -= value
             if len(self.skus_in_station[sku]) == 0:
                 self.skus_in_station.pop(sku)
+                self.skus.pop(sku)
 
     def removeOrder(self, order_id: int, order: Order):
         if order_id in self.order_ids:
@@ -48,10 +85,39 @@ class Station(Object):
             self.orders.remove(order)
 
     def addPod(self, pod):
-        self.incoming_pod.append(pod)
-    
+        if pod in self.incoming_pod:
+            return
+        self.incoming_pod.add(pod)
+        pod_obj = self._getPodObject(pod)
+        if pod_obj is not None:
+            pod_obj.addStockListener(self)
+            for sku, details in pod_obj.skus.items():
+                if details['current_qty'] > 0:
+                    self.updateIncomingSKU(sku, True)
+
     def removePod(self, pod):
-        self.incoming_pod.remove(pod)
+        if pod not in self.incoming_pod:
+            return
+        self.incoming_pod.discard(pod)
+        pod_obj = self._getPodObject(pod)
+        if pod_obj is not None:
+            pod_obj.removeStockListener(self)
+            for sku, details in pod_obj.skus.items():
+                if details['current_qty'] > 0:
+                    self.updateIncomingSKU(sku, False)
+
+    def _getPodObject(self, pod_number):
+        if self.station_manager is None:
+            return None
+        pods = self.station_manager.warehouse.pod_manager.pods
+        if 0 <= pod_number < len(pods):
+            return pods[pod_number]
+        return None
+
+    def updateIncomingSKU(self, sku, in_stock: bool):
+        """Called when an incoming pod starts or stops holding a SKU in stock."""
+        if self.station_manager is not None:
+            self.station_manager.updateIncomingSKUCoverage(self, sku, 1 if in_stock else -1)
 
     def isPickerStation(self) -> bool:
         return self.object_type == "picker"
@@ -82,14 +148,111 @@ class Station(Object):
             self.is_using_short_route = True
 
     def addRobot(self, robot_id):
+        is_new = robot_id not in self.robot_ids
         self.robot_ids[robot_id] = self.getPath()
         self.reevaluateRoute()
+        if is_new:
+            self._arrive(robot_id)
 
     def removeRobot(self, robot_id):
         if robot_id in self.robot_ids:
             del self.robot_ids[robot_id]
+            self._depart(robot_id)
         self.reevaluateRoute()
 
+    def _now(self) -> float:
+        if self.station_manager is None:
+            return 0.0
+        return self.station_manager.warehouse._tick
+
+    def _arrive(self, robot_id):
+        self._ensureServiceModel()
+        self.arrivals += 1
+        self.arrival_times[robot_id] = self._now()
+        if robot_id not in self.in_service:
+            self.service_queue.append(robot_id)
+        if self.station_manager is not None:
+            self.station_manager.onQueueChanged(self, 1)
+
+    def _depart(self, robot_id):
+        # 離開站點路徑；尚未完成的服務直接捨棄，heap 中的項目延後清除
+        self._ensureServiceModel()
+        if robot_id in self.service_queue:
+            self.service_queue.remove(robot_id)
+        self.in_service.pop(robot_id, None)
+        self.arrival_times.pop(robot_id, None)
+        if self.station_manager is not None:
+            self.station_manager.onQueueChanged(self, -1)
+
+    def startService(self, robot_id, service_ticks: int):
+        """機器人抵達站點開始處理，service_ticks 為預計需要的 tick 數；已在服務中則忽略"""
+        self._ensureServiceModel()
+        if robot_id in self.in_service:
+            return
+        if self.service_queue and self.service_queue[0] == robot_id:
+            self.service_queue.popleft()
+        elif robot_id in self.service_queue:
+            self.service_queue.remove(robot_id)
+        now = self._now()
+        expected = now + service_ticks * TICK_TO_SECOND
+        self.in_service[robot_id] = (now, expected)
+        heapq.heappush(self.completion_heap, (expected, self._completion_counter, robot_id))
+        self._completion_counter += 1
+
+    def completeService(self, robot_id, job_id=None) -> Optional[ServiceCompletion]:
+        """服務完成：更新計數器並透過 StationManager 發出 ServiceCompletion 事件"""
+        self._ensureServiceModel()
+        if robot_id not in self.in_service:
+            return None
+        start, _ = self.in_service.pop(robot_id)
+        now = self._now()
+        arrival = self.arrival_times.get(robot_id, start)
+        event = ServiceCompletion(now, self.id, robot_id, job_id, start - arrival, now - start)
+        self.completions += 1
+        self.total_waiting_time += event.waiting_time
+        self.total_service_time += event.service_time
+        self._pruneCompletionHeap()
+        if self.station_manager is not None:
+            self.station_manager.onServiceCompleted(self, event)
+        return event
+
+    def _pruneCompletionHeap(self):
+        heap = self.completion_heap
+        while heap and self.in_service.get(heap[0][2], (None, None))[1] != heap[0][0]:
+            heapq.heappop(heap)
+
+    def nextCompletionTime(self) -> Optional[float]:
+        """最早的預計完成時間，沒有服務中的機器人時回傳 None"""
+        self._ensureServiceModel()
+        self._pruneCompletionHeap()
+        return self.completion_heap[0][0] if self.completion_heap else None
+
+    def queueLength(self) -> int:
+        """分配到此站點 (站點路徑上) 的機器人數，含服務中"""
+        return len(self.robot_ids)
+
+    def waitingCount(self) -> int:
+        self._ensureServiceModel()
+        return len(self.service_queue)
+
+    def inServiceCount(self) -> int:
+        self._ensureServiceModel()
+        return len(self.in_service)
+
+    def getThroughput(self, elapsed: Optional[float] = None) -> float:
+        """每秒完成的服務數，elapsed 預設為目前模擬時間"""
+        self._ensureServiceModel()
+        elapsed = self._now() if elapsed is None else elapsed
+        return self.completions / elapsed if elapsed > 0 else 0.0
+
+    def getAverageWaitingTime(self) -> float:
+        self._ensureServiceModel()
+        return self.total_waiting_time / self.completions if self.completions else 0.0
+
+    def getAverageServiceTime(self) -> float:
+        self._ensureServiceModel()
+        return self.total_service_time / self.completions if self.completions else 0.0
+
     def updateRobotRouteType(self, robot_id):
         if robot_id in self.robot_ids:
             self.robot_ids[robot_id] = self.getPath()
@@ -101,8 +264,6 @@ class Station(Object):
         return self.getPath() != self.getRobotRoute(robot_id)
     
     def getSKUsInStation(self):
-        for sku, value in self.skus_in_station.items():
-            self.skus[sku] = sum(value)
         return self.skus
     
     def getOrdersInStation(self) -> Optional[List[Order]]: 
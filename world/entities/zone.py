@@ -1,6 +1,7 @@
 import numpy as np
 import matplotlib.pyplot as plt
 from sklearn.cluster import KMeans
+from sklearn.cluster import MiniBatchKMeans
 from sklearn.cluster import AffinityPropagation
 from sklearn.metrics import silhouette_score
 
@@ -8,8 +9,9 @@ class Zone:
     boundaries = [] # 3 Dimension Array berarti appendnya 2D
     penalty = [] # 1D Array of integer
     cluster_num = 2
+    centroids = None # KMeans cluster centers, used to warm-start the next clustering
 
-    def __init__(self, robots_location, warehouse_size,methods):
+    def __init__(self, robots_location, warehouse_size,methods, init_centroids=None, geometry=None):
         if methods == "default":
             self.boundaries = [
         [
@@ -51,10 +53,12 @@ class Zone:
         ]
         elif methods == "kmeans":
             self.kMeansClustering(robots_location)
+        elif methods == "miniBatchKMeans":
+            self.miniBatchKMeansClustering(robots_location, init_centroids)
         elif methods == "affinityPropagation":
             self.affinityPropagation(robots_location)
         elif methods == "routeCluster":
-            self.routeCluster(warehouse_size)
+            self.routeCluster(warehouse_size, geometry)
         
     def getBoundary(self):
         return self.boundaries
@@ -104,6 +108,84 @@ class Zone:
 
         #get robot by coor 
         return self.penalty
+
+    @staticmethod
+    def boundaryToRectangle(zone):
+        """Convert a zone boundary ([[row, col], [row, col]]) to (x_min, x_max, y_min, y_max)."""
+        y_min, y_max = sorted((zone[0][0], zone[1][0]))
+        x_min, x_max = sorted((zone[0][1], zone[1][1]))
+        return x_min, x_max, y_min, y_max
+
+    def _zoneMembership(self, points):
+        """Boolean matrix (zones x points) telling which points lie inside each zone."""
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        rectangles = np.array([self.boundaryToRectangle(zone) for zone in self.boundaries], dtype=float).reshape(-1, 4)
+        x = points[:, 0]
+        y = points[:, 1]
+        return ((x >= rectangles[:, [0]]) & (x <= rectangles[:, [1]]) &
+                (y >= rectangles[:, [2]]) & (y <= rectangles[:, [3]]))
+
+    def calculatePenaltyArray(self, robots_location, idle_time, warehouse_size, threshold):
+        """Vectorised version of calculatePenalty.
+
+        Args:
+            robots_location (list): list of robots location [x, y].
+            idle_time (list): idle time of each robot in robots_location.
+            warehouse_size (list): [total_rows, total_cols] of the warehouse.
+            threshold (int): number of idle robots after which a zone boundary gets blocked.
+
+        Returns:
+            np.ndarray: penalty of each zone
+        """
+        if len(self.boundaries) == 0:
+            self.penalty = np.empty(0)
+            return self.penalty
+
+        warehouse_area = warehouse_size[0] * warehouse_size[1]
+        rectangles = np.array([self.boundaryToRectangle(zone) for zone in self.boundaries], dtype=float)
+        area = (rectangles[:, 1] - rectangles[:, 0]) * (rectangles[:, 3] - rectangles[:, 2])
+
+        points = np.asarray(robots_location, dtype=float).reshape(-1, 2)
+        inside = self._zoneMembership(points)
+        robot_count = 1 + inside.sum(axis=1)
+        penalty = area / robot_count
+
+        idle = np.asarray(idle_time, dtype=float).reshape(-1) > 50
+        robot_idle_zone = 1 + (inside & idle).sum(axis=1)
+
+        # robots standing on the border of a congested zone block it
+        x = points[:, 0]
+        y = points[:, 1]
+        on_row_border = ((x >= rectangles[:, [0]]) & (x <= rectangles[:, [1]]) &
+                         ((y == rectangles[:, [2]]) | (y == rectangles[:, [3]])))
+        on_col_border = ((y >= rectangles[:, [2]]) & (y <= rectangles[:, [3]]) &
+                         ((x == rectangles[:, [0]]) | (x == rectangles[:, [1]])))
+        border_robots = (on_row_border | on_col_border).sum(axis=1)
+        penalty = penalty + np.where(robot_idle_zone >= threshold, border_robots * 100 * warehouse_area, 0)
+
+        self.penalty = penalty
+        return self.penalty
+
+    def nodePenaltyVector(self, node_coordinates, penalties=None):
+        """Map zone penalties onto graph nodes.
+
+        Args:
+            node_coordinates (np.ndarray): (n, 2) array of node [x, y].
+            penalties (array, optional): penalty of each zone, defaults to self.penalty.
+
+        Returns:
+            np.ndarray: penalty of each node, NaN for nodes outside every zone
+        """
+        penalties = self.penalty if penalties is None else penalties
+        node_penalties = np.full(len(node_coordinates), np.nan)
+        if len(self.boundaries) == 0 or len(node_coordinates) == 0:
+            return node_penalties
+
+        inside = self._zoneMembership(node_coordinates)
+        # later zones win, the same way dijkstraModified overwrote the weights
+        for index in range(len(self.boundaries)):
+            node_penalties[inside[index]] = penalties[index]
+        return node_penalties
     
     @staticmethod
     def _minimumBoundingRectangle(points):
@@ -170,6 +252,40 @@ class Zone:
             self.boundaries = boundaries
         return
     
+    def miniBatchKMeansClustering(self, robots_location, init_centroids=None):
+        """Clustering using mini-batch KMeans, warm-started from previous centroids
+
+        Args:
+            robots_location (list): list of robots location.
+            init_centroids (np.ndarray, optional): centroids of the previous clustering.
+                When not given, the cluster number is chosen with the silhouette score.
+
+        Returns:
+            lists of zone boundaries
+        """
+        robots = np.array(robots_location, dtype=float)
+        if init_centroids is not None and len(robots) >= len(init_centroids):
+            self.cluster_num = len(init_centroids)
+            kmeans = MiniBatchKMeans(n_clusters=self.cluster_num, init=np.asarray(init_centroids, dtype=float),
+                                     n_init=1, random_state=0)
+        elif len(robots) >= 3:
+            self.cluster_num = self._silhouetteScore(robots, min_cluster=2, max_cluster=9)
+            kmeans = MiniBatchKMeans(n_clusters=self.cluster_num, n_init=3, random_state=0)
+        else:
+            return
+
+        labels = kmeans.fit_predict(robots)
+        boundaries = []
+        for cluster_id in range(self.cluster_num):
+            cluster_points = robots[labels == cluster_id]
+            if len(cluster_points) == 0:
+                continue
+            boundaries.append(self._minimumBoundingRectangle(cluster_points))
+
+        self.boundaries = boundaries
+        self.centroids = kmeans.cluster_centers_
+        return
+
     def affinityPropagation(self, robots_location):
         robots = np.array(robots_location)
 
@@ -191,30 +307,34 @@ class Zone:
             self.boundaries = boundaries
         return 
     
-    def routeCluster(self,warehouse_size):
+    def routeCluster(self, warehouse_size, geometry=None):
         total_row = warehouse_size[0]
-        total_col = warehouse_size[1]
+        # 路口欄、道路列與左側高速道路由 LayoutGeometry 推導；沒有時沿用預設 31x49 版面的位置
+        if geometry is not None:
+            intersection_columns = geometry.intersection_columns
+            road_rows = geometry.intersection_rows
+            highway_start, highway_end = geometry.left_highway
+        else:
+            intersection_columns = list(range(9, 40, 6))
+            road_rows = range(0, total_row, 3)
+            highway_start, highway_end = 5, 9
         zones = []
 
         # Make zone for left highway
         end_row = 3
         for row in range(0, total_row, 4):
-            zones.append([[row, 5],[end_row, 9]])
+            zones.append([[row, highway_start],[end_row, highway_end]])
             end_row += 4
 
         # Make zone for right highway
         
-        # Make zone for horizontal paths
-        end_col = 14
-        for row in range(0, total_row, 3):
-            end_col = 14
-            for col in range(10, total_col-10,6):
-                zones.append([[row, col], [row, end_col]])
-                end_col += 6
+        # Make zone for horizontal paths (segments between consecutive intersection columns)
+        for row in road_rows:
+            for col, next_col in zip(intersection_columns[:-1], intersection_columns[1:]):
+                zones.append([[row, col + 1], [row, next_col - 1]])
 
         # Make zone for vertical paths
-        end_row = 3
-        for col in range(15, 34, 6):
+        for col in intersection_columns[1:-1]:
             for row in range(0, total_row, 4):
                 zones.append([[row,col],[row+3, col]])
 
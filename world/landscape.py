@@ -5,14 +5,28 @@ class Landscape:
         self.dimension = dimension
         self.total_objects = 0
         self.current_date_string = datetime.now().strftime("%Y-%m-%d-%H%M%S")
-        self.map = []
+        # 稀疏格位：只有放著物件的 (x, y) 才有項目，大型倉庫 (例如 200x200) 不需預先配置整張網格
+        self.map = {}
         self._objects = {}
-        for i in range(self.dimension+1):
-            one_row = []
-            for j in range(self.dimension+1):
-                one_row.append([])
-            self.map.append(one_row)
-    
+
+    def resize(self, dimension):
+        """調整座標上限 (0..dimension)，通常在載入版面後依版面大小呼叫"""
+        self.dimension = dimension
+
+    def _addToCell(self, x, y, obj):
+        self.map.setdefault((x, y), []).append(obj)
+
+    def _removeFromCell(self, x, y, label):
+        cell = self.map.get((x, y))
+        if not cell:
+            return
+        for index, e in enumerate(cell):
+            if e['label'] == label:
+                del cell[index]
+                break
+        if not cell:
+            del self.map[(x, y)]
+
     def getRobotObject(self):
         return self._objects
     
@@ -41,7 +55,7 @@ class Landscape:
             'state': state,
         }
 
-        self.map[new_x][new_y].append(self._objects[label])
+        self._addToCell(new_x, new_y, self._objects[label])
 
     def setObject(self, label, x, y, speed, acceleration, heading, state):
         # 檢查新位置是否在有效範圍內
@@ -62,17 +76,13 @@ class Landscape:
             # check if x or y has changed
             if new_x != old_x or new_y != old_y:
                 # remove from old position
-                to_iter = self.map[old_x][old_y] 
-                for index, e in enumerate(to_iter):
-                    if e['label'] == label:
-                        del to_iter[index]
-                        break
+                self._removeFromCell(old_x, old_y, label)
 
                 # add to new position
-                self.map[new_x][new_y].append(self._objects[label])
+                self._addToCell(new_x, new_y, self._objects[label])
         else:
             # 如果舊位置無效，則只添加到新位置
-            self.map[new_x][new_y].append(self._objects[label])
+            self._addToCell(new_x, new_y, self._objects[label])
 
         movement = 'vertical'
         if heading == 270 or heading == 90:
@@ -105,8 +115,8 @@ class Landscape:
             i += 1
 
         for p in points_to_check:
-            s = self.map[p[0]][p[1]]
-            if len(s) > 0:
+            s = self.map.get((p[0], p[1]))
+            if s:
                 for obj in s:
                     result.append(self._objects[obj['label']])
 
@@ -119,8 +129,8 @@ class Landscape:
         if x_rounded < 0 or y_rounded < 0 or x_rounded > self.dimension or y_rounded > self.dimension:
             return None
             
-        s = self.map[x_rounded][y_rounded]
-        if len(s) > 0:
+        s = self.map.get((x_rounded, y_rounded))
+        if s:
             for obj in s:
                 return self._objects[obj['label']]
         return None
@@ -1,68 +1,113 @@
-import csv
 import random
 
+import numpy as np
+
 from lib.file import *   
 from lib.constant import *   
 
 class Layout(object):
-    def __init__(self):
-        self.pod_batch_horizontal = 5
-        self.pod_batch_vertical = 2
-        self.pod_batch_horizontal_max = 5
+    def __init__(self, pod_batch_horizontal=5, pod_batch_vertical=2, pod_batch_horizontal_max=5,
+                 pod_batch_vertical_max=10, reserved_column_start=9, reserved_column_end=9,
+                 reserved_column_station=5, order_picker_total=3, order_replenishment_total=2,
+                 total_pods_active=300, total_charging_stations=10):
+        self.pod_batch_horizontal = pod_batch_horizontal
+        self.pod_batch_vertical = pod_batch_vertical
+        self.pod_batch_horizontal_max = pod_batch_horizontal_max
         self.pod_batch_vertical_count = 0
-        self.pod_batch_vertical_max = 10
-        self.reserved_column_start = 9
-        self.reserved_column_end = 9
-        self.reserved_column_station = 5
-        self.order_picker_total = 3
-        self.order_replenishment_total = 2
+        self.pod_batch_vertical_max = pod_batch_vertical_max
+        self.reserved_column_start = reserved_column_start
+        self.reserved_column_end = reserved_column_end
+        self.reserved_column_station = reserved_column_station
+        self.order_picker_total = order_picker_total
+        self.order_replenishment_total = order_replenishment_total
         self.horizontal_direction_switch = False
         self.vertical_direction_switch = False
-        self.total_pods_active = 300 # Number of pods
-        self.total_charging_stations = 10
-
-    def generate(self):
-        order_picker_positions = self.calculateStationPositions(self.order_picker_total)
-        order_replenishment_positions = self.calculateStationPositions(self.order_replenishment_total)
-
-        data_matrix = []
-
-        for row in range(self.totalRows()):
-            current_row = []
-            self.vertical_direction_switch = False
-            for col in range(self.totalCols()):
-                value_to_append = self.appendStationValue(row, col, order_picker_positions,
-                                                            order_replenishment_positions)
-                if value_to_append is not None:
-                    current_row.append(value_to_append)
-                else:
-                    if self.reserved_column_start <= col < (self.totalCols() - self.reserved_column_end):
-                        if row % (self.pod_batch_vertical + 1) == 0:
-                            if (col - self.reserved_column_start) % (self.pod_batch_horizontal + 1) == 0:
-                                current_row.append(3)
-                                self.vertical_direction_switch = not self.vertical_direction_switch
-                            else:
-                                current_row.append(4 if self.horizontal_direction_switch else 5)
-                        else:
-                            pod_index = (col - self.reserved_column_start - 1) % (self.pod_batch_horizontal + 1)
-                            if pod_index < self.pod_batch_horizontal:
-                                current_row.append(1)
-                            else:
-                                current_row.append(6 if self.vertical_direction_switch else 7)
-                                self.vertical_direction_switch = not self.vertical_direction_switch
-                    else:
-                        current_row.append(6 if self.vertical_direction_switch else 7)
-                        self.vertical_direction_switch = not self.vertical_direction_switch
+        self.total_pods_active = total_pods_active # Number of pods
+        self.total_charging_stations = total_charging_stations
+        self.grid = None
+
+    def generate(self, export=True, path=None) -> np.ndarray:
+        """
+        Generate the layout grid; by default it is also exported to generated_pod.csv.
+
+        Args:
+            export: write the grid to CSV
+            path: CSV path, defaults to data/output/generated_pod.csv
+
+        Returns:
+            np.ndarray: (rows, cols) grid of AreaPathType values
+        """
+        self.grid = self.generateGrid()
+        if export:
+            self.exportGrid(self.grid, path)
+        return self.grid
+
+    def exportGrid(self, grid, path=None):
+        pod_path = path or PARENT_DIRECTORY + '/data/output/generated_pod.csv'
+        np.savetxt(pod_path, grid, fmt='%d', delimiter=',')
+
+    def generateGrid(self) -> np.ndarray:
+        rows, cols = self.totalRows(), self.totalCols()
+        col = np.arange(cols)
+        row = np.arange(rows)
+
+        station_col = (col < self.reserved_column_station) | (col >= cols - self.reserved_column_station)
+        in_pod_area = (self.reserved_column_start <= col) & (col < cols - self.reserved_column_end)
+        # intersection columns of the road rows are the aisle columns of the pod rows
+        aisle_col = in_pod_area & ((col - self.reserved_column_start) % (self.pod_batch_horizontal + 1) == 0)
+
+        # the vertical direction alternates at every aisle (and every reserved column) and restarts on each row;
+        # the horizontal direction alternates row by row
+        toggles = ~station_col & (~in_pod_area | aisle_col)
+        vertical = (np.cumsum(toggles) - toggles) % 2 == 1
+        horizontal = (row % 2 == 1) != self.horizontal_direction_switch
+        road_row = row % (self.pod_batch_vertical + 1) == 0
+
+        vertical_value = np.where(vertical, 6, 7)
+        grid = np.broadcast_to(vertical_value, (rows, cols)).copy()
+        pod_col = in_pod_area & ~aisle_col
+        grid[np.ix_(~road_row, pod_col)] = 1
+        grid[np.ix_(road_row, pod_col)] = np.where(horizontal[road_row], 4, 5)[:, None]
+        grid[np.ix_(road_row, aisle_col)] = 3
+
+        grid[:, col < self.reserved_column_station] = self.stationBlock(
+            rows, self.calculateStationPositions(self.order_picker_total))
+        grid[:, col >= cols - self.reserved_column_station] = self.stationBlock(
+            rows, self.calculateStationPositions(self.order_replenishment_total), mirrored=True)
 
-            data_matrix.append(current_row)
-            self.horizontal_direction_switch = not self.horizontal_direction_switch
+        self.horizontal_direction_switch = self.horizontal_direction_switch != (rows % 2 == 1)
+        self.adjustPodAvailability(grid)
+        return grid
 
-        self.adjustPodAvailability(data_matrix)
+    def stationBlock(self, rows, ranges, mirrored=False) -> np.ndarray:
+        """Cells of the station columns, same values as getValueForStation for every (row, col)."""
+        width = self.reserved_column_station
+        block = np.full((rows, width), 99, dtype=np.int64)
+        # column of the k-th cell away from the outer wall
+        k_col = (lambda k: width - 1 - k) if mirrored else (lambda k: k)
 
-        pod_path = PARENT_DIRECTORY + '/data/output/generated_pod.csv'
-        with open(pod_path, 'w', newline='') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerows(data_matrix)
+        def put(r, values):
+            if 0 <= r < rows:
+                block[r, :] = 99
+                for k, value in values.items():
+                    if 0 <= k_col(k) < width:
+                        block[r, k_col(k)] = value
+
+        base = 10 if mirrored else 0
+        corner_0, corner_1, corner_2, corner_3 = 16 + base, 17 + base, 18 + base, 19 + base
+        rail_0, rail_1, rail_triangle, picker = 12 + base, 13 + base, 14 + base, 11 + base
+
+        # the first matching range wins, and within a range the first row wins over the last row
+        for start, end in reversed(ranges):
+            for r in range(start + 1, end):
+                put(r, {})
+            if start + 1 < end:
+                put(start + 1, {1: picker, 2: rail_triangle, 3: rail_1, 4: corner_2})
+            if start + 2 < end:
+                put(start + 2, {2: rail_triangle, 3: rail_0, 4: corner_3})
+            put(end, {2: corner_1, 3: rail_1, 4: rail_1})
+            put(start, {2: corner_0, 3: rail_0, 4: rail_0})
+        return block
 
     def appendStationValue(self, row, col, order_positions, replenish_positions):
         if col < self.reserved_column_station:
@@ -173,7 +218,9 @@ class Layout(object):
 
     def adjustPodAvailability(self, matrix):
         # Count the current total number of active pods
-        current_total_pods = sum(row.count(1) for row in matrix)
+        matrix = np.asarray(matrix)
+        pod_positions = np.flatnonzero(matrix == 1)
+        current_total_pods = len(pod_positions)
 
         # Calculate how many pods need to be deactivated and converted
         if current_total_pods > self.total_pods_active:
@@ -183,16 +230,72 @@ class Layout(object):
             pods_to_deactivate = 0
             pods_to_convert = 0
 
-        # List of all pod positions in matrix that are currently active
-        pod_positions = [(r, c) for r in range(len(matrix)) for c in range(len(matrix[r])) if matrix[r][c] == 1]
-
         # Randomly select and deactivate pods if there are any to deactivate
+        # (positions are row-major, sampled by index so the picks follow the same random sequence)
         if pods_to_deactivate > 0:
-            for r, c in random.sample(pod_positions, pods_to_deactivate):
-                matrix[r][c] = 0  # Mark this position as deactivated
-                pod_positions.remove((r, c))  # Remove this position from available pods
+            selected = random.sample(range(len(pod_positions)), pods_to_deactivate)
+            matrix.flat[pod_positions[selected]] = 0  # Mark this position as deactivated
+            pod_positions = np.delete(pod_positions, selected)  # Remove this position from available pods
 
         # Randomly select and convert remaining active pods to charging stations if needed
         if pods_to_convert > 0:
-            for r, c in random.sample(pod_positions, pods_to_convert):
-                matrix[r][c] = 2  # Mark this position as a charging station
+            selected = random.sample(range(len(pod_positions)), pods_to_convert)
+            matrix.flat[pod_positions[selected]] = 2  # Mark this position as a charging station
+
+
+class LayoutGeometry(object):
+    """
+    Geometry derived from a loaded layout grid, replacing the coordinates that used to be
+    hard-wired for the default 31x49 layout (RL intersections at x == 15, main intersection (15,15)).
+
+    Attributes:
+        intersection_columns / intersection_rows: sorted columns / rows that contain intersections
+        rl_column: column whose intersections are controlled by the RL models (the second intersection column)
+        rl_intersections: {(x, y): 'BOTTOM' | 'MIDDLE' | 'TOP'} model name of each RL intersection
+        main_intersection: RL intersection closest to the vertical middle of the layout
+        left_highway: (start, end) columns of the vertical highway left of the storage area
+        spawn_columns / spawn_rows: inclusive (first, last) ranges where robots are placed initially,
+            i.e. every row and the columns between the station blocks
+    """
+    INTERSECTION = 3
+    VERTICAL_PATHS = (6, 7)
+    STATION_MIN = 10  # station cells are 11-29 and 99
+
+    def __init__(self, grid):
+        grid = np.asarray(grid)
+        self.rows, self.cols = grid.shape
+        ys, xs = np.nonzero(grid == self.INTERSECTION)
+        self.intersection_columns = [int(x) for x in np.unique(xs)]
+        self.intersection_rows = [int(y) for y in np.unique(ys)]
+
+        self.rl_column = None
+        self.rl_intersections = {}
+        self.main_intersection = None
+        if self.intersection_columns:
+            self.rl_column = self.intersection_columns[min(1, len(self.intersection_columns) - 1)]
+            rl_rows = np.sort(ys[xs == self.rl_column])
+            bottom, top = int(rl_rows[0]), int(rl_rows[-1])
+            for y in rl_rows:
+                name = "BOTTOM" if y == bottom else "TOP" if y == top else "MIDDLE"
+                self.rl_intersections[(self.rl_column, int(y))] = name
+            middle = int(rl_rows[np.argmin(np.abs(rl_rows - (bottom + top) / 2))])
+            self.main_intersection = (self.rl_column, middle)
+
+        # Highway: vertical path columns directly left of the first intersection column
+        first = self.intersection_columns[0] if self.intersection_columns else 0
+        vertical = np.isin(grid, self.VERTICAL_PATHS).all(axis=0)
+        start = first
+        while start > 0 and vertical[start - 1]:
+            start -= 1
+        self.left_highway = (start, first)
+
+        # Robots spawn anywhere outside the station blocks
+        free_columns = np.nonzero((grid < self.STATION_MIN).all(axis=0))[0]
+        if len(free_columns):
+            self.spawn_columns = (int(free_columns[0]), int(free_columns[-1]))
+        else:
+            self.spawn_columns = (0, self.cols - 1)
+        self.spawn_rows = (0, self.rows - 1)
+
+    def rlModelName(self, x, y):
+        return self.rl_intersections.get((x, y))
@@ -26,6 +26,12 @@ class IntersectionManager:
         self.controllers: Dict[str, TrafficController] = {}
         self.current_controller_type = None
         self.intersection_controllers = {}
+        self.main_intersection = (15, 15)  # 預設版面的主要路口，載入版面後由 LayoutGeometry 覆寫
+        # 決策排程：每種控制器的決策間隔 (tick)，以及每個路口的相位偏移
+        self.decision_intervals: Dict[str, int] = {}
+        self.decision_phase_offsets: Dict[str, int] = {}
+        # 集中執行的最小綠燈時間，0 表示交由控制器自行處理
+        self.min_green_time = 0
 
     def initIntersectionManager(self):
         for intersection in self.intersections:
@@ -44,6 +50,10 @@ class IntersectionManager:
         return intersection
 
     def set_controller(self, controller_type, **kwargs):
+        decision_interval = kwargs.pop('decision_interval', None)
+        if decision_interval is not None:
+            self.setDecisionInterval(controller_type, decision_interval)
+
         if controller_type not in self.controllers:
             try:
                 self.controllers[controller_type] = TrafficControllerFactory.create_controller(controller_type, **kwargs)
@@ -54,22 +64,70 @@ class IntersectionManager:
         self.current_controller_type = controller_type
         return True
     
+    def setDecisionInterval(self, controller_type, interval):
+        """設定控制器的決策間隔，每 interval 個 tick 才詢問一次控制器"""
+        self.decision_intervals[controller_type] = max(1, int(interval))
+
+    def getDecisionInterval(self, controller_type=None):
+        controller_type = self.current_controller_type if controller_type is None else controller_type
+        return self.decision_intervals.get(controller_type, 1)
+
+    def setDecisionPhaseOffset(self, intersection_id, offset):
+        """設定路口的決策相位偏移，未設定時依路口編號錯開"""
+        self.decision_phase_offsets[intersection_id] = int(offset)
+
+    def setMinGreenTime(self, min_green_time):
+        """設定集中執行的最小綠燈時間 (tick)"""
+        self.min_green_time = max(0, min_green_time)
+
+    def isDecisionDue(self, intersection: Intersection, tick, interval=None):
+        """路口在這個 tick 是否需要詢問控制器"""
+        interval = self.getDecisionInterval() if interval is None else interval
+        if interval <= 1:
+            return True
+        offset = self.decision_phase_offsets.get(intersection.id)
+        if offset is None:
+            # 預設依路口編號錯開，讓每個 tick 的決策數量平均
+            offset = self.defaultDecisionPhaseOffset(intersection)
+        return (int(tick) - offset) % interval == 0
+
+    def defaultDecisionPhaseOffset(self, intersection: Intersection) -> int:
+        """路口 ID ('intersection-3') 的數字部分，即建立順序；無法解析時用在列表中的位置"""
+        try:
+            return int(str(intersection.id).rsplit('-', 1)[-1])
+        except ValueError:
+            return self.intersections.index(intersection)
+
+    def isMinGreenTimeSatisfied(self, intersection: Intersection, tick):
+        if intersection.allowed_direction is None:
+            return True
+        return intersection.durationSinceLastChange(tick) >= self.min_green_time
+
     def update_traffic_using_controller(self, tick):
         if self.current_controller_type is None or self.current_controller_type not in self.controllers:
             logger.warning("No valid traffic controller set")
             return
         
         controller = self.controllers[self.current_controller_type]
+        interval = self.getDecisionInterval()
         
         for intersection in self.intersections:
+            # 未到決策時間的路口維持目前方向，不詢問控制器
+            if not self.isDecisionDue(intersection, tick, interval):
+                continue
+
             # 獲取控制器決定的方向
             direction = controller.get_direction(intersection, tick, self.warehouse)
             
+            # 最小綠燈時間內不切換方向
+            if direction != intersection.allowed_direction and not self.isMinGreenTimeSatisfied(intersection, tick):
+                direction = intersection.allowed_direction
+
             # 更新方向如果需要
             if direction != intersection.allowed_direction:
-                # 對於主要交叉路口(15,15)保留特殊的日誌輸出
-                if intersection.pos_x == 15 and intersection.pos_y == 15:
-                    logger.info(f"Main intersection (15,15) direction change: {intersection.allowed_direction} -> {direction}")
+                # 對於主要交叉路口保留特殊的日誌輸出
+                if (intersection.pos_x, intersection.pos_y) == self.main_intersection:
+                    logger.info(f"Main intersection {self.main_intersection} direction change: {intersection.allowed_direction} -> {direction}")
                 else:
                     logger.info(f"Intersection {intersection.id} at ({intersection.pos_x}, {intersection.pos_y}) direction change: {intersection.allowed_direction} -> {direction}")
                 self.updateAllowedDirection(intersection.id, direction, tick)
@@ -306,8 +364,8 @@ class IntersectionManager:
             intersection_y = intersection.coordinate.y
             distance = abs(x - intersection_x) + abs(y - intersection_y)  # 曼哈頓距離
             
-            # 如果交叉路口是主要交叉路口(15,15)，使用更大的識別半徑(3個單位)
-            if intersection_x == 15 and intersection_y == 15:
+            # 如果交叉路口是主要交叉路口，使用更大的識別半徑(3個單位)
+            if (intersection_x, intersection_y) == self.main_intersection:
                 if distance <= 3:
                     logger.debug(f"Main intersection detection: Robot at ({x}, {y}) is near main intersection ({intersection_x}, {intersection_y}), distance: {distance}")
                     return intersection.id
@@ -19,6 +19,14 @@ class OrderManager:
         self.unfinished_orders.append(new_order)
         return new_order
 
+    def createOrders(self, order_ids, order_arrival: int) -> List[Order]:
+        """Create a batch of orders sharing the same arrival tick."""
+        new_orders = [Order(order_id, order_arrival) for order_id in order_ids]
+        self.orders.extend(new_orders)
+        self.order_id_to_order.update((order.id, order) for order in new_orders)
+        self.unfinished_orders.extend(new_orders)
+        return new_orders
+
     def getOrderById(self, order_id) -> Optional[Order]:
         """Retrieve an order by its ID using the dictionary for quick access."""
         return self.order_id_to_order.get(order_id, None)
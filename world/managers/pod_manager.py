@@ -223,22 +223,15 @@ class PodManager:
             return sku_id, False
     
     def determinePodWillBeReplenished(self, replenished_pod_needed_by_sku):
-        stock_out_probability_of_each_pod = {}
+        """Return the pod_number with the highest predicted stock-out risk among the candidate pods."""
+        unique_pods = list(dict.fromkeys(sum(replenished_pod_needed_by_sku.values(), [])))
+        if len(unique_pods) == 0:
+            return None
 
-        all_pods = sum(replenished_pod_needed_by_sku.values(), [])
-        unique_pods = set(all_pods)
-        unique_pods_list = list(unique_pods)
+        # Risk from the backlog and arrival-rate forecast of the replenishment planner
+        stock_out_risk = self.warehouse.replenishment_planner.stockOutRisk(unique_pods)
+        return unique_pods[int(np.argmax(stock_out_risk))].pod_number
 
-        for pod in unique_pods_list: 
-            skus_in_pod = pod.skus
-            pod_stock_out_probability = 0
-            for sku in skus_in_pod:
-                sku_current_qty = sku['current_qty']
-                # Get the max amount of the SKU that have been ordered
-                # Sum the probability from the probability of sku_current_qty until probability of max qty in the sku
-            # Put in the result of the sum probability of each pod to the stock_out_probability_of_each_pod
-        # Return the pod.pod_number with the highest value of stock_out_probability_of_each_pod
-        
     def _distancePodToRobot(self, pod_coordinate, robots_coordinate):
         pod_coordinate = np.array(pod_coordinate).reshape(1, -1)
         distance_to_robot_score = 1000
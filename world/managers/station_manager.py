@@ -1,6 +1,7 @@
 from __future__ import annotations
-from typing import List, Optional, Dict, TYPE_CHECKING
-from world.entities.station import Station
+from collections import deque
+from typing import Callable, List, Optional, Dict, TYPE_CHECKING
+from world.entities.station import Station, ServiceCompletion
 from world.entities.picker import Picker
 from world.entities.replenishment import Replenishment
 from .pod_manager import PodManager
@@ -17,6 +18,58 @@ class StationManager:
         self.replenishment_counter = 0
         self.replenishment_stations: List[Station] = []
         self.stations_by_id: Dict[int, Station] = {}
+        # Incoming-pod SKU coverage index: number of incoming pods of each station holding each SKU in stock
+        self.station_rows: Dict[str, int] = {}
+        self.sku_columns: Dict[int, int] = {}
+        self.incoming_sku_coverage = np.zeros((0, 0), dtype=np.int32)
+        self._initServiceCounters()
+
+    def _initServiceCounters(self):
+        # 由站點進出事件增量維護，不必每個 tick 重新加總 robot_ids
+        self.picking_queue_length = sum(len(station.robot_ids) for station in self.picking_stations)
+        self.service_listeners: List[Callable[[ServiceCompletion], None]] = []
+        self.recent_completions = deque(maxlen=1000)
+
+    def _ensureServiceCounters(self):
+        # 舊版狀態檔沒有這些欄位
+        if not hasattr(self, 'picking_queue_length'):
+            self._initServiceCounters()
+
+    def onQueueChanged(self, station: Station, delta: int):
+        self._ensureServiceCounters()
+        if station.isPickerStation():
+            self.picking_queue_length += delta
+
+    def getPickingQueueLength(self) -> int:
+        """所有揀貨台上的機器人數 (含服務中)"""
+        self._ensureServiceCounters()
+        return self.picking_queue_length
+
+    def addServiceListener(self, listener: Callable[[ServiceCompletion], None]):
+        """註冊服務完成事件的回呼"""
+        self._ensureServiceCounters()
+        self.service_listeners.append(listener)
+
+    def onServiceCompleted(self, station: Station, event: ServiceCompletion):
+        self._ensureServiceCounters()
+        self.recent_completions.append(event)
+        for listener in self.service_listeners:
+            listener(event)
+
+    def getServiceStatistics(self) -> Dict[int, Dict[str, float]]:
+        """各站點的排隊與服務統計，皆由計數器直接取得"""
+        return {
+            station.id: {
+                'queue_length': station.queueLength(),
+                'waiting': station.waitingCount(),
+                'in_service': station.inServiceCount(),
+                'completions': station.completions,
+                'throughput': station.getThroughput(),
+                'average_waiting_time': station.getAverageWaitingTime(),
+                'average_service_time': station.getAverageServiceTime(),
+            }
+            for station in self.getAllStations()
+        }
 
     def initStationManager(self):
         for station in self.getAllStations():
@@ -28,8 +81,36 @@ class StationManager:
     def getStationById(self, station_id):
         return self.stations_by_id[station_id]
     
-    def addStation(self, station: Station):
+    def _registerStation(self, station: Station):
         self.stations_by_id[station.id] = station
+        station.setStationManager(self)
+        self.station_rows[station.id] = len(self.station_rows)
+        self.incoming_sku_coverage = np.vstack(
+            [self.incoming_sku_coverage, np.zeros((1, self.incoming_sku_coverage.shape[1]), dtype=np.int32)])
+
+    def _getSKUColumn(self, sku):
+        column = self.sku_columns.get(sku)
+        if column is None:
+            column = len(self.sku_columns)
+            self.sku_columns[sku] = column
+            if column >= self.incoming_sku_coverage.shape[1]:
+                # grow geometrically so new SKUs are amortised O(1)
+                extra = max(64, self.incoming_sku_coverage.shape[1])
+                self.incoming_sku_coverage = np.hstack(
+                    [self.incoming_sku_coverage,
+                     np.zeros((self.incoming_sku_coverage.shape[0], extra), dtype=np.int32)])
+        return column
+
+    def updateIncomingSKUCoverage(self, station: Station, sku, delta: int):
+        """Add delta to the number of incoming pods of a station that hold a SKU in stock."""
+        row = self.station_rows.get(station.id)
+        if row is None:
+            return
+        column = self._getSKUColumn(sku)
+        self.incoming_sku_coverage[row, column] += delta
+
+    def addStation(self, station: Station):
+        self._registerStation(station)
 
         if station.isPickerStation():
             self.picking_stations.append(station)
@@ -40,13 +121,13 @@ class StationManager:
         obj = Picker(self.picker_counter, x, y, data)
         self.picker_counter += 1
         self.picking_stations.append(obj)
-        self.stations_by_id[obj.id] = obj
+        self._registerStation(obj)
     
     def createReplenishmentStation(self, x: int, y: int, data: pd.DataFrame, max_robots: int = 3):
         obj = Replenishment(self.replenishment_counter, x, y, data, max_robots)
         self.replenishment_counter += 1
         self.replenishment_stations.append(obj)
-        self.stations_by_id[obj.id] = obj
+        self._registerStation(obj)
     
     def findAvailablePickingStation(self) -> Optional[Station]:
         # Initialize the available station variable as None
@@ -107,56 +188,31 @@ class StationManager:
         return fallback_station
 
     def findHighestSimilarityStation(self, skus_in_order, pod_manager: PodManager) -> Optional[Station]:
-        available_station_rank = pd.DataFrame(columns=["station_id", "priority_score"])
-        sku_in_order_list = [i for i in skus_in_order]
-        available_station = []
-        assignStation = None
-
         # Store all available station
-        for station in self.picking_stations:
-            if len(station.order_ids) < station.max_orders:
-                available_station.append(station)
-        
+        available_station = [station for station in self.picking_stations
+                             if len(station.order_ids) < station.max_orders]
+
         # Check if more than one station is available
         if len(available_station) > 1:
-            for station in available_station:
-                # Take pod assigned to this particular station
-                station_incoming_pod = station.incoming_pod
-                station_pod_skus_set = set()
-                for pod_id in station_incoming_pod:
-                    pod = pod_manager.getPodByNumber(pod_id)
-                    if pod:
-                        pod_skus = [item for item, details in pod.skus.items() if details['current_qty'] > 0]
-                        station_pod_skus_set.update(pod_skus)
-
-                station_pod_skus_list = list(station_pod_skus_set)
-                station_pod_skus_in_order_mask = np.isin(sku_in_order_list, station_pod_skus_list)
-                station_pod_skus_in_order = np.array(sku_in_order_list)[station_pod_skus_in_order_mask]
-                similarity_score = len(station_pod_skus_in_order)
-
-                # Calculate load score (fraction of available capacity, higher is better)
-                if station.max_orders > 0:
-                    load_score = (station.max_orders - len(station.order_ids)) / station.max_orders
-                else:
-                    load_score = 0 # Should not happen for pickers, but safe check
-
-                # Combine scores (equal weight for now)
-                # priority_score = similarity_score + load_score # Old weighting
-                # New weighting: Scale load_score by max_orders to make it more comparable to similarity_score
-                priority_score = similarity_score + (station.max_orders * load_score)
-
-                available_station_rank = pd.concat([available_station_rank ,
-                                            pd.DataFrame([[station.id, priority_score]], columns=["station_id", "priority_score"])], ignore_index=True)
-        
-            available_station_rank.sort_values(by=["priority_score"], ascending=False, inplace=True)
-            available_station_rank.reset_index(drop=True, inplace=True)
-
-            if len(available_station_rank) > 0:
-                assignStation_id = available_station_rank.loc[0, "station_id"]
-                assignStation = self.getStationById(assignStation_id)
+            # Similarity: number of order SKUs held in stock by the pods already heading to each station
+            order_skus = np.zeros(self.incoming_sku_coverage.shape[1], dtype=np.int32)
+            order_columns = [self.sku_columns[sku] for sku in skus_in_order if sku in self.sku_columns]
+            order_skus[order_columns] = 1
+            rows = [self.station_rows[station.id] for station in available_station]
+            similarity_score = (self.incoming_sku_coverage[rows] > 0).astype(np.int32) @ order_skus
+
+            # Calculate load score (fraction of available capacity, higher is better)
+            max_orders = np.array([station.max_orders for station in available_station], dtype=float)
+            order_count = np.array([len(station.order_ids) for station in available_station], dtype=float)
+            load_score = np.divide(max_orders - order_count, max_orders,
+                                   out=np.zeros_like(max_orders), where=max_orders > 0)
+
+            # New weighting: Scale load_score by max_orders to make it more comparable to similarity_score
+            priority_score = similarity_score + (max_orders * load_score)
+
+            # ties go to the first station, as with the previous stable ranking
+            return available_station[int(np.argmax(priority_score))]
         elif len(available_station) == 1:
-            assignStation = available_station[0]
-
-        return assignStation
+            return available_station[0]
 
-    
+        return None
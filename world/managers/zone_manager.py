@@ -1,18 +1,79 @@
 from __future__ import annotations
-from typing import List, TYPE_CHECKING
+from typing import List, Optional, TYPE_CHECKING
 from world.entities.zone import Zone
 if TYPE_CHECKING:
     from world.warehouse import Warehouse
+    from lib.types.directed_graph import DirectedGraph
+
 class ZoneManager:
-    def __init__(self, warehouse: Warehouse):
+    def __init__(self, warehouse: Warehouse, zoning_interval: int = 50, zoning_method: str = "miniBatchKMeans"):
         self.warehouse = warehouse
         self.zones: List[Zone] = []
         self.zone_counter = 0
-    
+        # zoning service: re-cluster robots once every zoning_interval ticks
+        self.zoning_interval = zoning_interval
+        self.zoning_method = zoning_method
+        self.zone_penalty_threshold = 5
+        self.current_zone: Optional[Zone] = None
+        self.last_zoning_tick = None
+        self.node_penalties = {}  # graph key -> per-node penalty array
+        self.penalty_epoch = 0  # bumped whenever the penalties change, used as a route cache key
+
     def createZone(self, robots_location, warehouse_size, methods):
-        obj = Zone(robots_location, warehouse_size, methods)
+        obj = Zone(robots_location, warehouse_size, methods, geometry=self.warehouse.geometry)
         self.zones.append(obj)
         self.zone_counter += 1
         return obj
-    
 
+    def setZoningInterval(self, zoning_interval: int):
+        self.zoning_interval = zoning_interval
+        self.last_zoning_tick = None
+
+    def isZoningDue(self, tick):
+        return self.last_zoning_tick is None or tick - self.last_zoning_tick >= self.zoning_interval
+
+    def refreshZones(self, tick):
+        """Cluster the robots into zones and reset the cached node penalties."""
+        robots_location = []
+        robots_idle_time = []
+        for robot in self.warehouse.robot_manager.getAllRobots():
+            if robot.current_state == 'station_processing':
+                continue
+            robots_location.append([robot.pos_x, robot.pos_y])
+            robots_idle_time.append(robot.idle_time)
+
+        init_centroids = self.current_zone.centroids if self.current_zone is not None else None
+        zone = Zone(robots_location, self.warehouse.getWarehouseSize(), self.zoning_method, init_centroids=init_centroids,
+                    geometry=self.warehouse.geometry)
+        # keep the previous zones when there are too few robots to cluster
+        if len(zone.boundaries) == 0 and self.current_zone is not None:
+            zone = self.current_zone
+        zone.calculatePenaltyArray(robots_location, robots_idle_time, self.warehouse.getWarehouseSize(),
+                                   threshold=self.zone_penalty_threshold)
+
+        self.current_zone = zone
+        self.last_zoning_tick = tick
+        self.node_penalties = {}
+        self.penalty_epoch += 1
+        self.zone_counter += 1
+        return zone
+
+    def getNodePenalties(self, graph: DirectedGraph, tick=None):
+        """Return the cached per-node penalty array of a graph, re-clustering when due.
+
+        Args:
+            graph (DirectedGraph): graph that will be routed on.
+            tick (int, optional): current tick, defaults to the warehouse tick.
+
+        Returns:
+            np.ndarray: penalty of each node aligned with graph.getNodeIndex(), NaN for no penalty
+        """
+        tick = self.warehouse._tick if tick is None else tick
+        if self.isZoningDue(tick):
+            self.refreshZones(tick)
+
+        node_penalties = self.node_penalties.get(graph.key)
+        if node_penalties is None or len(node_penalties) != len(graph.getNodeIndex()):
+            node_penalties = self.current_zone.nodePenaltyVector(graph.getNodeCoordinates())
+            self.node_penalties[graph.key] = node_penalties
+        return node_penalties
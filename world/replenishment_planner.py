@@ -0,0 +1,238 @@
+"""
+預測式補貨規劃器
+原本的補貨只在揀貨完成、SKU 或貨架已低於門檻時才臨時建立工作，補貨台忙碌時就放棄。
+這裡改成每隔 planning_interval 秒預測各貨架在 horizon 秒內的庫存：
+
+- 需求 = 未完成訂單尚未分配的數量 (backlog) + 指數平滑的 SKU 到達率 x horizon
+- SKU 的需求依各貨架的現有庫存比例分攤到貨架
+- 預測庫存低於門檻的 SKU 達一半以上 (與 Pod.isNeedReplenishment 相同規則) 的閒置貨架列為補貨候選，
+  依缺口大小排序，按補貨台剩餘容量成批建立補貨工作
+
+規劃出的工作在補貨台服務完成時才補滿貨架 (透過 StationManager 的服務完成事件)。
+預設關閉，關閉時不影響原本的補貨流程；以 Warehouse.configureFeatures(predictive_replenishment=True)
+或 train.py / evaluate.py 的 --predictive_replenishment 開啟。
+
+補貨的前置時間主要來自兩處 (預設版面、20 台機器人實測)：
+- 排在 job_queue 末端時要等揀貨工作消化，約 280 秒才有機器人接手，因此規劃的工作插在佇列前端
+- 補貨台一次只服務一台機器人，每個貨架約 80 x (SKU 數 + 1) 步 (約 130 秒)，
+  多排的機器人只是停在 station_processing 等待，因此每個補貨台同時最多 max_jobs_per_station (2) 個規劃工作：
+  一台服務中、一台在路上
+在這兩個限制下前置時間約 180-250 秒，horizon 預設 300 秒以涵蓋前置時間；batch_size 不超過補貨台數量即可。
+吞吐量的上限是補貨台的服務時間：6 個缺貨貨架在兩個補貨台約 500 秒補完。
+"""
+from typing import Dict, List, Tuple
+import numpy as np
+
+from world.entities.job import Job
+from world.entities.pod import Pod
+from world.entities.station import ServiceCompletion, Station
+
+
+class ReplenishmentPlanner:
+    """依訂單積壓與到達率預測缺貨，提前把貨架排進補貨台"""
+
+    def __init__(self, warehouse, planning_interval: int = 10, horizon: float = 300.0,
+                 smoothing: float = 0.3, batch_size: int = 2, max_jobs_per_station: int = 2):
+        """
+        Args:
+            planning_interval: 每隔幾秒規劃一次
+            horizon: 預測的時間範圍 (秒)，應涵蓋補貨前置時間
+            smoothing: SKU 到達率的指數平滑係數 (0-1]
+            batch_size: 每次規劃最多新增的補貨工作數
+            max_jobs_per_station: 每個補貨台同時進行中的規劃工作上限
+        """
+        self.warehouse = warehouse
+        self.enabled = False
+        self.planning_interval = planning_interval
+        self.horizon = horizon
+        self.smoothing = smoothing
+        self.batch_size = batch_size
+        self.max_jobs_per_station = max_jobs_per_station
+        # SKU -> 到達率陣列索引
+        self.sku_index: Dict[int, int] = {}
+        self.arrival_rates = np.zeros(0, dtype=np.float64)
+        self.window_quantities = np.zeros(0, dtype=np.float64)
+        self.last_plan_tick = None
+        # job id -> (Job, 補貨台 id)，補貨台服務完成前都算在該站的負載內
+        self.pending_jobs: Dict[int, Tuple[Job, str]] = {}
+        self.planned_jobs = 0
+        self.completed_jobs = 0
+        warehouse.station_manager.addServiceListener(self.onServiceCompleted)
+
+    def setEnabled(self, enabled: bool):
+        self.enabled = enabled
+        if not enabled:
+            self.reset()
+
+    def reset(self):
+        """清除到達率估計 (已排入的工作照常完成)"""
+        self.arrival_rates[:] = 0
+        self.window_quantities[:] = 0
+        self.last_plan_tick = None
+
+    def _skuColumn(self, sku) -> int:
+        column = self.sku_index.get(sku)
+        if column is None:
+            column = len(self.sku_index)
+            self.sku_index[sku] = column
+            if column >= len(self.arrival_rates):
+                extra = max(64, len(self.arrival_rates))
+                self.arrival_rates = np.concatenate([self.arrival_rates, np.zeros(extra)])
+                self.window_quantities = np.concatenate([self.window_quantities, np.zeros(extra)])
+        return column
+
+    # === 資料來源 ===
+
+    def observeOrders(self, new_orders):
+        """記錄新到達的訂單 (含 item_id、item_quantity 欄位的 DataFrame)"""
+        if not self.enabled or len(new_orders) == 0:
+            return
+        quantities = new_orders.groupby('item_id')['item_quantity'].sum()
+        columns = [self._skuColumn(sku) for sku in quantities.index]
+        np.add.at(self.window_quantities, columns, quantities.to_numpy(dtype=np.float64))
+
+    def onServiceCompleted(self, event: ServiceCompletion):
+        """補貨台服務完成時補滿規劃的貨架"""
+        pending = self.pending_jobs.pop(event.job_id, None)
+        if pending is None:
+            return
+        job, _ = pending
+        if not job.is_finished:
+            self.warehouse.finishTaskInJob(job)
+        self.completed_jobs += 1
+
+    # === 預測 ===
+
+    def _backlogDemand(self) -> Dict[int, float]:
+        """未完成訂單中尚未分配到貨架的數量 (已分配的部分已從貨架庫存扣除)"""
+        demand: Dict[int, float] = {}
+        for order in self.warehouse.order_manager.unfinished_orders:
+            for sku, quantity in order.getRemainingSKU().items():
+                demand[sku] = demand.get(sku, 0) + quantity
+        return demand
+
+    def stockOutRisk(self, pods: List[Pod]) -> np.ndarray:
+        """
+        預測 horizon 秒後各貨架的缺貨程度
+
+        Returns:
+            ndarray: 每個貨架預測低於門檻的 SKU 缺口總和 (以容量比例計)；
+                     預測低於門檻的 SKU 未達一半的貨架為 0
+        """
+        if len(pods) == 0:
+            return np.zeros(0)
+        backlog = self._backlogDemand()
+        pod_rows, skus, current, limit, threshold = [], [], [], [], []
+        for row, pod in enumerate(pods):
+            for sku, details in pod.skus.items():
+                pod_rows.append(row)
+                skus.append(sku)
+                current.append(details['current_qty'])
+                limit.append(details['limit_qty'])
+                threshold.append(details['threshold'])
+        if not skus:
+            return np.zeros(len(pods))
+        pod_rows = np.asarray(pod_rows)
+        current = np.maximum(np.asarray(current, dtype=np.float64), 0)
+        limit = np.maximum(np.asarray(limit, dtype=np.float64), 1)
+        threshold = np.asarray(threshold, dtype=np.float64)
+
+        # SKU 需求依全倉 (所有貨架) 的現有庫存比例分攤
+        sku_to_pods = self.warehouse.pod_manager.sku_to_pods
+        total_stock = {sku: sum(max(pod.skus[sku]['current_qty'], 0) for pod in sku_to_pods.get(sku, ()))
+                       for sku in set(skus)}
+        demand = np.array([backlog.get(sku, 0) + self._arrivalRate(sku) * self.horizon for sku in skus])
+        stock = np.array([total_stock.get(sku, 0) for sku in skus], dtype=np.float64)
+        share = np.divide(current, stock, out=np.ones_like(current), where=stock > 0)
+        projected = (current - demand * share) / limit
+
+        deficit = np.maximum(threshold - projected, 0)
+        below = projected <= threshold
+        below_count = np.bincount(pod_rows, weights=below, minlength=len(pods))
+        sku_count = np.bincount(pod_rows, minlength=len(pods))
+        risk = np.bincount(pod_rows, weights=deficit, minlength=len(pods))
+        return np.where(below_count >= sku_count / 2, risk, 0.0)
+
+    def _arrivalRate(self, sku) -> float:
+        column = self.sku_index.get(sku)
+        return self.arrival_rates[column] if column is not None else 0.0
+
+    # === 排程 ===
+
+    def _stationLoad(self, station: Station) -> int:
+        """站點路徑上的機器人，加上已規劃但機器人尚未抵達的工作"""
+        robot_manager = self.warehouse.robot_manager
+        arrived = set()
+        for robot_id in station.robot_ids:
+            robot = robot_manager.getRobotByName(robot_id)
+            if robot is not None and robot.job is not None:
+                arrived.add(robot.job.id)
+        on_the_way = sum(1 for job_id, (_, station_id) in self.pending_jobs.items()
+                         if station_id == station.id and job_id not in arrived)
+        return len(station.robot_ids) + on_the_way
+
+    def _freeCapacity(self) -> Dict[str, int]:
+        planned = {}
+        for _, station_id in self.pending_jobs.values():
+            planned[station_id] = planned.get(station_id, 0) + 1
+        return {station.id: min(station.max_robots - self._stationLoad(station),
+                                self.max_jobs_per_station - planned.get(station.id, 0))
+                for station in self.warehouse.station_manager.replenishment_stations}
+
+    def _enqueue(self, job: Job):
+        """插在佇列前端 (排在先前規劃的工作之後)，不必等前面的揀貨工作都被接手"""
+        job_queue = self.warehouse.job_queue
+        position = 0
+        while position < len(job_queue) and getattr(job_queue[position], 'finish_at_station', False):
+            position += 1
+        job_queue.insert(position, job)
+
+    def plan(self) -> List[Job]:
+        """預測缺貨並依補貨台剩餘容量建立一批補貨工作"""
+        # 機器人中途放棄 (工作已結束) 的項目不再佔用容量
+        self.pending_jobs = {job_id: pending for job_id, pending in self.pending_jobs.items()
+                             if not pending[0].is_finished}
+        capacity = self._freeCapacity()
+        slots = min(self.batch_size, sum(max(free, 0) for free in capacity.values()))
+        if slots <= 0:
+            return []
+
+        planned_pods = {(job.pod_coordinate.x, job.pod_coordinate.y) for job, _ in self.pending_jobs.values()}
+        candidates = [pod for pod in self.warehouse.pod_manager.getAllPods()
+                      if pod.is_idle and (pod.pos_x, pod.pos_y) not in planned_pods]
+        risk = self.stockOutRisk(candidates)
+        ranked = [candidates[i] for i in np.argsort(-risk, kind='stable')[:slots] if risk[i] > 0]
+
+        jobs = []
+        for pod in ranked:
+            station_id = max(capacity, key=capacity.get)
+            capacity[station_id] -= 1
+            job = self.warehouse.job_manager.createJob(pod.coordinate, station_id=station_id)
+            job.addReplenishmentTask(pod)
+            job.finish_at_station = True
+            self.warehouse.pod_manager.setPodNotAvailable(pod.coordinate)
+            self._enqueue(job)
+            self.pending_jobs[job.id] = (job, station_id)
+            jobs.append(job)
+        self.planned_jobs += len(jobs)
+        return jobs
+
+    def update(self, tick: int) -> List[Job]:
+        """每隔 planning_interval 秒更新到達率並規劃補貨"""
+        if not self.enabled:
+            return []
+        if self.last_plan_tick is not None and tick - self.last_plan_tick < self.planning_interval:
+            return []
+        elapsed = self.planning_interval if self.last_plan_tick is None else tick - self.last_plan_tick
+        self.arrival_rates = ((1 - self.smoothing) * self.arrival_rates
+                              + self.smoothing * self.window_quantities / max(elapsed, 1))
+        self.window_quantities[:] = 0
+        self.last_plan_tick = tick
+        return self.plan()
+
+    def getStatistics(self) -> Dict[str, int]:
+        return {
+            'planned_jobs': self.planned_jobs,
+            'completed_jobs': self.completed_jobs,
+            'pending_jobs': len(self.pending_jobs),
+        }
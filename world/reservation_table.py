@@ -0,0 +1,212 @@
+"""
+時空預約表 (reservation table)
+在機器人取得新路徑時預約前方 window 格的時空區間，風格上類似 windowed hierarchical cooperative A* (WHCA*)
+
+- 空間路徑仍由 RouteService 提供 (hierarchical 的抽象層)，預約表只決定時間：
+  以名目行駛時間推估每一格的進出時間，找出與其他機器人預約不衝突的最早出發時間，
+  機器人在原地等到出發時間再起步，而不是在走廊中途急停。
+- 機器人走過視窗的一半時，從目前位置預約下一個視窗。
+- 預約有到期時間，機器人延遲時不會永久佔住格子；未預約到的情況由原本的逐 tick 衝突處理接手。
+
+時間單位為模擬步數 (每次 Warehouse.tick 為一步)。預設關閉。
+"""
+import math
+from typing import Dict, List, Optional, Tuple
+
+from lib.constant import TICK_TO_SECOND
+
+Cell = Tuple[int, int]
+
+
+class ReservationTable:
+    """多機器人協同路徑規劃的時空預約表"""
+
+    def __init__(self, warehouse, window: int = 8, max_departure_delay: int = 15, slack: int = 2):
+        """
+        Args:
+            window: 每次預約的格數
+            max_departure_delay: 最多延後出發幾步，超過時不預約，交給即時衝突處理
+            slack: 每段預約前後保留的緩衝步數，吸收加減速造成的時間誤差
+        """
+        self.warehouse = warehouse
+        self.enabled = False
+        self.window = window
+        self.max_departure_delay = max_departure_delay
+        self.slack = slack
+        self.current_step = 0
+        # 格子 -> [(開始步, 結束步, 機器人名稱)]
+        self.reservations: Dict[Cell, List[Tuple[int, int, str]]] = {}
+        # 機器人名稱 -> 已預約的格子
+        self.robot_cells: Dict[str, List[Cell]] = {}
+        # 機器人名稱 -> 在這一步之前不出發
+        self.departure_steps: Dict[str, int] = {}
+        # 機器人名稱 -> (路徑格子列表, 已預約到的索引)
+        self.robot_routes: Dict[str, Tuple[List[Cell], int]] = {}
+        self.planned = 0
+        self.delayed = 0
+        self.unreserved = 0
+
+    def setEnabled(self, enabled: bool):
+        self.enabled = enabled
+        if not enabled:
+            self.reservations.clear()
+            self.robot_cells.clear()
+            self.departure_steps.clear()
+            self.robot_routes.clear()
+
+    def step(self):
+        """每個 Warehouse.tick 呼叫一次"""
+        self.current_step += 1
+
+    # === 時間估計 ===
+
+    @staticmethod
+    def cellSteps(max_speed: float) -> int:
+        """以最高速度通過一格所需的步數"""
+        return max(1, math.ceil(1 / (max_speed * TICK_TO_SECOND)))
+
+    @staticmethod
+    def _heading(a: Cell, b: Cell):
+        if a[0] == b[0]:
+            return 0 if b[1] > a[1] else 180
+        return 90 if b[0] > a[0] else 270
+
+    def _schedule(self, cells: List[Cell], heading, cell_steps: int, turn_steps: int) -> List[Tuple[Cell, int, int]]:
+        """估計每一格相對於出發時間的 (進入, 離開) 步數，第一格為目前所在格"""
+        schedule = []
+        enter = 0
+        for i, cell in enumerate(cells):
+            leave = enter
+            if i + 1 < len(cells):
+                next_heading = self._heading(cell, cells[i + 1])
+                if heading is not None and next_heading != heading:
+                    leave += turn_steps * (min(abs(next_heading - heading), 360 - abs(next_heading - heading)) // 90)
+                heading = next_heading
+                leave += cell_steps
+            else:
+                leave += cell_steps
+            schedule.append((cell, enter, leave))
+            enter = leave
+        return schedule
+
+    # === 預約 ===
+
+    def _isFree(self, robot_name: str, cell: Cell, start: int, end: int) -> bool:
+        for other_start, other_end, other_robot in self.reservations.get(cell, ()):
+            if other_robot != robot_name and other_start <= end and start <= other_end:
+                return False
+        return True
+
+    def _reserve(self, robot_name: str, cell: Cell, start: int, end: int):
+        intervals = self.reservations.setdefault(cell, [])
+        # 順便清掉已到期的預約
+        intervals[:] = [interval for interval in intervals if interval[1] >= self.current_step]
+        intervals.append((start, end, robot_name))
+        self.robot_cells.setdefault(robot_name, []).append(cell)
+
+    def release(self, robot_name: str):
+        """釋放機器人的所有預約"""
+        for cell in self.robot_cells.pop(robot_name, ()):
+            intervals = self.reservations.get(cell)
+            if intervals:
+                intervals[:] = [interval for interval in intervals if interval[2] != robot_name]
+                if not intervals:
+                    del self.reservations[cell]
+        self.departure_steps.pop(robot_name, None)
+
+    def planRoute(self, robot, route_nodes: Optional[List[str]]):
+        """機器人取得新路徑時呼叫，預約第一個視窗"""
+        if not self.enabled:
+            return
+        robot_name = robot.robotName()
+        self.release(robot_name)
+        self.robot_routes.pop(robot_name, None)
+        if not route_nodes or len(route_nodes) < 2:
+            return
+        cells = [tuple(map(int, node.split(','))) for node in route_nodes]
+        self.robot_routes[robot_name] = (cells, 0)
+        self._reserveWindow(robot, 0, self.max_departure_delay)
+
+    def _reserveWindow(self, robot, start_index: int, max_delay: int):
+        robot_name = robot.robotName()
+        cells, _ = self.robot_routes[robot_name]
+        window_cells = cells[start_index:start_index + self.window + 1]
+        schedule = self._schedule(window_cells, robot.heading, self.cellSteps(robot.MAXIMUM_SPEED),
+                                  robot.delay_per_task)
+
+        # 找出整個視窗都不衝突的最早出發時間
+        now = self.current_step
+        for delay in range(max_delay + 1):
+            departure = now + delay
+            if all(self._isFree(robot_name, cell, departure + enter - self.slack, departure + leave + self.slack)
+                   for cell, enter, leave in schedule):
+                break
+        else:
+            self.unreserved += 1
+            self.robot_routes[robot_name] = (cells, start_index + len(window_cells) - 1)
+            return
+
+        self.release(robot_name)
+        for cell, enter, leave in schedule:
+            # 目前所在格從現在起就被佔用
+            start = now if enter == 0 else departure + enter - self.slack
+            self._reserve(robot_name, cell, start, departure + leave + self.slack)
+        if delay > 0:
+            self.departure_steps[robot_name] = departure
+            self.delayed += 1
+        self.planned += 1
+        self.robot_routes[robot_name] = (cells, start_index + len(window_cells) - 1)
+
+    def onCellEntered(self, robot, x: int, y: int):
+        """機器人換格時呼叫，走過視窗一半時預約下一個視窗"""
+        if not self.enabled:
+            return
+        robot_name = robot.robotName()
+        route = self.robot_routes.get(robot_name)
+        if route is None:
+            return
+        cells, reserved_until = route
+        cell = (x, y)
+        try:
+            index = cells.index(cell)
+        except ValueError:
+            # 已離開規劃的路徑，交給即時衝突處理直到下一次規劃
+            self.release(robot_name)
+            self.robot_routes.pop(robot_name, None)
+            return
+        if index >= len(cells) - 1:
+            self.release(robot_name)
+            self.robot_routes.pop(robot_name, None)
+        elif index >= reserved_until - self.window // 2:
+            # 行進中不延後出發，預約不到時交給即時衝突處理
+            self._reserveWindow(robot, index, 0)
+
+    # === 查詢 ===
+
+    def mustWait(self, robot, next_cell: Cell) -> bool:
+        """
+        靜止的機器人是否應繼續停在原地
+
+        尚未到預約的出發時間，或下一格此刻被其他機器人預約而自己沒有預約時為 True。
+        行進中的機器人不在這裡攔下，避免造成額外的急停。
+        """
+        if not self.enabled or robot.velocity != 0:
+            return False
+        robot_name = robot.robotName()
+        departure = self.departure_steps.get(robot_name)
+        if departure is not None:
+            if self.current_step < departure:
+                return True
+            del self.departure_steps[robot_name]
+
+        now = self.current_step
+        holders = [other for start, end, other in self.reservations.get(next_cell, ()) if start <= now <= end]
+        return bool(holders) and robot_name not in holders
+
+    def getStats(self):
+        return {
+            'planned': self.planned,
+            'delayed': self.delayed,
+            'unreserved': self.unreserved,
+            'reserved_cells': len(self.reservations)
+        }
@@ -0,0 +1,209 @@
+"""
+路徑服務
+快取機器人的最短路徑，並在重新規劃時只修補被阻擋的路段
+
+大部分路段會重複出現（儲位 → 揀貨台入口、揀貨台 → 儲位），
+快取以 (圖, 起點, 終點, 圖版本, 懲罰版本, 擁塞成本版本) 為鍵。
+邊權重增加時只使經過該邊的路徑失效；新增邊或權重降低可能產生更短的路徑，整張圖的快取一起失效。
+"""
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from lib.types.directed_graph import DirectedGraph
+
+# 修補時在目前位置之後搜尋阻擋節點的範圍
+REPAIR_LOOKAHEAD = 5
+# 避開節點的額外成本，與 DirectedGraph.dijkstra / dijkstraModified 相同
+AVOID_COST = 1000
+ZONING_AVOID_COST = 10000
+
+
+class RouteService:
+    """機器人路徑快取與路段修補"""
+
+    def __init__(self, warehouse, max_entries: int = 20000):
+        self.warehouse = warehouse
+        self.max_entries = max_entries
+        self.routes: "OrderedDict[tuple, List[str]]" = OrderedDict()
+        # 圖 key -> 快取版本，整張圖失效時遞增
+        self.graph_epochs: Dict[str, int] = {}
+        # 圖 key -> {邊 -> 使用該邊的快取鍵}
+        self.edge_routes: Dict[str, Dict[Tuple[str, str], Set[tuple]]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.repairs = 0
+        self.failed_repairs = 0
+
+    # === 快取 ===
+
+    def _penaltyEpoch(self):
+        if not self.warehouse.zoning:
+            return None
+        return self.warehouse.zone_manager.penalty_epoch
+
+    def _cacheKey(self, graph: "DirectedGraph", start: str, end: str):
+        graph.addEdgeListener(self)
+        return (graph.key, start, end, self.graph_epochs.get(graph.key, 0), self._penaltyEpoch(),
+                self.warehouse.congestion_cost_manager.getCostEpoch())
+
+    def _nodePenalties(self, graph: "DirectedGraph"):
+        if not self.warehouse.zoning:
+            return None
+        # zones are re-clustered by the zone manager once per zoning interval
+        return self.warehouse.zone_manager.getNodePenalties(graph)
+
+    def _avoidCost(self):
+        return ZONING_AVOID_COST if self.warehouse.zoning else AVOID_COST
+
+    def _computeRoute(self, graph: "DirectedGraph", start: str, end: str, avoid=None):
+        node_penalties = self._nodePenalties(graph)
+        edge_costs = self.warehouse.congestion_cost_manager.getEdgeCostFunction()
+        if node_penalties is None and edge_costs is None:
+            return graph.dijkstra(start, end, avoid)  # This one is baseline
+        return graph.dijkstraWithNodePenalties(start, end, node_penalties, avoid, edge_costs, self._avoidCost())
+
+    def getRoute(self, graph: "DirectedGraph", start: str, end: str, avoid=None) -> Optional[List[str]]:
+        """
+        取得從 start 到 end 的路徑
+
+        有避開節點時路徑取決於當下的機器人位置，不使用快取。
+
+        Returns:
+            list: 節點 key 的列表，找不到路徑時為 None
+        """
+        if avoid:
+            return self._computeRoute(graph, start, end, avoid)
+
+        if self.warehouse.zoning:
+            # 先確認分區是否需要更新，懲罰版本才會是最新的
+            self.warehouse.zone_manager.getNodePenalties(graph)
+
+        key = self._cacheKey(graph, start, end)
+        route = self.routes.get(key)
+        if route is not None:
+            self.routes.move_to_end(key)
+            self.hits += 1
+            return list(route)
+
+        self.misses += 1
+        route = self._computeRoute(graph, start, end)
+        if route is not None:
+            self._store(key, route)
+            return list(route)
+        return None
+
+    def _store(self, key, route: List[str]):
+        self.routes[key] = route
+        edge_routes = self.edge_routes.setdefault(key[0], {})
+        for edge in zip(route, route[1:]):
+            edge_routes.setdefault(edge, set()).add(key)
+        while len(self.routes) > self.max_entries:
+            self._discard(next(iter(self.routes)))
+
+    def _discard(self, key):
+        """移除快取的路徑，並從其經過的每條邊的索引中移除"""
+        route = self.routes.pop(key, None)
+        if route is None:
+            return
+        edge_routes = self.edge_routes.get(key[0])
+        if edge_routes is None:
+            return
+        for edge in zip(route, route[1:]):
+            keys = edge_routes.get(edge)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del edge_routes[edge]
+
+    # === 失效 ===
+
+    def invalidateGraph(self, graph_key: str):
+        """使整張圖的快取失效"""
+        self.graph_epochs[graph_key] = self.graph_epochs.get(graph_key, 0) + 1
+        for key in [key for key in self.routes if key[0] == graph_key]:
+            del self.routes[key]
+        self.edge_routes.pop(graph_key, None)
+
+    def invalidateEdge(self, graph_key: str, start: str, end: str):
+        """使經過某條邊的路徑失效"""
+        keys = self.edge_routes.get(graph_key, {}).get((start, end), ())
+        for key in list(keys):
+            self._discard(key)
+
+    def onEdgeChanged(self, graph: "DirectedGraph", start: str, end: str, old_weight, new_weight):
+        """DirectedGraph 的邊變更通知"""
+        if old_weight is not None and new_weight is not None and new_weight >= old_weight:
+            # 權重增加只會讓經過此邊的路徑變差
+            self.invalidateEdge(graph.key, start, end)
+        else:
+            self.invalidateGraph(graph.key)
+
+    # === 修補 ===
+
+    def repairRoute(self, graph: "DirectedGraph", route: List[str], start: str, avoid) -> Optional[List[str]]:
+        """
+        只重新規劃路徑中被阻擋的路段
+
+        從目前位置繞過前方被阻擋的節點，接回原路徑，其餘路段保持不變。
+
+        Args:
+            route: 原本的完整路徑 (節點 key 列表)
+            start: 目前所在節點
+            avoid: 需要避開的節點
+
+        Returns:
+            list: 修補後從 start 到原終點的路徑，無法修補時為 None
+        """
+        if not route or start not in route:
+            self.failed_repairs += 1
+            return None
+
+        current = route.index(start)
+        remaining = route[current + 1:]
+        if not remaining:
+            self.failed_repairs += 1
+            return None
+
+        # 找出前方最遠的阻擋節點，沒有時視為下一個節點被阻擋
+        avoid = set(avoid) if avoid else set()
+        lookahead = remaining[:REPAIR_LOOKAHEAD]
+        blocked = max((i for i, node in enumerate(lookahead) if node in avoid), default=0)
+
+        rejoin = blocked + 1
+        while rejoin < len(remaining) and remaining[rejoin] in avoid:
+            rejoin += 1
+        if rejoin >= len(remaining):
+            self.failed_repairs += 1
+            return None
+
+        detour_avoid = avoid.union(remaining[:rejoin])
+        target = remaining[rejoin]
+        detour = graph.dijkstraWithNodePenalties(start, target, self._nodePenalties(graph), detour_avoid,
+                                                 self.warehouse.congestion_cost_manager.getEdgeCostFunction(),
+                                                 self._avoidCost())
+        if detour is None:
+            self.failed_repairs += 1
+            return None
+
+        # 繞行路段若提前接上原路徑，直接從該點接回，避免繞圈
+        tail = remaining[rejoin + 1:]
+        tail_index = {node: i for i, node in enumerate(tail)}
+        for i, node in enumerate(detour):
+            if node in tail_index:
+                self.repairs += 1
+                return detour[:i] + tail[tail_index[node]:]
+
+        self.repairs += 1
+        return detour + tail
+
+    def getStats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'repairs': self.repairs,
+            'failed_repairs': self.failed_repairs,
+            'cached_routes': len(self.routes)
+        }
@@ -1,23 +1,75 @@
 """
 V7.0: 速度限制管理器
 管理整條路的限速，不只是單個路口
+
+限速區域以「區域柵格」表示：每個格子預先對應到它所屬的水平走廊與垂直走廊的區域ID，
+各區域的限速係數存放在一張區域表中。NERL 限速動作只更新區域表，
+套用到機器人時以一次陣列索引 (gather) 取得所有機器人的限速。
 """
 from typing import Dict, List, Tuple, Optional
+import numpy as np
 from world.entities.robot import Robot
 from world.entities.intersection import Intersection
 
+# 區域表中代表「不在任何限速區域」的值
+NO_SPEED_LIMIT = np.inf
+
 class SpeedLimitManager:
     """管理倉庫中的速度限制區域"""
-    
+
     def __init__(self, warehouse):
         self.warehouse = warehouse
         # 限速區域：(x1, y1, x2, y2) -> speed_factor
         self.speed_zones: Dict[Tuple[int, int, int, int], float] = {}
-        
+        # 區域柵格：zone_raster[0, x, y] 為水平走廊區域ID，zone_raster[1, x, y] 為垂直走廊區域ID
+        self.zone_raster: Optional[np.ndarray] = None
+        # 區域表：zone_id -> speed_factor，未限速的區域為 NO_SPEED_LIMIT
+        self.zone_speed_factors: Optional[np.ndarray] = None
+        # 區域表變更後，下一次 update 需要重新套用
+        self._zones_dirty = False
+        self._build_zone_raster()
+
+    def _grid_size(self) -> int:
+        return self.warehouse.landscape.dimension + 1
+
+    def _build_zone_raster(self):
+        """預先計算每個格子所屬的走廊區域ID"""
+        size = self._grid_size()
+        xs, ys = np.meshgrid(np.arange(size), np.arange(size), indexing='ij')
+        # 水平走廊 y 的區域ID為 y；垂直走廊 x 的區域ID為 size + x
+        self.zone_raster = np.stack([ys, size + xs]).astype(np.int32)
+        self.zone_speed_factors = np.full(2 * size, NO_SPEED_LIMIT, dtype=np.float64)
+        for zone, speed_factor in self.speed_zones.items():
+            self._write_zone(zone, speed_factor)
+
+    def _ensure_zone_raster(self):
+        # 舊版狀態檔或倉庫尺寸改變時重建柵格
+        if (getattr(self, 'zone_raster', None) is None
+                or self.zone_raster.shape[1] != self._grid_size()):
+            self._build_zone_raster()
+
+    def _zone_id(self, zone: Tuple[int, int, int, int]) -> Optional[int]:
+        """將走廊矩形轉換為區域ID，非走廊形狀的矩形回傳 None"""
+        x1, y1, x2, y2 = zone
+        size = self._grid_size()
+        if y1 == y2 and 0 <= y1 < size:
+            return y1
+        if x1 == x2 and 0 <= x1 < size:
+            return size + x1
+        return None
+
+    def _write_zone(self, zone: Tuple[int, int, int, int], speed_factor: float):
+        zone_id = self._zone_id(zone)
+        if zone_id is not None:
+            self.zone_speed_factors[zone_id] = speed_factor
+            self._zones_dirty = True
+
     def set_corridor_speed_limit(self, intersection_id: int, speed_factor: float, corridor_type: str = "both"):
         """
         設定通過特定路口的整條走廊的限速
-        
+
+        只更新區域表，實際套用到機器人由 update() 以向量化方式完成。
+
         Args:
             intersection_id: 路口ID
             speed_factor: 速度係數 (0.3-1.0)
@@ -27,30 +79,32 @@ class SpeedLimitManager:
         intersection = self.warehouse.intersection_manager.intersection_id_to_intersection.get(intersection_id)
         if not intersection:
             return
-            
+
+        self._ensure_zone_raster()
         x, y = intersection.pos_x, intersection.pos_y
-        
+        last_cell = self._grid_size() - 1
+
         # 設定水平走廊（整條橫向道路）
         if corridor_type in ["horizontal", "both"]:
-            # 假設倉庫寬度為60
-            self.speed_zones[(0, y, 60, y)] = speed_factor
-            
+            zone = (0, y, last_cell, y)
+            self.speed_zones[zone] = speed_factor
+            self._write_zone(zone, speed_factor)
+
         # 設定垂直走廊（整條縱向道路）
         if corridor_type in ["vertical", "both"]:
-            # 假設倉庫高度為60
-            self.speed_zones[(x, 0, x, 60)] = speed_factor
-            
-        # 應用限速到所有在該區域的機器人
-        self._apply_speed_limits()
-    
+            zone = (x, 0, x, last_cell)
+            self.speed_zones[zone] = speed_factor
+            self._write_zone(zone, speed_factor)
+
     def remove_corridor_speed_limit(self, intersection_id: int, corridor_type: str = "both"):
         """移除特定走廊的限速"""
         intersection = self.warehouse.intersection_manager.intersection_id_to_intersection.get(intersection_id)
         if not intersection:
             return
-            
+
+        self._ensure_zone_raster()
         x, y = intersection.pos_x, intersection.pos_y
-        
+
         # 移除對應的限速區域
         zones_to_remove = []
         for zone in self.speed_zones:
@@ -59,35 +113,47 @@ class SpeedLimitManager:
                 zones_to_remove.append(zone)
             if corridor_type in ["vertical", "both"] and x1 == x == x2:
                 zones_to_remove.append(zone)
-                
+
         for zone in zones_to_remove:
-            del self.speed_zones[zone]
-            
-        # 重新應用限速（可能需要恢復某些機器人的速度）
-        self._apply_speed_limits()
-    
+            if zone in self.speed_zones:
+                del self.speed_zones[zone]
+                self._write_zone(zone, NO_SPEED_LIMIT)
+
+    def get_robot_speed_factors(self, robots: List[Robot]) -> np.ndarray:
+        """
+        以一次陣列索引取得每個機器人所在格子的最嚴格限速
+
+        Returns:
+            np.ndarray: 每個機器人的限速係數，不在限速區域內為 NO_SPEED_LIMIT
+        """
+        self._ensure_zone_raster()
+        if not robots:
+            return np.empty(0, dtype=np.float64)
+
+        last_cell = self._grid_size() - 1
+        robot_x = np.fromiter((robot.pos_x for robot in robots), dtype=np.float64, count=len(robots))
+        robot_y = np.fromiter((robot.pos_y for robot in robots), dtype=np.float64, count=len(robots))
+        robot_x = np.clip(np.round(robot_x), 0, last_cell).astype(np.intp)
+        robot_y = np.clip(np.round(robot_y), 0, last_cell).astype(np.intp)
+
+        zone_ids = self.zone_raster[:, robot_x, robot_y]
+        return self.zone_speed_factors[zone_ids].min(axis=0)
+
     def _apply_speed_limits(self):
         """應用限速到所有機器人"""
-        for robot in self.warehouse.robot_manager.robots:
-            # 檢查機器人是否在任何限速區域內
-            robot_x, robot_y = round(robot.pos_x), round(robot.pos_y)
-            
-            # 找出最嚴格的限速
-            min_speed_factor = 1.0
-            in_speed_zone = False
-            
-            for (x1, y1, x2, y2), speed_factor in self.speed_zones.items():
-                if (min(x1, x2) <= robot_x <= max(x1, x2) and 
-                    min(y1, y2) <= robot_y <= max(y1, y2)):
-                    in_speed_zone = True
-                    min_speed_factor = min(min_speed_factor, speed_factor)
-            
-            # 應用或移除限速
-            if in_speed_zone:
-                robot.apply_speed_limit(min_speed_factor)
-            else:
+        robots = self.warehouse.robot_manager.robots
+        speed_factors = self.get_robot_speed_factors(robots)
+        in_speed_zone = np.isfinite(speed_factors)
+
+        # 應用或移除限速
+        for robot, limited, speed_factor in zip(robots, in_speed_zone, speed_factors):
+            if limited:
+                robot.apply_speed_limit(float(speed_factor))
+            elif robot.speed_limit_active:
                 robot.remove_speed_limit()
-    
+
+        self._zones_dirty = False
+
     def get_active_speed_zones(self) -> List[Dict]:
         """獲取所有活躍的限速區域信息"""
         zones = []
@@ -98,8 +164,11 @@ class SpeedLimitManager:
                 'speed_percentage': f"{speed_factor * 100:.0f}%"
             })
         return zones
-    
+
     def update(self, tick):
         """每個tick更新，確保新進入限速區的機器人被正確限速"""
-        if tick % 10 == 0:  # 每10個tick檢查一次
-            self._apply_speed_limits()
\ No newline at end of file
+        if getattr(self, '_zones_dirty', False):
+            # 區域表有變更時立即套用
+            self._apply_speed_limits()
+        elif self.speed_zones and tick % 10 == 0:  # 每10個tick檢查一次
+            self._apply_speed_limits()
@@ -22,10 +22,17 @@ from world.entities.job import Job
 from lib.generator.order_generator import *
 from lib.constant import *
 from world.speed_limit_manager import SpeedLimitManager
+from world.deadlock_detector import DeadlockDetector
+from world.route_service import RouteService
+from world.congestion_cost_manager import CongestionCostManager
+from world.reservation_table import ReservationTable
+from world.replenishment_planner import ReplenishmentPlanner
 if TYPE_CHECKING:
     from world.entities.object import Object
 
 class Warehouse:
+    # configureFeatures 可開關的選用功能，可經由 netlogo.training_setup 的 controller_kwargs 傳入
+    FEATURES = ('congestion_costs', 'reservations', 'predictive_replenishment')
     DIMENSION = 60
     def __init__(self):
         self._tick = 0
@@ -37,6 +44,7 @@ class Warehouse:
         self.total_turning = 0
         self.warehouse_size = []
         self.layout = Layout()
+        self.geometry = None  # LayoutGeometry，載入版面後設定
         self.landscape = Landscape(self.DIMENSION)
         self.order_manager = OrderManager(self)
         self.zone_manager = ZoneManager(self)
@@ -47,6 +55,11 @@ class Warehouse:
         self.pod_manager = PodManager(self)
         self.station_manager = StationManager(self)
         self.speed_limit_manager = SpeedLimitManager(self)  # V7.0: 速度限制管理器
+        self.deadlock_detector = DeadlockDetector(self)  # 死鎖偵測（進展與等待關係追蹤）
+        self.route_service = RouteService(self)  # 路徑快取與路段修補
+        self.congestion_cost_manager = CongestionCostManager(self)  # 動態擁塞成本（預設關閉）
+        self.reservation_table = ReservationTable(self)  # 時空預約協同規劃（預設關閉）
+        self.replenishment_planner = ReplenishmentPlanner(self)  # 預測式補貨規劃（預設關閉）
         self.next_process_tick = 0
         self.update_intersection_using_RL = True
         self.picking_station_queue_length = 0  # V5.0: 揀貨台排隊長度
@@ -69,6 +82,16 @@ class Warehouse:
     def getWarehouseSize(self):
         return self.warehouse_size
 
+    def setLayoutGeometry(self, geometry):
+        """
+        套用由版面推導出的幾何資訊：座標上限取 DIMENSION 與版面大小的較大者，
+        RL 路口與主要路口改由版面決定
+        """
+        self.geometry = geometry
+        self.landscape.resize(max(self.DIMENSION, geometry.rows - 1, geometry.cols - 1))
+        if geometry.main_intersection is not None:
+            self.intersection_manager.main_intersection = geometry.main_intersection
+
     def getObjects(self):
         result = []
         result.extend(self.area_path_manager.getAllAreaPaths())
@@ -88,17 +111,19 @@ class Warehouse:
 
     def tick(self):
         try:
-            # V5.0: 計算揀貨台排隊長度
-            self.picking_station_queue_length = 0
-            for station in self.station_manager.getAllStations():
-                if station.isPickerStation():
-                    # 統計分配給此揀貨台的機器人數量
-                    self.picking_station_queue_length += len(station.robot_ids)
+            self.deadlock_detector.step()
+            self.reservation_table.step()
+            # V5.0: 揀貨台排隊長度 (站點進出時增量維護)
+            self.picking_station_queue_length = self.station_manager.getPickingQueueLength()
             if int(self._tick) == self.next_process_tick:
                 self.findNewOrders()
                 self.processOrders()
                 if self.update_intersection_using_RL:
                     self.intersection_manager.update_traffic_using_controller(int(self._tick))
+                # V7.0: 將限速區域表套用到機器人
+                self.speed_limit_manager.update(int(self._tick))
+                self.congestion_cost_manager.update(int(self._tick))
+                self.replenishment_planner.update(int(self._tick))
             if len(self.job_queue) > 0:
                 current_distance = 1000000
                 nearest_robot: Optional[Robot] = None
@@ -134,7 +159,9 @@ class Warehouse:
                     if o.velocity == 0 and initial_velocity > 0:
                         self.stop_and_go += 1
 
-                    if o.job is not None and o.job.picking_delay == 0 and not o.job.is_finished:
+                    # 規劃的補貨工作在補貨台服務完成時才結束 (見 ReplenishmentPlanner)
+                    if (o.job is not None and o.job.picking_delay == 0 and not o.job.is_finished
+                            and not getattr(o.job, 'finish_at_station', False)):
                         need_replenish_pod = self.finishTaskInJob(o.job)
                         if need_replenish_pod:
                             print(f"cihuy masuk")
@@ -178,6 +205,7 @@ class Warehouse:
             self._tick += TICK_TO_SECOND
 
     def finishTaskInJob(self, job: Job):
+        self.deadlock_detector.recordSystemProgress()
         job_station = self.station_manager.getStationById(job.station_id)
         if job_station.isPickerStation():
             return self.finishPickingTask(job)
@@ -290,15 +318,15 @@ class Warehouse:
         new_orders = new_file_df[(new_file_df['order_arrival']<= current_second) & 
                                (new_file_df['order_arrival'] > previous_second) &
                                (new_file_df['status'] == -3)]
-        grouped_orders = new_orders.groupby('order_id')
+        grouped_orders = new_orders.groupby('order_id', sort=True)
+        items = grouped_orders['item_id'].agg(lambda values: values.tolist())
+        quantities = grouped_orders['item_quantity'].agg(lambda values: values.tolist())
 
-        for order_id, group in grouped_orders:
-            order_items = group[['item_id', 'item_quantity']].to_dict('records')
-            order = self.order_manager.createOrder(order_id, current_second)
-
-            # Add each item in the group to the order
-            for item in order_items:
-                order.addSKU(item['item_id'], item['item_quantity'])
+        # Add each item in the group to the order
+        for order, order_items, order_quantities in zip(
+                self.order_manager.createOrders(items.index, current_second), items, quantities):
+            order.addSKUs(order_items, order_quantities)
+        self.replenishment_planner.observeOrders(new_orders)
 
         return new_orders
 
@@ -435,6 +463,22 @@ class Warehouse:
 
         return result
 
+    def configureFeatures(self, congestion_costs=None, reservations=None, predictive_replenishment=None):
+        """
+        開關選用功能，None 表示維持目前設定
+
+        Args:
+            congestion_costs: 路徑規劃加入動態擁塞成本 (CongestionCostManager)
+            reservations: 取得新路徑時預約時空區間 (ReservationTable)
+            predictive_replenishment: 依訂單積壓與到達率提前排入補貨 (ReplenishmentPlanner)
+        """
+        if congestion_costs is not None:
+            self.congestion_cost_manager.setEnabled(bool(congestion_costs))
+        if reservations is not None:
+            self.reservation_table.setEnabled(bool(reservations))
+        if predictive_replenishment is not None:
+            self.replenishment_planner.setEnabled(bool(predictive_replenishment))
+
     def set_traffic_controller(self, controller_type, **kwargs):
         """
         設置交通控制器類型